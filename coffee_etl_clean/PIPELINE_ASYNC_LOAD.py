@@ -0,0 +1,312 @@
+"""
+PIPELINE ASYNC LOAD
+===================
+Giống PIPELINE_DIRECT_LOAD nhưng phần Consumer → Validate → Transform → Load
+chạy trên asyncio:
+
+- Một connection RabbitMQ (aio-pika), mỗi queue một channel, 5 queue được
+  drain đồng thời trong cùng một event loop
+- Validate chạy trong event loop, Transform + Load (pyodbc) chạy trong
+  ThreadPoolExecutor, mỗi batch checkout một kết nối Target DB từ SQL pool
+- Trong khi batch trước đang commit, event loop vẫn nhận message của batch
+  sau (ack-after-commit: chỉ ack sau khi batch đã commit)
+
+Usage:
+    python PIPELINE_ASYNC_LOAD.py
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Set
+
+from PIPELINE_DIRECT_LOAD import DirectLoadPipeline
+from etl.broker.async_client import AsyncRabbitMQClient
+from etl.broker.retry import RetryPolicy
+from etl.broker.tracing import TraceBatch
+from etl.utils.batch_validation import validate_batch
+from etl.config import settings
+from etl.logger import logger
+
+
+# Batch mặc định khi CONSUMER_BATCH_SIZE = 0 (async mode luôn load theo batch)
+DEFAULT_BATCH_SIZE = 100
+
+
+class AsyncDirectLoadPipeline(DirectLoadPipeline):
+    """Direct load pipeline với consumer chạy trên asyncio."""
+
+    def consumer_validate_transform_load(self):
+        """Consumer → Validate → Transform → Load cho tất cả queue trong một event loop."""
+        if settings.BROKER_BACKEND != "rabbitmq":
+            # aio-pika cần RabbitMQ server thật; broker in-memory dùng consumer đồng bộ
+            logger.warning("⚠️  BROKER_BACKEND=%s: consumer async cần RabbitMQ, dùng consumer đồng bộ", settings.BROKER_BACKEND)
+            return super().consumer_validate_transform_load()
+
+        queues = self.topology.consumer_queues()
+
+        asyncio.run(self.consume_all_async(queues))
+
+        logger.info("\n✅ Pipeline hoàn thành!")
+
+    async def consume_all_async(self, queues: List[tuple]):
+        """Drain tất cả queue đồng thời; SQL chạy trong executor."""
+        max_workers = settings.CONSUMER_WORKERS if settings.CONSUMER_WORKERS > 1 else len(queues)
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sql")
+
+        logger.info("\n📥 Consume async %s queues (SQL workers: %s)", len(queues), max_workers)
+        started = time.perf_counter()
+
+        try:
+            async with AsyncRabbitMQClient(
+                host=settings.RABBITMQ_HOST,
+                port=settings.RABBITMQ_PORT,
+                username=settings.RABBITMQ_USER,
+                password=settings.RABBITMQ_PASSWORD,
+            ) as rabbitmq:
+                results = await asyncio.gather(
+                    *(
+                        self.process_queue_async(rabbitmq, executor, queue_name, entity_type)
+                        for queue_name, entity_type in queues
+                    ),
+                    return_exceptions=True,
+                )
+        finally:
+            executor.shutdown(wait=True)
+
+        for (queue_name, _), result in zip(queues, results):
+            if isinstance(result, Exception):
+                logger.error("   ✗ Queue %s lỗi: %s", queue_name, result)
+
+        logger.info("   ⏱️  Consume async: wall-clock %.2fs", time.perf_counter() - started)
+
+    async def process_queue_async(
+        self,
+        rabbitmq: AsyncRabbitMQClient,
+        executor: ThreadPoolExecutor,
+        queue_name: str,
+        entity_type: str
+    ):
+        """
+        Consume → validate → transform → load một queue theo batch.
+
+        Mỗi batch được load trong executor; tối đa một batch đang load tại một
+        thời điểm cho mỗi queue, nên thứ tự ack được giữ nguyên. Batch đã được
+        giao lại mà vẫn lỗi được load lại từng message: chỉ message vẫn lỗi
+        chuyển sang retry / parking queue (RetryPolicy), giống MicroBatchConsumer.
+        """
+        try:
+            message_count = await rabbitmq.get_message_count(queue_name)
+        except Exception:
+            logger.warning("   Queue không tồn tại: %s", queue_name)
+            return
+
+        if message_count == 0 and not settings.CONSUMER_FOLLOW:
+            logger.info("   %s: queue rỗng", queue_name)
+            return
+
+        logger.info("   📥 %s: %s messages", queue_name, message_count)
+
+        loop = asyncio.get_running_loop()
+        batch_size = settings.CONSUMER_BATCH_SIZE or DEFAULT_BATCH_SIZE
+        # Prefetch đủ cho 2 batch để broker vẫn giao message khi batch trước đang commit
+        prefetch_count = max(settings.CONSUMER_PREFETCH_COUNT, batch_size * 2)
+        max_wait = settings.CONSUMER_BATCH_MAX_WAIT
+
+        seen_ids: Set[int] = set()
+        seen_emails: Set[str] = set()
+        counts = {
+            "rows": 0, "valid": 0, "invalid": 0, "messages": 0, "batches": 0,
+            "rejected": 0, "retried": 0, "parked": 0,
+        }
+        buffer: List = []
+        buffer_started = 0.0
+        in_flight: Optional[asyncio.Future] = None
+        # Trace của các message trong buffer; mỗi batch mang trace riêng vào executor
+        trace = TraceBatch(self.latency, entity_type)
+        retry_policy = RetryPolicy()
+        await retry_policy.declare_async(rabbitmq, queue_name)
+
+        def prepare(batch: List, batch_trace: Optional[TraceBatch] = None):
+            """Validate batch trong event loop, trả về (load, new_ids, new_emails); load chạy trong executor."""
+            # Dedup theo ID/email của queue
+            with self.latency.measure(entity_type, "validate"):
+                csv_rows, sql_rows, invalid_rows, new_ids, new_emails = validate_batch(
+                    entity_type, [parsed for _, parsed in batch], seen_ids, seen_emails
+                )
+
+            def load():
+                try:
+                    # CSV + SQL của batch commit trong một transaction
+                    with self.target_db_client() as target_db, target_db.transaction():
+                        if csv_rows:
+                            self.transform_and_load(entity_type, csv_rows, source="csv", atomic=True, target_db=target_db)
+                        if sql_rows:
+                            self.transform_and_load(entity_type, sql_rows, source="sql", atomic=True, target_db=target_db)
+                except Exception as e:
+                    return e
+                if batch_trace is not None:
+                    batch_trace.committed()
+                return len(csv_rows) + len(sql_rows), len(invalid_rows)
+
+            return load, new_ids, new_emails
+
+        def loaded(batch_len: int, result: tuple):
+            valid, invalid = result
+            counts["rows"] += valid + invalid
+            counts["valid"] += valid
+            counts["invalid"] += invalid
+            counts["messages"] += batch_len
+
+        async def reject(message, error: Exception, retryable: bool = True):
+            target = await retry_policy.reject_async(rabbitmq, queue_name, message, error, retryable)
+            if target == retry_policy.parking_queue(queue_name):
+                counts["parked"] += 1
+            elif target != queue_name:
+                counts["retried"] += 1
+
+        async def settle():
+            """Chờ batch đang load xong rồi ack/nack cả batch."""
+            nonlocal in_flight
+            if in_flight is None:
+                return
+
+            future, in_flight = in_flight, None
+            batch, new_ids, new_emails, result = await future
+            last_message = batch[-1][0]
+
+            if isinstance(result, Exception):
+                # Batch sẽ được giao lại → bỏ các ID/email vừa ghi nhận
+                seen_ids.difference_update(new_ids)
+                seen_emails.difference_update(new_emails)
+                if any(message.redelivered for message, _ in batch):
+                    # Đã giao lại mà vẫn lỗi → tách message lỗi ra thay vì requeue lặp lại
+                    logger.error(
+                        "   ✗ %s: lỗi load batch %s messages (đã giao lại), xử lý từng message: %s",
+                        queue_name, len(batch), result
+                    )
+                    await load_one_by_one(batch)
+                    return
+                logger.error("   ✗ %s: lỗi load batch %s messages, requeue: %s", queue_name, len(batch), result)
+                await rabbitmq.nack_message(last_message, requeue=True, multiple=True)
+                return
+
+            loaded(len(batch), result)
+            await rabbitmq.ack_message(last_message, multiple=True)
+
+        async def load_one_by_one(batch: List):
+            """Load từng message của batch lỗi: ack message thành công, retry / parking message lỗi."""
+            for message, parsed in batch:
+                load, new_ids, new_emails = prepare([(message, parsed)])
+                result = await loop.run_in_executor(executor, load)
+                if isinstance(result, Exception):
+                    seen_ids.difference_update(new_ids)
+                    seen_emails.difference_update(new_emails)
+                    await reject(message, result)
+                    continue
+                loaded(1, result)
+                await rabbitmq.ack_message(message)
+
+        async def flush():
+            nonlocal buffer, in_flight, trace
+            if not buffer:
+                return
+
+            batch, buffer = buffer, []
+            batch_trace, trace = trace, TraceBatch(self.latency, entity_type)
+            counts["batches"] += 1
+
+            # Batch trước phải xong trước khi batch này validate/load: giữ thứ
+            # tự ack và dedup không dựa vào ID của một batch có thể bị rollback
+            await settle()
+
+            load, new_ids, new_emails = prepare(batch, batch_trace)
+
+            def run():
+                return batch, new_ids, new_emails, load()
+
+            in_flight = loop.run_in_executor(executor, run)
+
+        async def on_message(message):
+            nonlocal buffer_started
+            try:
+                parsed = rabbitmq.decode(message)
+            except ValueError as e:
+                # Message hỏng không bao giờ xử lý được → parking ngay, không vào batch
+                logger.error("   %s: lỗi parse message: %s", queue_name, e)
+                await reject(message, e, retryable=False)
+                counts["rejected"] += 1
+                return
+
+            trace.received(message)
+            if not buffer:
+                buffer_started = time.monotonic()
+            buffer.append((message, parsed))
+
+            if len(buffer) >= batch_size:
+                await flush()
+
+        async def on_tick():
+            if buffer and time.monotonic() - buffer_started >= max_wait:
+                await flush()
+            if in_flight is not None and in_flight.done():
+                await settle()
+
+        async def on_finish():
+            # Batch cuối phải được load và ack trước khi drain đóng channel
+            await flush()
+            await settle()
+
+        try:
+            drain_stats = await rabbitmq.drain(
+                queue_name,
+                on_message,
+                idle_timeout=max(settings.CONSUMER_IDLE_TIMEOUT, max_wait),
+                follow=settings.CONSUMER_FOLLOW,
+                prefetch_count=prefetch_count,
+                on_tick=on_tick,
+                pending=lambda: bool(buffer) or in_flight is not None,
+                on_finish=on_finish,
+            )
+        finally:
+            if in_flight is not None:
+                # Channel đóng trước khi ack được (VD: mất connection): chờ batch
+                # đang load xong, message chưa ack sẽ được broker giao lại
+                await asyncio.wait([in_flight])
+
+        self.add_stats(
+            entity_type,
+            idle=drain_stats["idle_seconds"],
+            consumed=counts["rows"],
+            valid=counts["valid"],
+            invalid=counts["invalid"],
+        )
+
+        logger.info(
+            "   ✓ %s: %s rows / %s messages (%s batches) | Valid: %s | Invalid: %s | Rejected: %s | Retry: %s | Parking: %s",
+            queue_name, counts["rows"], counts["messages"], counts["batches"],
+            counts["valid"], counts["invalid"], counts["rejected"], counts["retried"], counts["parked"]
+        )
+
+
+def main():
+    print()
+    print("╔" + "=" * 78 + "╗")
+    print("║" + " " * 25 + "PIPELINE ASYNC LOAD" + " " * 34 + "║")
+    print("║" + " " * 15 + "Producer → Consumer → Validate → Transform → Load" + " " * 14 + "║")
+    print("╚" + "=" * 78 + "╝")
+    print()
+
+    pipeline = AsyncDirectLoadPipeline()
+
+    try:
+        pipeline.run()
+    except KeyboardInterrupt:
+        logger.info("\n⚠️  Pipeline bị dừng bởi user (Ctrl+C)")
+    except Exception as e:
+        logger.error("❌ Pipeline thất bại: %s", e, exc_info=True)
+        raise
+
+
+if __name__ == "__main__":
+    main()
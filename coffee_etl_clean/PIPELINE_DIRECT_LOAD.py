@@ -10,15 +10,25 @@ Giống main.py nhưng với cấu trúc rõ ràng hơn:
 - run
 """
 
+import threading
 import time
-import jso
 import csv
 from pathlib import Path
 from datetime import datetime
-from typing import Dict, List, Set
+from typing import ContextManager, Dict, List, Set
 
 from etl.broker.rabbitmq_client import RabbitMQClient
+from etl.broker.pool import BrokerPool
+from etl.broker.framing import unpack_message
+from etl.broker.batch_consumer import MicroBatchConsumer
+from etl.broker.topology import BrokerTopology
+from etl.broker.tracing import TraceBatch
+from etl.utils.batch_validation import validate_batch
+from etl.utils.concurrency import prefetch, run_queues_concurrently
+from etl.utils.latency import LatencyRecorder
 from etl.db.database_factory import DatabaseFactory, SourceDBReader
+from etl.db.pool import shared_pool
+from etl.discovery.entity_types import infer_entity_type
 from etl.db.sql_client import SQLServerClient
 from etl.readers.csv_staging_reader import csv_staging_reader
 from etl.quality.rule_registry import rule_registry
@@ -231,6 +241,24 @@ class DirectLoadPipeline:
         self.db_name = f"DB_{self.run_id}"
         self.target_db = None
         
+        # Pool connection RabbitMQ dùng chung cho mọi phase/queue của run
+        self.broker_pool = BrokerPool(
+            host=settings.RABBITMQ_HOST,
+            port=settings.RABBITMQ_PORT,
+            username=settings.RABBITMQ_USER,
+            password=settings.RABBITMQ_PASSWORD,
+            heartbeat=settings.RABBITMQ_HEARTBEAT,
+            codec=settings.MESSAGE_CODEC,
+            compression=settings.MESSAGE_COMPRESSION,
+            compress_min_bytes=settings.MESSAGE_COMPRESS_MIN_BYTES,
+            backend=settings.BROKER_BACKEND,
+            memory_dir=settings.BROKER_MEMORY_DIR,
+            high_watermark=settings.PRODUCER_HIGH_WATERMARK,
+            low_watermark=settings.PRODUCER_LOW_WATERMARK,
+            max_throttle=settings.PRODUCER_MAX_THROTTLE,
+        )
+        self.topology = BrokerTopology(settings.RABBITMQ_EXCHANGE, partitions=settings.BROKER_PARTITIONS)
+        
         # Thư mục
         self.raw_dir = Path("staging") / "raw"
         self.clean_dir = Path("staging") / "clean"
@@ -244,8 +272,13 @@ class DirectLoadPipeline:
             "consumed": {},
             "valid": {},
             "invalid": {},
-            "loaded": {}
+            "loaded": {},
+            "idle": {}
         }
+        # Partition queue của cùng entity có thể được consume song song
+        self._stats_lock = threading.Lock()
+        # Độ trễ theo entity: dwell trong broker, validate, transform, commit
+        self.latency = LatencyRecorder()
     
     def run(self):
         logger.info("=" * 80)
@@ -273,55 +306,40 @@ class DirectLoadPipeline:
             self.consumer_validate_transform_load()
             
             self.print_summary()
+            self.latency.write(Path("logs") / f"run_{self.run_id}" / "latency.json", run_id=self.run_id)
             
         except Exception as e:
             logger.error("❌ Lỗi pipeline: %s", e, exc_info=True)
             raise
         finally:
-            if self.target_db:
-                self.target_db.close()
+            shared_pool().close_all()
+            self.broker_pool.close_all()
     
     def setup_database(self):
         """Setup database và staging tables."""
-        master_db = SQLServerClient(
-            server=f"{settings.TARGET_DB_HOST},{settings.TARGET_DB_PORT}",
-            database="master",
-            driver=settings.TARGET_DB_DRIVER,
-            trusted_connection=settings.TARGET_DB_TRUSTED_CONNECTION,
-        )
-        
-        try:
-            master_db.connect()
+        with DatabaseFactory.target_db("master") as master_db:
             logger.info("📦 Tạo database: %s", self.db_name)
             
             if DatabaseManager.create_database(self.db_name, master_db):
                 logger.info("✅ Database đã sẵn sàng")
             else:
                 raise Exception("Không thể tạo database")
-        finally:
-            master_db.close()
         
         # Kết nối database mới
-        self.target_db = SQLServerClient(
-            server=f"{settings.TARGET_DB_HOST},{settings.TARGET_DB_PORT}",
-            database=self.db_name,
-            driver=settings.TARGET_DB_DRIVER,
-            trusted_connection=settings.TARGET_DB_TRUSTED_CONNECTION,
-        )
-        
-        self.target_db.connect()
-        DatabaseManager.create_staging_schema(self.target_db)
-        DatabaseManager.create_staging_tables(self.target_db)
+        with self.target_db_client() as target_db:
+            DatabaseManager.create_staging_schema(target_db)
+            DatabaseManager.create_staging_tables(target_db)
         logger.info("✅ Setup database hoàn thành")
     
+    def target_db_client(self) -> ContextManager[SQLServerClient]:
+        """Checkout kết nối tới database của run hiện tại từ SQL pool."""
+        return DatabaseFactory.target_db(self.db_name)
+    
     def producer_phase(self):
         """Producer phase - giống STEP1."""
-        with RabbitMQClient(
-            host=settings.RABBITMQ_HOST,
-            port=settings.RABBITMQ_PORT,
-            username=settings.RABBITMQ_USER,
-            password=settings.RABBITMQ_PASSWORD,
-        ) as rabbitmq:
+        with self.broker_pool.client() as rabbitmq:
+            # Exchange + queue entity + binding khai báo một lần cho cả run
+            self.topology.declare(rabbitmq)
             
             logger.info("📄 Producer 1: CSV files...")
             csv_stats = self.produce_from_csv(rabbitmq)
@@ -333,6 +351,10 @@ class DirectLoadPipeline:
             
             logger.info("\n✅ Producer phase hoàn thành!")
             logger.info("   Tổng: %s messages", sum(self.stats["produced"].values()))
+            if rabbitmq.compressor.encoding:
+                logger.info("   🗜️  Nén: %s", rabbitmq.compressor.summary())
+            if rabbitmq.flow.enabled or rabbitmq.flow.stats["throttled_seconds"]:
+                logger.info("   ⏸️  Backpressure: %s", rabbitmq.flow.summary())
     
     def produce_from_csv(self, rabbitmq: RabbitMQClient) -> Dict[str, int]:
         """Producer từ CSV files."""
@@ -355,25 +377,32 @@ class DirectLoadPipeline:
                 logger.warning("   ⚠️  Không tìm thấy: %s", file_name)
                 continue
             
-            rabbitmq.declare_queue(queue_name, durable=True)
-            count = 0
+            entity_type = queue_name.replace("queue_", "")
+            self.topology.ensure_entity(rabbitmq, entity_type)
             
             try:
-                for row in csv_staging_reader(str(file_path)):
-                    message = {
+                messages = (
+                    {
                         "source": "csv",
-                        "entity_type": queue_name.replace("queue_", ""),
+                        "entity_type": entity_type,
                         "data": row,
                         "metadata": {
                             "file": file_name,
                             "extract_time": datetime.now().isoformat(),
                         },
                     }
-                    rabbitmq.publish(queue_name, message, persistent=True)
-                    count += 1
+                    for row in csv_staging_reader(str(file_path))
+                )
+                result = rabbitmq.publish_batch(
+                    queue_name,
+                    messages,
+                    persistent=True,
+                    window=settings.RABBITMQ_PUBLISH_WINDOW,
+                    **self.topology.publish_args("csv", entity_type),
+                )
                 
-                stats[f"csv_{queue_name}"] = count
-                logger.info("   ✓ %s: %s messages → %s", file_name, count, queue_name)
+                stats[f"csv_{queue_name}"] = result["acked"]
+                logger.info("   ✓ %s: %s messages → %s", file_name, result["acked"], queue_name)
                 
             except Exception as e:
                 logger.error("   ✗ Lỗi %s: %s", file_name, e)
@@ -383,10 +412,8 @@ class DirectLoadPipeline:
     def produce_from_sql(self, rabbitmq: RabbitMQClient) -> Dict[str, int]:
         """Producer từ SQL Server."""
         stats = {}
-        source_db = DatabaseFactory.create_source_db()
         
-        try:
-            source_db.connect()
+        with DatabaseFactory.source_db() as source_db:
             reader = SourceDBReader(source_db)
             tables = reader.get_all_tables(schema="dbo")
             
@@ -394,65 +421,95 @@ class DirectLoadPipeline:
                 if table.lower() in ["sysdiagrams"]:
                     continue
                 
-                entity_type = self.infer_entity_type(table)
-                queue_name = f"queue_{entity_type}"
-                
-                rabbitmq.declare_queue(queue_name, durable=True)
+                entity_type = infer_entity_type(table)
+                queue_name = self.topology.ensure_entity(rabbitmq, entity_type)
                 
                 try:
-                    data = reader.read_table(table, schema="dbo")
-                    
-                    from etl.utils.json_encoder import convert_sql_row_to_json_compatible
+                    # Đọc trang keyset tiếp theo trong thread nền trong lúc publish trang hiện tại
+                    chunks = prefetch(
+                        reader.read_table_chunked(table, schema="dbo", chunk_size=settings.SQL_FETCH_SIZE),
+                        depth=settings.SQL_PREFETCH_CHUNKS,
+                        name=f"sql-{table}",
+                    )
                     
-                    for row in data:
-                        json_row = convert_sql_row_to_json_compatible(row)
-                        message = {
+                    messages = (
+                        {
                             "source": "sql",
                             "entity_type": entity_type,
-                            "data": json_row,
+                            "data": row,
                             "metadata": {
                                 "table": table,
                                 "database": settings.SOURCE_DB_NAME,
                                 "extract_time": datetime.now().isoformat(),
                             },
                         }
-                        rabbitmq.publish(queue_name, message, persistent=True)
+                        for chunk in chunks
+                        for row in chunk.rows
+                    )
+                    result = rabbitmq.publish_batch(
+                        queue_name,
+                        messages,
+                        persistent=True,
+                        window=settings.RABBITMQ_PUBLISH_WINDOW,
+                        **self.topology.publish_args("sql", entity_type),
+                    )
                     
-                    stats[f"sql_{queue_name}"] = len(data)
-                    logger.info("   ✓ %s: %s messages → %s", table, len(data), queue_name)
+                    stats[f"sql_{queue_name}"] = result["acked"]
+                    logger.info("   ✓ %s: %s messages → %s", table, result["acked"], queue_name)
                     
                 except Exception as e:
                     logger.error("   ✗ Lỗi %s: %s", table, e)
         
-        finally:
-            source_db.close()
-        
         return stats
     
+    def add_stats(self, entity_type: str, **counts):
+        """Cộng stats consume của entity (idle=..., consumed=..., ...)."""
+        with self._stats_lock:
+            for stats_name, value in counts.items():
+                entity_stats = self.stats[stats_name]
+                entity_stats[entity_type] = entity_stats.get(entity_type, 0) + value
+    
     def consumer_validate_transform_load(self):
         """Consumer → Validate → Transform → Load (trực tiếp, không ghi file)."""
-        queues = [
-            ("queue_khach_hang", "khach_hang"),
-            ("queue_loai_mon", "loai_mon"),
-            ("queue_mon", "mon"),
-            ("queue_nguyen_lieu", "nguyen_lieu"),
-            ("queue_dat_hang", "dat_hang"),
-        ]
+        queues = self.topology.consumer_queues()
         
-        for queue_name, entity_type in queues:
-            logger.info("\n📥 Processing: %s", queue_name)
-            self.process_queue(queue_name, entity_type)
+        if settings.CONSUMER_WORKERS == 1:
+            with self.target_db_client() as target_db:
+                self.target_db = target_db
+                try:
+                    for queue_name, entity_type in queues:
+                        logger.info("\n📥 Processing: %s", queue_name)
+                        self.process_queue(queue_name, entity_type)
+                finally:
+                    self.target_db = None
+        else:
+            self.process_queues_concurrently(queues)
         
         logger.info("\n✅ Pipeline hoàn thành!")
     
-    def process_queue(self, queue_name: str, entity_type: str):
+    def process_queues_concurrently(self, queues: List[tuple]):
+        """
+        Xử lý các queue song song: mỗi worker có RabbitMQ connection/channel
+        riêng và checkout kết nối Target DB từ SQL pool cho mỗi queue. Stats
+        cộng dồn theo entity dưới lock (partition queue của cùng entity chạy
+        trên nhiều worker).
+        """
+        logger.info(
+            "\n📥 Consume song song %s queues (workers: %s)",
+            len(queues),
+            settings.CONSUMER_WORKERS or len(queues),
+        )
+        
+        def worker(queue_name: str, entity_type: str):
+            logger.info("\n📥 Processing: %s", queue_name)
+            with self.target_db_client() as target_db:
+                self.process_queue(queue_name, entity_type, target_db=target_db)
+        
+        run_queues_concurrently(queues, worker, settings.CONSUMER_WORKERS)
+    
+    def process_queue(self, queue_name: str, entity_type: str, target_db: SQLServerClient = None):
         """Xử lý một queue: consume → validate → transform → load."""
-        with RabbitMQClient(
-            host=settings.RABBITMQ_HOST,
-            port=settings.RABBITMQ_PORT,
-            username=settings.RABBITMQ_USER,
-            password=settings.RABBITMQ_PASSWORD,
-        ) as rabbitmq:
+        with self.broker_pool.client() as rabbitmq:
             
             try:
                 method_frame = rabbitmq.channel.queue_declare(
@@ -463,13 +520,18 @@ class DirectLoadPipeline:
                 logger.warning("   Queue không tồn tại: %s", queue_name)
                 return
             
-            if message_count == 0:
+            if message_count == 0 and not settings.CONSUMER_FOLLOW:
                 logger.info("   Queue rỗng")
                 return
             
             logger.info("   Messages: %s", message_count)
             
+            if settings.CONSUMER_BATCH_SIZE > 0:
+                self.process_queue_batched(rabbitmq, queue_name, entity_type, target_db)
+                return
+            
             consumed = 0
+            row_count = 0
             csv_valid_rows: List[Dict] = []
             sql_valid_rows: List[Dict] = []
             csv_invalid_rows: List[Dict] = []
@@ -477,93 +539,191 @@ class DirectLoadPipeline:
             
             seen_ids = set()
             seen_emails = set()
+            trace = TraceBatch(self.latency, entity_type)
             
             def callback(ch, method, properties, body):
-                nonlocal consumed
+                nonlocal consumed, row_count
                 
                 try:
-                    message = json.loads(body.decode("utf-8"))
-                    data = message.get("data", {})
-                    source = message.get("source", "unknown")
-                    
-                    # Validate
-                    is_valid, fixed_row, errors = rule_registry.validate_row(
-                        entity_type=entity_type,
-                        row=data,
-                        context={
-                            "existing_ids": seen_ids,
-                            "existing_emails": seen_emails,
-                            "source": source,
-                        },
-                    )
+                    message = rabbitmq.decode(body, properties)
+                    source, _, rows = unpack_message(message)
+                    trace.received(properties)
+                    validate_started = time.perf_counter()
                     
-                    if is_valid:
-                        if source == "csv":
-                            csv_valid_rows.append(fixed_row)
-                        else:
-                            sql_valid_rows.append(fixed_row)
-                        
-                        # Track IDs
-                        for id_field in ["id", "customer_id"]:
-                            if id_field in fixed_row and fixed_row[id_field]:
-                                try:
-                                    seen_ids.add(int(fixed_row[id_field]))
-                                except (ValueError, TypeError):
-                                    pass
+                    for data in rows:
+                        # Validate
+                        is_valid, fixed_row, errors = rule_registry.validate_row(
+                            entity_type=entity_type,
+                            row=data,
+                            context={
+                                "existing_ids": seen_ids,
+                                "existing_emails": seen_emails,
+                                "source": source,
+                            },
+                        )
                         
-                        if "email" in fixed_row and fixed_row["email"]:
-                            seen_emails.add(fixed_row["email"].lower())
-                    else:
-                        if source == "csv":
-                            csv_invalid_rows.append({"data": data, "errors": errors})
+                        if is_valid:
+                            if source == "csv":
+                                csv_valid_rows.append(fixed_row)
+                            else:
+                                sql_valid_rows.append(fixed_row)
+                            
+                            # Track IDs
+                            for id_field in ["id", "customer_id"]:
+                                if id_field in fixed_row and fixed_row[id_field]:
+                                    try:
+                                        seen_ids.add(int(fixed_row[id_field]))
+                                    except (ValueError, TypeError):
+                                        pass
+                            
+                            if "email" in fixed_row and fixed_row["email"]:
+                                seen_emails.add(fixed_row["email"].lower())
                         else:
-                            sql_invalid_rows.append({"data": data, "errors": errors})
+                            if source == "csv":
+                                csv_invalid_rows.append({"data": data, "errors": errors})
+                            else:
+                                sql_invalid_rows.append({"data": data, "errors": errors})
                     
+                    self.latency.record(entity_type, "validate", time.perf_counter() - validate_started)
                     ch.basic_ack(delivery_tag=method.delivery_tag)
                     consumed += 1
+                    row_count += len(rows)
                     
                 except Exception as e:
                     logger.error("   Lỗi xử lý message: %s", e)
                     ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
             
-            rabbitmq.channel.basic_qos(prefetch_count=1)
-            rabbitmq.channel.basic_consume(
-                queue=queue_name,
-                on_message_callback=callback,
-                auto_ack=False,
+            # Consume cho tới khi queue cạn (hoặc liên tục nếu CONSUMER_FOLLOW)
+            drain_stats = rabbitmq.drain(
+                queue_name,
+                callback,
+                idle_timeout=settings.CONSUMER_IDLE_TIMEOUT,
+                follow=settings.CONSUMER_FOLLOW,
+                prefetch_count=settings.CONSUMER_PREFETCH_COUNT,
             )
-            
-            while consumed < message_count:
-                rabbitmq.connection.process_data_events(time_limit=1)
-            
             total_valid = len(csv_valid_rows) + len(sql_valid_rows)
             total_invalid = len(csv_invalid_rows) + len(sql_invalid_rows)
             
-            self.stats["consumed"][entity_type] = consumed
-            self.stats["valid"][entity_type] = total_valid
-            self.stats["invalid"][entity_type] = total_invalid
+            self.add_stats(
+                entity_type,
+                idle=drain_stats["idle_seconds"],
+                consumed=row_count,
+                valid=total_valid,
+                invalid=total_invalid,
+            )
             
-            logger.info("   Consumed: %s | Valid: %s | Invalid: %s", consumed, total_valid, total_invalid)
+            logger.info(
+                "   Consumed: %s rows / %s messages | Valid: %s | Invalid: %s",
+                row_count, consumed, total_valid, total_invalid
+            )
             
             # Transform & Load trực tiếp (không ghi file)
             if csv_valid_rows:
-                self.transform_and_load(entity_type, csv_valid_rows, source="csv")
+                self.transform_and_load(entity_type, csv_valid_rows, source="csv", target_db=target_db)
             
             if sql_valid_rows:
-                self.transform_and_load(entity_type, sql_valid_rows, source="sql")
+                self.transform_and_load(entity_type, sql_valid_rows, source="sql", target_db=target_db)
+            trace.committed()
+    
+    def process_queue_batched(
+        self,
+        rabbitmq: RabbitMQClient,
+        queue_name: str,
+        entity_type: str,
+        target_db: SQLServerClient = None
+    ):
+        """Micro-batch mode: validate → transform → load → commit rồi mới ack cả batch."""
+        seen_ids = set()
+        seen_emails = set()
+        counts = {"rows": 0, "valid": 0, "invalid": 0}
+        trace = TraceBatch(self.latency, entity_type)
+        
+        def handle_batch(messages: List[Dict]):
+            validate_started = time.perf_counter()
+            csv_valid_rows, sql_valid_rows, invalid_rows, new_ids, new_emails = validate_batch(
+                entity_type, messages, seen_ids, seen_emails
+            )
+            invalid = len(invalid_rows)
+            
+            self.latency.record(entity_type, "validate", time.perf_counter() - validate_started)
+            
+            try:
+                # CSV + SQL của batch commit trong một transaction: không có phần
+                # nào đã commit khi batch bị nack và giao lại
+                with (target_db or self.target_db).transaction():
+                    if csv_valid_rows:
+                        self.transform_and_load(
+                            entity_type, csv_valid_rows, source="csv", atomic=True, target_db=target_db
+                        )
+                    if sql_valid_rows:
+                        self.transform_and_load(
+                            entity_type, sql_valid_rows, source="sql", atomic=True, target_db=target_db
+                        )
+            except Exception:
+                # Batch sẽ được giao lại → bỏ các ID/email vừa ghi nhận
+                seen_ids.difference_update(new_ids)
+                seen_emails.difference_update(new_emails)
+                trace.discard()
+                raise
+            trace.committed()
+            
+            valid = len(csv_valid_rows) + len(sql_valid_rows)
+            counts["rows"] += valid + invalid
+            counts["valid"] += valid
+            counts["invalid"] += invalid
+        
+        consumer = MicroBatchConsumer(
+            rabbitmq,
+            handle_batch,
+            batch_size=settings.CONSUMER_BATCH_SIZE,
+            prefetch_count=settings.CONSUMER_PREFETCH_COUNT,
+            max_wait=settings.CONSUMER_BATCH_MAX_WAIT,
+            on_receive=trace.received,
+        )
+        batch_stats = consumer.consume(
+            queue_name,
+            idle_timeout=settings.CONSUMER_IDLE_TIMEOUT,
+            follow=settings.CONSUMER_FOLLOW,
+        )
+        self.add_stats(
+            entity_type,
+            idle=batch_stats["idle_seconds"],
+            consumed=counts["rows"],
+            valid=counts["valid"],
+            invalid=counts["invalid"],
+        )
+        
+        logger.info(
+            "   Consumed: %s rows / %s messages (%s batches) | Valid: %s | Invalid: %s",
+            counts["rows"], batch_stats["acked"], batch_stats["batches"],
+            counts["valid"], counts["invalid"]
+        )
     
-    def transform_and_load(self, entity_type: str, rows: List[Dict], source: str = "csv"):
-        """Transform và load trực tiếp vào SQL Server."""
+    def transform_and_load(
+        self,
+        entity_type: str,
+        rows: List[Dict],
+        source: str = "csv",
+        atomic: bool = False,
+        target_db: SQLServerClient = None
+    ):
+        """
+        Transform và load trực tiếp vào SQL Server.
+        
+        atomic=True: load trong một transaction và raise nếu lỗi (micro-batch mode).
+        target_db: kết nối riêng của worker (mặc định self.target_db).
+        """
         logger.info("   🔄 Transform & Load [%s]...", source.upper())
         
         # Transform
         transformed_rows = []
-        for row in rows:
-            try:
-                transformed = DataTransformer.transform(entity_type, row)
-                transformed_rows.append(transformed)
-            except Exception as e:
-                logger.error("   Lỗi transform: %s", e)
+        with self.latency.measure(entity_type, "transform"):
+            for row in rows:
+                try:
+                    transformed = DataTransformer.transform(entity_type, row)
+                    transformed_rows.append(transformed)
+                except Exception as e:
+                    logger.error("   Lỗi transform: %s", e)
         
         if not transformed_rows:
             return
@@ -573,38 +733,20 @@ class DirectLoadPipeline:
         staging_table = f"staging.{entity_type}{suffix}"
         
         try:
-            loaded = self.target_db.bulk_insert(
-                table_name=staging_table,
-                data=transformed_rows,
-                batch_size=1000,
-            )
-            stats_key = f"{entity_type}_{source}"
-            self.stats["loaded"][stats_key] = loaded
+            with self.latency.measure(entity_type, "commit"):
+                loaded = (target_db or self.target_db).bulk_insert(
+                    table_name=staging_table,
+                    data=transformed_rows,
+                    batch_size=1000,
+                    atomic=atomic,
+                )
+            self.add_stats(f"{entity_type}_{source}", loaded=loaded)
             logger.info("   ✅ Loaded: %s rows → %s", loaded, staging_table)
             
         except Exception as e:
             logger.error("   ❌ Lỗi load: %s", e)
-    
-    def infer_entity_type(self, name: str) -> str:
-        """Infer entity type từ table name."""
-        mapping = {
-            "khachhang": "khach_hang",
-            "khach_hang": "khach_hang",
-            "khach_hang_tbl": "khach_hang",
-            "mon": "mon",
-            "mon_tbl": "mon",
-            "nguyenlieu": "nguyen_lieu",
-            "nguyen_lieu": "nguyen_lieu",
-            "nguyen_lieu_tbl": "nguyen_lieu",
-            "loaimon": "loai_mon",
-            "loai_mon": "loai_mon",
-            "loai_mon_tbl": "loai_mon",
-            "dathang": "dat_hang",
-            "dat_hang": "dat_hang",
-            "dat_hang_tbl": "dat_hang",
-        }
-        normalized = name.lower().replace("-", "_").replace(" ", "_")
-        return mapping.get(normalized, normalized)
+            if atomic:
+                raise
     
     def print_summary(self):
         logger.info("\n" + "=" * 80)
@@ -613,10 +755,14 @@ class DirectLoadPipeline:
         
         logger.info("\n1️⃣  PRODUCED: %s messages", sum(self.stats["produced"].values()))
         logger.info("2️⃣  CONSUMED: %s messages", sum(self.stats["consumed"].values()))
+        if self.stats["idle"]:
+            logger.info("   Idle: %.2fs (tổng thời gian consumer chờ message)", sum(self.stats["idle"].values()))
         logger.info("3️⃣  VALID: %s records", sum(self.stats["valid"].values()))
         logger.info("4️⃣  INVALID: %s records", sum(self.stats["invalid"].values()))
         logger.info("5️⃣  LOADED: %s records", sum(self.stats["loaded"].values()))
         
+        self.latency.log_summary()
+        
         logger.info("\n💾 Database: %s", self.db_name)
         logger.info("   Staging tables: staging.*_csv, staging.*_sql")
         
@@ -8,43 +8,109 @@ Luồng:
 - SQL Server (ComVanPhong) → Producer → RabbitMQ
 
 Output: Messages trong RabbitMQ queues
+
+Checkpoint: vị trí đã được broker confirm của từng file/table được lưu ở
+staging/checkpoints/; nếu producer bị dừng giữa chừng, chạy lại với
+    python STEP1_PRODUCER.py --resume [RUN_ID]
+(bỏ RUN_ID = run gần nhất) để tiếp tục thay vì publish lại từ đầu.
+
+Incremental: SQL_INCREMENTAL=true (hoặc --incremental) chỉ publish rows SQL
+có watermark mới hơn lần chạy trước (xem etl/db/watermark.py);
+    python STEP1_PRODUCER.py --full-refresh
+đọc lại toàn bộ table và lưu watermark mới.
 """
 
+import sys
+import threading
 import time
+from collections import deque
 from pathlib import Path
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from etl.broker.rabbitmq_client import RabbitMQClient
+from etl.broker.rabbitmq_client import PublishNackedError, RabbitMQClient
+from etl.broker.framing import frame_rows
+from etl.broker.codecs import BodyCompressor
+from etl.broker.flow_control import FlowControl
+from etl.broker.parallel_producer import ParallelCSVProducer, merge_worker_stats
+from etl.broker.topology import BrokerTopology
+from etl.broker.pool import BrokerPool
 from etl.db.database_factory import DatabaseFactory, SourceDBReader
-from etl.readers.csv_staging_reader import csv_staging_reader
+from etl.db.extract import ExtractSlice, ParallelExtractor, plan_extract
+from etl.db.keyset import normalize_key
+from etl.db.pool import shared_pool
+from etl.db.watermark import IncrementalRange
+from etl.discovery.entity_types import infer_entity_type
+from etl.readers.csv_staging_reader import csv_chunk_ranges, csv_offset_reader
+from etl.utils.checkpoint import ProducerCheckpoint
+from etl.utils.concurrency import prefetch
+from etl.utils.watermark_store import WatermarkStore
 from etl.config import settings
 from etl.logger import logger
 
 
+def csv_range_name(file_name: str, start: int, end: int) -> str:
+    """Tên checkpoint của một đoạn byte [start, end) trong file CSV."""
+    return f"{file_name}#{start}-{end}"
+
+
 class ProducerPipeline:
     """Pipeline Producer - Gửi dữ liệu vào RabbitMQ."""
     
-    def __init__(self):
-        self.run_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+    def __init__(
+        self,
+        frame_rows: int = None,
+        frame_bytes: int = None,
+        resume_run_id: str = None,
+        incremental: bool = None,
+        full_refresh: bool = False
+    ):
+        """
+        Args:
+            resume_run_id: Tiếp tục run đã có checkpoint ("latest" = run gần nhất)
+            incremental: Chỉ đọc rows SQL sau watermark lần trước (mặc định SQL_INCREMENTAL)
+            full_refresh: Đọc lại toàn bộ table SQL, vẫn lưu watermark mới
+        """
+        if resume_run_id == "latest":
+            resume_run_id = ProducerCheckpoint.latest_run_id(settings.PRODUCER_CHECKPOINT_DIR)
+            if not resume_run_id:
+                logger.warning("⚠️  Không có checkpoint nào để resume, chạy run mới")
+        
+        self.run_id = resume_run_id or datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.resumed = bool(resume_run_id)
+        self.checkpoint = ProducerCheckpoint(self.run_id, settings.PRODUCER_CHECKPOINT_DIR)
+        self.topology = BrokerTopology(settings.RABBITMQ_EXCHANGE, partitions=settings.BROKER_PARTITIONS)
+        self.full_refresh = full_refresh
+        self.incremental = (settings.SQL_INCREMENTAL if incremental is None else incremental) or full_refresh
+        self.watermarks = WatermarkStore(settings.SOURCE_WATERMARK_FILE) if self.incremental else None
         self.stats = {
             "csv": {},
             "sql": {}
         }
+        
+        # Framing mode: > 1 rows mỗi message
+        self.frame_rows = settings.MESSAGE_FRAME_ROWS if frame_rows is None else frame_rows
+        self.frame_bytes = settings.MESSAGE_FRAME_BYTES if frame_bytes is None else frame_bytes
+        if self.topology.partitions and self.frame_rows > 1:
+            # Partition route theo khóa của từng row → mỗi message một row
+            logger.warning("⚠️  BROKER_PARTITIONS=%s: tắt framing (MESSAGE_FRAME_ROWS=%s)", self.topology.partitions, self.frame_rows)
+            self.frame_rows = 1
     
     def run(self):
         logger.info("=" * 80)
         logger.info("STEP 1: PRODUCER PIPELINE")
-        logger.info("Run ID: %s", self.run_id)
+        logger.info("Run ID: %s%s", self.run_id, " (resume)" if self.resumed else "")
+        if self.incremental:
+            logger.info("SQL: %s", "full refresh" if self.full_refresh else "incremental theo watermark")
+        if self.frame_rows > 1:
+            logger.info("Framing: %s rows / %s bytes mỗi message", self.frame_rows, self.frame_bytes)
         logger.info("=" * 80)
         
         try:
-            with RabbitMQClient(
-                host=settings.RABBITMQ_HOST,
-                port=settings.RABBITMQ_PORT,
-                username=settings.RABBITMQ_USER,
-                password=settings.RABBITMQ_PASSWORD,
-            ) as rabbitmq:
+            with RabbitMQClient(**self.broker_settings()) as rabbitmq:
+                
+                # Exchange + queue entity + binding khai báo một lần cho cả run
+                self.topology.declare(rabbitmq)
                 
                 logger.info("\n📄 Producer 1: CSV Files → RabbitMQ")
                 logger.info("-" * 80)
@@ -56,11 +122,31 @@ class ProducerPipeline:
                 sql_stats = self.produce_from_sql(rabbitmq)
                 self.stats["sql"] = sql_stats
                 
-                self.print_summary()
+                self.print_summary(rabbitmq.compressor, rabbitmq.flow)
                 
         except Exception as e:
             logger.error("❌ Lỗi Producer pipeline: %s", e, exc_info=True)
             raise
+        finally:
+            shared_pool().close_all()
+    
+    @staticmethod
+    def broker_settings() -> Dict:
+        """Tham số RabbitMQClient của producer (client chính và client của worker)."""
+        return dict(
+            host=settings.RABBITMQ_HOST,
+            port=settings.RABBITMQ_PORT,
+            username=settings.RABBITMQ_USER,
+            password=settings.RABBITMQ_PASSWORD,
+            codec=settings.MESSAGE_CODEC,
+            compression=settings.MESSAGE_COMPRESSION,
+            compress_min_bytes=settings.MESSAGE_COMPRESS_MIN_BYTES,
+            backend=settings.BROKER_BACKEND,
+            memory_dir=settings.BROKER_MEMORY_DIR,
+            high_watermark=settings.PRODUCER_HIGH_WATERMARK,
+            low_watermark=settings.PRODUCER_LOW_WATERMARK,
+            max_throttle=settings.PRODUCER_MAX_THROTTLE,
+        )
     
     def produce_from_csv(self, rabbitmq: RabbitMQClient) -> Dict[str, int]:
         """Producer từ CSV files."""
@@ -78,6 +164,12 @@ class ProducerPipeline:
             "dathang.csv": "queue_dat_hang",
         }
         
+        if settings.PRODUCER_WORKERS != 1:
+            if rabbitmq.backend == "memory":
+                logger.warning("   ⚠️  Broker in-memory không dùng chung được giữa các process, publish tuần tự")
+            else:
+                return self.produce_from_csv_parallel(rabbitmq, data_dir, csv_files)
+        
         for file_name, queue_name in csv_files.items():
             file_path = data_dir / file_name
             
@@ -85,109 +177,502 @@ class ProducerPipeline:
                 logger.warning("   ⚠️  Không tìm thấy: %s", file_name)
                 continue
             
-            # Declare queue
-            rabbitmq.declare_queue(queue_name, durable=True)
-            count = 0
-            
             try:
-                for row in csv_staging_reader(str(file_path)):
-                    message = {
-                        "source": "csv",
-                        "entity_type": queue_name.replace("queue_", ""),
-                        "data": row,
-                        "metadata": {
-                            "file": file_name,
-                            "extract_time": datetime.now().isoformat(),
-                            "run_id": self.run_id
-                        },
-                    }
-                    rabbitmq.publish(queue_name, message, persistent=True)
-                    count += 1
-                
-                stats[queue_name] = count
-                logger.info("   ✓ %s: %s messages → %s", file_name, count, queue_name)
-                
+                stats[queue_name] = self.produce_csv_file(rabbitmq, file_path, queue_name)
             except Exception as e:
                 logger.error("   ✗ Lỗi %s: %s", file_name, e)
         
         return stats
     
+    def produce_csv_file(self, rabbitmq: RabbitMQClient, file_path: Path, queue_name: str) -> int:
+        """Publish một file CSV, tiếp tục từ checkpoint nếu có."""
+        file_name = file_path.name
+        entry = self.checkpoint.get("csv", file_name)
+        if entry and entry["done"]:
+            logger.info("   ⏭️  %s: đã publish xong ở lần chạy trước (%s rows)", file_name, entry["rows"])
+            return entry["rows"]
+        
+        start, base_rows = None, 0
+        if entry:
+            start, base_rows = entry["position"], entry["rows"]
+            logger.info("   ↪️  %s: tiếp tục từ byte %s (%s rows đã confirm)", file_name, start, base_rows)
+        
+        entity_type = queue_name.replace("queue_", "")
+        self.topology.ensure_entity(rabbitmq, entity_type)
+        
+        header = {
+            "source": "csv",
+            "entity_type": entity_type,
+            "metadata": {
+                "file": file_name,
+                "run_id": self.run_id
+            },
+        }
+        rows = csv_offset_reader(str(file_path), start)
+        count = self.publish_rows(
+            rabbitmq, queue_name, header, rows, file_name,
+            checkpoint=("csv", file_name),
+            base_rows=base_rows,
+        )
+        return base_rows + count
+    
+    def produce_from_csv_parallel(
+        self,
+        rabbitmq: RabbitMQClient,
+        data_dir: Path,
+        csv_files: Dict[str, str]
+    ) -> Dict[str, int]:
+        """
+        Producer CSV trên process pool: mỗi file (file lớn chia thành nhiều
+        đoạn PRODUCER_CHUNK_BYTES) được parse + encode + publish trong một
+        worker process với connection riêng. Checkpoint theo đoạn
+        (file#start-end); ranh giới đoạn được lưu vào checkpoint để resume
+        chia file giống hệt lần chạy đầu và chỉ publish lại đoạn chưa xong.
+        """
+        stats = {}
+        file_queue_mapping = {}
+        ranges = {}
+        base_rows = {}
+        for file_name, queue_name in csv_files.items():
+            file_path = data_dir / file_name
+            if not file_path.exists():
+                logger.warning("   ⚠️  Không tìm thấy: %s", file_name)
+                continue
+            
+            entry = self.checkpoint.get("csv", file_name)
+            if entry:
+                # Đã xong hoặc dừng giữa chừng khi chạy tuần tự: tiếp tục từ checkpoint
+                try:
+                    stats[queue_name] = stats.get(queue_name, 0) + self.produce_csv_file(rabbitmq, file_path, queue_name)
+                except Exception as e:
+                    logger.error("   ✗ Lỗi %s: %s", file_name, e)
+                continue
+            
+            plan = self.checkpoint.get_plan("csv", file_name)
+            if plan is None:
+                try:
+                    plan = csv_chunk_ranges(str(file_path), settings.PRODUCER_CHUNK_BYTES)
+                except Exception as e:
+                    logger.error("   ✗ Lỗi đọc %s: %s", file_name, e)
+                    continue
+                self.checkpoint.set_plan("csv", file_name, plan)
+            
+            pending = []
+            base_rows[str(file_path)] = 0
+            for start, end in plan:
+                range_entry = self.checkpoint.get("csv", csv_range_name(file_name, start, end))
+                if range_entry and range_entry["done"]:
+                    base_rows[str(file_path)] += range_entry["rows"]
+                else:
+                    pending.append((start, end))
+            if len(pending) < len(plan):
+                logger.info(
+                    "   ↪️  %s: %s/%s đoạn đã publish xong ở lần chạy trước (%s rows)",
+                    file_name, len(plan) - len(pending), len(plan), base_rows[str(file_path)]
+                )
+            
+            self.topology.ensure_entity(rabbitmq, queue_name.replace("queue_", ""))
+            file_queue_mapping[str(file_path)] = queue_name
+            ranges[str(file_path)] = pending
+        
+        def chunk_done(file_path: str, start: int, end: int, count: int):
+            self.checkpoint.complete("csv", csv_range_name(Path(file_path).name, start, end), count)
+        
+        results = ParallelCSVProducer(
+            rabbitmq.client_kwargs(),
+            workers=settings.PRODUCER_WORKERS,
+            chunk_bytes=settings.PRODUCER_CHUNK_BYTES,
+        ).produce(
+            file_queue_mapping,
+            self.publish_csv_chunk,
+            keepalive=lambda: rabbitmq.connection.process_data_events(time_limit=0),
+            ranges=ranges,
+            on_chunk=chunk_done,
+        )
+        merge_worker_stats(results, rabbitmq)
+        
+        for file_path, result in results.items():
+            rows = base_rows[file_path] + result["success"]
+            if result.get("error"):
+                logger.error("   ✗ Lỗi %s: %s", Path(file_path).name, result["error"])
+            else:
+                self.checkpoint.complete("csv", Path(file_path).name, rows)
+            queue_name = result["queue"]
+            stats[queue_name] = stats.get(queue_name, 0) + rows
+            logger.info(
+                "   ✓ %s: %s rows (%s đoạn, %.2fs) → %s",
+                Path(file_path).name,
+                rows,
+                result["chunks"],
+                result["seconds"],
+                queue_name
+            )
+        
+        return stats
+    
+    def publish_csv_chunk(
+        self,
+        rabbitmq: RabbitMQClient,
+        file_path: str,
+        queue_name: str,
+        rows: Iterable[Dict]
+    ) -> Tuple[int, int]:
+        """Publish một đoạn file CSV (chạy trong worker process)."""
+        file_name = Path(file_path).name
+        header = {
+            "source": "csv",
+            "entity_type": queue_name.replace("queue_", ""),
+            "metadata": {
+                "file": file_name,
+                "run_id": self.run_id
+            },
+        }
+        count = self.publish_rows(rabbitmq, queue_name, header, rows, file_name)
+        return count, 0
+    
     def produce_from_sql(self, rabbitmq: RabbitMQClient) -> Dict[str, int]:
         """Producer từ SQL Server."""
         stats = {}
-        source_db = DatabaseFactory.create_source_db()
         
-        try:
-            source_db.connect()
+        with DatabaseFactory.source_db() as source_db:
             reader = SourceDBReader(source_db)
             
             # Auto-discovery tables
-            tables = reader.get_all_tables(schema="dbo")
+            tables = [
+                table for table in reader.get_all_tables(schema="dbo")
+                if table.lower() not in ["sysdiagrams"]
+            ]
+            
+            if settings.SQL_EXTRACT_WORKERS > 1:
+                return self.produce_from_sql_parallel(rabbitmq, reader, tables)
             
             for table in tables:
-                if table.lower() in ["sysdiagrams"]:
-                    continue
-                
                 # Infer entity type từ table name
-                entity_type = self.infer_entity_type(table)
-                queue_name = f"queue_{entity_type}"
+                entity_type = infer_entity_type(table)
+                queue_name = self.topology.queue_name(entity_type)
+                
+                entry = self.checkpoint.get("sql", table)
+                if entry and entry["done"]:
+                    logger.info("   ⏭️  %s: đã publish xong ở lần chạy trước (%s rows)", table, entry["rows"])
+                    stats[queue_name] = entry["rows"]
+                    self.commit_watermark(reader, table, entry["rows"])
+                    continue
                 
-                # Declare queue
-                rabbitmq.declare_queue(queue_name, durable=True)
+                self.topology.ensure_entity(rabbitmq, entity_type)
                 
                 try:
-                    data = reader.read_table(table, schema="dbo")
+                    # Checkpoint theo khóa (khóa chính / unique index): đọc theo trang keyset,
+                    # tiếp tục với khóa > khóa cuối
+                    key = reader.get_key_columns(table, schema="dbo")
+                    after, base_rows = None, 0
+                    if entry and key and entry["position"] is not None:
+                        after, base_rows = entry["position"], entry["rows"]
+                        logger.info("   ↪️  %s: tiếp tục sau %s = %s (%s rows đã confirm)", table, ", ".join(key), after, base_rows)
+                    elif entry:
+                        logger.warning("   ⚠️  %s không có khóa chính / unique index, publish lại từ đầu", table)
+                    incremental = self.incremental_range(reader, table, key)
                     
-                    from etl.utils.json_encoder import convert_sql_row_to_json_compatible
+                    # Đọc trang tiếp theo trong thread nền trong lúc publish trang hiện tại
+                    chunks = prefetch(
+                        reader.read_table_chunked(
+                            table,
+                            schema="dbo",
+                            chunk_size=settings.SQL_FETCH_SIZE,
+                            after=after,
+                            key_columns=key,
+                            where=incremental.where if incremental else None,
+                        ),
+                        depth=settings.SQL_PREFETCH_CHUNKS,
+                        name=f"sql-{table}",
+                    )
                     
-                    for row in data:
-                        json_row = convert_sql_row_to_json_compatible(row)
-                        message = {
-                            "source": "sql",
-                            "entity_type": entity_type,
-                            "data": json_row,
-                            "metadata": {
-                                "table": table,
-                                "database": settings.SOURCE_DB_NAME,
-                                "extract_time": datetime.now().isoformat(),
-                                "run_id": self.run_id
-                            },
-                        }
-                        rabbitmq.publish(queue_name, message, persistent=True)
+                    header = {
+                        "source": "sql",
+                        "entity_type": entity_type,
+                        "metadata": {
+                            "table": table,
+                            "database": settings.SOURCE_DB_NAME,
+                            "run_id": self.run_id
+                        },
+                    }
+                    rows = (
+                        pair
+                        for chunk in chunks
+                        for pair in zip(chunk.keys or [None] * len(chunk.rows), chunk.rows)
+                    )
+                    count = self.publish_rows(
+                        rabbitmq, queue_name, header, rows, table,
+                        checkpoint=("sql", table),
+                        base_rows=base_rows,
+                    )
                     
-                    stats[queue_name] = len(data)
-                    logger.info("   ✓ %s: %s messages → %s", table, len(data), queue_name)
+                    stats[queue_name] = base_rows + count
+                    entry = self.checkpoint.get("sql", table)
+                    if entry and entry["done"]:
+                        self.commit_watermark(reader, table, base_rows + count)
                     
                 except Exception as e:
                     logger.error("   ✗ Lỗi %s: %s", table, e)
         
+        return stats
+    
+    def produce_from_sql_parallel(
+        self,
+        rabbitmq: RabbitMQClient,
+        reader: SourceDBReader,
+        tables: List[str]
+    ) -> Dict[str, int]:
+        """
+        Producer SQL song song (xem etl/db/extract.py): table và slice theo
+        khoảng khóa của table lớn được chia cho SQL_EXTRACT_WORKERS worker,
+        slice lớn trước. Mỗi worker đọc trên connection Source DB riêng từ SQL
+        pool và publish slice thẳng vào queue của entity bằng RabbitMQ client
+        riêng. Checkpoint theo slice; ranh giới slice được lưu vào checkpoint
+        để resume chia table giống hệt lần chạy đầu.
+        """
+        stats = {}
+        stats_lock = threading.Lock()
+        
+        stored = {table: self.checkpoint.get_plan("sql", table) for table in tables}
+        incremental = {}
+        for table in tables:
+            incremental[table] = self.incremental_range(reader, table)
+            if incremental[table] and not self.full_refresh and stored[table] is None:
+                # Incremental chỉ đọc phần mới của table: không chia theo khoảng khóa cả table
+                stored[table] = []
+        slices = plan_extract(
+            reader,
+            tables,
+            "dbo",
+            workers=settings.SQL_EXTRACT_WORKERS,
+            slice_rows=settings.SQL_EXTRACT_SLICE_ROWS,
+            boundaries={table: plan for table, plan in stored.items() if plan is not None},
+        )
+        for table in tables:
+            if stored[table] is None:
+                bounds = [s.until for s in slices if s.table == table and s.until is not None]
+                self.checkpoint.set_plan("sql", table, bounds)
+        
+        pending = []
+        base_rows = {}
+        for extract_slice in slices:
+            queue_name = self.topology.queue_name(infer_entity_type(extract_slice.table))
+            entry = self.checkpoint.get("sql", extract_slice.name)
+            if entry and entry["done"]:
+                logger.info("   ⏭️  %s: đã publish xong ở lần chạy trước (%s rows)", extract_slice.name, entry["rows"])
+                stats[queue_name] = stats.get(queue_name, 0) + entry["rows"]
+                continue
+            
+            if incremental[extract_slice.table]:
+                extract_slice = extract_slice._replace(where=incremental[extract_slice.table].where)
+            base_rows[extract_slice.name] = 0
+            if entry and extract_slice.key_columns and entry["position"] is not None:
+                extract_slice = extract_slice._replace(after=normalize_key(entry["position"]))
+                base_rows[extract_slice.name] = entry["rows"]
+                logger.info(
+                    "   ↪️  %s: tiếp tục sau %s = %s (%s rows đã confirm)",
+                    extract_slice.name, ", ".join(extract_slice.key_columns), entry["position"], entry["rows"]
+                )
+            elif entry:
+                logger.warning("   ⚠️  %s không có khóa chính / unique index, publish lại từ đầu", extract_slice.name)
+            pending.append(extract_slice)
+        
+        # Khai báo queue trên client chính trước khi các worker publish
+        for table in {extract_slice.table for extract_slice in pending}:
+            self.topology.ensure_entity(rabbitmq, infer_entity_type(table))
+        
+        broker_pool = BrokerPool(**self.broker_settings())
+        
+        def publish_slice(extract_slice: ExtractSlice, chunks) -> int:
+            entity_type = infer_entity_type(extract_slice.table)
+            queue_name = self.topology.queue_name(entity_type)
+            header = {
+                "source": "sql",
+                "entity_type": entity_type,
+                "metadata": {
+                    "table": extract_slice.table,
+                    "database": settings.SOURCE_DB_NAME,
+                    "run_id": self.run_id
+                },
+            }
+            # Đọc trang tiếp theo trong thread nền trong lúc publish trang hiện tại
+            chunks = prefetch(chunks, depth=settings.SQL_PREFETCH_CHUNKS, name=f"sql-{extract_slice.name}")
+            rows = (
+                pair
+                for chunk in chunks
+                for pair in zip(chunk.keys or [None] * len(chunk.rows), chunk.rows)
+            )
+            with broker_pool.client() as worker_rabbitmq:
+                count = self.publish_rows(
+                    worker_rabbitmq, queue_name, header, rows, extract_slice.name,
+                    checkpoint=("sql", extract_slice.name),
+                    base_rows=base_rows[extract_slice.name],
+                )
+            
+            with stats_lock:
+                stats[queue_name] = stats.get(queue_name, 0) + base_rows[extract_slice.name] + count
+            return count
+        
+        extractor = ParallelExtractor(
+            reader.pooled,
+            workers=settings.SQL_EXTRACT_WORKERS,
+            schema="dbo",
+            chunk_size=settings.SQL_FETCH_SIZE,
+        )
+        try:
+            extractor.run(pending, publish_slice)
         finally:
-            source_db.close()
+            broker_pool.close_all()
+        
+        # Watermark của table chỉ được lưu khi mọi slice đã publish xong
+        for table in tables:
+            entries = [self.checkpoint.get("sql", s.name) for s in slices if s.table == table]
+            if all(entry and entry["done"] for entry in entries):
+                self.commit_watermark(reader, table, sum(entry["rows"] for entry in entries))
         
         return stats
     
-    def infer_entity_type(self, name: str) -> str:
-        """Infer entity type từ table name."""
-        mapping = {
-            "khachhang": "khach_hang",
-            "khach_hang": "khach_hang",
-            "khach_hang_tbl": "khach_hang",
-            "mon": "mon",
-            "mon_tbl": "mon",
-            "nguyenlieu": "nguyen_lieu",
-            "nguyen_lieu": "nguyen_lieu",
-            "nguyen_lieu_tbl": "nguyen_lieu",
-            "loaimon": "loai_mon",
-            "loai_mon": "loai_mon",
-            "loai_mon_tbl": "loai_mon",
-            "dathang": "dat_hang",
-            "dat_hang": "dat_hang",
-            "dat_hang_tbl": "dat_hang",
-        }
-        normalized = name.lower().replace("-", "_").replace(" ", "_")
-        return mapping.get(normalized, normalized)
+    def incremental_range(
+        self,
+        reader: SourceDBReader,
+        table: str,
+        key_columns: List[str] = None
+    ) -> Optional[IncrementalRange]:
+        """
+        Khoảng watermark cần đọc của table (None = đọc toàn bộ). Khoảng được
+        lưu vào checkpoint để khi resume đọc đúng khoảng của lần chạy đầu.
+        """
+        if not self.incremental:
+            return None
+        
+        stored = self.checkpoint.get_plan("watermark", table)
+        if stored is not None:
+            return IncrementalRange.load(stored) if stored else None
+        
+        incremental = reader.plan_incremental(table, self.watermarks, "dbo", self.full_refresh, key_columns)
+        self.checkpoint.set_plan("watermark", table, incremental.dump() if incremental else {})
+        return incremental
+    
+    def commit_watermark(self, reader: SourceDBReader, table: str, rows: int):
+        """Lưu watermark của table khi đã publish xong (mọi row được broker confirm)."""
+        stored = self.checkpoint.get_plan("watermark", table) if self.incremental else None
+        if stored:
+            reader.commit_watermark(table, self.watermarks, IncrementalRange.load(stored), "dbo", rows, self.run_id)
     
-    def print_summary(self):
+    def publish_rows(
+        self,
+        rabbitmq: RabbitMQClient,
+        queue_name: str,
+        header: Dict,
+        rows: Iterable,
+        label: str,
+        checkpoint: Optional[Tuple[str, str]] = None,
+        base_rows: int = 0
+    ) -> int:
+        """
+        Gửi rows vào queue, mỗi row một message hoặc theo framing mode.
+        
+        Args:
+            rows: Iterable các row (dict); khi có checkpoint là (position, row)
+            checkpoint: (source, name) - lưu position của row cuối cùng đã được
+                        broker confirm, đánh dấu xong khi không có message bị nack
+            base_rows: Số rows đã confirm ở lần chạy trước (resume)
+        
+        Returns:
+            Số rows đã được broker xác nhận
+        
+        Raises:
+            PublishNackedError: Broker nack một phần message (file/table không
+                                được đánh dấu xong, không lưu watermark)
+        """
+        frame_sizes = []
+        message_positions = []
+        row_positions = deque()
+        
+        if checkpoint:
+            pairs = rows
+            
+            def tracked():
+                for position, row in pairs:
+                    row_positions.append(position)
+                    yield row
+            
+            rows = tracked()
+        
+        def add_message(size: int):
+            frame_sizes.append(size)
+            if checkpoint:
+                # frame_rows đọc trước một row: position của message là của row thứ `size`
+                for _ in range(size - 1):
+                    row_positions.popleft()
+                message_positions.append(row_positions.popleft())
+        
+        if self.frame_rows > 1:
+            header = {
+                **header,
+                "metadata": {
+                    **header["metadata"],
+                    "extract_time": datetime.now().isoformat(),
+                },
+            }
+            
+            def messages():
+                for frame in frame_rows(rows, header, self.frame_rows, self.frame_bytes):
+                    add_message(len(frame["rows"]))
+                    yield frame
+        else:
+            def messages():
+                for row in rows:
+                    add_message(1)
+                    yield {
+                        **header,
+                        "data": row,
+                        "metadata": {
+                            **header["metadata"],
+                            "extract_time": datetime.now().isoformat(),
+                        },
+                    }
+        
+        confirmed = {"messages": 0, "rows": base_rows}
+        
+        def on_confirmed(n: int):
+            confirmed["rows"] += sum(frame_sizes[confirmed["messages"]:n])
+            confirmed["messages"] = n
+            self.checkpoint.advance(checkpoint[0], checkpoint[1], message_positions[n - 1], confirmed["rows"])
+        
+        try:
+            result = rabbitmq.publish_batch(
+                queue_name,
+                messages(),
+                persistent=True,
+                window=settings.RABBITMQ_PUBLISH_WINDOW,
+                on_confirmed=on_confirmed if checkpoint else None,
+                **self.topology.publish_args(header["source"], header["entity_type"]),
+            )
+        except PublishNackedError as e:
+            # Checkpoint dừng ở message bị nack đầu tiên: --resume publish lại từ đó
+            nacked_rows = sum(frame_sizes[i] for i in e.result["nacked"])
+            logger.warning("   ⚠️  %s: %s rows bị broker nack", label, nacked_rows)
+            raise
+        finally:
+            if checkpoint:
+                self.checkpoint.save()
+        
+        count = sum(frame_sizes)
+        if checkpoint:
+            self.checkpoint.complete(checkpoint[0], checkpoint[1], base_rows + count)
+        
+        logger.info(
+            "   ✓ %s: %s rows (%s messages) → %s",
+            label,
+            count,
+            result["acked"],
+            queue_name
+        )
+        
+        return count
+    
+    def print_summary(self, compressor: BodyCompressor = None, flow: FlowControl = None):
         logger.info("\n" + "=" * 80)
         logger.info("📊 PRODUCER SUMMARY")
         logger.info("=" * 80)
@@ -195,18 +680,23 @@ class ProducerPipeline:
         logger.info("\n📄 CSV → RabbitMQ:")
         csv_total = 0
         for queue, count in self.stats["csv"].items():
-            logger.info("   • %s: %s messages", queue, count)
+            logger.info("   • %s: %s rows", queue, count)
             csv_total += count
-        logger.info("   TỔNG CSV: %s messages", csv_total)
+        logger.info("   TỔNG CSV: %s rows", csv_total)
         
         logger.info("\n💾 SQL → RabbitMQ:")
         sql_total = 0
         for queue, count in self.stats["sql"].items():
-            logger.info("   • %s: %s messages", queue, count)
+            logger.info("   • %s: %s rows", queue, count)
             sql_total += count
-        logger.info("   TỔNG SQL: %s messages", sql_total)
+        logger.info("   TỔNG SQL: %s rows", sql_total)
+        
+        logger.info("\n✅ TỔNG: %s rows đã gửi vào RabbitMQ", csv_total + sql_total)
         
-        logger.info("\n✅ TỔNG: %s messages đã gửi vào RabbitMQ", csv_total + sql_total)
+        if compressor and compressor.encoding:
+            logger.info("\n🗜️  Nén: %s", compressor.summary())
+        if flow and (flow.enabled or flow.stats["throttled_seconds"]):
+            logger.info("\n⏸️  Backpressure: %s", flow.summary())
         logger.info("=" * 80)
 
 
@@ -218,7 +708,18 @@ def main():
     print("╚" + "=" * 78 + "╝")
     print()
     
-    pipeline = ProducerPipeline()
+    # --resume [RUN_ID]: tiếp tục run bị dừng (bỏ RUN_ID = run gần nhất)
+    resume_run_id = None
+    if "--resume" in sys.argv:
+        index = sys.argv.index("--resume")
+        resume_run_id = sys.argv[index + 1] if len(sys.argv) > index + 1 and not sys.argv[index + 1].startswith("--") else "latest"
+    
+    # --incremental: chỉ đọc rows SQL mới (như SQL_INCREMENTAL=true); --full-refresh: đọc lại toàn bộ
+    pipeline = ProducerPipeline(
+        resume_run_id=resume_run_id,
+        incremental=True if "--incremental" in sys.argv else None,
+        full_refresh="--full-refresh" in sys.argv,
+    )
     
     try:
         pipeline.run()
@@ -12,13 +12,18 @@ Output: CSV files trong staging/raw/
 - ...
 """
 
-import json
 import csv
+import threading
 from pathlib import Path
 from datetime import datetime
 from typing import Dict, List
 
-from etl.broker.rabbitmq_client import RabbitMQClient
+from etl.broker.pool import BrokerPool
+from etl.broker.topology import BrokerTopology
+from etl.broker.tracing import TraceBatch
+from etl.broker.framing import unpack_message
+from etl.utils.concurrency import run_queues_concurrently
+from etl.utils.latency import LatencyRecorder
 from etl.config import settings
 from etl.logger import logger
 
@@ -35,6 +40,29 @@ class RawConsumerPipeline:
         
         self.stats = {}
         self.file_writers = {}  # Cache CSV writers
+        # Partition queue của cùng entity có thể được consume song song
+        # → chung file writer và stats của entity
+        self._lock = threading.Lock()
+        # Độ trễ: dwell trong broker, end-to-end tới khi row được ghi vào raw zone
+        self.latency = LatencyRecorder()
+        
+        self.topology = BrokerTopology(
+            settings.RABBITMQ_EXCHANGE, partitions=settings.BROKER_PARTITIONS
+        )
+        
+        # Pool connection RabbitMQ dùng chung cho mọi phase/queue của run
+        self.broker_pool = BrokerPool(
+            host=settings.RABBITMQ_HOST,
+            port=settings.RABBITMQ_PORT,
+            username=settings.RABBITMQ_USER,
+            password=settings.RABBITMQ_PASSWORD,
+            heartbeat=settings.RABBITMQ_HEARTBEAT,
+            codec=settings.MESSAGE_CODEC,
+            compression=settings.MESSAGE_COMPRESSION,
+            compress_min_bytes=settings.MESSAGE_COMPRESS_MIN_BYTES,
+            backend=settings.BROKER_BACKEND,
+            memory_dir=settings.BROKER_MEMORY_DIR,
+        )
     
     def run(self):
         logger.info("=" * 80)
@@ -45,35 +73,37 @@ class RawConsumerPipeline:
         
         try:
             # Danh sách queues cần consume
-            queues = [
-                ("queue_khach_hang", "khach_hang"),
-                ("queue_loai_mon", "loai_mon"),
-                ("queue_mon", "mon"),
-                ("queue_nguyen_lieu", "nguyen_lieu"),
-                ("queue_dat_hang", "dat_hang"),
-            ]
-            
-            for queue_name, entity_type in queues:
-                logger.info("\n📥 Processing: %s", queue_name)
-                self.consume_queue(queue_name, entity_type)
+            queues = self.topology.consumer_queues()
+            
+            if settings.CONSUMER_WORKERS == 1:
+                for queue_name, entity_type in queues:
+                    logger.info("\n📥 Processing: %s", queue_name)
+                    self.consume_queue(queue_name, entity_type)
+            else:
+                # Mỗi worker có connection/channel riêng; file writers và stats
+                # theo entity, ghi dưới lock (partition queue cùng entity)
+                logger.info(
+                    "\n📥 Consume song song %s queues (workers: %s)",
+                    len(queues),
+                    settings.CONSUMER_WORKERS or len(queues)
+                )
+                run_queues_concurrently(queues, self.consume_queue, settings.CONSUMER_WORKERS)
             
             # Đóng tất cả file writers
             self.close_all_writers()
             
             self.print_summary()
+            self.latency.write(Path("logs") / f"run_{self.run_id}" / "latency.json", run_id=self.run_id)
             
         except Exception as e:
             logger.error("❌ Lỗi Raw Consumer pipeline: %s", e, exc_info=True)
             raise
+        finally:
+            self.broker_pool.close_all()
     
     def consume_queue(self, queue_name: str, entity_type: str):
         """Consume một queue và ghi vào CSV files."""
-        with RabbitMQClient(
-            host=settings.RABBITMQ_HOST,
-            port=settings.RABBITMQ_PORT,
-            username=settings.RABBITMQ_USER,
-            password=settings.RABBITMQ_PASSWORD,
-        ) as rabbitmq:
+        with self.broker_pool.client() as rabbitmq:
             
             try:
                 # Kiểm tra số message trong queue
@@ -85,58 +115,80 @@ class RawConsumerPipeline:
                 logger.warning("   Queue không tồn tại: %s", queue_name)
                 return
             
-            if message_count == 0:
+            if message_count == 0 and not settings.CONSUMER_FOLLOW:
                 logger.info("   Queue rỗng")
                 return
             
             logger.info("   Messages: %s", message_count)
             
             consumed = 0
+            row_count = 0
             csv_count = 0
             sql_count = 0
+            trace = TraceBatch(self.latency, entity_type)
             
             def callback(ch, method, properties, body):
-                nonlocal consumed, csv_count, sql_count
+                nonlocal consumed, row_count, csv_count, sql_count
                 
                 try:
-                    message = json.loads(body.decode("utf-8"))
-                    source = message.get("source", "unknown")
-                    data = message.get("data", {})
-                    metadata = message.get("metadata", {})
+                    message = rabbitmq.decode(body, properties)
+                    source, metadata, rows = unpack_message(message)
+                    trace.received(properties)
                     
-                    # Ghi vào CSV file tương ứng
-                    self.write_to_csv(entity_type, source, data, metadata)
+                    # Ghi vào CSV file tương ứng (framed message chứa nhiều rows)
+                    with self._lock:
+                        for data in rows:
+                            self.write_to_csv(entity_type, source, data, metadata)
+                    trace.committed()
                     
                     if source == "csv":
-                        csv_count += 1
+                        csv_count += len(rows)
                     elif source == "sql":
-                        sql_count += 1
+                        sql_count += len(rows)
                     
                     ch.basic_ack(delivery_tag=method.delivery_tag)
                     consumed += 1
+                    row_count += len(rows)
                     
                 except Exception as e:
                     logger.error("   Lỗi xử lý message: %s", e)
                     ch.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
             
-            rabbitmq.channel.basic_qos(prefetch_count=1)
-            rabbitmq.channel.basic_consume(
-                queue=queue_name,
-                on_message_callback=callback,
-                auto_ack=False,
+            # Consume cho tới khi queue cạn (hoặc liên tục nếu CONSUMER_FOLLOW)
+            # Client được dùng lại giữa các queue → chỉ báo phần giải nén của queue này
+            decompress_before = dict(rabbitmq.compressor.stats)
+            drain_stats = rabbitmq.drain(
+                queue_name,
+                callback,
+                idle_timeout=settings.CONSUMER_IDLE_TIMEOUT,
+                follow=settings.CONSUMER_FOLLOW,
+                prefetch_count=settings.CONSUMER_PREFETCH_COUNT,
             )
             
-            # Consume messages
-            while consumed < message_count:
-                rabbitmq.connection.process_data_events(time_limit=1)
-            
-            self.stats[entity_type] = {
-                "total": consumed,
-                "csv": csv_count,
-                "sql": sql_count
-            }
+            with self._lock:
+                entity_stats = self.stats.setdefault(
+                    entity_type, {"total": 0, "csv": 0, "sql": 0, "idle_seconds": 0.0}
+                )
+                entity_stats["total"] += row_count
+                entity_stats["csv"] += csv_count
+                entity_stats["sql"] += sql_count
+                entity_stats["idle_seconds"] += drain_stats["idle_seconds"]
             
-            logger.info("   ✓ Consumed: %s (CSV: %s, SQL: %s)", consumed, csv_count, sql_count)
+            logger.info(
+                "   ✓ Consumed: %s rows / %s messages (CSV: %s, SQL: %s)",
+                row_count, consumed, csv_count, sql_count
+            )
+            logger.info(
+                "   ⏱️  Busy: %.2fs | Idle: %.2fs",
+                drain_stats["busy_seconds"], drain_stats["idle_seconds"]
+            )
+            decompressed = rabbitmq.compressor.stats["decompressed"] - decompress_before["decompressed"]
+            if decompressed:
+                logger.info(
+                    "   🗜️  Giải nén: %s messages, CPU %.3fs",
+                    decompressed,
+                    rabbitmq.compressor.stats["decompress_seconds"] - decompress_before["decompress_seconds"]
+                )
     
     def write_to_csv(self, entity_type: str, source: str, data: Dict, metadata: Dict):
         """Ghi một row vào CSV file."""
@@ -208,6 +260,8 @@ class RawConsumerPipeline:
                        stats["sql"])
             total_all += stats["total"]
         
+        self.latency.log_summary()
+        
         logger.info("\n✅ TỔNG: %s rows đã ghi vào RAW ZONE", total_all)
         logger.info("=" * 80)
 
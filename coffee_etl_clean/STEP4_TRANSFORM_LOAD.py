@@ -19,9 +19,9 @@ from pathlib import Path
 from datetime import datetime
 from typing import Dict, List
 
-from etl.db.sql_client import SQLServerClient
+from etl.db.database_factory import DatabaseFactory
+from etl.db.pool import shared_pool
 from etl.transformers.data_transformer import DataTransformer
-from etl.config import settings
 from etl.logger import logger
 
 
@@ -291,7 +291,9 @@ class TransformLoadPipeline:
             raise
         finally:
             if self.target_db:
-                self.target_db.close()
+                shared_pool().release(self.target_db)
+                self.target_db = None
+            shared_pool().close_all()
     
     def process_from_memory(self, valid_data: Dict[str, List[Dict]]):
         """Xử lý data trực tiếp từ memory (pipeline mode)."""
@@ -333,34 +335,16 @@ class TransformLoadPipeline:
     def setup_database(self):
         """Setup database và staging tables."""
         # Kết nối master để tạo database
-        master_db = SQLServerClient(
-            server=f"{settings.TARGET_DB_HOST},{settings.TARGET_DB_PORT}",
-            database="master",
-            driver=settings.TARGET_DB_DRIVER,
-            trusted_connection=settings.TARGET_DB_TRUSTED_CONNECTION,
-        )
-        
-        try:
-            master_db.connect()
+        with DatabaseFactory.target_db("master") as master_db:
             logger.info("📦 Tạo database: %s", self.db_name)
             
             if DatabaseManager.create_database(self.db_name, master_db):
                 logger.info("✅ Database đã sẵn sàng")
             else:
                 raise Exception("Không thể tạo database")
-                
-        finally:
-            master_db.close()
-        
-        # Kết nối database mới
-        self.target_db = SQLServerClient(
-            server=f"{settings.TARGET_DB_HOST},{settings.TARGET_DB_PORT}",
-            database=self.db_name,
-            driver=settings.TARGET_DB_DRIVER,
-            trusted_connection=settings.TARGET_DB_TRUSTED_CONNECTION,
-        )
         
-        self.target_db.connect()
+        # Kết nối database mới (giữ tới hết run, trả lại pool trong run())
+        self.target_db = shared_pool().acquire(**DatabaseFactory.target_params(self.db_name))
         DatabaseManager.create_staging_schema(self.target_db)
         DatabaseManager.create_staging_tables(self.target_db)
         logger.info("✅ Setup database hoàn thành")
@@ -0,0 +1,178 @@
+"""
+BENCHMARK: BULK INSERT (executemany vs fast_executemany + setinputsizes)
+========================================================================
+Đo rows/sec của SQLServerClient.bulk_insert trên từng dạng staging table
+(khach_hang, loai_mon, mon, nguyen_lieu, dat_hang) với hai chế độ:
+
+- executemany: pyodbc mặc định (mỗi row một lần execute, kiểu tham số
+  đoán theo giá trị Python)
+- fast: fast_executemany + setinputsizes theo INFORMATION_SCHEMA
+
+Rows giả lập giống output của DataTransformer: cột chuỗi lẫn None, số dạng
+float/str, ngày dạng str ISO. Cần SQL Server thật (TARGET_DB_* trong .env);
+benchmark tạo table staging.bench_<entity> trong database --database rồi
+xóa khi xong.
+
+Usage (chạy từ thư mục coffee_etl_clean):
+    python -m benchmarks.bench_bulk_insert --database newdata
+    python -m benchmarks.bench_bulk_insert --database newdata --rows 50000 --batch-size 5000
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from etl.config import settings
+from etl.db.sql_client import SQLServerClient
+
+# Cột của các staging table (giống DDL trong main.py, bỏ id IDENTITY / loaded_at)
+SHAPES = {
+    "khach_hang": """
+        customer_id NVARCHAR(50), ho_ten NVARCHAR(200), sdt NVARCHAR(20),
+        thanh_pho NVARCHAR(100), email NVARCHAR(200), extract_time DATETIME
+    """,
+    "loai_mon": """
+        ma_loai NVARCHAR(50), ten_loai NVARCHAR(200), mo_ta NVARCHAR(500),
+        extract_time DATETIME
+    """,
+    "mon": """
+        ten_mon NVARCHAR(200), loai_id INT, gia DECIMAL(18,2), extract_time DATETIME
+    """,
+    "nguyen_lieu": """
+        ma_nguyen_lieu NVARCHAR(50), ten_nguyen_lieu NVARCHAR(200), so_luong DECIMAL(18,2),
+        don_vi NVARCHAR(50), gia DECIMAL(18,2), nha_cung_cap NVARCHAR(200),
+        ngay_nhap DATE, extract_time DATETIME
+    """,
+    "dat_hang": """
+        khach_hang_id NVARCHAR(50), mon_id NVARCHAR(50), so_luong INT,
+        ngay_dat DATE, trang_thai NVARCHAR(50), extract_time DATETIME
+    """,
+}
+
+
+def maybe_none(rng: random.Random, value, ratio: float = 0.1):
+    return None if rng.random() < ratio else value
+
+
+def make_rows(entity: str, count: int, seed: int = 42) -> list:
+    rng = random.Random(seed)
+    now = datetime.now()
+    rows = []
+    for i in range(count):
+        day = (now - timedelta(days=rng.randint(0, 365))).date().isoformat()
+        if entity == "khach_hang":
+            row = {
+                "customer_id": str(i),
+                "ho_ten": maybe_none(rng, "Nguyễn Văn A %s" % i),
+                "sdt": maybe_none(rng, "090%07d" % i),
+                "thanh_pho": maybe_none(rng, rng.choice(["Hà Nội", "Hồ Chí Minh", "Đà Nẵng"])),
+                "email": maybe_none(rng, "user%s@example.com" % i),
+            }
+        elif entity == "loai_mon":
+            row = {
+                "ma_loai": "L%04d" % i,
+                "ten_loai": "Loại %s" % i,
+                "mo_ta": maybe_none(rng, "Mô tả loại món %s" % i, 0.3),
+            }
+        elif entity == "mon":
+            row = {
+                "ten_mon": "Món %s" % i,
+                "loai_id": maybe_none(rng, rng.choice([rng.randint(1, 20), str(rng.randint(1, 20))])),
+                "gia": maybe_none(rng, rng.choice([rng.randint(10, 90) * 1000.0, "45000"])),
+            }
+        elif entity == "nguyen_lieu":
+            row = {
+                "ma_nguyen_lieu": "NL%05d" % i,
+                "ten_nguyen_lieu": "Nguyên liệu %s" % i,
+                "so_luong": rng.choice([rng.random() * 100, 0]),
+                "don_vi": rng.choice(["kg", "lít", "hộp"]),
+                "gia": rng.random() * 500000,
+                "nha_cung_cap": maybe_none(rng, "NCC %s" % rng.randint(1, 50)),
+                "ngay_nhap": maybe_none(rng, day),
+            }
+        else:
+            row = {
+                "khach_hang_id": str(rng.randint(1, 1000)),
+                "mon_id": str(rng.randint(1, 200)),
+                "so_luong": rng.choice([rng.randint(1, 5), str(rng.randint(1, 5))]),
+                "ngay_dat": maybe_none(rng, day),
+                "trang_thai": rng.choice(["Đã giao", "Đang xử lý", None]),
+            }
+        row["extract_time"] = now
+        rows.append(row)
+    return rows
+
+
+def make_client(database: str, fast: bool) -> SQLServerClient:
+    client = SQLServerClient(
+        server=f"{settings.TARGET_DB_HOST},{settings.TARGET_DB_PORT}",
+        database=database,
+        driver=settings.TARGET_DB_DRIVER,
+        trusted_connection=settings.TARGET_DB_TRUSTED_CONNECTION,
+        fast_executemany=fast,
+    )
+    client.connect()
+    return client
+
+
+def bench(client: SQLServerClient, table: str, rows: list, batch_size: int) -> float:
+    client.execute_non_query(f"TRUNCATE TABLE {table}")
+    start = time.perf_counter()
+    loaded = client.bulk_insert(table, rows, batch_size=batch_size)
+    elapsed = time.perf_counter() - start
+    assert loaded == len(rows), "Insert thiếu rows: %s/%s" % (loaded, len(rows))
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", default=settings.TARGET_DB_NAME)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--entities", nargs="+", default=list(SHAPES))
+    args = parser.parse_args()
+
+    plain = make_client(args.database, fast=False)
+    fast = make_client(args.database, fast=True)
+    results = []
+
+    try:
+        plain.execute_non_query(
+            "IF NOT EXISTS (SELECT * FROM sys.schemas WHERE name = 'staging') EXEC('CREATE SCHEMA staging')"
+        )
+        for entity in args.entities:
+            table = f"staging.bench_{entity}"
+            plain.execute_non_query(f"IF OBJECT_ID('{table}') IS NOT NULL DROP TABLE {table}")
+            plain.execute_non_query(
+                f"CREATE TABLE {table} (id INT IDENTITY(1,1) PRIMARY KEY, {SHAPES[entity]}, "
+                f"loaded_at DATETIME DEFAULT GETDATE())"
+            )
+            try:
+                rows = make_rows(entity, args.rows)
+                plain_elapsed = bench(plain, table, rows, args.batch_size)
+                fast_elapsed = bench(fast, table, rows, args.batch_size)
+                results.append((entity, plain_elapsed, fast_elapsed, fast.fast_executemany))
+            finally:
+                plain.execute_non_query(f"DROP TABLE {table}")
+    finally:
+        plain.close()
+        fast.close()
+
+    print()
+    print(f"Rows: {args.rows} | Batch size: {args.batch_size} | Driver: {settings.TARGET_DB_DRIVER}")
+    print("-" * 72)
+    print(f"{'Table':<16}{'executemany rows/s':>20}{'fast rows/s':>16}{'speedup':>10}{'fast?':>8}")
+    print("-" * 72)
+    for entity, plain_elapsed, fast_elapsed, fast_active in results:
+        plain_rate = args.rows / plain_elapsed
+        fast_rate = args.rows / fast_elapsed
+        print(
+            f"{entity:<16}{plain_rate:>20,.0f}{fast_rate:>16,.0f}{fast_rate / plain_rate:>9.1f}x"
+            f"{'yes' if fast_active else 'no':>8}"
+        )
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+BENCHMARK: CODEC BODY MESSAGE (JSON vs BINARY THEO VỊ TRÍ CỘT)
+===============================================================
+So sánh bytes/row và tốc độ encode/decode (rows/sec) của JsonCodec và
+RowsBinaryCodec trên dữ liệu thật trong data/:
+
+- khachhang : khachhang.csv (toàn chuỗi, nhiều tiếng Việt)
+- dathang   : dathang.csv (toàn chuỗi)
+- dathang (native): dathang với kiểu như khi đọc từ SQL Server
+  (int, date, Decimal, datetime) - JSON phải đổi sang isoformat/float
+
+Mỗi shape được đo với message 1 row (legacy) và framed message nhiều rows.
+
+Usage (chạy từ thư mục coffee_etl_clean):
+    python -m benchmarks.bench_codecs
+    python -m benchmarks.bench_codecs --frame-rows 1 50 500 --repeat 5
+"""
+
+import argparse
+import time
+from datetime import date, datetime
+from decimal import Decimal
+from pathlib import Path
+
+from etl.broker.codecs import get_codec
+from etl.broker.framing import frame_rows
+from etl.readers.csv_staging_reader import csv_staging_reader
+
+DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+
+
+def load_shapes(min_rows: int) -> dict:
+    khachhang = list(csv_staging_reader(str(DATA_DIR / "khachhang.csv")))
+    dathang = list(csv_staging_reader(str(DATA_DIR / "dathang.csv")))
+
+    dathang_native = []
+    for i, row in enumerate(dathang):
+        dathang_native.append({
+            "id": int(row["id"]),
+            "khach_hang_id": int(row["khach_hang_id"]),
+            "mon_id": int(row["mon_id"]),
+            "so_luong": int(row["so_luong"]),
+            "ngay_dat": date.fromisoformat(row["ngay_dat"]),
+            "trang_thai": row["trang_thai"],
+            "thanh_tien": Decimal("45000.00") * int(row["so_luong"]),
+            "cap_nhat": datetime(2024, 12, 1, 8, 30) if i % 2 else None,
+        })
+
+    shapes = {
+        "khachhang": khachhang,
+        "dathang": dathang,
+        "dathang (native)": dathang_native,
+    }
+    # Lặp lại dữ liệu để đủ số rows đo (dathang.csv chỉ có 30 dòng)
+    return {
+        name: (rows * (min_rows // max(1, len(rows)) + 1))[:max(min_rows, len(rows))]
+        for name, rows in shapes.items()
+    }
+
+
+def build_messages(rows: list, frame_size: int, file_name: str) -> list:
+    header = {
+        "source": "csv",
+        "entity_type": "bench",
+        "metadata": {
+            "file": file_name,
+            "extract_time": datetime.now().isoformat(),
+            "run_id": "bench",
+        },
+    }
+    if frame_size <= 1:
+        return [dict(header, data=row) for row in rows]
+    return list(frame_rows(rows, header, frame_size))
+
+
+def bench(codec_name: str, messages: list, row_count: int, repeat: int) -> dict:
+    codec = get_codec(codec_name)
+
+    encode_best = float("inf")
+    bodies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        bodies = [codec.encode(message) for message in messages]
+        encode_best = min(encode_best, time.perf_counter() - start)
+
+    decode_best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for body in bodies:
+            codec.decode(body)
+        decode_best = min(decode_best, time.perf_counter() - start)
+
+    total_bytes = sum(len(body) for body in bodies)
+    return {
+        "bytes_per_row": total_bytes / row_count,
+        "encode_rps": row_count / encode_best,
+        "decode_rps": row_count / decode_best,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=5000, help="Số rows mỗi shape")
+    parser.add_argument("--frame-rows", type=int, nargs="+", default=[1, 100], help="Số rows mỗi message")
+    parser.add_argument("--repeat", type=int, default=3, help="Số lần đo, lấy lần nhanh nhất")
+    args = parser.parse_args()
+
+    shapes = load_shapes(args.rows)
+
+    print()
+    print(f"Rows mỗi shape: {args.rows} | Lấy lần nhanh nhất trong {args.repeat} lần đo")
+    print("-" * 92)
+    print(f"{'Shape':<18}{'rows/msg':>9}{'codec':>13}{'bytes/row':>11}{'vs json':>9}{'encode rows/s':>16}{'decode rows/s':>16}")
+    print("-" * 92)
+
+    for name, rows in shapes.items():
+        for frame_size in args.frame_rows:
+            messages = build_messages(rows, frame_size, f"{name}.csv")
+            results = {
+                codec_name: bench(codec_name, messages, len(rows), args.repeat)
+                for codec_name in ("json", "rows-binary")
+            }
+            json_bytes = results["json"]["bytes_per_row"]
+            for codec_name, r in results.items():
+                print(
+                    f"{name:<18}{frame_size:>9}{codec_name:>13}{r['bytes_per_row']:>11.1f}"
+                    f"{r['bytes_per_row'] / json_bytes:>8.2f}x"
+                    f"{r['encode_rps']:>16,.0f}{r['decode_rps']:>16,.0f}"
+                )
+        print("-" * 92)
+    print()
+
+
+if __name__ == "__main__":
+    main()
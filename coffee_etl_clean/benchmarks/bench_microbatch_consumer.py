@@ -0,0 +1,107 @@
+"""
+BENCHMARK: MICRO-BATCH CONSUMER (ACK-AFTER-COMMIT)
+===================================================
+Đo throughput của MicroBatchConsumer với batch size K = 1, 100, 1000 trên
+broker giả lập chạy trong process.
+
+Mô hình chi phí:
+- Mỗi lần chờ broker giao message tốn `--rtt-ms` (round-trip mạng);
+  broker chỉ giao tối đa prefetch_count message chưa ack.
+- Mỗi batch commit vào DB tốn `--commit-ms` cộng `--row-us` mỗi row
+  (giả lập bulk_insert + commit).
+
+Usage (chạy từ thư mục coffee_etl_clean):
+    python -m benchmarks.bench_microbatch_consumer
+    python -m benchmarks.bench_microbatch_consumer --messages 5000 --commit-ms 5
+"""
+
+import argparse
+import time
+
+from benchmarks.standin_broker import StandInBroker, make_client
+from etl.broker.batch_consumer import MicroBatchConsumer
+from etl.utils.json_encoder import json_dumps
+
+
+def fill_queue(broker: StandInBroker, queue_name: str, count: int):
+    broker.declare(queue_name)
+    for i in range(count):
+        message = {
+            "source": "csv",
+            "entity_type": "khach_hang",
+            "data": {
+                "id": str(i),
+                "ho_ten": "Nguyễn Văn A",
+                "sdt": "0901234567",
+                "thanh_pho": "Hồ Chí Minh",
+                "email": f"user{i}@example.com",
+            },
+            "metadata": {"file": "khachhang.csv", "run_id": "bench"},
+        }
+        broker.enqueue(queue_name, json_dumps(message))
+
+
+def bench(messages: int, batch_size: int, rtt_ms: float, commit_ms: float, row_us: float) -> dict:
+    queue_name = "queue_khach_hang"
+    broker = StandInBroker(rtt_ms)
+    fill_queue(broker, queue_name, messages)
+    client = make_client(broker)
+
+    loaded = []
+
+    def handle_batch(batch):
+        # Giả lập bulk_insert + commit
+        time.sleep(commit_ms / 1000.0 + len(batch) * row_us / 1_000_000.0)
+        loaded.extend(batch)
+
+    consumer = MicroBatchConsumer(client, handle_batch, batch_size=batch_size, max_wait=0.05)
+
+    start = time.perf_counter()
+    stats = consumer.consume(queue_name, idle_timeout=0.05)
+    elapsed = time.perf_counter() - start
+
+    assert len(loaded) == messages == stats["acked"]
+    assert not client.channel.unacked
+    return {
+        "batch_size": batch_size,
+        "elapsed": elapsed,
+        "batches": stats["batches"],
+        "round_trips": broker.round_trips,
+        "acks": broker.acks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=3000)
+    parser.add_argument("--rtt-ms", type=float, default=0.2, help="Độ trễ round-trip giả lập (ms)")
+    parser.add_argument("--commit-ms", type=float, default=1.0, help="Chi phí mỗi lần commit DB (ms)")
+    parser.add_argument("--row-us", type=float, default=5.0, help="Chi phí insert mỗi row (µs)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 100, 1000])
+    args = parser.parse_args()
+
+    results = [
+        bench(args.messages, k, args.rtt_ms, args.commit_ms, args.row_us)
+        for k in args.batch_sizes
+    ]
+
+    baseline = args.messages / results[0]["elapsed"]
+    print()
+    print(
+        f"Messages: {args.messages} | RTT: {args.rtt_ms} ms | "
+        f"Commit: {args.commit_ms} ms + {args.row_us} µs/row"
+    )
+    print("-" * 80)
+    print(f"{'K':>6}{'msgs/sec':>14}{'speedup':>10}{'elapsed (s)':>14}{'batches':>10}{'round-trips':>13}{'acks':>8}")
+    print("-" * 80)
+    for r in results:
+        rate = args.messages / r["elapsed"]
+        print(
+            f"{r['batch_size']:>6}{rate:>14,.0f}{rate / baseline:>9.1f}x{r['elapsed']:>14.3f}"
+            f"{r['batches']:>10}{r['round_trips']:>13}{r['acks']:>8}"
+        )
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+BENCHMARK: PUBLISH VỚI PUBLISHER CONFIRMS
+==========================================
+So sánh msgs/sec của RabbitMQClient.publish_batch ở các window size khác nhau
+trên một broker giả lập chạy trong process (không cần RabbitMQ thật).
+
+Broker giả lập mô phỏng round-trip mạng: mỗi lần client phải chờ confirm
+tốn `--rtt-ms` mili-giây, sau đó broker ack (multiple=True) toàn bộ
+message đã nhận.
+
+Usage (chạy từ thư mục coffee_etl_clean):
+    python -m benchmarks.bench_publish_confirms
+    python -m benchmarks.bench_publish_confirms --messages 20000 --rtt-ms 0.5
+"""
+
+import argparse
+import time
+from datetime import datetime
+
+from benchmarks.standin_broker import StandInBroker, make_client
+from etl.broker.rabbitmq_client import PublishNackedError
+
+
+def make_messages(count: int):
+    """Sinh message có cùng cấu trúc với STEP1_PRODUCER (khachhang.csv)."""
+    now = datetime.now().isoformat()
+    for i in range(count):
+        yield {
+            "source": "csv",
+            "entity_type": "khach_hang",
+            "data": {
+                "id": str(i),
+                "ho_ten": "Nguyễn Văn A",
+                "sdt": "0901234567",
+                "thanh_pho": "Hồ Chí Minh",
+                "email": f"user{i}@example.com",
+            },
+            "metadata": {
+                "file": "khachhang.csv",
+                "extract_time": now,
+                "run_id": "bench",
+            },
+        }
+
+
+def bench_publish(messages: int, rtt_ms: float) -> dict:
+    """Baseline: publish() từng message, không có confirm."""
+    broker = StandInBroker(rtt_ms)
+    broker.declare("queue_khach_hang")
+    client = make_client(broker)
+
+    start = time.perf_counter()
+    for message in make_messages(messages):
+        client.publish("queue_khach_hang", message)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "mode": "publish (no confirm)",
+        "elapsed": elapsed,
+        "round_trips": broker.round_trips,
+        "nacked": "n/a",
+    }
+
+
+def bench_publish_batch(messages: int, rtt_ms: float, window: int, nack_rate: float) -> dict:
+    broker = StandInBroker(rtt_ms, nack_rate)
+    broker.declare("queue_khach_hang")
+    client = make_client(broker)
+
+    start = time.perf_counter()
+    try:
+        result = client.publish_batch("queue_khach_hang", make_messages(messages), window=window)
+    except PublishNackedError as e:
+        result = e.result
+    elapsed = time.perf_counter() - start
+
+    assert result["published"] == messages
+    return {
+        "mode": f"publish_batch window={window}",
+        "elapsed": elapsed,
+        "round_trips": broker.round_trips,
+        "nacked": len(result["nacked"]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--rtt-ms", type=float, default=0.2, help="Độ trễ round-trip giả lập (ms)")
+    parser.add_argument("--nack-rate", type=float, default=0.0, help="Tỉ lệ message bị broker nack")
+    parser.add_argument("--windows", type=int, nargs="+", default=[1, 100, 1000])
+    args = parser.parse_args()
+
+    results = [bench_publish(args.messages, args.rtt_ms)]
+    for window in args.windows:
+        results.append(bench_publish_batch(args.messages, args.rtt_ms, window, args.nack_rate))
+
+    print()
+    print(f"Messages: {args.messages} | RTT giả lập: {args.rtt_ms} ms | Nack rate: {args.nack_rate}")
+    print("-" * 80)
+    print(f"{'Mode':<32}{'msgs/sec':>14}{'elapsed (s)':>14}{'round-trips':>12}{'nacked':>8}")
+    print("-" * 80)
+    for r in results:
+        rate = args.messages / r["elapsed"] if r["elapsed"] else float("inf")
+        print(f"{r['mode']:<32}{rate:>14,.0f}{r['elapsed']:>14.3f}{r['round_trips']:>12}{r['nacked']:>8}")
+    print()
+
+
+if __name__ == "__main__":
+    main()
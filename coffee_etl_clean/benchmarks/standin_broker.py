@@ -0,0 +1,89 @@
+"""
+Broker giả lập dùng chung cho các benchmark.
+
+Là broker in-memory của pipeline (etl/broker/memory_broker.py) cộng với độ
+trễ round-trip mạng: mỗi lần client chờ broker (flush confirm,
+process_data_events) tốn `rtt_ms`. Có thể nack ngẫu nhiên một phần message
+khi publish với confirms, và đếm số round-trip / số lệnh ack.
+"""
+
+import random
+import time
+
+from etl.broker.memory_broker import MemoryBroker, MemoryChannel, MemoryConfirmPublisher, MemoryConnection
+from etl.broker.rabbitmq_client import RabbitMQClient
+
+
+class StandInConfirmPublisher(MemoryConfirmPublisher):
+    """Chờ confirm tốn một round-trip; nack ngẫu nhiên theo nack_rate của broker."""
+
+    def wait(self, until=None):
+        broker = self.channel.broker
+        broker.round_trip()
+        if broker.nack_rate:
+            for tag in range(self.confirmed_tag + 1, self.published_tag + 1):
+                if random.random() < broker.nack_rate:
+                    self.confirm(tag, nack=True)
+        super().wait(until)
+
+
+class StandInChannel(MemoryChannel):
+    """MemoryChannel có round-trip khi chờ confirm, nack ngẫu nhiên và đếm ack."""
+
+    def confirm_publisher(self, on_confirm) -> StandInConfirmPublisher:
+        self._check_open()
+        return StandInConfirmPublisher(self, on_confirm)
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self.broker.acks += 1
+        super().basic_ack(delivery_tag, multiple)
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        self.broker.acks += 1
+        super().basic_nack(delivery_tag, multiple, requeue)
+
+
+class StandInConnection(MemoryConnection):
+    """MemoryConnection có round-trip mỗi lần process_data_events."""
+
+    def channel(self) -> StandInChannel:
+        channel = StandInChannel(self, len(self.channels) + 1)
+        self.channels.append(channel)
+        return channel
+
+    def process_data_events(self, time_limit: float = 0):
+        self.broker.round_trip()
+        super().process_data_events(time_limit)
+
+
+class StandInBroker(MemoryBroker):
+    """
+    Broker in-memory (không persist) có độ trễ round-trip.
+
+    Args:
+        rtt_ms: Độ trễ round-trip giả lập (ms)
+        nack_rate: Tỉ lệ message bị nack khi publish với confirms
+    """
+
+    def __init__(self, rtt_ms: float = 0.2, nack_rate: float = 0.0):
+        super().__init__()
+        self.rtt = rtt_ms / 1000.0
+        self.nack_rate = nack_rate
+        self.acks = 0
+        self.round_trips = 0
+
+    def connection(self) -> StandInConnection:
+        return StandInConnection(self)
+
+    def round_trip(self):
+        self.round_trips += 1
+        if self.rtt:
+            time.sleep(self.rtt)
+
+
+def make_client(broker: StandInBroker) -> RabbitMQClient:
+    """Tạo RabbitMQClient gắn với broker giả lập (không kết nối mạng)."""
+    client = RabbitMQClient(backend="memory")
+    client.connection = broker.connection()
+    client.channel = client.connection.channel()
+    return client
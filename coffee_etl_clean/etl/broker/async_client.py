@@ -0,0 +1,379 @@
+# etl/broker/async_client.py
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+import aio_pika
+from aio_pika.abc import AbstractIncomingMessage
+from aio_pika.exceptions import DeliveryError
+
+from .codecs import BodyCompressor, decode_body, get_codec
+from .rabbitmq_client import PublishNackedError
+from .tracing import trace_headers
+from ..logger import logger
+from ..utils.retry import async_retry
+
+
+class AsyncRabbitMQClient:
+    """
+    Client RabbitMQ chạy trên asyncio (aio-pika), cùng API với RabbitMQClient.
+
+    Một event loop có thể đọc nhiều queue cùng lúc trên một connection
+    (mỗi queue một channel) trong khi các lệnh SQL chạy trong executor.
+    Các hàm I/O đều là coroutine; callback consume nhận aio_pika IncomingMessage.
+    """
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 5672,
+        username: str = "guest",
+        password: str = "guest",
+        virtual_host: str = "/",
+        heartbeat: int = 600,
+        codec: str = "json",
+        compression: Optional[str] = None,
+        compress_min_bytes: int = 1024
+    ):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.virtual_host = virtual_host
+        self.heartbeat = heartbeat
+        self.codec = get_codec(codec)
+        self.compressor = BodyCompressor(compression, compress_min_bytes)
+        self.connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+        self.channel: Optional[aio_pika.abc.AbstractChannel] = None
+
+        # Channel riêng cho publisher confirms (dùng bởi publish_batch)
+        self._confirm_channel: Optional[aio_pika.abc.AbstractChannel] = None
+
+    @async_retry(times=3, delay_sec=2, label="rabbitmq_connect")
+    async def connect(self):
+        """Kết nối tới RabbitMQ."""
+        self.connection = await aio_pika.connect_robust(
+            host=self.host,
+            port=self.port,
+            login=self.username,
+            password=self.password,
+            virtualhost=self.virtual_host,
+            heartbeat=self.heartbeat,
+        )
+        self.channel = await self.connection.channel(publisher_confirms=False)
+        logger.info("Kết nối RabbitMQ (async) thành công: %s:%s", self.host, self.port)
+
+    async def open_channel(self, prefetch_count: int = 0) -> aio_pika.abc.AbstractChannel:
+        """Mở thêm một channel trên cùng connection (VD: mỗi queue một channel)."""
+        if not self.connection:
+            raise RuntimeError("Chưa kết nối RabbitMQ")
+
+        channel = await self.connection.channel(publisher_confirms=False)
+        if prefetch_count:
+            await channel.set_qos(prefetch_count=prefetch_count)
+        return channel
+
+    async def declare_queue(self, queue_name: str, durable: bool = True, arguments: Optional[Dict] = None):
+        """Khai báo queue (arguments: x-message-ttl, x-dead-letter-exchange, ...)."""
+        if not self.channel:
+            raise RuntimeError("Chưa kết nối RabbitMQ")
+
+        await self.channel.declare_queue(queue_name, durable=durable, arguments=arguments)
+        logger.info("Đã khai báo queue: %s", queue_name)
+
+    def _build_message(self, message: Dict, persistent: bool) -> aio_pika.Message:
+        body, content_encoding = self.compressor.compress(self.codec.encode(message))
+        return aio_pika.Message(
+            body=body,
+            content_encoding=content_encoding,
+            delivery_mode=(
+                aio_pika.DeliveryMode.PERSISTENT if persistent else aio_pika.DeliveryMode.NOT_PERSISTENT
+            ),
+            content_type=self.codec.content_type,
+            headers=trace_headers(),
+        )
+
+    async def publish(
+        self,
+        queue_name: str,
+        message: Dict,
+        persistent: bool = True
+    ):
+        """Gửi message vào queue."""
+        if not self.channel:
+            raise RuntimeError("Chưa kết nối RabbitMQ")
+
+        await self.channel.default_exchange.publish(
+            self._build_message(message, persistent),
+            routing_key=queue_name,
+        )
+
+    async def publish_confirmed(
+        self,
+        routing_key: str,
+        body: bytes,
+        headers: Optional[Dict] = None,
+        content_type: Optional[str] = None,
+        content_encoding: Optional[str] = None,
+        delivery_mode: int = 2
+    ):
+        """
+        Publish một body đã encode (VD: chuyển message lỗi sang retry queue,
+        xem retry.py) trên channel confirm và chờ broker xác nhận.
+
+        Raises:
+            PublishNackedError: Broker nack message
+        """
+        if not self.connection:
+            raise RuntimeError("Chưa kết nối RabbitMQ")
+
+        if self._confirm_channel is None or self._confirm_channel.is_closed:
+            self._confirm_channel = await self.connection.channel(publisher_confirms=True)
+
+        try:
+            await self._confirm_channel.default_exchange.publish(
+                aio_pika.Message(
+                    body=body,
+                    headers=headers,
+                    content_type=content_type,
+                    content_encoding=content_encoding,
+                    delivery_mode=delivery_mode,
+                ),
+                routing_key=routing_key,
+            )
+        except DeliveryError:
+            raise PublishNackedError(routing_key, {"published": 1, "acked": 0, "nacked": [0]}) from None
+
+    async def publish_batch(
+        self,
+        queue_name: str,
+        messages: Iterable[Dict],
+        persistent: bool = True,
+        window: int = 100
+    ) -> Dict:
+        """
+        Gửi nhiều message với publisher confirms, tối đa `window` message
+        chưa được broker xác nhận (giống RabbitMQClient.publish_batch).
+
+        Returns:
+            Dict: {"published": n, "acked": n, "nacked": []}
+
+        Raises:
+            PublishNackedError: Broker nack ít nhất một message (e.result["nacked"]
+                                là vị trí các message bị nack)
+        """
+        if not self.connection:
+            raise RuntimeError("Chưa kết nối RabbitMQ")
+
+        if self._confirm_channel is None or self._confirm_channel.is_closed:
+            self._confirm_channel = await self.connection.channel(publisher_confirms=True)
+
+        exchange = self._confirm_channel.default_exchange
+        window = max(1, window)
+        pending: Dict[asyncio.Future, int] = {}
+        published = 0
+        nacked = []
+
+        async def settle(return_when):
+            done, _ = await asyncio.wait(pending, return_when=return_when)
+            for future in done:
+                index = pending.pop(future)
+                try:
+                    future.result()
+                except DeliveryError:
+                    nacked.append(index)
+
+        try:
+            for index, message in enumerate(messages):
+                future = asyncio.ensure_future(
+                    exchange.publish(self._build_message(message, persistent), routing_key=queue_name)
+                )
+                pending[future] = index
+                published += 1
+
+                if len(pending) >= window:
+                    await settle(asyncio.FIRST_COMPLETED)
+        finally:
+            if pending:
+                await settle(asyncio.ALL_COMPLETED)
+
+        nacked.sort()
+        result = {
+            "published": published,
+            "acked": published - len(nacked),
+            "nacked": nacked,
+        }
+        if nacked:
+            raise PublishNackedError(queue_name, result)
+        return result
+
+    def decode(self, message: AbstractIncomingMessage) -> Dict:
+        """Giải nén theo content_encoding rồi decode theo content_type (không có → JSON)."""
+        body = self.compressor.decompress(message.body, message.content_encoding)
+        return decode_body(body, message.content_type)
+
+    async def get_message_count(self, queue_name: str) -> int:
+        """
+        Số message sẵn sàng trong queue (passive declare).
+
+        Dùng channel tạm vì passive declare một queue không tồn tại sẽ đóng channel.
+        """
+        if not self.connection:
+            raise RuntimeError("Chưa kết nối RabbitMQ")
+
+        async with self.connection.channel(publisher_confirms=False) as channel:
+            queue = await channel.declare_queue(queue_name, durable=True, passive=True)
+            return queue.declaration_result.message_count
+
+    async def consume(
+        self,
+        queue_name: str,
+        callback: Callable[[AbstractIncomingMessage], Awaitable[None]],
+        prefetch_count: int = 1,
+        channel: Optional[aio_pika.abc.AbstractChannel] = None
+    ) -> str:
+        """
+        Đăng ký consumer cho queue (không block).
+
+        Returns:
+            consumer_tag
+        """
+        channel = channel or self.channel
+        if not channel:
+            raise RuntimeError("Chưa kết nối RabbitMQ")
+
+        await channel.set_qos(prefetch_count=prefetch_count)
+        queue = await channel.declare_queue(queue_name, durable=True)
+        logger.info("Bắt đầu consume từ queue (async): %s", queue_name)
+        return await queue.consume(callback, no_ack=False)
+
+    async def drain(
+        self,
+        queue_name: str,
+        callback: Callable[[AbstractIncomingMessage], Awaitable[None]],
+        idle_timeout: float = 1.0,
+        follow: bool = False,
+        prefetch_count: int = 1,
+        stop_event: Optional[asyncio.Event] = None,
+        on_tick: Optional[Callable[[], Awaitable[None]]] = None,
+        pending: Optional[Callable[[], bool]] = None,
+        on_finish: Optional[Callable[[], Awaitable[None]]] = None
+    ) -> Dict:
+        """
+        Consume tới khi queue cạn hoặc chạy liên tục (giống RabbitMQClient.drain).
+
+        Mỗi lần drain mở một channel riêng, nên nhiều queue có thể drain song
+        song trên cùng connection bằng asyncio.gather.
+
+        Args:
+            on_tick: Gọi sau mỗi lần chờ message (VD: flush batch quá max_wait)
+            pending: True khi caller còn việc chưa xong (VD: batch đang load,
+                     chưa ack) - drain không dừng vì idle lúc đó
+            on_finish: Gọi trước khi đóng channel (VD: flush batch cuối và chờ
+                       ack), vì message chỉ ack được trên channel đã nhận nó
+
+        Returns:
+            Dict: messages, elapsed, busy_seconds, idle_seconds, stop_reason
+        """
+        channel = await self.open_channel(prefetch_count)
+        queue = await channel.declare_queue(queue_name, durable=True)
+        inbox: "asyncio.Queue[AbstractIncomingMessage]" = asyncio.Queue()
+        consumer_tag = await queue.consume(inbox.put, no_ack=False)
+
+        stats = {"messages": 0, "busy_seconds": 0.0}
+        poll_interval = min(idle_timeout, 0.5) if idle_timeout > 0 else 0.5
+        started_at = last_activity = time.monotonic()
+        stop_reason = "empty"
+
+        async def handle(message: AbstractIncomingMessage):
+            nonlocal last_activity
+            started = time.monotonic()
+            try:
+                await callback(message)
+            finally:
+                last_activity = time.monotonic()
+                stats["busy_seconds"] += last_activity - started
+                stats["messages"] += 1
+
+        try:
+            while True:
+                if stop_event is not None and stop_event.is_set():
+                    stop_reason = "stopped"
+                    break
+
+                try:
+                    message = await asyncio.wait_for(inbox.get(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    message = None
+
+                if message is not None:
+                    await handle(message)
+
+                if on_tick:
+                    tick_started = time.monotonic()
+                    await on_tick()
+                    stats["busy_seconds"] += time.monotonic() - tick_started
+
+                if follow or not inbox.empty() or time.monotonic() - last_activity < idle_timeout:
+                    continue
+                if pending is not None and pending():
+                    continue
+
+                # Đã idle đủ lâu → hỏi broker xem queue còn message không
+                if await self.get_message_count(queue_name) == 0:
+                    break
+                last_activity = time.monotonic()
+        finally:
+            if not channel.is_closed:
+                await queue.cancel(consumer_tag)
+                # Message đã được giao trước khi cancel vẫn phải xử lý (hoặc trả lại)
+                while not inbox.empty():
+                    await handle(inbox.get_nowait())
+                try:
+                    if on_finish:
+                        finish_started = time.monotonic()
+                        await on_finish()
+                        stats["busy_seconds"] += time.monotonic() - finish_started
+                finally:
+                    await channel.close()
+
+        stats["elapsed"] = time.monotonic() - started_at
+        stats["idle_seconds"] = max(0.0, stats["elapsed"] - stats["busy_seconds"])
+        stats["stop_reason"] = stop_reason
+
+        logger.info(
+            "Drain %s: %s messages trong %.2fs (busy %.2fs, idle %.2fs, %s)",
+            queue_name,
+            stats["messages"],
+            stats["elapsed"],
+            stats["busy_seconds"],
+            stats["idle_seconds"],
+            stop_reason
+        )
+        return stats
+
+    async def ack_message(self, message: AbstractIncomingMessage, multiple: bool = False):
+        """Xác nhận đã xử lý message (multiple=True: ack mọi message tới message này)."""
+        await message.ack(multiple=multiple)
+
+    async def nack_message(
+        self,
+        message: AbstractIncomingMessage,
+        requeue: bool = True,
+        multiple: bool = False
+    ):
+        """Từ chối message (requeue hoặc không)."""
+        await message.nack(multiple=multiple, requeue=requeue)
+
+    async def close(self):
+        """Đóng kết nối."""
+        if self.connection and not self.connection.is_closed:
+            await self.connection.close()
+            logger.info("Đã đóng kết nối RabbitMQ (async)")
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
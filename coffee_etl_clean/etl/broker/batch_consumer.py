@@ -0,0 +1,223 @@
+# etl/broker/batch_consumer.py
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from .rabbitmq_client import RabbitMQClient
+from .retry import RetryPolicy
+from ..logger import logger
+
+
+class MicroBatchConsumer:
+    """
+    Consumer theo micro-batch với ack-after-commit.
+
+    Gom tối đa `batch_size` messages, gọi `batch_handler` (validate →
+    transform → load → commit) rồi mới ack cả batch bằng một lệnh
+    basic_ack(multiple=True). Nếu handler lỗi, cả batch bị nack để
+    RabbitMQ giao lại thay vì mất dữ liệu.
+
+    Batch đã được giao lại mà vẫn lỗi thì xử lý lại từng message: message
+    thành công được ack, chỉ message vẫn lỗi (message "độc") được chuyển
+    sang retry / parking queue của RetryPolicy, không kéo theo cả batch.
+    """
+
+    def __init__(
+        self,
+        rabbitmq_client: RabbitMQClient,
+        batch_handler: Callable[[List[Dict]], None],
+        batch_size: int = 100,
+        prefetch_count: Optional[int] = None,
+        max_wait: float = 1.0,
+        on_receive: Optional[Callable] = None,
+        retry_policy: Optional[RetryPolicy] = None
+    ):
+        """
+        Args:
+            rabbitmq_client: RabbitMQ client (đã connect)
+            batch_handler: Function xử lý một batch message đã parse
+                           Signature: batch_handler(messages: List[dict]) -> None
+                           Raise exception nếu batch chưa được commit.
+            batch_size: Số messages tối đa mỗi batch (K)
+            prefetch_count: Prefetch window (mặc định = batch_size, không nhỏ hơn batch_size)
+            max_wait: Thời gian tối đa (giây) giữ một batch chưa đầy trước khi flush
+            on_receive: Gọi với properties của mỗi message được đưa vào batch
+                        (VD: TraceBatch.received để đo dwell)
+            retry_policy: Retry queue / parking queue cho message lỗi
+                          (mặc định RetryPolicy())
+        """
+        self.client = rabbitmq_client
+        self.batch_handler = batch_handler
+        self.batch_size = max(1, batch_size)
+        # Prefetch nhỏ hơn batch_size sẽ khiến broker ngừng giao trước khi batch đầy
+        self.prefetch_count = max(prefetch_count or self.batch_size, self.batch_size)
+        self.max_wait = max_wait
+        self.on_receive = on_receive
+        self.retry_policy = retry_policy or RetryPolicy()
+
+        self._queue_name: Optional[str] = None
+        self._buffer: List[Dict] = []
+        # (delivery_tag, properties, body) của từng message trong _buffer
+        self._deliveries: List[Tuple] = []
+        self._last_tag = None
+        self._redelivered = False
+        self._buffer_started = 0.0
+
+        self.stats = {
+            "messages": 0,
+            "acked": 0,
+            "failed": 0,
+            "rejected": 0,
+            "requeued": 0,
+            "retried": 0,
+            "parked": 0,
+            "batches": 0,
+        }
+
+    def consume(
+        self,
+        queue_name: str,
+        idle_timeout: float = 1.0,
+        follow: bool = False,
+        stop_event: Optional[threading.Event] = None
+    ) -> Dict:
+        """
+        Consume queue theo micro-batch cho tới khi queue cạn (hoặc chạy liên tục).
+
+        Args:
+            queue_name: Tên queue
+            idle_timeout: Số giây không có message trước khi coi queue đã cạn
+                          (không nhỏ hơn max_wait để batch dở được flush trước)
+            follow: Chạy liên tục, không dừng khi queue rỗng
+            stop_event: Event để dừng từ bên ngoài
+
+        Returns:
+            Dict thống kê: messages, acked, failed, rejected, requeued, retried,
+            parked, batches, busy_seconds, idle_seconds
+        """
+        self._queue_name = queue_name
+        self.retry_policy.declare(self.client, queue_name)
+
+        try:
+            drain_stats = self.client.drain(
+                queue_name,
+                self._on_message,
+                idle_timeout=max(idle_timeout, self.max_wait),
+                follow=follow,
+                prefetch_count=self.prefetch_count,
+                stop_event=stop_event,
+                on_tick=self._flush_if_due,
+            )
+        finally:
+            if self._buffer:
+                self._flush()
+
+        self.stats["busy_seconds"] = drain_stats["busy_seconds"]
+        self.stats["idle_seconds"] = drain_stats["idle_seconds"]
+
+        logger.info(
+            "[MicroBatch] %s: %s messages, %s batches (acked: %s, failed: %s, rejected: %s, parked: %s, idle: %.2fs)",
+            queue_name,
+            self.stats["messages"],
+            self.stats["batches"],
+            self.stats["acked"],
+            self.stats["failed"],
+            self.stats["rejected"],
+            self.stats["parked"],
+            self.stats["idle_seconds"],
+        )
+        return self.stats
+
+    def _flush_if_due(self):
+        """Flush batch chưa đầy nếu đã giữ quá max_wait."""
+        if self._buffer and time.monotonic() - self._buffer_started >= self.max_wait:
+            self._flush()
+
+    def _on_message(self, ch, method, properties, body):
+        self.stats["messages"] += 1
+
+        try:
+            message = self.client.decode(body, properties)
+        except ValueError as e:
+            # Message hỏng không bao giờ xử lý được → parking ngay, không vào batch
+            logger.error("[MicroBatch] Lỗi parse message: %s", e)
+            self._reject(method.delivery_tag, properties, body, e, retryable=False)
+            self.stats["rejected"] += 1
+            return
+
+        if self.on_receive:
+            self.on_receive(properties)
+
+        if not self._buffer:
+            self._buffer_started = time.monotonic()
+
+        self._buffer.append(message)
+        self._deliveries.append((method.delivery_tag, properties, body))
+        self._last_tag = method.delivery_tag
+        self._redelivered = self._redelivered or method.redelivered
+
+        if len(self._buffer) >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        """Xử lý batch hiện tại, commit rồi ack/nack cả batch."""
+        batch = self._buffer
+        deliveries = self._deliveries
+        last_tag = self._last_tag
+        redelivered = self._redelivered
+
+        self._buffer = []
+        self._deliveries = []
+        self._last_tag = None
+        self._redelivered = False
+        self.stats["batches"] += 1
+
+        try:
+            self.batch_handler(batch)
+        except Exception as e:
+            if redelivered:
+                # Batch đã từng được giao lại mà vẫn lỗi → tách message lỗi ra thay vì requeue lặp lại
+                logger.error("[MicroBatch] Lỗi xử lý batch %s messages (đã giao lại), xử lý từng message: %s", len(batch), e)
+                self._flush_one_by_one(batch, deliveries)
+                return
+
+            logger.error("[MicroBatch] Lỗi xử lý batch %s messages, requeue: %s", len(batch), e)
+            self.client.nack_message(last_tag, requeue=True, multiple=True)
+            # Các message sẽ được giao lại và đếm lại
+            self.stats["messages"] -= len(batch)
+            self.stats["requeued"] += len(batch)
+            return
+
+        self.client.ack_message(last_tag, multiple=True)
+        self.stats["acked"] += len(batch)
+
+    def _flush_one_by_one(self, batch: List[Dict], deliveries: List[Tuple]):
+        """Xử lý từng message của batch lỗi: ack message thành công, retry / parking message lỗi."""
+        for message, (delivery_tag, properties, body) in zip(batch, deliveries):
+            try:
+                self.batch_handler([message])
+            except Exception as e:
+                self._reject(delivery_tag, properties, body, e)
+                self.stats["failed"] += 1
+                continue
+
+            self.client.ack_message(delivery_tag)
+            self.stats["acked"] += 1
+
+    def _reject(self, delivery_tag: int, properties, body: bytes, error: Exception, retryable: bool = True):
+        target = self.retry_policy.reject(
+            self.client,
+            self._queue_name,
+            delivery_tag,
+            properties,
+            body,
+            error,
+            retryable=retryable,
+        )
+        if target == self.retry_policy.parking_queue(self._queue_name):
+            self.stats["parked"] += 1
+        elif target == self._queue_name:
+            # Broker không nhận bản retry, message gốc được requeue và sẽ đếm lại
+            self.stats["messages"] -= 1
+            self.stats["requeued"] += 1
+        else:
+            self.stats["retried"] += 1
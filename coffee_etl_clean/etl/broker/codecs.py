@@ -0,0 +1,476 @@
+# etl/broker/codecs.py
+"""
+Codec cho body message RabbitMQ, chọn theo content_type của message.
+
+- application/json        : JSON như cũ (tương thích consumer cũ)
+- application/x-etl-rows  : binary theo vị trí cột, tên cột chỉ gửi một lần
+                            mỗi message (framed message nhiều rows được lợi nhất)
+
+Producer chọn codec (RabbitMQClient(codec=...)), consumer đọc
+properties.content_type để chọn decoder, nên hai loại message có thể nằm
+chung một queue.
+
+Format binary (little-endian):
+    b"ER1" | u32 len + header JSON | u8 kind | u16 n_cols | cột (u16 len + utf-8)...
+          | u32 n_rows | mỗi row: n_cols giá trị (u8 tag + payload)
+
+    header = message bỏ "data"/"rows" (source, entity_type, metadata, format)
+    kind   = 0: legacy {"data": row}, 1: framed {"rows": [...]}, 2: không có row
+
+Khác với JSON, datetime/date/Decimal/bytes giữ nguyên kiểu khi decode.
+
+Nén body (BodyCompressor) độc lập với codec: body lớn hơn ngưỡng được nén
+bằng codec stdlib và ghi tên vào properties.content_encoding; consumer giải
+nén theo content_encoding trước khi decode.
+"""
+import bz2
+import gzip
+import json
+import lzma
+import struct
+import time as _time
+import zlib
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from ..utils.json_encoder import json_dumps
+
+JSON_CONTENT_TYPE = "application/json"
+ROWS_BINARY_CONTENT_TYPE = "application/x-etl-rows"
+
+
+class CodecError(ValueError):
+    """Lỗi encode/decode body message."""
+
+
+class JsonCodec:
+    """Codec JSON (CustomJSONEncoder), mặc định."""
+
+    content_type = JSON_CONTENT_TYPE
+
+    def encode(self, message: Dict) -> bytes:
+        return json_dumps(message).encode("utf-8")
+
+    def decode(self, body: bytes) -> Dict:
+        return json.loads(body.decode("utf-8"))
+
+
+# Tag của từng giá trị trong binary codec
+_ABSENT = 0      # row không có cột này (khác với None)
+_NONE = 1
+_TRUE = 2
+_FALSE = 3
+_INT8 = 4
+_INT32 = 5
+_INT64 = 6
+_BIGINT = 7      # int ngoài phạm vi int64, lưu dạng chuỗi
+_FLOAT = 8
+_STR8 = 9        # chuỗi <= 255 bytes
+_STR32 = 10
+_DECIMAL = 11
+_DATETIME = 12   # datetime naive: microseconds từ 1970-01-01
+_DATE = 13       # ordinal
+_BYTES = 14
+_ISO_DATETIME = 15   # datetime có timezone (isoformat)
+_TIME = 16
+_JSON = 17       # list/dict (VD: cột thừa của csv.DictReader), lưu dạng JSON
+
+_MAGIC = b"ER1"
+_KIND_DATA = 0
+_KIND_ROWS = 1
+_KIND_EMPTY = 2
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+_U8 = struct.Struct("<B")
+_U16 = struct.Struct("<H")
+_U32 = struct.Struct("<I")
+_I8 = struct.Struct("<b")
+_I32 = struct.Struct("<i")
+_I64 = struct.Struct("<q")
+_F64 = struct.Struct("<d")
+
+
+class RowsBinaryCodec:
+    """Codec binary theo vị trí cột (schema-positional)."""
+
+    content_type = ROWS_BINARY_CONTENT_TYPE
+
+    def encode(self, message: Dict) -> bytes:
+        if "rows" in message:
+            kind, rows = _KIND_ROWS, message["rows"]
+        elif "data" in message:
+            kind, rows = _KIND_DATA, [message["data"]]
+        else:
+            kind, rows = _KIND_EMPTY, []
+
+        header = {key: value for key, value in message.items() if key not in ("data", "rows")}
+        header_bytes = json_dumps(header).encode("utf-8")
+
+        # Schema = hợp các cột theo thứ tự xuất hiện
+        columns: List[str] = []
+        known = set()
+        for row in rows:
+            for key in row:
+                if key not in known:
+                    known.add(key)
+                    columns.append(key)
+
+        if len(columns) > 0xFFFF:
+            raise CodecError("Quá nhiều cột: %s" % len(columns))
+
+        out = bytearray(_MAGIC)
+        out += _U32.pack(len(header_bytes))
+        out += header_bytes
+        out += _U8.pack(kind)
+        out += _U16.pack(len(columns))
+        for column in columns:
+            # Key không phải chuỗi (VD: None - cột thừa của csv.DictReader) đổi như JSON
+            name = (column if isinstance(column, str) else json.dumps(column)).encode("utf-8")
+            out += _U16.pack(len(name))
+            out += name
+
+        out += _U32.pack(len(rows))
+        encode_value = _encode_value
+        for row in rows:
+            get = row.get
+            for column in columns:
+                value = get(column, _MISSING)
+                # Đường nhanh cho chuỗi ngắn (phần lớn giá trị từ CSV)
+                if value.__class__ is str:
+                    data = value.encode("utf-8")
+                    if len(data) <= 0xFF:
+                        out.append(_STR8)
+                        out.append(len(data))
+                        out += data
+                        continue
+                if value is _MISSING:
+                    out.append(_ABSENT)
+                else:
+                    encode_value(out, value)
+
+        return bytes(out)
+
+    def decode(self, body: bytes) -> Dict:
+        try:
+            return self._decode(bytes(body))
+        except (struct.error, IndexError, UnicodeDecodeError, json.JSONDecodeError) as e:
+            raise CodecError("Body binary không hợp lệ: %s" % e) from e
+
+    def _decode(self, view: bytes) -> Dict:
+        if view[:3] != _MAGIC:
+            raise CodecError("Sai magic bytes, không phải %s" % ROWS_BINARY_CONTENT_TYPE)
+
+        pos = 3
+        (header_len,) = _U32.unpack_from(view, pos)
+        pos += 4
+        message = json.loads(view[pos:pos + header_len].decode("utf-8"))
+        pos += header_len
+
+        kind = view[pos]
+        pos += 1
+        (n_cols,) = _U16.unpack_from(view, pos)
+        pos += 2
+
+        columns = []
+        for _ in range(n_cols):
+            (name_len,) = _U16.unpack_from(view, pos)
+            pos += 2
+            columns.append(view[pos:pos + name_len].decode("utf-8"))
+            pos += name_len
+
+        (n_rows,) = _U32.unpack_from(view, pos)
+        pos += 4
+
+        rows = []
+        decode_value = _decode_value
+        for _ in range(n_rows):
+            row = {}
+            for column in columns:
+                # Đường nhanh cho chuỗi ngắn
+                if view[pos] == _STR8:
+                    start = pos + 2
+                    pos = start + view[pos + 1]
+                    row[column] = view[start:pos].decode("utf-8")
+                    continue
+                value, pos = decode_value(view, pos)
+                if value is not _MISSING:
+                    row[column] = value
+            rows.append(row)
+
+        if kind == _KIND_ROWS:
+            message["rows"] = rows
+        elif kind == _KIND_DATA:
+            message["data"] = rows[0] if rows else {}
+
+        return message
+
+
+_MISSING = object()
+
+
+def _encode_value(out: bytearray, value) -> None:
+    # bool phải kiểm tra trước int
+    if value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif isinstance(value, str):
+        data = value.encode("utf-8")
+        if len(data) <= 0xFF:
+            out.append(_STR8)
+            out.append(len(data))
+        else:
+            out.append(_STR32)
+            out += _U32.pack(len(data))
+        out += data
+    elif isinstance(value, int):
+        if -0x80 <= value <= 0x7F:
+            out.append(_INT8)
+            out += _I8.pack(value)
+        elif -0x80000000 <= value <= 0x7FFFFFFF:
+            out.append(_INT32)
+            out += _I32.pack(value)
+        elif -0x8000000000000000 <= value <= 0x7FFFFFFFFFFFFFFF:
+            out.append(_INT64)
+            out += _I64.pack(value)
+        else:
+            _encode_short_text(out, _BIGINT, str(value))
+    elif isinstance(value, float):
+        out.append(_FLOAT)
+        out += _F64.pack(value)
+    elif isinstance(value, Decimal):
+        _encode_short_text(out, _DECIMAL, str(value))
+    elif isinstance(value, datetime):
+        if value.tzinfo is None:
+            out.append(_DATETIME)
+            out += _I64.pack((value - _EPOCH) // _MICROSECOND)
+        else:
+            _encode_short_text(out, _ISO_DATETIME, value.isoformat())
+    elif isinstance(value, date):
+        out.append(_DATE)
+        out += _I32.pack(value.toordinal())
+    elif isinstance(value, time):
+        _encode_short_text(out, _TIME, value.isoformat())
+    elif isinstance(value, (bytes, bytearray)):
+        out.append(_BYTES)
+        out += _U32.pack(len(value))
+        out += value
+    elif isinstance(value, (list, tuple, dict)):
+        data = json_dumps(value).encode("utf-8")
+        out.append(_JSON)
+        out += _U32.pack(len(data))
+        out += data
+    else:
+        raise CodecError("Không encode được kiểu %s" % type(value).__name__)
+
+
+def _encode_short_text(out: bytearray, tag: int, text: str) -> None:
+    data = text.encode("ascii")
+    if len(data) > 0xFF:
+        # Độ dài lưu trong 1 byte (VD: Decimal / int quá nhiều chữ số)
+        raise CodecError("Giá trị quá dài cho tag %s: %s bytes" % (tag, len(data)))
+    out.append(tag)
+    out.append(len(data))
+    out += data
+
+
+def _decode_value(view: bytes, pos: int):
+    tag = view[pos]
+    pos += 1
+
+    if tag == _STR8:
+        length = view[pos]
+        pos += 1
+        return view[pos:pos + length].decode("utf-8"), pos + length
+    if tag == _NONE:
+        return None, pos
+    if tag == _INT8:
+        return _I8.unpack_from(view, pos)[0], pos + 1
+    if tag == _INT32:
+        return _I32.unpack_from(view, pos)[0], pos + 4
+    if tag == _ABSENT:
+        return _MISSING, pos
+    if tag == _TRUE:
+        return True, pos
+    if tag == _FALSE:
+        return False, pos
+    if tag == _INT64:
+        return _I64.unpack_from(view, pos)[0], pos + 8
+    if tag == _FLOAT:
+        return _F64.unpack_from(view, pos)[0], pos + 8
+    if tag == _STR32:
+        (length,) = _U32.unpack_from(view, pos)
+        pos += 4
+        return view[pos:pos + length].decode("utf-8"), pos + length
+    if tag == _DATETIME:
+        return _EPOCH + _MICROSECOND * _I64.unpack_from(view, pos)[0], pos + 8
+    if tag == _DATE:
+        return date.fromordinal(_I32.unpack_from(view, pos)[0]), pos + 4
+    if tag == _BYTES:
+        (length,) = _U32.unpack_from(view, pos)
+        pos += 4
+        return view[pos:pos + length], pos + length
+    if tag == _JSON:
+        (length,) = _U32.unpack_from(view, pos)
+        pos += 4
+        return json.loads(view[pos:pos + length].decode("utf-8")), pos + length
+    if tag in (_BIGINT, _DECIMAL, _ISO_DATETIME, _TIME):
+        length = view[pos]
+        pos += 1
+        text = view[pos:pos + length].decode("ascii")
+        pos += length
+        if tag == _BIGINT:
+            return int(text), pos
+        if tag == _DECIMAL:
+            return Decimal(text), pos
+        if tag == _ISO_DATETIME:
+            return datetime.fromisoformat(text), pos
+        return time.fromisoformat(text), pos
+
+    raise CodecError("Tag không hợp lệ: %s" % tag)
+
+
+_CODECS = {
+    JSON_CONTENT_TYPE: JsonCodec(),
+    ROWS_BINARY_CONTENT_TYPE: RowsBinaryCodec(),
+}
+
+# Tên ngắn dùng trong config (MESSAGE_CODEC)
+_ALIASES = {
+    "json": JSON_CONTENT_TYPE,
+    "rows-binary": ROWS_BINARY_CONTENT_TYPE,
+    "binary": ROWS_BINARY_CONTENT_TYPE,
+}
+
+
+def get_codec(name: Optional[str] = None):
+    """
+    Lấy codec theo tên ngắn ("json", "rows-binary") hoặc content_type.
+
+    None / rỗng → JSON (message cũ không có content_type).
+    """
+    if not name:
+        return _CODECS[JSON_CONTENT_TYPE]
+
+    name = name.split(";")[0].strip().lower()
+    content_type = _ALIASES.get(name, name)
+    codec = _CODECS.get(content_type)
+    if codec is None:
+        raise CodecError("Codec không được hỗ trợ: %s" % name)
+    return codec
+
+
+def decode_body(body: bytes, content_type: Optional[str] = None) -> Dict:
+    """Decode body message theo content_type trong message properties."""
+    return get_codec(content_type).decode(body)
+
+
+# content_encoding → (compress, decompress), chỉ dùng codec có sẵn trong stdlib
+_COMPRESSORS = {
+    "gzip": (lambda data: gzip.compress(data, compresslevel=6), gzip.decompress),
+    "deflate": (lambda data: zlib.compress(data, 6), zlib.decompress),
+    "bzip2": (lambda data: bz2.compress(data, 9), bz2.decompress),
+    "xz": (lambda data: lzma.compress(data, preset=1), lzma.decompress),
+}
+
+
+class BodyCompressor:
+    """
+    Nén body message theo content_encoding, bỏ qua body nhỏ hơn ngưỡng.
+
+    Thống kê (self.stats) để báo cáo tỉ lệ nén và chi phí CPU:
+        messages, compressed, raw_bytes, wire_bytes,
+        compress_seconds, decompressed, decompress_seconds
+    """
+
+    def __init__(self, encoding: Optional[str] = None, min_bytes: int = 1024):
+        """
+        Args:
+            encoding: "gzip", "deflate", "bzip2", "xz" hoặc None (không nén)
+            min_bytes: Body nhỏ hơn ngưỡng này không nén
+        """
+        encoding = (encoding or "").strip().lower() or None
+        if encoding and encoding not in _COMPRESSORS:
+            raise CodecError("Content encoding không được hỗ trợ: %s" % encoding)
+
+        self.encoding = encoding
+        self.min_bytes = min_bytes
+        self.stats = {
+            "messages": 0,
+            "compressed": 0,
+            "raw_bytes": 0,
+            "wire_bytes": 0,
+            "compress_seconds": 0.0,
+            "decompressed": 0,
+            "decompress_seconds": 0.0,
+        }
+
+    def compress(self, body: bytes) -> Tuple[bytes, Optional[str]]:
+        """
+        Nén body nếu bật nén và body đủ lớn.
+
+        Returns:
+            (body, content_encoding) - content_encoding = None nếu không nén
+            (cả khi bản nén không nhỏ hơn bản gốc)
+        """
+        stats = self.stats
+        stats["messages"] += 1
+        stats["raw_bytes"] += len(body)
+
+        encoding = None
+        if self.encoding and len(body) >= self.min_bytes:
+            started = _time.perf_counter()
+            compressed = _COMPRESSORS[self.encoding][0](body)
+            stats["compress_seconds"] += _time.perf_counter() - started
+
+            if len(compressed) < len(body):
+                body = compressed
+                encoding = self.encoding
+                stats["compressed"] += 1
+
+        stats["wire_bytes"] += len(body)
+        return body, encoding
+
+    def decompress(self, body: bytes, encoding: Optional[str] = None) -> bytes:
+        """Giải nén body theo content_encoding của message (None/identity → giữ nguyên)."""
+        encoding = (encoding or "").strip().lower()
+        if not encoding or encoding == "identity":
+            return body
+
+        codec = _COMPRESSORS.get(encoding)
+        if codec is None:
+            raise CodecError("Content encoding không được hỗ trợ: %s" % encoding)
+
+        started = _time.perf_counter()
+        try:
+            body = codec[1](body)
+        except (OSError, EOFError, zlib.error, lzma.LZMAError) as e:
+            raise CodecError("Lỗi giải nén %s: %s" % (encoding, e)) from e
+        finally:
+            self.stats["decompress_seconds"] += _time.perf_counter() - started
+        self.stats["decompressed"] += 1
+        return body
+
+    def ratio(self) -> float:
+        """Tỉ lệ bytes gửi đi / bytes gốc (1.0 = không tiết kiệm)."""
+        raw = self.stats["raw_bytes"]
+        return self.stats["wire_bytes"] / raw if raw else 1.0
+
+    def summary(self) -> str:
+        """Một dòng tóm tắt cho run summary."""
+        stats = self.stats
+        return "%s/%s messages nén (%s), %.1f KB → %.1f KB (tỉ lệ %.2f), CPU nén %.3fs, giải nén %.3fs" % (
+            stats["compressed"],
+            stats["messages"],
+            self.encoding or "tắt",
+            stats["raw_bytes"] / 1024,
+            stats["wire_bytes"] / 1024,
+            self.ratio(),
+            stats["compress_seconds"],
+            stats["decompress_seconds"],
+        )
@@ -0,0 +1,78 @@
+# etl/broker/confirms.py
+"""
+Publisher confirms không chặn từng message trên pika BlockingChannel.
+
+BlockingChannel.confirm_delivery() chờ confirm sau mỗi basic_publish (một
+round-trip mỗi message). Để publish cả cửa sổ rồi mới chờ confirm,
+ConfirmPublisher dùng channel bất đồng bộ bên dưới (BlockingChannel._impl)
+và vòng I/O của BlockingChannel (_flush_output). Đây là API nội bộ của
+pika và chỉ được dùng trong module này:
+
+- requirements.txt pin PIKA_REQUIREMENT
+- Thiếu thuộc tính nào thì ConfirmPublisher raise ngay khi mở channel
+  confirm, không lỗi giữa chừng lúc publish
+
+Channel không phải của pika (VD: MemoryChannel) tự cung cấp publisher qua
+channel.confirm_publisher(on_confirm), cùng interface với ConfirmPublisher.
+"""
+from typing import Callable
+
+import pika
+
+PIKA_REQUIREMENT = "pika>=1.3,<2"
+
+
+class ConfirmPublisher:
+    """
+    Channel ở chế độ confirm, publish không chờ.
+
+    on_confirm(method_frame) nhận Basic.Ack / Basic.Nack của broker (trong
+    lúc wait()).
+    """
+
+    def __init__(self, channel: "pika.adapters.blocking_connection.BlockingChannel", on_confirm: Callable):
+        impl = getattr(channel, "_impl", None)
+        missing = [
+            name
+            for owner, attribute, name in (
+                (impl, "confirm_delivery", "_impl.confirm_delivery"),
+                (impl, "basic_publish", "_impl.basic_publish"),
+                (channel, "_flush_output", "_flush_output"),
+            )
+            if not callable(getattr(owner, attribute, None))
+        ]
+        if missing:
+            raise RuntimeError(
+                "pika %s không có BlockingChannel.%s (cần %s)"
+                % (pika.__version__, ", ".join(missing), PIKA_REQUIREMENT)
+            )
+
+        self.channel = channel
+        select_ok = []
+        impl.confirm_delivery(ack_nack_callback=on_confirm, callback=select_ok.append)
+        self.wait(lambda: bool(select_ok))
+
+    @property
+    def is_closed(self) -> bool:
+        return self.channel.is_closed
+
+    def publish(self, exchange: str, routing_key: str, body: bytes, properties: pika.BasicProperties):
+        """Gửi message, không chờ confirm."""
+        self.channel._impl.basic_publish(
+            exchange=exchange,
+            routing_key=routing_key,
+            body=body,
+            properties=properties
+        )
+
+    def wait(self, until: Callable[[], bool]):
+        """Gửi frame đang chờ và xử lý confirm tới khi until() trả về True."""
+        self.channel._flush_output(until)
+
+
+def confirm_publisher(channel, on_confirm: Callable):
+    """ConfirmPublisher cho `channel` (channel giả lập dùng publisher riêng của nó)."""
+    factory = getattr(channel, "confirm_publisher", None)
+    if factory is not None:
+        return factory(on_confirm)
+    return ConfirmPublisher(channel, on_confirm)
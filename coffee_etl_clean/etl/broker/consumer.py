@@ -1,7 +1,12 @@
 # etl/broker/consumer.py
-import json
-from typing import Callable, Optional
-from .rabbitmq_client import RabbitMQClient
+from typing import Callable, Dict, List, Optional
+
+import pika
+from pika.exceptions import AMQPChannelError
+
+from .rabbitmq_client import PublishNackedError, RabbitMQClient
+from .framing import build_frame, unpack_message
+from .retry import RetryPolicy
 from ..logger import logger
 
 
@@ -11,18 +16,24 @@ class StagingConsumer:
     def __init__(
         self,
         rabbitmq_client: RabbitMQClient,
-        staging_writer: Callable
+        staging_writer: Callable,
+        retry_policy: Optional[RetryPolicy] = None
     ):
         """
         Args:
             rabbitmq_client: RabbitMQ client
             staging_writer: Function để ghi dữ liệu vào staging
                            Signature: staging_writer(data: dict) -> bool
+            retry_policy: Retry queue / parking queue cho message lỗi
+                          (mặc định RetryPolicy())
         """
         self.client = rabbitmq_client
         self.staging_writer = staging_writer
+        self.retry_policy = retry_policy or RetryPolicy()
         self.processed_count = 0
         self.error_count = 0
+        self.retried_count = 0
+        self.parked_count = 0
     
     def start_consuming(
         self,
@@ -32,50 +43,114 @@ class StagingConsumer:
         """
         Bắt đầu consume message từ queue.
         
+        Message lỗi không được requeue ngay mà chuyển sang retry queue với
+        delay tăng dần, quá số lần thử thì vào parking queue (xem
+        RetryPolicy), nên message lỗi không chặn các message khác.
+        
         Args:
             queue_name: Tên queue
             max_messages: Số message tối đa (None = không giới hạn)
         """
         logger.info("[Consumer] Bắt đầu consume từ queue: %s", queue_name)
         
+        retry_policy = self.retry_policy
+        retry_policy.declare(self.client, queue_name)
+        
+        def reject(method, properties, body, error, retryable=True):
+            target = retry_policy.reject(
+                self.client,
+                queue_name,
+                method.delivery_tag,
+                properties,
+                body,
+                error,
+                retryable=retryable
+            )
+            count_target(target)
+        
+        def count_target(target):
+            if target == retry_policy.parking_queue(queue_name):
+                self.parked_count += 1
+            elif target != queue_name:
+                self.retried_count += 1
+        
+        def retry_rows(method, properties, message: Dict, rows: List[Dict]):
+            """
+            Chuyển các row lỗi của framed message sang retry queue (một framed
+            message mới, chờ broker confirm) rồi mới ack message gốc.
+            """
+            body, content_encoding = self.client.compressor.compress(
+                self.client.codec.encode(build_frame(message, rows))
+            )
+            # Header x-attempt của message gốc đi theo các row lỗi
+            retry_properties = pika.BasicProperties(
+                delivery_mode=getattr(properties, "delivery_mode", None) or 2,
+                content_type=self.client.codec.content_type,
+                content_encoding=content_encoding,
+                headers=getattr(properties, "headers", None)
+            )
+            error = RuntimeError(f"staging_writer lỗi {len(rows)} rows của message")
+            try:
+                target = retry_policy.forward(self.client, queue_name, retry_properties, body, error)
+            except (PublishNackedError, AMQPChannelError) as e:
+                # Không chắc các row lỗi đã vào retry queue: giao lại cả message
+                logger.error("[Consumer] Không chuyển được %s rows lỗi, requeue message: %s", len(rows), e)
+                self.client.nack_message(method.delivery_tag, requeue=True)
+                return
+            count_target(target)
+            self.client.ack_message(method.delivery_tag)
+        
         def callback(ch, method, properties, body):
             try:
-                # Parse message
-                message = json.loads(body.decode("utf-8"))
-                data = message.get("data", {})
+                # Parse message (legacy hoặc framed)
+                message = self.client.decode(body, properties)
+                _, _, rows = unpack_message(message)
                 
                 # Ghi vào staging
-                success = self.staging_writer(data)
+                failed = []
+                for data in rows:
+                    if self.staging_writer(data):
+                        self.processed_count += 1
+                        
+                        if self.processed_count % 100 == 0:
+                            logger.info(
+                                "[Consumer] Đã xử lý %s rows",
+                                self.processed_count
+                            )
+                    else:
+                        failed.append(data)
                 
-                if success:
-                    self.processed_count += 1
+                self.error_count += len(failed)
+                
+                if not failed:
                     self.client.ack_message(method.delivery_tag)
-                    
-                    if self.processed_count % 100 == 0:
-                        logger.info(
-                            "[Consumer] Đã xử lý %s messages",
-                            self.processed_count
-                        )
+                elif len(failed) < len(rows):
+                    logger.warning(
+                        "[Consumer] Lỗi ghi staging %s/%s rows của message, retry các row lỗi",
+                        len(failed),
+                        len(rows)
+                    )
+                    retry_rows(method, properties, message, failed)
                 else:
-                    self.error_count += 1
-                    self.client.nack_message(method.delivery_tag, requeue=False)
                     logger.warning(
-                        "[Consumer] Lỗi ghi staging, message bị reject"
+                        "[Consumer] Lỗi ghi staging, message được retry"
                     )
+                    reject(method, properties, body, RuntimeError("staging_writer lỗi toàn bộ rows"))
                 
                 # Dừng nếu đạt max_messages
                 if max_messages and self.processed_count >= max_messages:
                     ch.stop_consuming()
             
-            except json.JSONDecodeError as e:
+            except ValueError as e:
+                # Body hỏng không bao giờ decode được → parking ngay
                 self.error_count += 1
-                logger.error("[Consumer] Lỗi parse JSON: %s", e)
-                self.client.nack_message(method.delivery_tag, requeue=False)
+                logger.error("[Consumer] Lỗi decode message: %s", e)
+                reject(method, properties, body, e, retryable=False)
             
             except Exception as e:
                 self.error_count += 1
                 logger.error("[Consumer] Lỗi xử lý message: %s", e)
-                self.client.nack_message(method.delivery_tag, requeue=True)
+                reject(method, properties, body, e)
         
         try:
             self.client.consume(queue_name, callback, auto_ack=False)
@@ -83,7 +158,9 @@ class StagingConsumer:
             logger.info("[Consumer] Dừng consume bởi user")
         finally:
             logger.info(
-                "[Consumer] Tổng kết: %s thành công, %s lỗi",
+                "[Consumer] Tổng kết: %s thành công, %s lỗi (retry: %s, parking: %s)",
                 self.processed_count,
-                self.error_count
+                self.error_count,
+                self.retried_count,
+                self.parked_count
             )
@@ -0,0 +1,181 @@
+# etl/broker/flow_control.py
+"""
+Backpressure cho producer theo độ sâu queue và trạng thái blocked của broker.
+
+Producer đọc nhanh hơn consumer xử lý thì queue durable phình ra tới khi
+broker chặn connection (connection.blocked, blocked_connection_timeout).
+FlowControl cho producer tự dừng trước:
+
+- Cứ mỗi `check_interval` messages, hỏi độ sâu queue (passive declare)
+- Độ sâu >= high_watermark → tạm dừng publish, vẫn xử lý heartbeat/confirm
+- Tiếp tục khi độ sâu <= low_watermark (hysteresis, tránh dừng/chạy liên tục)
+- Broker gửi connection.blocked → tạm dừng tới khi nhận connection.unblocked
+
+Độ sâu tính theo message: ở framing mode một message chứa nhiều rows.
+Không có consumer nào chạy song song thì queue không bao giờ giảm, nên mỗi
+lần dừng bị giới hạn bởi max_pause (giây) rồi publish tiếp kèm cảnh báo;
+queue đó không bị dừng theo độ sâu nữa cho tới khi xuống dưới low watermark.
+"""
+import time
+from typing import Callable
+
+from ..logger import logger
+
+
+class FlowControl:
+    """Watermark high/low cho producer; high_watermark = 0 là tắt."""
+
+    def __init__(
+        self,
+        high_watermark: int = 0,
+        low_watermark: int = None,
+        max_pause: float = 300.0,
+        check_interval: int = 100,
+        poll_interval: float = 0.5
+    ):
+        """
+        Args:
+            high_watermark: Số message trong queue để bắt đầu dừng (0 = tắt)
+            low_watermark: Số message để publish lại (mặc định: một nửa high)
+            max_pause: Thời gian dừng tối đa mỗi lần (giây)
+            check_interval: Số messages giữa hai lần hỏi độ sâu queue
+            poll_interval: Chu kỳ hỏi lại khi đang dừng (giây)
+        """
+        self.high_watermark = max(0, high_watermark)
+        if low_watermark is None or low_watermark >= self.high_watermark:
+            low_watermark = self.high_watermark // 2
+        self.low_watermark = max(0, low_watermark)
+        self.max_pause = max_pause
+        self.check_interval = max(1, check_interval)
+        self.poll_interval = poll_interval
+
+        self.blocked = False
+        self._since_check = 0
+        # Queue đã dừng hết max_pause mà không giảm (không có consumer)
+        self._gave_up = set()
+
+        self.stats = {
+            "checks": 0,
+            "pauses": 0,
+            "throttled_seconds": 0.0,
+            "blocked_seconds": 0.0,
+            "timeouts": 0,
+            "max_depth": 0,
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.high_watermark > 0
+
+    # ----- callback connection.blocked / connection.unblocked -----
+
+    def on_blocked(self, connection, method_frame):
+        reason = getattr(method_frame.method, "reason", "")
+        logger.warning("⚠️  Broker chặn connection (%s), producer tạm dừng", reason)
+        self.blocked = True
+
+    def on_unblocked(self, connection, method_frame):
+        logger.info("Broker bỏ chặn connection")
+        self.blocked = False
+
+    # ----- producer -----
+
+    def due(self) -> bool:
+        """Gọi trước mỗi message: True khi cần kiểm tra backpressure."""
+        if self.blocked:
+            return True
+        if not self.enabled:
+            return False
+
+        self._since_check += 1
+        if self._since_check < self.check_interval:
+            return False
+        self._since_check = 0
+        return True
+
+    def throttle(
+        self,
+        queue_name: str,
+        get_depth: Callable[[], int],
+        process_events: Callable[[float], None]
+    ) -> float:
+        """
+        Dừng publish nếu queue vượt high watermark hoặc broker đang chặn.
+
+        Args:
+            queue_name: Queue đang publish (để log)
+            get_depth: Trả về số message sẵn sàng trong queue
+            process_events: Xử lý I/O connection tối đa N giây (heartbeat, confirm)
+
+        Returns:
+            Số giây đã dừng
+        """
+        depth = self._depth(get_depth) if self.enabled else 0
+        if queue_name in self._gave_up:
+            if depth > self.low_watermark and not self.blocked:
+                return 0.0
+            self._gave_up.discard(queue_name)
+
+        if not self.blocked and (not self.enabled or depth < self.high_watermark):
+            return 0.0
+
+        self.stats["pauses"] += 1
+        if self.blocked:
+            logger.info("   ⏸️  Tạm dừng publish vào %s: broker đang chặn connection", queue_name)
+        else:
+            logger.info(
+                "   ⏸️  Tạm dừng publish vào %s: %s messages ≥ high watermark %s",
+                queue_name,
+                depth,
+                self.high_watermark
+            )
+
+        started = time.monotonic()
+        while True:
+            tick = time.monotonic()
+            process_events(self.poll_interval)
+            if self.blocked:
+                self.stats["blocked_seconds"] += time.monotonic() - tick
+
+            elapsed = time.monotonic() - started
+            if not self.blocked:
+                depth = self._depth(get_depth) if self.enabled else 0
+                if depth <= self.low_watermark:
+                    break
+
+            if elapsed >= self.max_pause:
+                self.stats["timeouts"] += 1
+                if not self.blocked:
+                    self._gave_up.add(queue_name)
+                logger.warning(
+                    "⚠️  %s vẫn %s sau %.1fs (không có consumer?), publish tiếp",
+                    queue_name,
+                    "bị chặn" if self.blocked else "%s messages" % depth,
+                    elapsed
+                )
+                break
+
+        elapsed = time.monotonic() - started
+        self.stats["throttled_seconds"] += elapsed
+        logger.info("   ▶️  Publish tiếp vào %s sau %.2fs (%s messages)", queue_name, elapsed, depth)
+        return elapsed
+
+    def _depth(self, get_depth: Callable[[], int]) -> int:
+        depth = get_depth()
+        self.stats["checks"] += 1
+        if depth > self.stats["max_depth"]:
+            self.stats["max_depth"] = depth
+        return depth
+
+    def summary(self) -> str:
+        """Một dòng tóm tắt cho producer summary."""
+        stats = self.stats
+        return "watermark %s/%s, dừng %s lần, %.2fs (broker chặn %.2fs), queue sâu nhất %s messages%s" % (
+            self.high_watermark,
+            self.low_watermark,
+            stats["pauses"],
+            stats["throttled_seconds"],
+            stats["blocked_seconds"],
+            stats["max_depth"],
+            ", %s lần hết max_pause" % stats["timeouts"] if stats["timeouts"] else "",
+        )
@@ -0,0 +1,111 @@
+# etl/broker/framing.py
+"""
+Message framing - Đóng gói nhiều rows vào một message RabbitMQ.
+
+Message thường (legacy), mỗi row một message:
+    {"source": "csv", "entity_type": "khach_hang", "data": {...}, "metadata": {...}}
+
+Framed message, nhiều rows dùng chung một header:
+    {"source": "csv", "entity_type": "khach_hang", "metadata": {...},
+     "format": "rows.v1", "rows": [{...}, {...}, ...]}
+"""
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+FRAME_FORMAT = "rows.v1"
+
+
+def estimate_row_size(row: Dict) -> int:
+    """Ước lượng số bytes của một row sau khi encode JSON."""
+    size = 2
+    for key, value in row.items():
+        # "key": value, → 6 ký tự phân cách + dấu ngoặc kép
+        size += len(str(key)) + 6
+        if value is None:
+            size += 4
+        elif isinstance(value, str):
+            size += len(value.encode("utf-8"))
+        else:
+            size += len(str(value))
+    return size
+
+
+def frame_rows(
+    rows: Iterable[Dict],
+    header: Dict,
+    max_rows: int,
+    max_bytes: int = 0
+) -> Iterator[Dict]:
+    """
+    Gom rows thành các framed message.
+
+    Một frame được đóng khi đủ `max_rows` rows hoặc khi thêm row tiếp theo
+    sẽ vượt `max_bytes` (ước lượng). Frame luôn chứa ít nhất 1 row.
+
+    Args:
+        rows: Iterable các row (dict)
+        header: Header dùng chung (source, entity_type, metadata)
+        max_rows: Số rows tối đa mỗi message
+        max_bytes: Kích thước tối đa (bytes) phần rows, 0 = không giới hạn
+
+    Yields:
+        Framed message (dict)
+    """
+    max_rows = max(1, max_rows)
+    batch: List[Dict] = []
+    batch_size = 0
+
+    for row in rows:
+        row_size = estimate_row_size(row) if max_bytes else 0
+
+        if batch and (
+            len(batch) >= max_rows
+            or (max_bytes and batch_size + row_size > max_bytes)
+        ):
+            yield build_frame(header, batch)
+            batch = []
+            batch_size = 0
+
+        batch.append(row)
+        batch_size += row_size
+
+    if batch:
+        yield build_frame(header, batch)
+
+
+def build_frame(header: Dict, rows: List[Dict]) -> Dict:
+    """Tạo framed message từ header và danh sách rows."""
+    message = dict(header)
+    message.pop("data", None)
+    message["format"] = FRAME_FORMAT
+    message["rows"] = rows
+    return message
+
+
+def is_framed(message: Dict) -> bool:
+    """Kiểm tra message có phải framed message không."""
+    return message.get("format") == FRAME_FORMAT
+
+
+def unpack_message(message: Dict) -> Tuple[str, Dict, List[Dict]]:
+    """
+    Tách message (framed hoặc legacy) thành source, metadata và rows.
+
+    Returns:
+        Tuple (source, metadata, rows)
+    """
+    source = message.get("source", "unknown")
+    metadata = message.get("metadata", {})
+
+    if is_framed(message):
+        rows = message.get("rows", [])
+    else:
+        rows = [message.get("data", {})]
+
+    return source, metadata, rows
+
+
+def count_rows(message: Dict) -> int:
+    """Số rows chứa trong một message."""
+    if is_framed(message):
+        return len(message.get("rows", []))
+    return 1
@@ -0,0 +1,581 @@
+# etl/broker/memory_broker.py
+"""
+Broker in-memory thay cho RabbitMQ (BROKER_BACKEND=memory).
+
+Giả lập phần API của pika BlockingConnection / BlockingChannel mà
+RabbitMQClient sử dụng, để pipeline chạy offline và benchmark lặp lại được:
+
+- queue_declare (passive=True trả về message_count, queue không tồn tại →
+  ChannelClosedByBroker 404 và channel bị đóng giống RabbitMQ)
+- exchange_declare / queue_bind: exchange direct, fanout, topic (* và #)
+- Queue có x-message-ttl: message hết hạn được dead-letter theo
+  x-dead-letter-exchange / x-dead-letter-routing-key (hoặc bị bỏ)
+- basic_publish + publisher confirms (confirm_publisher, broker ack khi
+  publisher chờ confirm)
+- basic_qos / basic_consume / basic_cancel với giới hạn prefetch theo channel
+- basic_ack / basic_nack / basic_reject (multiple, requeue → redelivered)
+- process_data_events(time_limit) chờ có message mới thay vì busy-loop
+- Đóng connection → message chưa ack được trả lại queue
+
+Các process khác nhau (STEP1 rồi STEP2) dùng chung queue qua thư mục
+persist_dir: broker nạp snapshot khi khởi tạo và ghi lại khi đóng connection
+(queue durable + message persistent, giống RabbitMQ sau khi restart, cùng
+các exchange và binding).
+Không hỗ trợ hai process cùng ghi một lúc.
+"""
+import pickle
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+import pika
+from pika.exceptions import ChannelClosedByBroker
+from pika.frame import Method
+
+from ..logger import logger
+
+SNAPSHOT_FILE = "queues.pkl"
+
+# (body, properties, redelivered)
+QueueItem = Tuple[bytes, pika.BasicProperties, bool]
+
+
+class MemoryBroker:
+    """Trạng thái broker (các queue), dùng chung cho mọi connection trong process."""
+
+    def __init__(self, persist_dir: Optional[str] = None):
+        self.queues: Dict[str, Deque[QueueItem]] = {}
+        self.durable: Set[str] = set()
+        # exchange -> type, exchange -> [(queue, binding key)]
+        self.exchanges: Dict[str, str] = {}
+        self.bindings: Dict[str, List[Tuple[str, str]]] = {}
+        # Tham số queue; queue có TTL giữ thời điểm hết hạn song song với message
+        self.arguments: Dict[str, Dict] = {}
+        self._expires: Dict[str, Deque[float]] = {}
+        self.persist_dir = Path(persist_dir) if persist_dir else None
+
+        self._lock = threading.RLock()
+        self._changed = threading.Condition(self._lock)
+        self._load()
+
+    def connection(self) -> "MemoryConnection":
+        return MemoryConnection(self)
+
+    # ----- queue -----
+
+    def declare(self, queue: str, durable: bool = False, passive: bool = False, arguments: Optional[Dict] = None) -> int:
+        """Khai báo queue, trả về số message sẵn sàng."""
+        with self._lock:
+            if queue not in self.queues:
+                if passive:
+                    raise KeyError(queue)
+                self.queues[queue] = deque()
+                self._set_arguments(queue, arguments or {})
+            if durable:
+                self.durable.add(queue)
+            self.expire()
+            return len(self.queues[queue])
+
+    def _set_arguments(self, queue: str, arguments: Dict):
+        self.arguments[queue] = dict(arguments)
+        if "x-message-ttl" in arguments:
+            self._expires[queue] = deque()
+
+    # ----- exchange -----
+
+    def declare_exchange(self, exchange: str, exchange_type: str = "direct", passive: bool = False):
+        with self._lock:
+            if exchange not in self.exchanges:
+                if passive:
+                    raise KeyError(exchange)
+                if exchange_type not in ("direct", "fanout", "topic"):
+                    raise NotImplementedError("Broker in-memory không hỗ trợ exchange %s" % exchange_type)
+                self.exchanges[exchange] = exchange_type
+                self.bindings[exchange] = []
+
+    def bind(self, queue: str, exchange: str, routing_key: str):
+        with self._lock:
+            if queue not in self.queues:
+                raise KeyError(queue)
+            if exchange not in self.exchanges:
+                raise KeyError(exchange)
+            if (queue, routing_key) not in self.bindings[exchange]:
+                self.bindings[exchange].append((queue, routing_key))
+
+    def route(self, exchange: str, routing_key: str) -> List[str]:
+        """Các queue nhận message (exchange mặc định: routing_key = tên queue)."""
+        if not exchange:
+            return [routing_key]
+
+        with self._lock:
+            exchange_type = self.exchanges.get(exchange)
+            if exchange_type is None:
+                raise KeyError(exchange)
+
+            queues = []
+            for queue, binding_key in self.bindings[exchange]:
+                if queue in queues:
+                    continue
+                if (
+                    exchange_type == "fanout"
+                    or (exchange_type == "direct" and binding_key == routing_key)
+                    or (exchange_type == "topic" and _topic_matches(binding_key, routing_key))
+                ):
+                    queues.append(queue)
+            return queues
+
+    # ----- message -----
+
+    def enqueue(
+        self,
+        queue: str,
+        body: bytes,
+        properties=None,
+        redelivered: bool = False,
+        front: bool = False,
+        expires_at: Optional[float] = None
+    ):
+        """Đưa message vào queue (queue có TTL: hết hạn lúc expires_at, mặc định bây giờ + TTL)."""
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+
+        with self._changed:
+            messages = self.queues.get(queue)
+            if messages is None:
+                # Giống RabbitMQ: message không route được bị bỏ
+                return False
+
+            item = (body, properties or pika.BasicProperties(), redelivered)
+            expires = self._expires.get(queue)
+            if expires is not None and expires_at is None:
+                expires_at = self._expiry(queue)
+            if front:
+                messages.appendleft(item)
+                if expires is not None:
+                    expires.appendleft(expires_at)
+            else:
+                messages.append(item)
+                if expires is not None:
+                    expires.append(expires_at)
+            self._changed.notify_all()
+            return True
+
+    def requeue(self, items: List[Tuple[str, QueueItem, Optional[float]]]):
+        """
+        Trả message chưa ack về đầu queue (giữ thứ tự), đánh dấu redelivered.
+
+        Giống RabbitMQ, message giữ thời điểm hết hạn ban đầu (không tính lại
+        TTL), nên message bị nack liên tục vẫn hết hạn và được dead-letter.
+        """
+        with self._changed:
+            for queue, (body, properties, _), expires_at in reversed(items):
+                if queue in self.queues:
+                    self.enqueue(queue, body, properties, redelivered=True, front=True, expires_at=expires_at)
+            self._changed.notify_all()
+
+    def take(self, queue: str, limit: int) -> List[Tuple[QueueItem, Optional[float]]]:
+        """
+        Lấy tối đa `limit` message đầu queue (limit < 0: không giới hạn), kèm
+        thời điểm hết hạn (None nếu queue không có TTL) để requeue giữ nguyên.
+        """
+        with self._lock:
+            self.expire()
+            messages = self.queues.get(queue)
+            if not messages:
+                return []
+            count = len(messages) if limit < 0 else min(limit, len(messages))
+            expires = self._expires.get(queue)
+            return [
+                (messages.popleft(), expires.popleft() if expires is not None else None)
+                for _ in range(count)
+            ]
+
+    def wait(self, timeout: float):
+        """Chờ tới khi có message mới, có message hết TTL (hoặc hết timeout)."""
+        with self._changed:
+            next_expiry = min((expires[0] for expires in self._expires.values() if expires), default=None)
+            if next_expiry is not None:
+                timeout = max(0.0, min(timeout, next_expiry - time.time()))
+            self._changed.wait(timeout)
+            self.expire()
+
+    # ----- TTL / dead-letter -----
+
+    def _expiry(self, queue: str) -> float:
+        return time.time() + self.arguments[queue]["x-message-ttl"] / 1000.0
+
+    def expire(self):
+        """Chuyển message hết TTL sang dead-letter exchange (không có: bỏ message)."""
+        with self._lock:
+            now = time.time()
+            for queue, expires in self._expires.items():
+                messages = self.queues[queue]
+                while expires and expires[0] <= now:
+                    expires.popleft()
+                    body, properties, _ = messages.popleft()
+                    self._dead_letter(queue, body, properties)
+
+    def _dead_letter(self, queue: str, body: bytes, properties):
+        arguments = self.arguments.get(queue, {})
+        exchange = arguments.get("x-dead-letter-exchange")
+        if exchange is None:
+            return
+        routing_key = arguments.get("x-dead-letter-routing-key", queue)
+        try:
+            targets = self.route(exchange, routing_key)
+        except KeyError:
+            return
+        for target in targets:
+            self.enqueue(target, body, properties)
+
+    # ----- persist -----
+
+    def _load(self):
+        if not self.persist_dir:
+            return
+
+        path = self.persist_dir / SNAPSHOT_FILE
+        if not path.exists():
+            return
+
+        try:
+            with open(path, "rb") as f:
+                snapshot = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            logger.warning("Không đọc được snapshot broker in-memory %s: %s", path, e)
+            return
+
+        for queue, items in snapshot.get("queues", {}).items():
+            self.queues[queue] = deque()
+            self.durable.add(queue)
+            # Đồng hồ TTL tính lại từ lúc nạp snapshot
+            self._set_arguments(queue, snapshot.get("arguments", {}).get(queue, {}))
+            for body, props, redelivered in items:
+                self.enqueue(queue, body, pika.BasicProperties(**props), redelivered)
+        for exchange, exchange_type in snapshot.get("exchanges", {}).items():
+            self.exchanges[exchange] = exchange_type
+            self.bindings[exchange] = [
+                (queue, routing_key)
+                for queue, routing_key in snapshot.get("bindings", {}).get(exchange, [])
+                if queue in self.queues
+            ]
+
+        logger.info(
+            "Đã nạp broker in-memory từ %s (%s messages)",
+            path,
+            sum(len(q) for q in self.queues.values())
+        )
+
+    def save(self):
+        """Ghi queue durable + message persistent ra persist_dir."""
+        if not self.persist_dir:
+            return
+
+        # Serialize ngay trong lock: snapshot không dùng chung object (headers,
+        # arguments, ...) với các thread đang publish / ack; chỉ ghi file ngoài lock
+        with self._lock:
+            snapshot = {
+                "queues": {
+                    queue: [
+                        (body, _properties_to_dict(properties), redelivered)
+                        for body, properties, redelivered in self.queues[queue]
+                        if properties.delivery_mode == 2
+                    ]
+                    for queue in self.durable
+                    if queue in self.queues
+                },
+                "arguments": {queue: self.arguments.get(queue, {}) for queue in self.durable},
+                "exchanges": dict(self.exchanges),
+                "bindings": {
+                    exchange: [(queue, key) for queue, key in bindings if queue in self.durable]
+                    for exchange, bindings in self.bindings.items()
+                },
+            }
+            data = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+
+        self.persist_dir.mkdir(parents=True, exist_ok=True)
+        path = self.persist_dir / SNAPSHOT_FILE
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        tmp_path.replace(path)
+
+
+def _topic_matches(binding_key: str, routing_key: str) -> bool:
+    """Routing key khớp binding key topic (* = đúng một từ, # = không hoặc nhiều từ)."""
+    pattern = binding_key.split(".")
+    words = routing_key.split(".") if routing_key else []
+
+    def match(i: int, j: int) -> bool:
+        if i == len(pattern):
+            return j == len(words)
+        if pattern[i] == "#":
+            return any(match(i + 1, k) for k in range(j, len(words) + 1))
+        return j < len(words) and pattern[i] in ("*", words[j]) and match(i + 1, j + 1)
+
+    return match(0, 0)
+
+
+def _properties_to_dict(properties: pika.BasicProperties) -> Dict:
+    return {
+        key: getattr(properties, key)
+        for key in ("content_type", "content_encoding", "headers", "delivery_mode", "message_id", "timestamp")
+        if getattr(properties, key, None) is not None
+    }
+
+
+class MemoryConnection:
+    """Giả lập pika BlockingConnection trên MemoryBroker."""
+
+    def __init__(self, broker: MemoryBroker):
+        self.broker = broker
+        self.channels: List["MemoryChannel"] = []
+        self.is_closed = False
+
+    @property
+    def is_open(self) -> bool:
+        return not self.is_closed
+
+    def channel(self) -> "MemoryChannel":
+        channel = MemoryChannel(self, len(self.channels) + 1)
+        self.channels.append(channel)
+        return channel
+
+    def process_data_events(self, time_limit: float = 0):
+        """Giao message cho consumer; nếu chưa có gì để giao thì chờ tối đa time_limit."""
+        if self._dispatch() or not time_limit:
+            return
+
+        deadline = time.monotonic() + time_limit
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            self.broker.wait(remaining)
+            if self._dispatch():
+                return
+
+    def sleep(self, duration: float):
+        time.sleep(duration)
+
+    def add_on_connection_blocked_callback(self, callback):
+        """Broker in-memory không giới hạn bộ nhớ nên không bao giờ chặn connection."""
+
+    def add_on_connection_unblocked_callback(self, callback):
+        pass
+
+    def _dispatch(self) -> int:
+        return sum(channel.dispatch() for channel in list(self.channels) if not channel.is_closed)
+
+    def close(self):
+        for channel in self.channels:
+            channel.close()
+        self.is_closed = True
+        self.broker.save()
+
+
+class MemoryConfirmPublisher:
+    """
+    ConfirmPublisher (confirms.py) của MemoryChannel: broker ack (multiple)
+    mọi message đã publish mỗi lần wait().
+    """
+
+    def __init__(self, channel: "MemoryChannel", on_confirm):
+        self.channel = channel
+        self.on_confirm = on_confirm
+        # Delivery tag của message publish cuối cùng / đã confirm
+        self.published_tag = 0
+        self.confirmed_tag = 0
+
+    @property
+    def is_closed(self) -> bool:
+        return self.channel.is_closed
+
+    def publish(self, exchange, routing_key, body, properties=None):
+        self.channel.basic_publish(exchange, routing_key, body, properties)
+        self.published_tag += 1
+
+    def wait(self, until=None):
+        if self.published_tag > self.confirmed_tag:
+            self.confirm(self.published_tag, multiple=True)
+
+    def confirm(self, delivery_tag: int, nack: bool = False, multiple: bool = False):
+        """Gửi Basic.Ack / Basic.Nack cho publisher (VD: giả lập broker nack)."""
+        method = pika.spec.Basic.Nack if nack else pika.spec.Basic.Ack
+        self.on_confirm(Method(self.channel.channel_number, method(delivery_tag, multiple)))
+        if multiple:
+            self.confirmed_tag = max(self.confirmed_tag, delivery_tag)
+
+
+class MemoryChannel:
+    """Giả lập pika BlockingChannel (publish, confirm, consume, ack/nack)."""
+
+    def __init__(self, connection: MemoryConnection, channel_number: int):
+        self.connection = connection
+        self.broker = connection.broker
+        self.channel_number = channel_number
+        self.is_closed = False
+
+        self.prefetch_count = 0
+        self.consumers: Dict[str, Tuple[str, object, bool]] = {}
+        # delivery tag -> (queue, message, thời điểm hết hạn)
+        self.unacked: Dict[int, Tuple[str, QueueItem, Optional[float]]] = {}
+        self.next_delivery_tag = 0
+        self._consuming = False
+
+    @property
+    def is_open(self) -> bool:
+        return not self.is_closed
+
+    def _check_open(self):
+        if self.is_closed:
+            raise pika.exceptions.ChannelWrongStateError("Channel is closed.")
+
+    # ----- publish -----
+
+    def confirm_delivery(self):
+        """Chế độ confirm đồng bộ: message được confirm ngay khi publish."""
+        self._check_open()
+
+    def basic_publish(self, exchange, routing_key, body, properties=None, mandatory=False):
+        self._check_open()
+        try:
+            queues = self.broker.route(exchange, routing_key)
+        except KeyError:
+            self.close()
+            raise ChannelClosedByBroker(404, "NOT_FOUND - no exchange '%s'" % exchange)
+
+        for queue in queues:
+            self.broker.enqueue(queue, body, properties)
+
+    def confirm_publisher(self, on_confirm) -> MemoryConfirmPublisher:
+        """Chế độ confirm không chặn (publish_batch, xem confirms.py)."""
+        self._check_open()
+        return MemoryConfirmPublisher(self, on_confirm)
+
+    # ----- exchange / queue / consume -----
+
+    def exchange_declare(self, exchange, exchange_type="direct", passive=False, durable=False, auto_delete=False, internal=False, arguments=None):
+        self._check_open()
+        try:
+            self.broker.declare_exchange(exchange, exchange_type, passive=passive)
+        except KeyError:
+            self.close()
+            raise ChannelClosedByBroker(404, "NOT_FOUND - no exchange '%s'" % exchange)
+
+    def queue_bind(self, queue, exchange, routing_key=None, arguments=None):
+        self._check_open()
+        try:
+            self.broker.bind(queue, exchange, queue if routing_key is None else routing_key)
+        except KeyError as e:
+            self.close()
+            raise ChannelClosedByBroker(404, "NOT_FOUND - no queue/exchange '%s'" % e.args[0])
+
+    def queue_declare(self, queue, durable=False, passive=False, exclusive=False, auto_delete=False, arguments=None):
+        self._check_open()
+        try:
+            message_count = self.broker.declare(queue, durable=durable, passive=passive, arguments=arguments)
+        except KeyError:
+            # Giống RabbitMQ: passive declare queue không tồn tại → đóng channel
+            self.close()
+            raise ChannelClosedByBroker(404, "NOT_FOUND - no queue '%s'" % queue)
+
+        consumer_count = sum(1 for q, _, _ in self.consumers.values() if q == queue)
+        return SimpleNamespace(
+            method=SimpleNamespace(queue=queue, message_count=message_count, consumer_count=consumer_count)
+        )
+
+    def basic_qos(self, prefetch_size=0, prefetch_count=0, global_qos=False):
+        self._check_open()
+        self.prefetch_count = prefetch_count
+
+    def basic_consume(self, queue, on_message_callback, auto_ack=False, exclusive=False, consumer_tag=None, arguments=None):
+        self._check_open()
+        self.queue_declare(queue, passive=True)
+        consumer_tag = consumer_tag or "ctag%s.%s" % (self.channel_number, len(self.consumers) + 1)
+        self.consumers[consumer_tag] = (queue, on_message_callback, auto_ack)
+        return consumer_tag
+
+    def basic_cancel(self, consumer_tag):
+        self.consumers.pop(consumer_tag, None)
+
+    def basic_ack(self, delivery_tag=0, multiple=False):
+        self._check_open()
+        for tag in self._settle(delivery_tag, multiple):
+            self.unacked.pop(tag, None)
+
+    def basic_nack(self, delivery_tag=0, multiple=False, requeue=True):
+        self._check_open()
+        items = [self.unacked.pop(tag) for tag in self._settle(delivery_tag, multiple) if tag in self.unacked]
+        if requeue and items:
+            self.broker.requeue(items)
+
+    def basic_reject(self, delivery_tag, requeue=True):
+        self.basic_nack(delivery_tag, multiple=False, requeue=requeue)
+
+    def _settle(self, delivery_tag, multiple):
+        if multiple:
+            return [tag for tag in self.unacked if tag <= delivery_tag or delivery_tag == 0]
+        return [delivery_tag]
+
+    def dispatch(self) -> int:
+        """Giao message cho các consumer của channel trong giới hạn prefetch."""
+        delivered = 0
+        for consumer_tag, (queue, callback, auto_ack) in list(self.consumers.items()):
+            limit = -1
+            if self.prefetch_count and not auto_ack:
+                limit = self.prefetch_count - len(self.unacked)
+                if limit <= 0:
+                    break
+
+            for item, expires_at in self.broker.take(queue, limit):
+                body, properties, redelivered = item
+                self.next_delivery_tag += 1
+                tag = self.next_delivery_tag
+                if not auto_ack:
+                    self.unacked[tag] = (queue, item, expires_at)
+                method = pika.spec.Basic.Deliver(consumer_tag, tag, redelivered, "", queue)
+                callback(self, method, properties, body)
+                delivered += 1
+
+                if self.is_closed or consumer_tag not in self.consumers:
+                    # Consumer bị cancel giữa chừng: trả lại phần còn lại
+                    break
+        return delivered
+
+    def start_consuming(self):
+        self._consuming = True
+        while self._consuming and self.consumers and not self.is_closed:
+            self.connection.process_data_events(time_limit=1)
+
+    def stop_consuming(self, consumer_tag=None):
+        self._consuming = False
+        for tag in [consumer_tag] if consumer_tag else list(self.consumers):
+            self.basic_cancel(tag)
+
+    def close(self):
+        if self.is_closed:
+            return
+        # Message chưa ack được trả lại queue (redelivered) như khi channel đóng
+        if self.unacked:
+            self.broker.requeue([self.unacked[tag] for tag in sorted(self.unacked)])
+            self.unacked.clear()
+        self.consumers.clear()
+        self.is_closed = True
+
+
+_brokers: Dict[str, MemoryBroker] = {}
+_brokers_lock = threading.Lock()
+
+
+def get_memory_broker(persist_dir: Optional[str] = None) -> MemoryBroker:
+    """Broker in-memory dùng chung trong process (một broker cho mỗi persist_dir)."""
+    key = str(Path(persist_dir).resolve()) if persist_dir else ""
+    with _brokers_lock:
+        broker = _brokers.get(key)
+        if broker is None:
+            broker = _brokers[key] = MemoryBroker(persist_dir)
+        return broker
@@ -0,0 +1,206 @@
+# etl/broker/parallel_producer.py
+"""
+Producer CSV song song nhiều process.
+
+Parse CSV và encode message tốn CPU, chạy trong một thread thì bị GIL giới
+hạn ở một core. ParallelCSVProducer chia mỗi file thành các đoạn byte
+(csv_chunk_ranges) và gửi từng đoạn cho ProcessPoolExecutor:
+
+- Mỗi worker process giữ một RabbitMQClient riêng, mở lần đầu và dùng lại
+  cho mọi đoạn mà process đó xử lý
+- Kết quả (count, errors, thống kê nén/backpressure) của các đoạn được gộp
+  lại theo file
+
+Các đoạn của cùng một file được publish song song nên thứ tự message trong
+queue không còn theo thứ tự dòng trong file.
+
+`publish` là hàm nhận (client, file_path, queue_name, rows) và trả về
+(count, errors); hàm này chạy trong worker nên phải pickle được (hàm ở mức
+module hoặc method của object pickle được).
+"""
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing.util import Finalize
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from .rabbitmq_client import RabbitMQClient
+from ..readers.csv_staging_reader import csv_chunk_ranges, csv_range_reader
+from ..logger import logger
+
+PublishFunc = Callable[[RabbitMQClient, str, str, Iterable[Dict]], Tuple[int, int]]
+
+# Client RabbitMQ của worker process hiện tại
+_worker_client: Optional[RabbitMQClient] = None
+
+
+def _init_worker(client_kwargs: Dict):
+    global _worker_client
+    _worker_client = RabbitMQClient(**client_kwargs)
+    _worker_client.connect()
+    # ProcessPoolExecutor không chạy atexit trong worker; Finalize chạy khi process kết thúc
+    Finalize(_worker_client, _worker_client.close, exitpriority=10)
+
+
+def _publish_chunk(publish: PublishFunc, file_path: str, queue_name: str, start: int, end: int) -> Dict:
+    client = _worker_client
+    compress_before = dict(client.compressor.stats)
+    throttled_before = client.flow.stats["throttled_seconds"]
+    started = time.perf_counter()
+
+    count, errors = publish(client, file_path, queue_name, csv_range_reader(file_path, start, end))
+
+    return {
+        "count": count,
+        "errors": errors,
+        "seconds": time.perf_counter() - started,
+        "pid": os.getpid(),
+        "compress": {key: value - compress_before[key] for key, value in client.compressor.stats.items()},
+        "throttled_seconds": client.flow.stats["throttled_seconds"] - throttled_before,
+    }
+
+
+class ParallelCSVProducer:
+    """
+    Publish nhiều file CSV song song trên process pool.
+
+    Ví dụ:
+
+    producer = ParallelCSVProducer(rabbitmq.client_kwargs(), workers=4)
+    results = producer.produce({"data/khachhang.csv": "queue_khach_hang"}, publish)
+    """
+
+    def __init__(self, client_kwargs: Dict, workers: int = 0, chunk_bytes: int = 8 * 1024 * 1024):
+        """
+        Args:
+            client_kwargs: Tham số RabbitMQClient cho connection của mỗi worker
+            workers: Số process (0 = số CPU)
+            chunk_bytes: Kích thước mỗi đoạn file (0 = mỗi file một đoạn)
+        """
+        self.client_kwargs = client_kwargs
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_bytes = chunk_bytes
+
+    def produce(
+        self,
+        file_queue_mapping: Dict[str, str],
+        publish: PublishFunc,
+        keepalive: Optional[Callable[[], None]] = None,
+        ranges: Optional[Dict[str, List[Tuple[int, int]]]] = None,
+        on_chunk: Optional[Callable[[str, int, int, int], None]] = None
+    ) -> Dict[str, Dict]:
+        """
+        Publish các file vào queue tương ứng.
+
+        Args:
+            file_queue_mapping: Dict file_path -> queue_name
+            publish: Hàm publish rows của một đoạn, trả về (count, errors)
+            keepalive: Gọi định kỳ trong lúc chờ worker (VD: giữ heartbeat
+                       cho connection của process chính)
+            ranges: Dict file_path -> các đoạn (start, end) cần publish, thay
+                    cho csv_chunk_ranges (VD: resume bỏ qua đoạn đã xong)
+            on_chunk: Gọi trong process chính khi một đoạn publish xong,
+                      nhận (file_path, start, end, count)
+
+        Returns:
+            Dict: {file_path: {"success", "errors", "queue", "chunks", "seconds",
+                   "compress", "throttled_seconds"[, "error"]}}
+        """
+        tasks: List[Tuple[str, str, int, int]] = []
+        results: Dict[str, Dict] = {}
+
+        for file_path, queue_name in file_queue_mapping.items():
+            results[file_path] = {
+                "success": 0,
+                "errors": 0,
+                "queue": queue_name,
+                "chunks": 0,
+                "seconds": 0.0,
+                "compress": {},
+                "throttled_seconds": 0.0,
+            }
+            try:
+                if ranges is not None and file_path in ranges:
+                    file_ranges = ranges[file_path]
+                else:
+                    file_ranges = csv_chunk_ranges(file_path, self.chunk_bytes)
+                for start, end in file_ranges:
+                    tasks.append((file_path, queue_name, start, end))
+                    results[file_path]["chunks"] += 1
+            except Exception as e:
+                logger.error("[ParallelProducer] Lỗi đọc file %s: %s", file_path, e)
+                results[file_path].update(errors=-1, error=str(e))
+
+        if not tasks:
+            return results
+
+        workers = min(self.workers, len(tasks))
+        logger.info(
+            "[ParallelProducer] %s files / %s đoạn trên %s processes",
+            len(file_queue_mapping),
+            len(tasks),
+            workers
+        )
+        started = time.perf_counter()
+        pids = set()
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(self.client_kwargs,)
+        ) as pool:
+            pending = {
+                pool.submit(_publish_chunk, publish, *task): task
+                for task in tasks
+            }
+
+            while pending:
+                done, _ = wait(pending, timeout=1.0, return_when=FIRST_COMPLETED)
+                if keepalive:
+                    keepalive()
+
+                for future in done:
+                    file_path, queue_name, start, end = pending.pop(future)
+                    result = results[file_path]
+                    try:
+                        chunk = future.result()
+                    except Exception as e:
+                        logger.error(
+                            "[ParallelProducer] Lỗi đoạn %s-%s của %s: %s",
+                            start,
+                            end,
+                            file_path,
+                            e
+                        )
+                        result["errors"] = -1
+                        result["error"] = str(e)
+                        continue
+
+                    pids.add(chunk["pid"])
+                    if on_chunk:
+                        on_chunk(file_path, start, end, chunk["count"])
+                    result["success"] += chunk["count"]
+                    if result["errors"] >= 0:
+                        result["errors"] += chunk["errors"]
+                    result["seconds"] += chunk["seconds"]
+                    result["throttled_seconds"] += chunk["throttled_seconds"]
+                    for key, value in chunk["compress"].items():
+                        result["compress"][key] = result["compress"].get(key, 0) + value
+
+        wall = time.perf_counter() - started
+        logger.info(
+            "   ⏱️  %s đoạn / %s processes: wall-clock %.2fs (tổng tuần tự %.2fs)",
+            len(tasks),
+            len(pids),
+            wall,
+            sum(r["seconds"] for r in results.values())
+        )
+        return results
+
+
+def merge_worker_stats(results: Dict[str, Dict], client: RabbitMQClient):
+    """Cộng thống kê nén/backpressure của worker vào client của process chính (cho summary)."""
+    for result in results.values():
+        for key, value in result.get("compress", {}).items():
+            client.compressor.stats[key] += value
+        client.flow.stats["throttled_seconds"] += result.get("throttled_seconds", 0.0)
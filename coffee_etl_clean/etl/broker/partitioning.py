@@ -0,0 +1,60 @@
+# etl/broker/partitioning.py
+"""
+Chia message của một entity vào N partition queue theo khóa của row.
+
+Consumer kiểm tra trùng (seen_ids / seen_emails) bằng state trong process,
+nên trước đây mỗi entity chỉ chạy được một consumer. Khi producer route mọi
+row có cùng khóa vào cùng một partition, mỗi consumer giữ state của partition
+mình và N consumer chạy song song mà vẫn phát hiện đúng các row trùng khóa.
+
+Khóa là field đầu tiên có giá trị trong `key_fields` (mặc định id,
+customer_id - cùng field với seen_ids). Row trùng ở field khác khóa (VD:
+cùng email, khác id) chỉ được phát hiện khi nằm cùng partition.
+
+Partition được tính bằng jump consistent hash nên khi đổi số partition
+chỉ khoảng 1/N khóa phải chuyển sang partition khác.
+"""
+import hashlib
+from typing import Dict, Iterable, Optional
+
+DEFAULT_KEY_FIELDS = ("id", "customer_id")
+
+_MASK64 = (1 << 64) - 1
+
+
+def jump_hash(key: int, buckets: int) -> int:
+    """Jump consistent hash (Lamping & Veach): key 64-bit → bucket trong [0, buckets)."""
+    b, j = -1, 0
+    while j < buckets:
+        b = j
+        key = (key * 2862933555777941757 + 1) & _MASK64
+        j = int((b + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return b
+
+
+class KeyPartitioner:
+    """Tính partition của row theo khóa."""
+
+    def __init__(self, partitions: int, key_fields: Iterable[str] = DEFAULT_KEY_FIELDS):
+        self.partitions = max(1, partitions)
+        self.key_fields = tuple(key_fields)
+
+    def key(self, row: Dict) -> Optional[str]:
+        """Khóa đã chuẩn hóa của row ("1" và 1 là cùng khóa), None nếu không có."""
+        for field in self.key_fields:
+            value = row.get(field)
+            if value is None or value == "":
+                continue
+            try:
+                return str(int(value))
+            except (TypeError, ValueError):
+                return str(value).strip().lower()
+        return None
+
+    def partition(self, row: Dict) -> int:
+        """Partition của row; row không có khóa vào partition 0."""
+        key = self.key(row)
+        if key is None or self.partitions == 1:
+            return 0
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest()
+        return jump_hash(int.from_bytes(digest, "big"), self.partitions)
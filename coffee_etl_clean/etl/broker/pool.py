@@ -0,0 +1,139 @@
+# etl/broker/pool.py
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator, List
+
+import pika
+
+from .rabbitmq_client import RabbitMQClient
+from ..logger import logger
+
+
+class BrokerPool:
+    """
+    Pool kết nối RabbitMQ dùng chung cho cả một pipeline run.
+
+    pika BlockingConnection không thread-safe nên mỗi thread giữ một
+    RabbitMQClient (connection + channel) riêng, dùng lại cho mọi phase và
+    mọi queue mà thread đó xử lý thay vì connect lại từ đầu.
+
+    Trước mỗi lần cấp client, pool kiểm tra sức khỏe connection: xử lý
+    heartbeat đang chờ, connect lại nếu connection đã chết, mở channel mới
+    nếu channel bị broker đóng (VD: passive declare queue không tồn tại).
+
+    Ví dụ:
+
+    pool = BrokerPool(host=..., port=..., username=..., password=...)
+    with pool.client() as rabbitmq:
+        rabbitmq.publish_batch(...)
+    pool.close_all()
+    """
+
+    def __init__(self, **client_kwargs):
+        """
+        Args:
+            client_kwargs: Tham số khởi tạo RabbitMQClient (host, port, heartbeat, codec, ...)
+        """
+        self.client_kwargs = client_kwargs
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._clients: List[RabbitMQClient] = []
+
+        self.stats = {
+            "connects": 0,
+            "connect_seconds": 0.0,
+            "reuses": 0,
+            "reconnects": 0,
+            "channels_reopened": 0,
+        }
+
+    @contextmanager
+    def client(self) -> Iterator[RabbitMQClient]:
+        """Lấy client của thread hiện tại (không đóng khi ra khỏi context)."""
+        yield self.acquire()
+
+    def acquire(self) -> RabbitMQClient:
+        """Trả về client còn sống của thread hiện tại, tạo mới nếu cần."""
+        client = getattr(self._local, "client", None)
+
+        if client is not None:
+            if self._healthy(client):
+                with self._lock:
+                    self.stats["reuses"] += 1
+                return client
+
+            logger.warning("Connection RabbitMQ của thread %s đã đóng, kết nối lại", threading.current_thread().name)
+            with self._lock:
+                self.stats["reconnects"] += 1
+            self._discard(client)
+
+        client = RabbitMQClient(**self.client_kwargs)
+        started = time.perf_counter()
+        client.connect()
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self.stats["connects"] += 1
+            self.stats["connect_seconds"] += elapsed
+            self._clients.append(client)
+
+        self._local.client = client
+        return client
+
+    def _healthy(self, client: RabbitMQClient) -> bool:
+        connection = client.connection
+        if connection is None or connection.is_closed:
+            return False
+
+        try:
+            # Xử lý heartbeat/frame đang chờ; raise nếu connection đã chết
+            connection.process_data_events(time_limit=0)
+
+            if client.channel is None or client.channel.is_closed:
+                client.channel = connection.channel()
+                with self._lock:
+                    self.stats["channels_reopened"] += 1
+        except pika.exceptions.AMQPError as e:
+            logger.warning("Health check RabbitMQ thất bại: %s", e)
+            return False
+
+        return True
+
+    def _discard(self, client: RabbitMQClient):
+        with self._lock:
+            if client in self._clients:
+                self._clients.remove(client)
+        try:
+            client.close()
+        except Exception:
+            pass
+        self._local.client = None
+
+    def summary(self) -> str:
+        """Một dòng tóm tắt: số connection, thời gian connect và ước lượng tiết kiệm."""
+        stats = self.stats
+        avg = stats["connect_seconds"] / stats["connects"] if stats["connects"] else 0.0
+        return "%s connections (connect %.2fs, TB %.0f ms), dùng lại %s lần (~tiết kiệm %.2fs), kết nối lại %s" % (
+            stats["connects"],
+            stats["connect_seconds"],
+            avg * 1000,
+            stats["reuses"],
+            stats["reuses"] * avg,
+            stats["reconnects"],
+        )
+
+    def close_all(self):
+        """Đóng tất cả connection của pool."""
+        with self._lock:
+            clients, self._clients = self._clients, []
+
+        for client in clients:
+            try:
+                client.close()
+            except Exception as e:
+                logger.warning("Lỗi đóng connection RabbitMQ: %s", e)
+
+        self._local = threading.local()
+        if self.stats["connects"]:
+            logger.info("🔌 Broker pool: %s", self.summary())
@@ -1,7 +1,8 @@
 # etl/broker/producer.py
-from typing import Dict, List
+from typing import Dict, Iterable, List, Tuple
 from pathlib import Path
 from .rabbitmq_client import RabbitMQClient
+from .parallel_producer import ParallelCSVProducer, merge_worker_stats
 from ..readers.csv_staging_reader import csv_staging_reader
 from ..logger import logger
 
@@ -35,37 +36,15 @@ class CSVProducer:
         # Khai báo queue
         self.client.declare_queue(queue_name)
         
-        count = 0
-        errors = 0
+        throttled_before = self.client.flow.stats["throttled_seconds"]
         
         try:
-            for row in csv_staging_reader(file_path):
-                try:
-                    # Thêm metadata
-                    message = {
-                        "data": row,
-                        "source_file": Path(file_path).name,
-                        "queue": queue_name
-                    }
-                    
-                    self.client.publish(queue_name, message)
-                    count += 1
-                    
-                    if count % batch_size == 0:
-                        logger.info(
-                            "[Producer] Đã gửi %s records vào queue %s",
-                            count,
-                            queue_name
-                        )
-                
-                except Exception as e:
-                    errors += 1
-                    logger.error(
-                        "[Producer] Lỗi gửi record: %s",
-                        e,
-                        extra={"extra_data": {"row": row, "error": str(e)}}
-                    )
-        
+            count, errors = self.publish_rows(
+                file_path,
+                queue_name,
+                csv_staging_reader(file_path),
+                batch_size
+            )
         except Exception as e:
             logger.error("[Producer] Lỗi đọc file %s: %s", file_path, e)
             raise
@@ -75,8 +54,61 @@ class CSVProducer:
             count,
             errors
         )
+        throttled = self.client.flow.stats["throttled_seconds"] - throttled_before
+        if throttled:
+            logger.info("[Producer] Dừng %.2fs do backpressure (queue %s)", throttled, queue_name)
         
         return count, errors
+    
+    def publish_rows(
+        self,
+        file_path: str,
+        queue_name: str,
+        rows: Iterable[Dict],
+        batch_size: int = 100
+    ) -> Tuple[int, int]:
+        """
+        Gửi từng row vào queue kèm metadata file.
+        
+        Returns:
+            (count, errors)
+        """
+        count = 0
+        errors = 0
+        
+        for row in rows:
+            try:
+                # Thêm metadata
+                message = {
+                    "data": row,
+                    "source_file": Path(file_path).name,
+                    "queue": queue_name
+                }
+                
+                self.client.publish(queue_name, message)
+                count += 1
+                
+                if count % batch_size == 0:
+                    logger.info(
+                        "[Producer] Đã gửi %s records vào queue %s",
+                        count,
+                        queue_name
+                    )
+            
+            except Exception as e:
+                errors += 1
+                logger.error(
+                    "[Producer] Lỗi gửi record: %s",
+                    e,
+                    extra={"extra_data": {"row": row, "error": str(e)}}
+                )
+        
+        return count, errors
+
+
+def _publish_csv_chunk(client: RabbitMQClient, file_path: str, queue_name: str, rows: Iterable[Dict]) -> Tuple[int, int]:
+    """Publish một đoạn file trong worker process (xem ParallelCSVProducer)."""
+    return CSVProducer(client).publish_rows(file_path, queue_name, rows)
 
 
 class MultiFileProducer:
@@ -88,7 +120,9 @@ class MultiFileProducer:
     
     def produce_multiple(
         self,
-        file_queue_mapping: Dict[str, str]
+        file_queue_mapping: Dict[str, str],
+        workers: int = 1,
+        chunk_bytes: int = 8 * 1024 * 1024
     ):
         """
         Đọc nhiều file và gửi vào các queue tương ứng.
@@ -99,7 +133,17 @@ class MultiFileProducer:
                 "data/nguyenlieu.csv": "queue_nguyenlieu",
                 "data/tensanpham.csv": "queue_tensanpham"
             }
+            workers: 1 = tuần tự trong process hiện tại, khác 1 = chia file
+                     (và đoạn chunk_bytes của file lớn) cho process pool
+                     (0 = số CPU), mỗi process một connection riêng
+            chunk_bytes: Kích thước mỗi đoạn file khi chạy song song
         """
+        if workers != 1:
+            if self.client.backend == "memory":
+                logger.warning("⚠️  Broker in-memory không dùng chung được giữa các process, publish tuần tự")
+            else:
+                return self.produce_parallel(file_queue_mapping, workers, chunk_bytes)
+        
         results = {}
         
         for file_path, queue_name in file_queue_mapping.items():
@@ -126,3 +170,35 @@ class MultiFileProducer:
                 }
         
         return results
+    
+    def produce_parallel(
+        self,
+        file_queue_mapping: Dict[str, str],
+        workers: int = 0,
+        chunk_bytes: int = 8 * 1024 * 1024
+    ) -> Dict[str, Dict]:
+        """Publish các file trên process pool (xem ParallelCSVProducer)."""
+        for queue_name in set(file_queue_mapping.values()):
+            self.client.declare_queue(queue_name)
+        
+        results = ParallelCSVProducer(
+            self.client.client_kwargs(),
+            workers=workers,
+            chunk_bytes=chunk_bytes
+        ).produce(
+            file_queue_mapping,
+            _publish_csv_chunk,
+            keepalive=lambda: self.client.connection.process_data_events(time_limit=0)
+        )
+        merge_worker_stats(results, self.client)
+        
+        for file_path, result in results.items():
+            logger.info(
+                "[MultiFileProducer] %s: %s records thành công, %s lỗi (%s đoạn)",
+                file_path,
+                result["success"],
+                result["errors"],
+                result["chunks"]
+            )
+        
+        return results
@@ -1,11 +1,39 @@
 # etl/broker/rabbitmq_client.py
 import pika
-import json
-from typing import Dict, Callable, Optional
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Callable, Iterable, List, Optional, Set, Tuple
+from .codecs import BodyCompressor, decode_body, get_codec
+from .confirms import confirm_publisher
+from .flow_control import FlowControl
+from .memory_broker import get_memory_broker
+from .tracing import trace_headers
 from ..logger import logger
 from ..utils.retry import retry
 
 
+class PublishNackedError(RuntimeError):
+    """
+    Broker nack (hoặc không xác nhận được) message khi publish với confirms.
+    
+    `result` giữ kết quả như publish_batch trả về khi thành công
+    ({"published", "acked", "nacked", ...}) để caller biết message nào bị nack.
+    """
+    
+    def __init__(self, queue_name: str, result: Dict):
+        super().__init__(queue_name, result)
+        self.queue_name = queue_name
+        self.result = result
+    
+    def __str__(self) -> str:
+        return "Broker nack %s/%s messages vào queue %s" % (
+            len(self.result["nacked"]),
+            self.result["published"],
+            self.queue_name
+        )
+
+
 class RabbitMQClient:
     """Client để kết nối và tương tác với RabbitMQ."""
     
@@ -17,8 +45,35 @@ class RabbitMQClient:
         password: str = "guest",
         virtual_host: str = "/",
         heartbeat: int = 600,
-        blocked_connection_timeout: int = 300
+        blocked_connection_timeout: int = 300,
+        codec: str = "json",
+        compression: Optional[str] = None,
+        compress_min_bytes: int = 1024,
+        backend: str = "rabbitmq",
+        memory_dir: Optional[str] = None,
+        high_watermark: int = 0,
+        low_watermark: Optional[int] = None,
+        max_throttle: float = 300.0
     ):
+        """
+        Args:
+            codec: Codec encode message khi publish ("json", "rows-binary"
+                   hoặc content_type); consumer tự chọn decoder theo content_type
+            compression: Nén body khi publish ("gzip", "deflate", "bzip2", "xz"
+                         hoặc None); consumer tự giải nén theo content_encoding
+            compress_min_bytes: Body nhỏ hơn ngưỡng này không nén
+            backend: "rabbitmq" (mặc định) hoặc "memory" - broker in-memory
+                     chạy trong process, không cần RabbitMQ server
+            memory_dir: Thư mục lưu queue của broker in-memory giữa các process
+                        (None: chỉ giữ trong process hiện tại)
+            high_watermark: Backpressure khi publish - dừng khi queue có từ
+                            N messages (0 = tắt), xem FlowControl
+            low_watermark: Publish lại khi queue còn <= N messages
+            max_throttle: Thời gian dừng tối đa mỗi lần (giây)
+        """
+        if backend not in ("rabbitmq", "memory"):
+            raise ValueError("Broker backend không hợp lệ: %s" % backend)
+
         self.host = host
         self.port = port
         self.username = username
@@ -26,12 +81,54 @@ class RabbitMQClient:
         self.virtual_host = virtual_host
         self.heartbeat = heartbeat
         self.blocked_connection_timeout = blocked_connection_timeout
+        self.codec = get_codec(codec)
+        self.compressor = BodyCompressor(compression, compress_min_bytes)
+        self.flow = FlowControl(high_watermark, low_watermark, max_pause=max_throttle)
+        self.backend = backend
+        self.memory_dir = memory_dir
         self.connection: Optional[pika.BlockingConnection] = None
         self.channel: Optional[pika.channel.Channel] = None
+        
+        # Queue / exchange / binding đã khai báo trên connection hiện tại
+        self._declared: Set[Tuple] = set()
+        
+        # Channel riêng cho publisher confirms (dùng bởi publish_batch, xem confirms.py)
+        self._confirms = None
+        self._confirm_seq = 0
+        self._unconfirmed: "OrderedDict[int, int]" = OrderedDict()
+        self._nacked: List[int] = []
+    
+    def client_kwargs(self) -> Dict:
+        """Tham số khởi tạo client tương đương (VD: để worker process mở connection riêng)."""
+        return {
+            "host": self.host,
+            "port": self.port,
+            "username": self.username,
+            "password": self.password,
+            "virtual_host": self.virtual_host,
+            "heartbeat": self.heartbeat,
+            "blocked_connection_timeout": self.blocked_connection_timeout,
+            "codec": self.codec.content_type,
+            "compression": self.compressor.encoding,
+            "compress_min_bytes": self.compressor.min_bytes,
+            "backend": self.backend,
+            "memory_dir": self.memory_dir,
+            "high_watermark": self.flow.high_watermark,
+            "low_watermark": self.flow.low_watermark,
+            "max_throttle": self.flow.max_pause,
+        }
     
     @retry(times=3, delay_sec=2, label="rabbitmq_connect")
     def connect(self):
-        """Kết nối tới RabbitMQ."""
+        """Kết nối tới RabbitMQ (hoặc broker in-memory khi backend="memory")."""
+        self._declared = set()
+        if self.backend == "memory":
+            self.connection = get_memory_broker(self.memory_dir).connection()
+            self.channel = self.connection.channel()
+            self._watch_blocked()
+            logger.info("Kết nối broker in-memory thành công (persist: %s)", self.memory_dir or "không")
+            return
+
         credentials = pika.PlainCredentials(self.username, self.password)
         parameters = pika.ConnectionParameters(
             host=self.host,
@@ -44,38 +141,98 @@ class RabbitMQClient:
         
         self.connection = pika.BlockingConnection(parameters)
         self.channel = self.connection.channel()
+        self._watch_blocked()
         logger.info("Kết nối RabbitMQ thành công: %s:%s", self.host, self.port)
     
-    def declare_queue(self, queue_name: str, durable: bool = True):
-        """Khai báo queue."""
+    def _watch_blocked(self):
+        """Theo dõi connection.blocked / unblocked để producer tự dừng."""
+        self.flow.blocked = False
+        self.connection.add_on_connection_blocked_callback(self.flow.on_blocked)
+        self.connection.add_on_connection_unblocked_callback(self.flow.on_unblocked)
+    
+    def _throttle(self, queue_name: str):
+        """Backpressure: dừng publish nếu queue quá high watermark hoặc broker chặn."""
+        self.flow.throttle(
+            queue_name,
+            lambda: self.get_message_count(queue_name),
+            lambda seconds: self.connection.process_data_events(time_limit=seconds)
+        )
+    
+    def declare_queue(self, queue_name: str, durable: bool = True, arguments: Optional[Dict] = None):
+        """
+        Khai báo queue (chỉ gửi lên broker lần đầu trên mỗi connection).
+        
+        Args:
+            arguments: Tham số queue (x-message-ttl, x-dead-letter-exchange, ...)
+        """
         if not self.channel:
             raise RuntimeError("Chưa kết nối RabbitMQ")
         
-        self.channel.queue_declare(queue=queue_name, durable=durable)
+        if ("queue", queue_name) in self._declared:
+            return
+        
+        self.channel.queue_declare(queue=queue_name, durable=durable, arguments=arguments)
+        self._declared.add(("queue", queue_name))
         logger.info("Đã khai báo queue: %s", queue_name)
     
+    def declare_exchange(self, exchange: str, exchange_type: str = "topic", durable: bool = True):
+        """Khai báo exchange (chỉ gửi lên broker lần đầu trên mỗi connection)."""
+        if not self.channel:
+            raise RuntimeError("Chưa kết nối RabbitMQ")
+        
+        if ("exchange", exchange) in self._declared:
+            return
+        
+        self.channel.exchange_declare(exchange=exchange, exchange_type=exchange_type, durable=durable)
+        self._declared.add(("exchange", exchange))
+        logger.info("Đã khai báo exchange: %s (%s)", exchange, exchange_type)
+    
+    def bind_queue(self, queue_name: str, exchange: str, routing_key: str):
+        """Bind queue vào exchange với binding key (chỉ gửi lần đầu trên mỗi connection)."""
+        if not self.channel:
+            raise RuntimeError("Chưa kết nối RabbitMQ")
+        
+        if ("binding", queue_name, exchange, routing_key) in self._declared:
+            return
+        
+        self.channel.queue_bind(queue=queue_name, exchange=exchange, routing_key=routing_key)
+        self._declared.add(("binding", queue_name, exchange, routing_key))
+        logger.info("Đã bind queue %s ← %s [%s]", queue_name, exchange, routing_key)
+    
     def publish(
         self,
         queue_name: str,
         message: Dict,
-        persistent: bool = True
+        persistent: bool = True,
+        exchange: str = "",
+        routing_key: Optional[str] = None
     ):
-        """Gửi message vào queue."""
+        """
+        Gửi message vào queue.
+        
+        Mặc định publish lên default exchange với routing key = queue_name;
+        khi có `exchange` thì publish với `routing_key` (queue_name vẫn là
+        queue đích, dùng cho backpressure). Message được gắn header trace
+        (trace id + thời điểm publish, xem tracing.py).
+        """
         if not self.channel:
             raise RuntimeError("Chưa kết nối RabbitMQ")
         
-        # Import custom encoder
-        from ..utils.json_encoder import json_dumps
-        body = json_dumps(message)
+        if self.flow.due():
+            self._throttle(queue_name)
+        
+        body, content_encoding = self.compressor.compress(self.codec.encode(message))
         
         properties = pika.BasicProperties(
             delivery_mode=2 if persistent else 1,  # 2 = persistent
-            content_type="application/json"
+            content_type=self.codec.content_type,
+            content_encoding=content_encoding,
+            headers=trace_headers()
         )
         
         self.channel.basic_publish(
-            exchange="",
-            routing_key=queue_name,
+            exchange=exchange,
+            routing_key=routing_key or queue_name,
             body=body,
             properties=properties
         )
@@ -83,17 +240,192 @@ class RabbitMQClient:
         # Log ở level DEBUG thay vì INFO để giảm noise
         # logger.debug("Đã gửi message vào queue %s", queue_name)
     
+    def publish_batch(
+        self,
+        queue_name: str,
+        messages: Iterable[Dict],
+        persistent: bool = True,
+        window: int = 100,
+        on_confirmed: Optional[Callable[[int], None]] = None,
+        exchange: str = "",
+        routing_key: Optional[str] = None,
+        route: Optional[Callable[[Dict], Tuple[str, str]]] = None
+    ) -> Dict:
+        """
+        Gửi nhiều message với publisher confirms.
+        
+        Giữ tối đa `window` message chưa được broker xác nhận; chỉ chờ
+        confirm khi cửa sổ đầy thay vì chờ từng message. Khi bật
+        backpressure (high_watermark), tạm dừng đọc `messages` lúc queue đầy.
+        Mỗi message được gắn header trace riêng (xem tracing.py).
+        
+        Args:
+            queue_name: Tên queue
+            messages: Iterable các message (có thể là generator)
+            persistent: Message persistent hay không
+            window: Số message tối đa chưa được confirm
+            on_confirmed: Gọi với n khi n message đầu tiên của `messages` đều
+                          đã được broker ack (dừng ở message nack đầu tiên),
+                          VD: để lưu checkpoint của producer
+            exchange: Exchange (mặc định: default exchange, routing key = queue_name)
+            routing_key: Routing key khi publish lên `exchange`
+            route: Tính (routing_key, queue_name) cho từng message (VD: theo
+                   partition); backpressure khi đó kiểm tra queue của message
+        
+        Returns:
+            Dict: {"published": n, "acked": n, "nacked": [], "throttled_seconds": s}
+        
+        Raises:
+            PublishNackedError: Broker nack ít nhất một message; e.result có
+                                "nacked": [index, ...] với index là vị trí của
+                                message trong `messages` (on_confirmed vẫn được
+                                gọi cho phần đầu đã confirm)
+        """
+        if not self.connection:
+            raise RuntimeError("Chưa kết nối RabbitMQ")
+        
+        if self._confirms is None or self._confirms.is_closed:
+            self._open_confirm_channel()
+        
+        confirms = self._confirms
+        window = max(1, window)
+        delivery_mode = 2 if persistent else 1
+        content_type = self.codec.content_type
+        encode = self.codec.encode
+        compress = self.compressor.compress
+        flow = self.flow
+        routing_key = routing_key or queue_name
+        
+        self._nacked = []
+        published = 0
+        throttled_before = flow.stats["throttled_seconds"]
+        reported = 0
+        
+        def report_confirmed():
+            nonlocal reported
+            # Các message trước message chưa confirm / bị nack đầu tiên
+            confirmed = next(iter(self._unconfirmed.values()), published)
+            if self._nacked:
+                confirmed = min(confirmed, min(self._nacked))
+            if confirmed > reported:
+                reported = confirmed
+                on_confirmed(confirmed)
+        
+        try:
+            for index, message in enumerate(messages):
+                if route:
+                    routing_key, target_queue = route(message)
+                else:
+                    target_queue = queue_name
+                
+                if flow.due():
+                    self._throttle(target_queue)
+                
+                if len(self._unconfirmed) >= window:
+                    confirms.wait(lambda: len(self._unconfirmed) < window)
+                    if on_confirmed:
+                        report_confirmed()
+                
+                body, content_encoding = compress(encode(message))
+                confirms.publish(
+                    exchange,
+                    routing_key,
+                    body,
+                    pika.BasicProperties(
+                        delivery_mode=delivery_mode,
+                        content_type=content_type,
+                        content_encoding=content_encoding,
+                        headers=trace_headers()
+                    )
+                )
+                self._confirm_seq += 1
+                self._unconfirmed[self._confirm_seq] = index
+                published += 1
+        finally:
+            # Chờ confirm cho phần còn lại của cửa sổ
+            if not confirms.is_closed:
+                confirms.wait(lambda: not self._unconfirmed)
+            if on_confirmed:
+                report_confirmed()
+        
+        nacked = sorted(self._nacked)
+        result = {
+            "published": published,
+            "acked": published - len(nacked),
+            "nacked": nacked,
+            "throttled_seconds": flow.stats["throttled_seconds"] - throttled_before
+        }
+        if nacked:
+            raise PublishNackedError(queue_name, result)
+        return result
+    
+    def publish_confirmed(
+        self,
+        routing_key: str,
+        body: bytes,
+        properties: pika.BasicProperties,
+        exchange: str = ""
+    ):
+        """
+        Publish một body đã encode (VD: chuyển message lỗi sang retry queue,
+        xem retry.py) trên channel confirm và chờ broker xác nhận.
+        
+        Raises:
+            PublishNackedError: Broker nack message
+        """
+        if not self.connection:
+            raise RuntimeError("Chưa kết nối RabbitMQ")
+        
+        if self._confirms is None or self._confirms.is_closed:
+            self._open_confirm_channel()
+        
+        self._nacked = []
+        self._confirms.publish(exchange, routing_key, body, properties)
+        self._confirm_seq += 1
+        self._unconfirmed[self._confirm_seq] = 0
+        self._confirms.wait(lambda: not self._unconfirmed)
+        
+        if self._nacked:
+            raise PublishNackedError(routing_key, {"published": 1, "acked": 0, "nacked": [0]})
+    
+    def _open_confirm_channel(self):
+        """Mở channel riêng ở chế độ confirm (không chặn từng message)."""
+        # BlockingChannel.confirm_delivery() chờ confirm sau mỗi basic_publish,
+        # nên dùng ConfirmPublisher (confirms.py) để pipeline cả cửa sổ.
+        self._confirms = confirm_publisher(self.connection.channel(), self._on_delivery_confirmation)
+        self._confirm_seq = 0
+        self._unconfirmed = OrderedDict()
+    
+    def _on_delivery_confirmation(self, method_frame):
+        """Xử lý Basic.Ack / Basic.Nack từ broker."""
+        method = method_frame.method
+        is_nack = isinstance(method, pika.spec.Basic.Nack)
+        
+        if method.multiple:
+            while self._unconfirmed:
+                tag = next(iter(self._unconfirmed))
+                if tag > method.delivery_tag:
+                    break
+                index = self._unconfirmed.pop(tag)
+                if is_nack:
+                    self._nacked.append(index)
+        else:
+            index = self._unconfirmed.pop(method.delivery_tag, None)
+            if is_nack and index is not None:
+                self._nacked.append(index)
+    
     def consume(
         self,
         queue_name: str,
         callback: Callable,
-        auto_ack: bool = False
+        auto_ack: bool = False,
+        prefetch_count: int = 1
     ):
         """Nhận message từ queue."""
         if not self.channel:
             raise RuntimeError("Chưa kết nối RabbitMQ")
         
-        self.channel.basic_qos(prefetch_count=1)
+        self.channel.basic_qos(prefetch_count=prefetch_count)
         self.channel.basic_consume(
             queue=queue_name,
             on_message_callback=callback,
@@ -103,15 +435,142 @@ class RabbitMQClient:
         logger.info("Bắt đầu consume từ queue: %s", queue_name)
         self.channel.start_consuming()
     
-    def ack_message(self, delivery_tag):
-        """Xác nhận đã xử lý message."""
+    def drain(
+        self,
+        queue_name: str,
+        callback: Callable,
+        idle_timeout: float = 1.0,
+        follow: bool = False,
+        prefetch_count: int = 1,
+        stop_event: Optional[threading.Event] = None,
+        on_tick: Optional[Callable[[], None]] = None
+    ) -> Dict:
+        """
+        Consume theo sự kiện cho tới khi queue cạn (hoặc chạy liên tục).
+        
+        Drain mode (follow=False): dừng khi không nhận message nào trong
+        `idle_timeout` giây VÀ broker báo queue rỗng. Không phụ thuộc vào
+        message_count chụp lúc đầu nên không treo khi có message bị nack
+        và không dừng sớm khi có message mới được publish.
+        
+        Follow mode (follow=True): chạy liên tục cho tới khi `stop_event`
+        được set hoặc Ctrl+C.
+        
+        Args:
+            queue_name: Tên queue
+            callback: Callback pika (ch, method, properties, body)
+            idle_timeout: Số giây không có message trước khi kiểm tra queue rỗng
+            follow: Chạy liên tục, không dừng khi queue rỗng
+            prefetch_count: Prefetch window
+            stop_event: Event để dừng từ bên ngoài (hoặc từ callback)
+            on_tick: Hàm gọi sau mỗi vòng xử lý events (VD: flush batch theo thời gian)
+        
+        Returns:
+            Dict: messages, elapsed, busy_seconds, idle_seconds, stop_reason
+            (idle_seconds = thời gian chờ message, busy_seconds = thời gian xử lý)
+        """
+        if not self.channel:
+            raise RuntimeError("Chưa kết nối RabbitMQ")
+        
+        stats = {"messages": 0, "busy_seconds": 0.0}
+        last_activity = time.monotonic()
+        
+        def on_message(ch, method, properties, body):
+            nonlocal last_activity
+            started = time.monotonic()
+            try:
+                callback(ch, method, properties, body)
+            finally:
+                last_activity = time.monotonic()
+                stats["busy_seconds"] += last_activity - started
+                stats["messages"] += 1
+        
+        self.channel.basic_qos(prefetch_count=prefetch_count)
+        consumer_tag = self.channel.basic_consume(
+            queue=queue_name,
+            on_message_callback=on_message,
+            auto_ack=False
+        )
+        
+        poll_interval = min(idle_timeout, 0.5) if idle_timeout > 0 else 0.5
+        started_at = time.monotonic()
+        stop_reason = "empty"
+        
+        try:
+            while True:
+                if stop_event is not None and stop_event.is_set():
+                    stop_reason = "stopped"
+                    break
+                
+                self.connection.process_data_events(time_limit=poll_interval)
+                
+                if on_tick:
+                    tick_started = time.monotonic()
+                    on_tick()
+                    stats["busy_seconds"] += time.monotonic() - tick_started
+                
+                if follow or time.monotonic() - last_activity < idle_timeout:
+                    continue
+                
+                # Đã idle đủ lâu → hỏi broker xem queue còn message không
+                if self.get_message_count(queue_name) == 0:
+                    break
+                last_activity = time.monotonic()
+        except KeyboardInterrupt:
+            stop_reason = "interrupted"
+        finally:
+            if not self.channel.is_closed:
+                self.channel.basic_cancel(consumer_tag)
+        
+        stats["elapsed"] = time.monotonic() - started_at
+        stats["idle_seconds"] = max(0.0, stats["elapsed"] - stats["busy_seconds"])
+        stats["stop_reason"] = stop_reason
+        
+        logger.info(
+            "Drain %s: %s messages trong %.2fs (busy %.2fs, idle %.2fs, %s)",
+            queue_name,
+            stats["messages"],
+            stats["elapsed"],
+            stats["busy_seconds"],
+            stats["idle_seconds"],
+            stop_reason
+        )
+        return stats
+    
+    def decode(self, body: bytes, properties=None) -> Dict:
+        """
+        Giải nén (theo content_encoding) rồi decode body message theo
+        content_type trong properties (không có content_type → JSON).
+        
+        Raises:
+            ValueError: Body không decode được (CodecError, JSONDecodeError, ...)
+        """
+        body = self.compressor.decompress(body, getattr(properties, "content_encoding", None))
+        return decode_body(body, getattr(properties, "content_type", None))
+    
+    def get_message_count(self, queue_name: str) -> int:
+        """Số message sẵn sàng trong queue (passive declare)."""
+        if not self.channel:
+            raise RuntimeError("Chưa kết nối RabbitMQ")
+        
+        method_frame = self.channel.queue_declare(
+            queue=queue_name, durable=True, passive=True
+        )
+        return method_frame.method.message_count
+    
+    def ack_message(self, delivery_tag, multiple: bool = False):
+        """Xác nhận đã xử lý message (multiple=True: tất cả tag <= delivery_tag)."""
         if self.channel:
-            self.channel.basic_ack(delivery_tag=delivery_tag)
+            self.channel.basic_ack(delivery_tag=delivery_tag, multiple=multiple)
     
-    def nack_message(self, delivery_tag, requeue: bool = True):
-        """Từ chối message."""
+    def nack_message(self, delivery_tag, requeue: bool = True, multiple: bool = False):
+        """Từ chối message (multiple=True: tất cả tag <= delivery_tag)."""
         if self.channel:
-            self.channel.basic_nack(delivery_tag=delivery_tag, requeue=requeue)
+            self.channel.basic_nack(
+                delivery_tag=delivery_tag,
+                multiple=multiple,
+                requeue=requeue
+            )
     
     def close(self):
         """Đóng kết nối."""
@@ -0,0 +1,199 @@
+# etl/broker/retry.py
+"""
+Retry có backoff cho consumer thay vì nack requeue=True.
+
+Nack requeue đưa message lỗi về ngay đầu queue: một message "độc" bị giao
+lại liên tục với tốc độ tối đa, chiếm CPU và chặn các message phía sau
+(prefetch=1). RetryPolicy chuyển message lỗi ra khỏi queue chính:
+
+    queue_khach_hang ──lỗi lần 1──► queue_khach_hang.retry.1 (TTL 1s)
+           ▲          ──lỗi lần 2──► queue_khach_hang.retry.2 (TTL 2s)
+           │                         ...
+           └──── hết TTL: dead-letter về queue chính ◄──┘
+                      ──lỗi lần max_attempts──► queue_khach_hang.parking
+
+- Mỗi lần thử một retry queue riêng với x-message-ttl cố định (delay tăng
+  theo cấp số nhân), hết TTL broker dead-letter message về queue chính qua
+  default exchange. TTL theo queue nên message không bị chặn sau message
+  có delay dài hơn.
+- Số lần thử nằm trong header x-attempt (lần giao đầu tiên = 1), lỗi gần
+  nhất trong x-last-error.
+- Quá max_attempts (hoặc lỗi không thể retry, VD: body không decode được)
+  message nằm ở parking queue để kiểm tra / publish lại bằng tay.
+
+Message được publish sang retry/parking queue và chờ broker confirm rồi mới
+ack bản gốc, nên nếu consumer chết giữa chừng hoặc broker nack bản retry,
+message bị giao lại chứ không mất.
+"""
+from typing import Dict, Tuple
+
+import pika
+from pika.exceptions import AMQPChannelError
+
+from .rabbitmq_client import PublishNackedError, RabbitMQClient
+from ..logger import logger
+
+ATTEMPT_HEADER = "x-attempt"
+ERROR_HEADER = "x-last-error"
+
+
+class RetryPolicy:
+    """Retry queue TTL theo cấp số nhân + parking queue cho từng queue entity."""
+
+    def __init__(self, max_attempts: int = 5, base_delay: float = 1.0, max_delay: float = 300.0):
+        """
+        Args:
+            max_attempts: Số lần xử lý tối đa (tính cả lần đầu) trước khi vào parking
+            base_delay: Delay (giây) trước lần thử thứ 2, gấp đôi sau mỗi lần
+            max_delay: Delay tối đa (giây)
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int) -> float:
+        """Delay (giây) sau lần thử thứ `attempt` bị lỗi."""
+        return min(self.base_delay * (2 ** (attempt - 1)), self.max_delay)
+
+    @staticmethod
+    def retry_queue(queue_name: str, attempt: int) -> str:
+        return f"{queue_name}.retry.{attempt}"
+
+    @staticmethod
+    def parking_queue(queue_name: str) -> str:
+        return f"{queue_name}.parking"
+
+    @staticmethod
+    def attempt(properties) -> int:
+        """Lần thử hiện tại của message (1 = lần giao đầu tiên)."""
+        headers = getattr(properties, "headers", None) or {}
+        try:
+            return max(1, int(headers.get(ATTEMPT_HEADER, 1)))
+        except (TypeError, ValueError):
+            return 1
+
+    def declare(self, client: RabbitMQClient, queue_name: str):
+        """Khai báo các retry queue (dead-letter về `queue_name`) và parking queue."""
+        for attempt in range(1, self.max_attempts):
+            client.declare_queue(
+                self.retry_queue(queue_name, attempt),
+                durable=True,
+                arguments=self._retry_arguments(queue_name, attempt),
+            )
+        client.declare_queue(self.parking_queue(queue_name), durable=True)
+
+    def _retry_arguments(self, queue_name: str, attempt: int) -> Dict:
+        return {
+            "x-message-ttl": int(self.delay(attempt) * 1000),
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": queue_name,
+        }
+
+    def route(self, queue_name: str, properties, error: Exception, retryable: bool = True) -> Tuple[str, Dict]:
+        """
+        Queue đích (retry kế tiếp hoặc parking) và thuộc tính message cho bản
+        chuyển đi của message lỗi (header x-attempt / x-last-error cập nhật).
+        """
+        attempt = self.attempt(properties)
+
+        parked = not retryable or attempt >= self.max_attempts
+        target = self.parking_queue(queue_name) if parked else self.retry_queue(queue_name, attempt)
+
+        headers = dict(getattr(properties, "headers", None) or {})
+        headers[ATTEMPT_HEADER] = attempt + 1
+        headers[ERROR_HEADER] = str(error)[:500]
+
+        return target, {
+            "delivery_mode": int(getattr(properties, "delivery_mode", None) or 2),
+            "content_type": getattr(properties, "content_type", None),
+            "content_encoding": getattr(properties, "content_encoding", None),
+            "headers": headers,
+        }
+
+    def forward(
+        self,
+        client: RabbitMQClient,
+        queue_name: str,
+        properties,
+        body: bytes,
+        error: Exception,
+        retryable: bool = True
+    ) -> str:
+        """
+        Publish `body` sang retry queue kế tiếp (hoặc parking) và chờ broker
+        confirm, không ack message gốc (VD: chỉ các row lỗi của một message).
+
+        Returns:
+            Tên queue message được chuyển tới
+
+        Raises:
+            PublishNackedError / AMQPChannelError: broker không nhận bản chuyển đi
+        """
+        target, message_properties = self.route(queue_name, properties, error, retryable)
+        client.publish_confirmed(target, body, pika.BasicProperties(**message_properties))
+        self._log(queue_name, properties, target, error)
+        return target
+
+    def reject(
+        self,
+        client: RabbitMQClient,
+        queue_name: str,
+        delivery_tag: int,
+        properties,
+        body: bytes,
+        error: Exception,
+        retryable: bool = True
+    ) -> str:
+        """
+        Chuyển message lỗi sang retry queue kế tiếp (hoặc parking), chờ broker
+        confirm rồi ack bản gốc.
+
+        Args:
+            retryable: False = vào parking ngay (lỗi không thể tự hết)
+
+        Returns:
+            Tên queue message được chuyển tới; `queue_name` nếu broker không
+            nhận bản retry và bản gốc được nack requeue
+        """
+        try:
+            target = self.forward(client, queue_name, properties, body, error, retryable)
+        except (PublishNackedError, AMQPChannelError) as e:
+            # Không chắc bản retry đã vào queue: giữ bản gốc thay vì ack
+            logger.error("[Retry] Không chuyển được message của %s, requeue: %s", queue_name, e)
+            client.nack_message(delivery_tag, requeue=True)
+            return queue_name
+        client.ack_message(delivery_tag)
+        return target
+
+    # ----- asyncio (AsyncRabbitMQClient, message aio-pika) -----
+
+    async def declare_async(self, client, queue_name: str):
+        """declare() cho AsyncRabbitMQClient."""
+        for attempt in range(1, self.max_attempts):
+            await client.declare_queue(self.retry_queue(queue_name, attempt), arguments=self._retry_arguments(queue_name, attempt))
+        await client.declare_queue(self.parking_queue(queue_name))
+
+    async def reject_async(self, client, queue_name: str, message, error: Exception, retryable: bool = True) -> str:
+        """reject() cho AsyncRabbitMQClient: `message` là aio_pika IncomingMessage."""
+        target, message_properties = self.route(queue_name, message, error, retryable)
+        try:
+            await client.publish_confirmed(target, message.body, **message_properties)
+        except PublishNackedError as e:
+            logger.error("[Retry] Không chuyển được message của %s, requeue: %s", queue_name, e)
+            await client.nack_message(message, requeue=True)
+            return queue_name
+        self._log(queue_name, message, target, error)
+        await client.ack_message(message)
+        return target
+
+    def _log(self, queue_name: str, properties, target: str, error: Exception):
+        attempt = self.attempt(properties)
+        if target == self.parking_queue(queue_name):
+            logger.warning("[Retry] Message lần thử %s → %s: %s", attempt, target, error)
+        else:
+            logger.info(
+                "[Retry] Message lần thử %s lỗi, thử lại sau %.1fs (%s)",
+                attempt,
+                self.delay(attempt),
+                target
+            )
@@ -0,0 +1,155 @@
+# etl/broker/topology.py
+"""
+Topology broker: một topic exchange + queue cho từng entity, khai báo một lần.
+
+Producer publish lên exchange với routing key "<source>.<entity_type>"
+(VD: csv.khach_hang, sql.dat_hang). Queue entity queue_<entity_type> được
+bind với "*.<entity_type>" nên vẫn nhận message của mọi nguồn như khi
+publish thẳng vào queue; consumer muốn xử lý riêng một phần (VD: chỉ nguồn
+SQL cho fast path) khai báo queue riêng và bind với pattern hẹp hơn:
+
+    topology.subscribe(rabbitmq, "queue_sql_dat_hang", ["sql.dat_hang.#"])
+
+Queue chỉ nhận message được publish sau khi bind, nên queue subscribe cần
+được khai báo trước khi producer chạy.
+
+Các lần khai báo được RabbitMQClient cache theo connection, nên gọi
+ensure_entity trước mỗi file/table không tốn round-trip sau lần đầu.
+exchange="" (RABBITMQ_EXCHANGE rỗng) giữ cách cũ: default exchange,
+routing key = tên queue.
+
+Partition mode (partitions=N > 0): mỗi entity có N queue
+queue_<entity>.p0 ... p<N-1>, bind "*.<entity>.p<i>"; producer route từng
+row theo khóa (xem KeyPartitioner) với routing key "<source>.<entity>.p<i>"
+và mỗi consumer xử lý một partition queue (consumer_queues()).
+"""
+from functools import partial
+from typing import Dict, Iterable, List, Tuple
+
+from .framing import unpack_message
+from .partitioning import KeyPartitioner
+from .rabbitmq_client import RabbitMQClient
+from ..discovery.entity_types import ENTITY_TYPES
+from ..logger import logger
+
+
+class BrokerTopology:
+    """Exchange, queue entity và binding của pipeline."""
+
+    def __init__(
+        self,
+        exchange: str = "coffee_etl",
+        entity_types: Iterable[str] = ENTITY_TYPES,
+        partitions: int = 0
+    ):
+        """
+        Args:
+            exchange: Tên topic exchange ("" = default exchange, không bind)
+            entity_types: Các entity khai báo sẵn trong declare()
+            partitions: Số partition queue mỗi entity (0 = một queue mỗi entity)
+        """
+        self.exchange = exchange
+        self.entity_types = tuple(entity_types)
+        self.partitions = max(0, partitions)
+        self.partitioner = KeyPartitioner(self.partitions) if self.partitions else None
+
+    @staticmethod
+    def queue_name(entity_type: str) -> str:
+        return f"queue_{entity_type}"
+
+    @staticmethod
+    def partition_queue(entity_type: str, partition: int) -> str:
+        return f"queue_{entity_type}.p{partition}"
+
+    def entity_queues(self, entity_type: str) -> List[str]:
+        """Các queue chứa message của entity."""
+        if self.partitions:
+            return [self.partition_queue(entity_type, i) for i in range(self.partitions)]
+        return [self.queue_name(entity_type)]
+
+    def consumer_queues(self) -> List[Tuple[str, str]]:
+        """[(queue_name, entity_type)] cần consume, mỗi queue một consumer."""
+        return [
+            (queue_name, entity_type)
+            for entity_type in self.entity_types
+            for queue_name in self.entity_queues(entity_type)
+        ]
+
+    def routing_key(self, source: str, entity_type: str) -> str:
+        """Routing key khi publish message của `source` cho `entity_type`."""
+        if not self.exchange:
+            return self.queue_name(entity_type)
+        return f"{source}.{entity_type}"
+
+    def route(self, source: str, entity_type: str, message: Dict) -> Tuple[str, str]:
+        """(routing_key, queue_name) của một message một row trong partition mode."""
+        _, _, rows = unpack_message(message)
+        if len(rows) != 1:
+            raise ValueError("Partition mode cần mỗi message đúng một row (tắt framing)")
+
+        partition = self.partitioner.partition(rows[0])
+        queue_name = self.partition_queue(entity_type, partition)
+        if not self.exchange:
+            return queue_name, queue_name
+        return f"{source}.{entity_type}.p{partition}", queue_name
+
+    def publish_args(self, source: str, entity_type: str) -> Dict:
+        """Tham số exchange / routing_key (hoặc route theo partition) cho publish_batch."""
+        if self.partitions:
+            return {
+                "exchange": self.exchange,
+                "route": partial(self.route, source, entity_type),
+            }
+        return {
+            "exchange": self.exchange,
+            "routing_key": self.routing_key(source, entity_type),
+        }
+
+    def declare(self, client: RabbitMQClient):
+        """Khai báo exchange, queue entity và binding (một lần cho mỗi connection)."""
+        for entity_type in self.entity_types:
+            self.ensure_entity(client, entity_type)
+
+        if self.partitions:
+            logger.info(
+                "🔀 Topology: exchange %s, %s entities x %s partitions (theo %s)",
+                self.exchange or "(default)",
+                len(self.entity_types),
+                self.partitions,
+                "/".join(self.partitioner.key_fields)
+            )
+        elif self.exchange:
+            logger.info(
+                "🔀 Topology: exchange %s (topic), %s queues bind *.<entity>",
+                self.exchange,
+                len(self.entity_types)
+            )
+
+    def ensure_entity(self, client: RabbitMQClient, entity_type: str) -> str:
+        """Đảm bảo các queue của entity đã được khai báo và bind, trả về tên queue entity."""
+        if self.exchange:
+            client.declare_exchange(self.exchange, "topic")
+
+        for index, queue_name in enumerate(self.entity_queues(entity_type)):
+            client.declare_queue(queue_name, durable=True)
+            if self.exchange:
+                binding_key = f"*.{entity_type}.p{index}" if self.partitions else f"*.{entity_type}"
+                client.bind_queue(queue_name, self.exchange, binding_key)
+        return self.queue_name(entity_type)
+
+    def subscribe(self, client: RabbitMQClient, queue_name: str, binding_keys: Iterable[str]) -> str:
+        """
+        Khai báo queue riêng của consumer nhận một phần message.
+
+        Args:
+            binding_keys: Binding key topic, VD: ["sql.#"], ["csv.khach_hang"]
+                          (* = một từ, # = không hoặc nhiều từ)
+        """
+        if not self.exchange:
+            raise ValueError("Subscribe cần topic exchange (RABBITMQ_EXCHANGE đang rỗng)")
+
+        client.declare_exchange(self.exchange, "topic")
+        client.declare_queue(queue_name, durable=True)
+        for binding_key in binding_keys:
+            client.bind_queue(queue_name, self.exchange, binding_key)
+        return queue_name
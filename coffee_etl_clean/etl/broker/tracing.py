@@ -0,0 +1,95 @@
+# etl/broker/tracing.py
+"""
+Header trace của message để đo độ trễ end-to-end.
+
+Producer gắn vào mỗi message (framed message = một batch rows) một trace id
+và thời điểm publish; consumer đọc lại để tính thời gian message nằm trong
+broker (dwell) và thời gian từ lúc publish tới khi commit vào staging.
+
+Producer và consumer thường là hai process (STEP1 → STEP2 / main), nên thời
+điểm publish là wall clock (epoch, micro giây) chứ không phải time.monotonic()
+- monotonic chỉ so sánh được trong cùng một process. Khi producer và consumer
+chạy trên hai máy, độ lệch đồng hồ giữa hai máy cộng thẳng vào dwell.
+"""
+import time
+import uuid
+from typing import Dict, Optional
+
+TRACE_ID_HEADER = "x-trace-id"
+PUBLISHED_AT_HEADER = "x-published-at"
+
+
+def trace_headers() -> Dict:
+    """Header trace cho một message mới publish."""
+    return {
+        TRACE_ID_HEADER: uuid.uuid4().hex,
+        PUBLISHED_AT_HEADER: time.time_ns() // 1000,
+    }
+
+
+def trace_id(properties) -> Optional[str]:
+    """Trace id của message (None nếu message không có header trace)."""
+    headers = getattr(properties, "headers", None) or {}
+    value = headers.get(TRACE_ID_HEADER)
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", "replace")
+    return value
+
+
+def published_at(properties) -> Optional[float]:
+    """Thời điểm publish (epoch, giây) của message, None nếu không có."""
+    headers = getattr(properties, "headers", None) or {}
+    try:
+        return int(headers[PUBLISHED_AT_HEADER]) / 1_000_000
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def age_seconds(properties, now: Optional[float] = None) -> Optional[float]:
+    """Số giây từ lúc message được publish tới `now` (mặc định: hiện tại)."""
+    started = published_at(properties)
+    if started is None:
+        return None
+    return max(0.0, (time.time() if now is None else now) - started)
+
+
+class TraceBatch:
+    """
+    Message đã nhận nhưng rows chưa commit của một consumer.
+
+    received() ghi dwell ngay khi nhận message; committed() ghi end-to-end
+    cho các message đang giữ sau khi rows của chúng đã vào staging,
+    discard() bỏ chúng khi batch lỗi (message sẽ được giao lại).
+    """
+
+    def __init__(self, latency, entity_type: str):
+        """
+        Args:
+            latency: LatencyRecorder nhận số đo
+            entity_type: Entity của queue đang consume
+        """
+        self.latency = latency
+        self.entity_type = entity_type
+        self._pending = []
+
+    def received(self, properties):
+        """Ghi dwell của message (pika properties hoặc message aio-pika, đều có .headers)."""
+        started = published_at(properties)
+        if started is None:
+            return
+        message_trace_id = trace_id(properties)
+        self.latency.record(
+            self.entity_type, "dwell", max(0.0, time.time() - started), trace_id=message_trace_id
+        )
+        self._pending.append((started, message_trace_id))
+
+    def committed(self):
+        now = time.time()
+        for started, message_trace_id in self._pending:
+            self.latency.record(
+                self.entity_type, "end_to_end", max(0.0, now - started), trace_id=message_trace_id
+            )
+        self._pending = []
+
+    def discard(self):
+        self._pending = []
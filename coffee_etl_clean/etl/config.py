@@ -21,6 +21,79 @@ class Settings:
     RABBITMQ_MANAGEMENT_PORT = int(os.getenv("RABBITMQ_MANAGEMENT_PORT", "15672"))
     RABBITMQ_USER = os.getenv("RABBITMQ_USER", "guest")
     RABBITMQ_PASSWORD = os.getenv("RABBITMQ_PASSWORD", "guest")
+    # Heartbeat (giây) của connection; pool kiểm tra heartbeat trước khi dùng lại connection
+    RABBITMQ_HEARTBEAT = int(os.getenv("RABBITMQ_HEARTBEAT", "600"))
+    # Số message tối đa chưa được confirm khi publish_batch
+    RABBITMQ_PUBLISH_WINDOW = int(os.getenv("RABBITMQ_PUBLISH_WINDOW", "100"))
+    # Topic exchange producer publish lên (routing key <source>.<entity>, VD: csv.khach_hang);
+    # rỗng = publish thẳng vào queue qua default exchange
+    RABBITMQ_EXCHANGE = os.getenv("RABBITMQ_EXCHANGE", "coffee_etl")
+    # Chia mỗi entity thành N partition queue theo khóa row (id) để N consumer kiểm tra
+    # trùng song song mà vẫn đúng (0 = một queue mỗi entity); cần mỗi message một row
+    BROKER_PARTITIONS = int(os.getenv("BROKER_PARTITIONS", "0"))
+    
+    # Broker: "rabbitmq" hoặc "memory" (in-process, chạy offline không cần RabbitMQ);
+    # broker memory lưu queue vào BROKER_MEMORY_DIR để STEP1 → STEP2 chạy ở các process khác nhau
+    BROKER_BACKEND = os.getenv("BROKER_BACKEND", "rabbitmq").lower()
+    BROKER_MEMORY_DIR = os.getenv("BROKER_MEMORY_DIR", "staging/broker")
+    
+    # Backpressure producer: dừng publish khi queue có >= PRODUCER_HIGH_WATERMARK messages
+    # (0 = tắt), publish lại khi còn <= PRODUCER_LOW_WATERMARK (mặc định một nửa high);
+    # mỗi lần dừng tối đa PRODUCER_MAX_THROTTLE giây
+    PRODUCER_HIGH_WATERMARK = int(os.getenv("PRODUCER_HIGH_WATERMARK", "0"))
+    PRODUCER_LOW_WATERMARK = int(os.getenv("PRODUCER_LOW_WATERMARK", "0")) or None
+    PRODUCER_MAX_THROTTLE = float(os.getenv("PRODUCER_MAX_THROTTLE", "300"))
+    
+    # Producer CSV song song: số process (1 = tuần tự, 0 = số CPU); file lớn hơn
+    # PRODUCER_CHUNK_BYTES được chia thành nhiều đoạn cho các process
+    PRODUCER_WORKERS = int(os.getenv("PRODUCER_WORKERS", "1"))
+    PRODUCER_CHUNK_BYTES = int(os.getenv("PRODUCER_CHUNK_BYTES", str(8 * 1024 * 1024)))
+    
+    # Producer SQL: đọc table theo chunk SQL_FETCH_SIZE rows (fetchmany), đọc trước
+    # tối đa SQL_PREFETCH_CHUNKS chunk trong thread nền trong lúc publish
+    SQL_FETCH_SIZE = int(os.getenv("SQL_FETCH_SIZE", "1000"))
+    SQL_PREFETCH_CHUNKS = int(os.getenv("SQL_PREFETCH_CHUNKS", "2"))
+    
+    # Extract SQL song song: số connection đọc đồng thời (1 = tuần tự), table lớn trước;
+    # table có >= 2 * SQL_EXTRACT_SLICE_ROWS rows được chia thành nhiều slice theo khoảng khóa
+    SQL_EXTRACT_WORKERS = int(os.getenv("SQL_EXTRACT_WORKERS", "1"))
+    SQL_EXTRACT_SLICE_ROWS = int(os.getenv("SQL_EXTRACT_SLICE_ROWS", "250000"))
+    
+    # Extract incremental (STEP1): chỉ đọc rows có watermark lớn hơn lần extract trước -
+    # cột rowversion, cột datetime NOT NULL có tên trong SQL_WATERMARK_COLUMNS, hoặc khóa
+    # IDENTITY; watermark lưu ở SOURCE_WATERMARK_FILE, chạy với --full-refresh để đọc lại toàn bộ
+    SQL_INCREMENTAL = os.getenv("SQL_INCREMENTAL", "false").lower() == "true"
+    SQL_WATERMARK_COLUMNS = os.getenv("SQL_WATERMARK_COLUMNS", "updated_at,modified_at,last_modified,ngay_cap_nhat").split(",")
+    SOURCE_WATERMARK_FILE = os.getenv("SOURCE_WATERMARK_FILE", "staging/watermarks/source_db.json")
+    
+    # Checkpoint producer (STEP1): vị trí đã được broker confirm của từng file/table,
+    # chạy lại với --resume để tiếp tục run bị dừng giữa chừng
+    PRODUCER_CHECKPOINT_DIR = os.getenv("PRODUCER_CHECKPOINT_DIR", "staging/checkpoints")
+    
+    # Message framing: số rows / bytes tối đa mỗi message (1 = mỗi row một message)
+    MESSAGE_FRAME_ROWS = int(os.getenv("MESSAGE_FRAME_ROWS", "1"))
+    MESSAGE_FRAME_BYTES = int(os.getenv("MESSAGE_FRAME_BYTES", str(256 * 1024)))
+    
+    # Codec body message khi publish: "json" hoặc "rows-binary" (consumer tự nhận theo content_type)
+    MESSAGE_CODEC = os.getenv("MESSAGE_CODEC", "json")
+    
+    # Nén body message: "gzip", "deflate", "bzip2", "xz" hoặc rỗng (tắt);
+    # body nhỏ hơn MESSAGE_COMPRESS_MIN_BYTES không nén
+    MESSAGE_COMPRESSION = os.getenv("MESSAGE_COMPRESSION", "")
+    MESSAGE_COMPRESS_MIN_BYTES = int(os.getenv("MESSAGE_COMPRESS_MIN_BYTES", "1024"))
+    
+    # Consumer micro-batch: số messages mỗi batch (0 = ack từng message như cũ)
+    CONSUMER_BATCH_SIZE = int(os.getenv("CONSUMER_BATCH_SIZE", "0"))
+    CONSUMER_PREFETCH_COUNT = int(os.getenv("CONSUMER_PREFETCH_COUNT", "1"))
+    CONSUMER_BATCH_MAX_WAIT = float(os.getenv("CONSUMER_BATCH_MAX_WAIT", "1.0"))
+    
+    # Số worker consume song song (1 = tuần tự, 0 = mỗi queue một worker)
+    CONSUMER_WORKERS = int(os.getenv("CONSUMER_WORKERS", "1"))
+    
+    # Consumer dừng khi queue rỗng và không có message trong N giây;
+    # CONSUMER_FOLLOW=true để chạy liên tục (Ctrl+C để dừng)
+    CONSUMER_IDLE_TIMEOUT = float(os.getenv("CONSUMER_IDLE_TIMEOUT", "1.0"))
+    CONSUMER_FOLLOW = os.getenv("CONSUMER_FOLLOW", "false").lower() == "true"
     
     # Source Database: ComVanPhong (Data Source 2 - nguồn nội bộ)
     SOURCE_DB_HOST = os.getenv("SOURCE_DB_HOST", "localhost")
@@ -35,6 +108,17 @@ class Settings:
     TARGET_DB_NAME = os.getenv("TARGET_DB_NAME", "newdata")
     TARGET_DB_TRUSTED_CONNECTION = os.getenv("TARGET_DB_TRUSTED_CONNECTION", "true").lower() == "true"
     TARGET_DB_DRIVER = os.getenv("TARGET_DB_DRIVER", "ODBC Driver 17 for SQL Server")
+    
+    # Pool kết nối SQL Server theo (server, database), dùng chung trong process: mở sẵn
+    # SQL_POOL_MIN_SIZE connection mỗi database, tối đa SQL_POOL_MAX_SIZE (nên >= số
+    # consumer worker + 1), pool đầy thì chờ tối đa SQL_POOL_TIMEOUT giây; connection rảnh
+    # quá SQL_POOL_HEALTH_CHECK giây được kiểm tra (SELECT 1) trước khi dùng lại, rảnh
+    # quá SQL_POOL_MAX_IDLE giây thì đóng
+    SQL_POOL_MIN_SIZE = int(os.getenv("SQL_POOL_MIN_SIZE", "0"))
+    SQL_POOL_MAX_SIZE = int(os.getenv("SQL_POOL_MAX_SIZE", "16"))
+    SQL_POOL_TIMEOUT = float(os.getenv("SQL_POOL_TIMEOUT", "60"))
+    SQL_POOL_HEALTH_CHECK = float(os.getenv("SQL_POOL_HEALTH_CHECK", "30"))
+    SQL_POOL_MAX_IDLE = float(os.getenv("SQL_POOL_MAX_IDLE", "300"))
 
 
 settings = Settings()
@@ -0,0 +1,181 @@
+# etl/db/column_types.py
+"""
+Kiểu tham số cho bulk insert, lấy một lần từ INFORMATION_SCHEMA.COLUMNS.
+
+Không có setinputsizes, pyodbc đoán kiểu SQL của từng tham số theo giá trị
+Python của row đầu tiên trong lô; cột lẫn None / str / float khiến driver
+phải prepare lại hoặc (fast_executemany) đoán sai kích thước buffer. Với
+kiểu lấy từ table đích:
+
+- setinputsizes nhận (sql_type, size, decimal_digits) cố định cho mỗi cột
+- giá trị được chuẩn hóa về đúng kiểu Python của cột (VD: "12" → 12 cho
+  INT, "2024-01-05" → date cho DATE, 12 → "12" cho NVARCHAR); giá trị không
+  đổi được giữ nguyên để SQL Server báo lỗi như khi insert thường
+"""
+import datetime as dt
+from decimal import Decimal, InvalidOperation
+from typing import Any, Callable, NamedTuple, Optional, Tuple
+
+import pyodbc
+
+COLUMNS_QUERY = """
+    SELECT COLUMN_NAME, DATA_TYPE, CHARACTER_MAXIMUM_LENGTH,
+           NUMERIC_PRECISION, NUMERIC_SCALE, DATETIME_PRECISION
+    FROM INFORMATION_SCHEMA.COLUMNS
+    WHERE TABLE_SCHEMA = ? AND TABLE_NAME = ?
+"""
+
+
+class ColumnType(NamedTuple):
+    """Kiểu của một cột: tham số setinputsizes + hàm chuẩn hóa giá trị."""
+    name: str
+    data_type: str
+    input_size: Optional[Tuple[int, int, int]]
+    normalize: Callable[[Any], Any]
+
+
+def _blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _to_str(value):
+    if value is None or isinstance(value, str):
+        return value
+    return str(value)
+
+
+def _to_int(value):
+    if _blank(value):
+        return None
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int):
+        return value
+    try:
+        if isinstance(value, str):
+            value = value.strip()
+            try:
+                return int(value)
+            except ValueError:
+                value = float(value)
+        if isinstance(value, (float, Decimal)) and value == int(value):
+            return int(value)
+    except (TypeError, ValueError, OverflowError):
+        pass
+    return value
+
+
+def _to_bit(value):
+    if _blank(value):
+        return None
+    if isinstance(value, str):
+        lowered = value.strip().lower()
+        if lowered in ("1", "true", "yes"):
+            return True
+        if lowered in ("0", "false", "no"):
+            return False
+        return value
+    return bool(value)
+
+
+def _to_float(value):
+    if _blank(value):
+        return None
+    if isinstance(value, float):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return value
+
+
+def _to_decimal(scale: int) -> Callable[[Any], Any]:
+    quantum = Decimal(1).scaleb(-scale)
+
+    def normalize(value):
+        if _blank(value):
+            return None
+        try:
+            number = value if isinstance(value, Decimal) else Decimal(str(value).strip())
+            return number.quantize(quantum)
+        except (InvalidOperation, ValueError):
+            return value
+
+    return normalize
+
+
+def _to_date(value):
+    if _blank(value):
+        return None
+    if isinstance(value, dt.datetime):
+        return value.date()
+    if isinstance(value, dt.date):
+        return value
+    if isinstance(value, str):
+        try:
+            return dt.date.fromisoformat(value.strip()[:10])
+        except ValueError:
+            pass
+    return value
+
+
+def _to_datetime(value):
+    if _blank(value):
+        return None
+    if isinstance(value, dt.datetime):
+        return value.replace(tzinfo=None) if value.tzinfo else value
+    if isinstance(value, dt.date):
+        return dt.datetime(value.year, value.month, value.day)
+    if isinstance(value, str):
+        try:
+            parsed = dt.datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+            return parsed.replace(tzinfo=None) if parsed.tzinfo else parsed
+        except ValueError:
+            pass
+    return value
+
+
+def column_type(
+    name: str,
+    data_type: str,
+    char_length: Optional[int] = None,
+    precision: Optional[int] = None,
+    scale: Optional[int] = None,
+    datetime_precision: Optional[int] = None
+) -> ColumnType:
+    """ColumnType từ một dòng INFORMATION_SCHEMA.COLUMNS (kiểu lạ: không setinputsizes)."""
+    data_type = data_type.lower()
+    # CHARACTER_MAXIMUM_LENGTH = -1 với (N)VARCHAR(MAX): size 0 = không giới hạn
+    length = char_length if char_length and char_length > 0 else 0
+
+    if data_type in ("nvarchar", "nchar", "ntext"):
+        return ColumnType(name, data_type, (pyodbc.SQL_WVARCHAR, length, 0), _to_str)
+    if data_type in ("varchar", "char", "text"):
+        return ColumnType(name, data_type, (pyodbc.SQL_VARCHAR, length, 0), _to_str)
+    if data_type == "int":
+        return ColumnType(name, data_type, (pyodbc.SQL_INTEGER, 0, 0), _to_int)
+    if data_type == "bigint":
+        return ColumnType(name, data_type, (pyodbc.SQL_BIGINT, 0, 0), _to_int)
+    if data_type == "smallint":
+        return ColumnType(name, data_type, (pyodbc.SQL_SMALLINT, 0, 0), _to_int)
+    if data_type == "tinyint":
+        return ColumnType(name, data_type, (pyodbc.SQL_TINYINT, 0, 0), _to_int)
+    if data_type == "bit":
+        return ColumnType(name, data_type, (pyodbc.SQL_BIT, 0, 0), _to_bit)
+    if data_type in ("decimal", "numeric", "money", "smallmoney"):
+        precision = precision or 18
+        scale = scale or 0
+        return ColumnType(name, data_type, (pyodbc.SQL_DECIMAL, precision, scale), _to_decimal(scale))
+    if data_type == "float":
+        return ColumnType(name, data_type, (pyodbc.SQL_DOUBLE, 0, 0), _to_float)
+    if data_type == "real":
+        return ColumnType(name, data_type, (pyodbc.SQL_REAL, 0, 0), _to_float)
+    if data_type == "date":
+        return ColumnType(name, data_type, (pyodbc.SQL_TYPE_DATE, 0, 0), _to_date)
+    if data_type in ("datetime", "datetime2", "smalldatetime"):
+        # DATETIME: độ chính xác 3 chữ số (23 ký tự); DATETIME2(n): 20 + n
+        digits = 3 if data_type == "datetime" else (datetime_precision or 0)
+        size = 23 if data_type == "datetime" else 20 + digits if digits else 19
+        return ColumnType(name, data_type, (pyodbc.SQL_TYPE_TIMESTAMP, size, digits), _to_datetime)
+
+    return ColumnType(name, data_type, None, lambda value: value)
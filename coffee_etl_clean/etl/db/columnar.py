@@ -0,0 +1,78 @@
+# etl/db/columnar.py
+"""
+Kết quả truy vấn dạng cột cho SQLServerClient.execute_columnar.
+
+Mỗi chunk fetchmany được chuyển vị bằng zip(*rows) (chạy trong C) rồi nối
+vào cột, không tạo dict hay object nào cho từng row:
+
+- cột int → array("q"), cột float → array("d") (liên tục trong bộ nhớ)
+- cột khác (str, Decimal, date, bytes, ...) → list
+
+Cột int/float có NULL (hoặc int vượt quá 64-bit) chuyển sang list từ
+chunk gặp giá trị đó, nên có thể chứa None.
+"""
+from array import array
+from typing import Dict, Iterator, List, Sequence, Union
+
+Column = Union[array, list]
+
+# Kiểu Python của cột (cursor.description[i][1]) → typecode array
+_ARRAY_TYPECODES = {int: "q", float: "d"}
+
+
+def new_column(type_code) -> Column:
+    typecode = _ARRAY_TYPECODES.get(type_code)
+    return array(typecode) if typecode else []
+
+
+def extend_column(column: Column, values: Sequence) -> Column:
+    """Nối values vào cột; array không nhận được giá trị thì chuyển cột sang list."""
+    if isinstance(column, array):
+        size = len(column)
+        try:
+            column.extend(values)
+            return column
+        except (TypeError, OverflowError):
+            # extend dừng giữa chừng: bỏ phần đã nối trước khi chuyển sang list
+            del column[size:]
+            column = column.tolist()
+    column.extend(values)
+    return column
+
+
+class ColumnarResult:
+    """
+    Kết quả truy vấn theo cột.
+
+    Ví dụ:
+
+    result = client.execute_columnar("SELECT id, email FROM dbo.khach_hang")
+    ids = result["id"]              # array("q")
+    emails = set(result["email"])   # list
+    """
+
+    def __init__(self, names: List[str], types: List[type], columns: List[Column]):
+        self.names = names
+        self.types = types
+        self.columns = columns
+        self._index = {name: i for i, name in enumerate(names)}
+
+    def __len__(self) -> int:
+        return len(self.columns[0]) if self.columns else 0
+
+    def __getitem__(self, name: str) -> Column:
+        return self.columns[self._index[name]]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._index
+
+    def to_dict(self) -> Dict[str, Column]:
+        """{tên cột: cột}."""
+        return dict(zip(self.names, self.columns))
+
+    def rows(self) -> Iterator[tuple]:
+        """Duyệt lại theo row (tuple), VD: để ghi file."""
+        return zip(*self.columns)
+
+    def __repr__(self) -> str:
+        return "ColumnarResult(%s rows, columns=%s)" % (len(self), self.names)
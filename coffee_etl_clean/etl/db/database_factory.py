@@ -1,12 +1,45 @@
 # etl/db/database_factory.py
+import threading
+from contextlib import contextmanager
+from typing import Any, ContextManager, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .columnar import ColumnarResult
+from .extract import ExtractSlice, ParallelExtractor, plan_extract
+from .keyset import KEY_INDEXES_QUERY, TABLE_SIZES_QUERY, TableChunk, boundaries_query, choose_key
+from .keyset import keyed_row_factory, keyset_predicate, normalize_key
+from .pool import shared_pool
 from .sql_client import SQLServerClient
+from .watermark import WATERMARK_COLUMNS_QUERY, IncrementalRange, Watermark, choose_watermark, dump_value
+from .watermark import high_watermark_query, load_value, rowversion_before
 from ..config import settings
 from ..logger import logger
+from ..utils.json_encoder import build_sql_row_converter
+from ..utils.watermark_store import WatermarkStore
 
 
 class DatabaseFactory:
     """Factory để tạo kết nối tới các database."""
     
+    @staticmethod
+    def source_params() -> Dict[str, Any]:
+        """Tham số SQLServerClient của Source Database (ComVanPhong)."""
+        return dict(
+            server=f"{settings.SOURCE_DB_HOST},{settings.SOURCE_DB_PORT}",
+            database=settings.SOURCE_DB_NAME,
+            driver=settings.SOURCE_DB_DRIVER,
+            trusted_connection=settings.SOURCE_DB_TRUSTED_CONNECTION
+        )
+    
+    @staticmethod
+    def target_params(database: Optional[str] = None) -> Dict[str, Any]:
+        """Tham số SQLServerClient của Target Database (mặc định TARGET_DB_NAME)."""
+        return dict(
+            server=f"{settings.TARGET_DB_HOST},{settings.TARGET_DB_PORT}",
+            database=database or settings.TARGET_DB_NAME,
+            driver=settings.TARGET_DB_DRIVER,
+            trusted_connection=settings.TARGET_DB_TRUSTED_CONNECTION
+        )
+    
     @staticmethod
     def create_source_db() -> SQLServerClient:
         """
@@ -15,12 +48,7 @@ class DatabaseFactory:
         """
         logger.info("Tạo kết nối tới Source DB: %s", settings.SOURCE_DB_NAME)
         
-        return SQLServerClient(
-            server=f"{settings.SOURCE_DB_HOST},{settings.SOURCE_DB_PORT}",
-            database=settings.SOURCE_DB_NAME,
-            driver=settings.SOURCE_DB_DRIVER,
-            trusted_connection=settings.SOURCE_DB_TRUSTED_CONNECTION
-        )
+        return SQLServerClient(**DatabaseFactory.source_params())
     
     @staticmethod
     def create_target_db() -> SQLServerClient:
@@ -30,12 +58,30 @@ class DatabaseFactory:
         """
         logger.info("Tạo kết nối tới Target DB: %s", settings.TARGET_DB_NAME)
         
-        return SQLServerClient(
-            server=f"{settings.TARGET_DB_HOST},{settings.TARGET_DB_PORT}",
-            database=settings.TARGET_DB_NAME,
-            driver=settings.TARGET_DB_DRIVER,
-            trusted_connection=settings.TARGET_DB_TRUSTED_CONNECTION
-        )
+        return SQLServerClient(**DatabaseFactory.target_params())
+    
+    @staticmethod
+    def source_db() -> ContextManager[SQLServerClient]:
+        """
+        Checkout kết nối Source DB từ pool dùng chung (đã connect, trả lại
+        pool khi ra khỏi with).
+        
+        Ví dụ:
+            with DatabaseFactory.source_db() as source_db:
+                tables = SourceDBReader(source_db).get_all_tables()
+        """
+        return shared_pool().client(**DatabaseFactory.source_params())
+    
+    @staticmethod
+    def target_db(database: Optional[str] = None) -> ContextManager[SQLServerClient]:
+        """
+        Checkout kết nối Target DB từ pool dùng chung.
+        
+        Args:
+            database: Database trên Target server (VD: "master", DB của run);
+                      mặc định TARGET_DB_NAME
+        """
+        return shared_pool().client(**DatabaseFactory.target_params(database))
 
 
 class SourceDBReader:
@@ -44,6 +90,12 @@ class SourceDBReader:
     def __init__(self, sql_client: SQLServerClient):
         self.sql_client = sql_client
     
+    @contextmanager
+    def pooled(self) -> Iterator["SourceDBReader"]:
+        """Reader trên connection riêng từ SQL pool, cùng server/database (cho worker thread)."""
+        with shared_pool().client(**self.sql_client.connection_params()) as sql_client:
+            yield SourceDBReader(sql_client)
+    
     def get_all_tables(self, schema: str = "dbo"):
         """
         Lấy danh sách tất cả tables trong database.
@@ -63,9 +115,7 @@ class SourceDBReader:
         """
         
         logger.info("Lấy danh sách tables từ schema: %s", schema)
-        results = self.sql_client.execute_query(query, (schema,))
-        
-        tables = [row["TABLE_NAME"] for row in results]
+        tables = list(self.sql_client.execute_columnar(query, (schema,))["TABLE_NAME"])
         logger.info("Tìm thấy %s tables: %s", len(tables), ", ".join(tables))
         
         return tables
@@ -104,6 +154,16 @@ class SourceDBReader:
             "row_count": row_count
         }
     
+    def get_key_columns(self, table_name: str, schema: str = "dbo") -> Optional[List[str]]:
+        """
+        Các cột khóa dùng cho phân trang keyset: khóa chính (có thể nhiều cột),
+        nếu không có thì unique index không có cột nullable; None nếu không có.
+        """
+        index_rows = self.sql_client.iter_query(
+            KEY_INDEXES_QUERY, (f"[{schema}].[{table_name}]",), row_shape="tuple"
+        )
+        return choose_key(list(index_rows))
+    
     def read_table(self, table_name: str, schema: str = "dbo", limit: int = None):
         """
         Đọc dữ liệu từ bất kỳ table nào.
@@ -123,18 +183,334 @@ class SourceDBReader:
         logger.info("Đọc dữ liệu từ %s.%s", schema, table_name)
         return self.sql_client.execute_query(query)
     
-    def read_all_tables(self, schema: str = "dbo", limit: int = None):
+    def get_table_sizes(self, schema: str = "dbo") -> Dict[str, int]:
+        """Số rows ước lượng của từng table (sys.partitions, không quét table)."""
+        return {
+            table: int(rows or 0)
+            for table, rows in self.sql_client.iter_query(TABLE_SIZES_QUERY, (schema,), row_shape="tuple")
+        }
+    
+    def get_key_boundaries(
+        self,
+        table_name: str,
+        key_columns: List[str],
+        slices: int,
+        schema: str = "dbo"
+    ) -> List[tuple]:
+        """
+        Ranh giới chia table thành `slices` khoảng khóa có số rows gần bằng
+        nhau (tối đa slices - 1 khóa, tăng dần); quét index khóa một lần.
+        """
+        query = boundaries_query(f"{schema}.{table_name}", key_columns, slices)
+        return list(self.sql_client.iter_query(query, row_shape="tuple"))
+    
+    def read_table_chunked(
+        self,
+        table_name: str,
+        schema: str = "dbo",
+        chunk_size: int = 10000,
+        after=None,
+        key_columns: List[str] = None,
+        json_compatible: bool = True,
+        until=None,
+        where: Optional[Tuple[str, Sequence]] = None
+    ) -> Iterator[TableChunk]:
+        """
+        Đọc table theo trang keyset (xem keyset.py): mỗi trang là một query
+        TOP (chunk_size) ... WHERE khóa > khóa cuối ORDER BY khóa, không giữ
+        một scan dài trên source trong suốt thời gian đọc.
+        
+        Args:
+            table_name: Tên table
+            schema: Schema name
+            chunk_size: Số rows mỗi trang
+            after: Chỉ đọc rows có khóa > after (last_key của chunk trước, hoặc
+                   giá trị đơn với khóa một cột) - tiếp tục sau khi restart
+            key_columns: Cột khóa (mặc định: get_key_columns)
+            json_compatible: Convert giá trị như stream_table
+            until: Chỉ đọc rows có khóa <= until (slice của table, xem extract.py)
+            where: Điều kiện thêm (sql, params), VD: IncrementalRange.where
+        
+        Yields:
+            TableChunk(rows, keys); table không có khóa thì đọc một lượt như
+            stream_table (keys = None, không tiếp tục được)
+        
+        Ví dụ:
+            for chunk in reader.read_table_chunked("dat_hang_tho", after=checkpoint):
+                load(chunk.rows)
+                checkpoint = chunk.last_key
+        """
+        key_columns = key_columns or self.get_key_columns(table_name, schema)
+        row_factory = build_sql_row_converter if json_compatible else None
+        
+        if not key_columns:
+            logger.warning("⚠️  %s.%s không có khóa chính / unique index, đọc một lượt", schema, table_name)
+            for rows in self.stream_table(
+                table_name, schema, chunk_size=chunk_size, json_compatible=json_compatible, where=where
+            ):
+                yield TableChunk(rows, None)
+            return
+        
+        order_by = ", ".join(f"[{column}]" for column in key_columns)
+        keyed = keyed_row_factory(key_columns, row_factory)
+        last_key = normalize_key(after)
+        until = normalize_key(until)
+        pages = 0
+        total = 0
+        
+        logger.info(
+            "Đọc dữ liệu (keyset %s, %s rows/trang) từ %s.%s",
+            order_by, chunk_size, schema, table_name
+        )
+        while True:
+            query = f"SELECT TOP ({int(chunk_size)}) * FROM {schema}.{table_name}"
+            predicates = [f"({where[0]})"] if where else []
+            params = list(where[1]) if where else []
+            for bound, op in ((last_key, ">"), (until, "<=")):
+                if bound is not None:
+                    predicate, bound_params = keyset_predicate(key_columns, bound, op)
+                    predicates.append(f"({predicate})")
+                    params.extend(bound_params)
+            if predicates:
+                query += " WHERE " + " AND ".join(predicates)
+            query += f" ORDER BY {order_by}"
+            
+            pairs = [
+                pair
+                for chunk in self.sql_client.stream_query(query, tuple(params), chunk_size=chunk_size, row_factory=keyed)
+                for pair in chunk
+            ]
+            if not pairs:
+                break
+            
+            keys = [key for key, _ in pairs]
+            pages += 1
+            total += len(pairs)
+            last_key = keys[-1]
+            yield TableChunk([row for _, row in pairs], keys)
+            
+            if len(pairs) < chunk_size:
+                break
+        
+        logger.info("✓ %s.%s: %s rows, %s trang keyset", schema, table_name, total, pages)
+    
+    def get_watermark(
+        self,
+        table_name: str,
+        schema: str = "dbo",
+        key_columns: List[str] = None
+    ) -> Optional[Watermark]:
+        """
+        Cột watermark cho extract incremental (xem watermark.py): rowversion,
+        cột updated_at (SQL_WATERMARK_COLUMNS) hoặc khóa IDENTITY; None nếu không có.
+        """
+        column_rows = self.sql_client.iter_query(
+            WATERMARK_COLUMNS_QUERY, (f"[{schema}].[{table_name}]",), row_shape="tuple"
+        )
+        key_columns = key_columns or self.get_key_columns(table_name, schema)
+        candidates = [column.strip() for column in settings.SQL_WATERMARK_COLUMNS if column.strip()]
+        return choose_watermark(list(column_rows), key_columns, candidates)
+    
+    def get_high_watermark(self, table_name: str, watermark: Watermark, schema: str = "dbo") -> Optional[tuple]:
+        """Giá trị watermark lớn nhất hiện tại (high), None nếu table rỗng."""
+        query = high_watermark_query(f"{schema}.{table_name}", watermark)
+        rows = list(self.sql_client.iter_query(query, row_shape="tuple"))
+        if not rows or rows[0][0] is None:
+            return None
+        if watermark.kind == "rowversion":
+            return (rowversion_before(bytes(rows[0][0])),)
+        return tuple(rows[0])
+    
+    def watermark_name(self, table_name: str, schema: str = "dbo") -> str:
+        """Tên table trong WatermarkStore (database.schema.table)."""
+        return f"{self.sql_client.database}.{schema}.{table_name}"
+    
+    def plan_incremental(
+        self,
+        table_name: str,
+        store: WatermarkStore,
+        schema: str = "dbo",
+        full_refresh: bool = False,
+        key_columns: List[str] = None
+    ) -> Optional[IncrementalRange]:
+        """
+        Khoảng watermark (low, high] cần đọc của table: low từ store (None khi
+        full_refresh, lần đầu hoặc cột watermark đã đổi), high chốt lúc gọi.
+        
+        Returns:
+            IncrementalRange, None nếu table không có cột watermark (đọc toàn bộ)
+        """
+        watermark = self.get_watermark(table_name, schema, key_columns)
+        if watermark is None:
+            logger.warning("⚠️  %s.%s không có cột watermark, đọc toàn bộ", schema, table_name)
+            return None
+        
+        low = None
+        entry = store.get(self.watermark_name(table_name, schema))
+        if entry and not full_refresh:
+            if entry["kind"] == watermark.kind and entry["columns"] == watermark.columns:
+                low = load_value(watermark.kind, entry["value"])
+            else:
+                logger.warning(
+                    "⚠️  %s.%s: cột watermark đổi từ %s sang %s, đọc toàn bộ",
+                    schema, table_name, ", ".join(entry["columns"]), ", ".join(watermark.columns)
+                )
+        
+        incremental = IncrementalRange(watermark, low, self.get_high_watermark(table_name, watermark, schema))
+        logger.info(
+            "   🔖 %s.%s: watermark %s (%s) %s → %s%s",
+            schema, table_name, ", ".join(watermark.columns), watermark.kind,
+            dump_value(watermark.kind, low), dump_value(watermark.kind, incremental.high),
+            " (full refresh)" if full_refresh else "",
+        )
+        return incremental
+    
+    def commit_watermark(
+        self,
+        table_name: str,
+        store: WatermarkStore,
+        incremental: IncrementalRange,
+        schema: str = "dbo",
+        rows: int = 0,
+        run_id: str = None
+    ):
+        """Lưu high của khoảng đã extract xong làm low của lần sau."""
+        if incremental.high is None:
+            return
+        watermark = incremental.watermark
+        store.commit(
+            self.watermark_name(table_name, schema),
+            watermark.kind,
+            watermark.columns,
+            dump_value(watermark.kind, incremental.high),
+            rows=rows,
+            run_id=run_id,
+        )
+    
+    def read_table_incremental(
+        self,
+        table_name: str,
+        store: WatermarkStore,
+        schema: str = "dbo",
+        chunk_size: int = 10000,
+        full_refresh: bool = False,
+        json_compatible: bool = True
+    ) -> Iterator[TableChunk]:
+        """
+        Như read_table_chunked nhưng chỉ đọc rows sau watermark của lần trước;
+        watermark mới được lưu khi iterator đã được đọc hết (không lưu nếu
+        dừng giữa chừng hoặc lỗi).
+        
+        Ví dụ:
+            store = WatermarkStore(settings.SOURCE_WATERMARK_FILE)
+            for chunk in reader.read_table_incremental("dat_hang_tho", store):
+                load(chunk.rows)
+        """
+        key_columns = self.get_key_columns(table_name, schema)
+        incremental = self.plan_incremental(table_name, store, schema, full_refresh, key_columns)
+        rows = 0
+        for chunk in self.read_table_chunked(
+            table_name,
+            schema=schema,
+            chunk_size=chunk_size,
+            key_columns=key_columns,
+            json_compatible=json_compatible,
+            where=incremental.where if incremental else None,
+        ):
+            rows += len(chunk.rows)
+            yield chunk
+        
+        if incremental:
+            self.commit_watermark(table_name, store, incremental, schema, rows)
+    
+    def iter_table(
+        self,
+        table_name: str,
+        schema: str = "dbo",
+        limit: int = None,
+        chunk_size: int = 1000,
+        row_shape: str = "dict"
+    ) -> Iterator[Any]:
+        """
+        Như read_table nhưng trả về iterator lazy từng row (fetchmany),
+        bộ nhớ không tăng theo kích thước table.
+        
+        Args:
+            row_shape: "dict", "tuple" hoặc "record" (xem SQLServerClient.iter_query)
+        """
+        top = f"TOP {int(limit)} " if limit else ""
+        query = f"SELECT {top}* FROM {schema}.{table_name}"
+        
+        logger.info("Đọc dữ liệu (lazy, %s) từ %s.%s", row_shape, schema, table_name)
+        return self.sql_client.iter_query(query, chunk_size=chunk_size, row_shape=row_shape)
+    
+    def read_columns(self, table_name: str, columns: List[str] = None, schema: str = "dbo") -> ColumnarResult:
+        """
+        Đọc table theo cột (execute_columnar) thay vì dict từng row,
+        VD: tập id để dedup, map mã → id cho lookup, aggregate.
+        
+        Args:
+            columns: Các cột cần đọc (mặc định: tất cả)
+        """
+        select = ", ".join(f"[{column}]" for column in columns) if columns else "*"
+        query = f"SELECT {select} FROM {schema}.{table_name}"
+        
+        logger.info("Đọc dữ liệu (columnar) từ %s.%s", schema, table_name)
+        return self.sql_client.execute_columnar(query)
+    
+    def stream_table(
+        self,
+        table_name: str,
+        schema: str = "dbo",
+        chunk_size: int = 1000,
+        json_compatible: bool = True,
+        where: Optional[Tuple[str, Sequence]] = None
+    ) -> Iterator[List[Dict]]:
+        """
+        Đọc table theo từng chunk (fetchmany) thay vì đọc hết vào bộ nhớ.
+        
+        Args:
+            table_name: Tên table
+            schema: Schema name
+            chunk_size: Số rows mỗi chunk
+            json_compatible: Convert giá trị như convert_sql_row_to_json_compatible
+                             (plan convert tính một lần từ cursor.description)
+            where: Điều kiện thêm (sql, params)
+        
+        Yields:
+            List of dict (tối đa chunk_size rows)
+        """
+        query = f"SELECT * FROM {schema}.{table_name}"
+        params = None
+        if where:
+            query += f" WHERE ({where[0]})"
+            params = tuple(where[1]) or None
+        
+        logger.info("Đọc dữ liệu (stream, %s rows/chunk) từ %s.%s", chunk_size, schema, table_name)
+        return self.sql_client.stream_query(
+            query,
+            params,
+            chunk_size=chunk_size,
+            row_factory=build_sql_row_converter if json_compatible else None
+        )
+    
+    def read_all_tables(self, schema: str = "dbo", limit: int = None, workers: int = None):
         """
         Đọc dữ liệu từ TẤT CẢ tables trong database.
         
         Args:
             schema: Schema name
             limit: Giới hạn số rows mỗi table
+            workers: Số connection đọc song song (mặc định SQL_EXTRACT_WORKERS,
+                     1 = tuần tự trên connection của reader)
         
         Returns:
             Dict: {table_name: [rows]}
         """
         tables = self.get_all_tables(schema)
+        workers = settings.SQL_EXTRACT_WORKERS if workers is None else workers
+        if workers > 1:
+            return self._read_all_tables_parallel(tables, schema, limit, workers)
         
         results = {}
         for table_name in tables:
@@ -148,6 +524,49 @@ class SourceDBReader:
         
         return results
     
+    def _read_all_tables_parallel(self, tables: List[str], schema: str, limit: int, workers: int):
+        """
+        read_all_tables song song (xem extract.py): table lớn trước, table lớn
+        chia slice theo khoảng khóa (không chia khi có limit).
+        """
+        slices = plan_extract(
+            self,
+            tables,
+            schema,
+            workers=workers,
+            slice_rows=0 if limit else settings.SQL_EXTRACT_SLICE_ROWS,
+        )
+        extractor = ParallelExtractor(
+            self.pooled,
+            workers=workers,
+            schema=schema,
+            chunk_size=settings.SQL_FETCH_SIZE,
+            limit=limit,
+            json_compatible=False,
+        )
+        parts = {}
+        parts_lock = threading.Lock()
+        
+        def collect(extract_slice: ExtractSlice, chunks: Iterator[TableChunk]) -> int:
+            rows = [row for chunk in chunks for row in chunk.rows]
+            with parts_lock:
+                parts[(extract_slice.table, extract_slice.index)] = rows
+            return len(rows)
+        
+        report = extractor.run(slices, collect)
+        
+        results = {table: [] for table in tables}
+        for table, index in sorted(parts):
+            results[table].extend(parts[(table, index)])
+        for table, table_report in report["tables"].items():
+            if table_report["errors"]:
+                logger.error("✗ Lỗi đọc table %s (%s slice lỗi)", table, table_report["errors"])
+                results[table] = []
+            else:
+                logger.info("✓ Đọc %s rows từ %s", len(results[table]), table)
+        
+        return results
+    
     # Giữ lại các method cũ để tương thích ngược
     def read_nguyen_lieu_tho(self, limit: int = None):
         """Đọc dữ liệu từ table nguyên_liệu_thô."""
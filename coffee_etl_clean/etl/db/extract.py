@@ -0,0 +1,271 @@
+# etl/db/extract.py
+"""
+Extract song song nhiều table từ Source DB.
+
+- plan_extract chia việc thành các ExtractSlice: mỗi table một slice, table
+  lớn (>= 2 * slice_rows rows ước lượng, có khóa) chia thành tối đa `workers`
+  slice theo khoảng khóa (after, until] có số rows gần bằng nhau; slice lớn
+  được xếp trước để table lớn nhất không bắt đầu muộn và kéo dài cả run
+- ParallelExtractor chạy các slice trên ThreadPoolExecutor, mỗi slice đọc
+  theo trang keyset trên một connection riêng từ SQL pool và được stream
+  thẳng vào handler (VD: publish vào queue) độc lập với các slice khác
+- Báo cáo thời gian theo table: wall-clock, thời gian đọc SQL, rows/s
+"""
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from .keyset import TableChunk, normalize_key
+from ..logger import logger
+
+
+class ExtractSlice(NamedTuple):
+    """Một phần việc extract: cả table hoặc khoảng khóa (after, until] của table."""
+    table: str
+    index: int
+    count: int
+    # Số rows ước lượng (sys.partitions / số slice)
+    rows: int
+    key_columns: Optional[List[str]] = None
+    after: Optional[tuple] = None
+    until: Optional[tuple] = None
+    # Điều kiện thêm (sql, params), VD: khoảng watermark khi extract incremental
+    where: Optional[Tuple[str, Sequence]] = None
+
+    @property
+    def name(self) -> str:
+        """Tên slice (VD: "dat_hang_tho#2/4"), là tên table nếu không chia."""
+        return self.table if self.count == 1 else f"{self.table}#{self.index + 1}/{self.count}"
+
+
+def table_slices(table: str, rows: int, key_columns: Optional[List[str]], boundaries: List) -> List[ExtractSlice]:
+    """Các slice (None, b1], (b1, b2], ..., (bn, None) từ ranh giới khóa b1 < ... < bn."""
+    bounds = [None] + [normalize_key(boundary) for boundary in boundaries] + [None]
+    count = len(bounds) - 1
+    return [
+        ExtractSlice(table, i, count, rows // count, key_columns, bounds[i], bounds[i + 1])
+        for i in range(count)
+    ]
+
+
+def plan_extract(
+    reader,
+    tables: List[str],
+    schema: str = "dbo",
+    workers: int = 1,
+    slice_rows: int = 0,
+    boundaries: Optional[Dict[str, List]] = None
+) -> List[ExtractSlice]:
+    """
+    Chia tables thành các slice, slice lớn trước.
+
+    Args:
+        reader: SourceDBReader
+        workers: Số worker (số slice tối đa của một table)
+        slice_rows: Table có >= 2 * slice_rows rows được chia (0 = không chia)
+        boundaries: Ranh giới đã có theo table (VD: từ checkpoint khi resume),
+                    dùng lại thay vì tính lại
+    """
+    boundaries = boundaries or {}
+    sizes = reader.get_table_sizes(schema)
+    slices: List[ExtractSlice] = []
+
+    for table in tables:
+        rows = sizes.get(table, 0)
+        key_columns = reader.get_key_columns(table, schema)
+        table_boundaries = boundaries.get(table)
+
+        if table_boundaries is None:
+            table_boundaries = []
+            count = max(1, min(math.ceil(rows / slice_rows), workers)) if slice_rows and rows >= 2 * slice_rows else 1
+            if key_columns and count > 1:
+                try:
+                    table_boundaries = reader.get_key_boundaries(table, key_columns, count, schema)
+                except Exception as e:
+                    logger.warning("⚠️  Không chia được %s theo khóa, đọc một slice: %s", table, e)
+
+        slices.extend(table_slices(table, rows, key_columns, table_boundaries))
+
+    # sort ổn định: các slice của cùng table giữ thứ tự khóa
+    slices.sort(key=lambda extract_slice: extract_slice.rows, reverse=True)
+    logger.info(
+        "🔀 Extract plan: %s tables → %s slices (%s tables được chia)",
+        len(tables),
+        len(slices),
+        len({s.table for s in slices if s.count > 1}),
+    )
+    return slices
+
+
+class ParallelExtractor:
+    """
+    Chạy các ExtractSlice song song trên một số worker giới hạn.
+
+    Mỗi slice mở reader trên connection riêng (open_reader, VD:
+    SourceDBReader.pooled - pool giới hạn số connection tới source) và gọi
+    handle(slice, chunks) trong worker thread; handler tiêu thụ iterator
+    TableChunk theo kiểu stream (không cần đọc hết slice vào bộ nhớ).
+
+    Ví dụ:
+
+    extractor = ParallelExtractor(reader.pooled, workers=4)
+    report = extractor.run(plan_extract(reader, tables, workers=4, slice_rows=200000), publish_slice)
+    """
+
+    def __init__(
+        self,
+        open_reader: Callable[[], ContextManager[Any]],
+        workers: int = 4,
+        schema: str = "dbo",
+        chunk_size: int = 10000,
+        limit: Optional[int] = None,
+        json_compatible: bool = True
+    ):
+        """
+        Args:
+            open_reader: Trả về context manager cho một SourceDBReader trên connection riêng
+            workers: Số slice chạy đồng thời
+            chunk_size: Số rows mỗi trang keyset
+            limit: Số rows tối đa mỗi slice (dùng với slice không chia)
+            json_compatible: Convert giá trị như stream_table
+        """
+        self.open_reader = open_reader
+        self.workers = max(1, workers)
+        self.schema = schema
+        self.chunk_size = chunk_size
+        self.limit = limit
+        self.json_compatible = json_compatible
+
+    def run(self, slices: List[ExtractSlice], handle: Callable[[ExtractSlice, Iterator[TableChunk]], Any]) -> Dict:
+        """
+        Chạy tất cả slice (theo thứ tự trong list) và log báo cáo thời gian.
+
+        Returns:
+            Dict: {"wall": giây, "slices": [kết quả từng slice], "tables": {table: tổng hợp}}
+            Kết quả slice: slice, result (giá trị handler trả về), error, rows,
+            start, read (giây đọc SQL), seconds
+        """
+        started = time.perf_counter()
+        results = []
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="extract") as pool:
+            futures = [pool.submit(self._run_slice, extract_slice, handle, started) for extract_slice in slices]
+            for future in as_completed(futures):
+                results.append(future.result())
+
+        report = {
+            "wall": time.perf_counter() - started,
+            "slices": results,
+            "tables": self._tables_report(results),
+        }
+        self.log_report(report)
+        return report
+
+    def _run_slice(self, extract_slice: ExtractSlice, handle: Callable, started: float) -> Dict:
+        result = {
+            "slice": extract_slice,
+            "result": None,
+            "error": None,
+            "rows": 0,
+            # Giây từ lúc bắt đầu run tới khi slice được worker nhận
+            "start": time.perf_counter() - started,
+            "read": 0.0,
+        }
+        t0 = time.perf_counter()
+
+        try:
+            with self.open_reader() as reader:
+                result["result"] = handle(extract_slice, self._chunks(reader, extract_slice, result))
+        except Exception as e:
+            logger.error("   ✗ Extract %s lỗi: %s", extract_slice.name, e, exc_info=True)
+            result["error"] = e
+
+        result["seconds"] = time.perf_counter() - t0
+        return result
+
+    def _chunks(self, reader, extract_slice: ExtractSlice, result: Dict) -> Iterator[TableChunk]:
+        """Các trang của slice, đo thời gian đọc SQL và số rows (cắt theo limit)."""
+        chunk_size = min(self.chunk_size, self.limit) if self.limit else self.chunk_size
+        chunks = reader.read_table_chunked(
+            extract_slice.table,
+            schema=self.schema,
+            chunk_size=chunk_size,
+            after=extract_slice.after,
+            until=extract_slice.until,
+            key_columns=extract_slice.key_columns,
+            json_compatible=self.json_compatible,
+            where=extract_slice.where,
+        )
+        try:
+            while True:
+                t0 = time.perf_counter()
+                try:
+                    chunk = next(chunks)
+                except StopIteration:
+                    return
+                finally:
+                    result["read"] += time.perf_counter() - t0
+
+                if self.limit is not None and result["rows"] + len(chunk.rows) >= self.limit:
+                    keep = self.limit - result["rows"]
+                    result["rows"] += keep
+                    yield TableChunk(chunk.rows[:keep], chunk.keys[:keep] if chunk.keys else None)
+                    return
+
+                result["rows"] += len(chunk.rows)
+                yield chunk
+        finally:
+            chunks.close()
+
+    @staticmethod
+    def _tables_report(results: List[Dict]) -> Dict[str, Dict]:
+        tables: Dict[str, Dict] = {}
+        for result in results:
+            extract_slice = result["slice"]
+            table = tables.setdefault(extract_slice.table, {
+                "slices": 0,
+                "rows": 0,
+                "errors": 0,
+                "read": 0.0,
+                "seconds": 0.0,
+                "start": math.inf,
+                "end": 0.0,
+            })
+            table["slices"] += 1
+            table["rows"] += result["rows"]
+            table["errors"] += 1 if result["error"] else 0
+            table["read"] += result["read"]
+            table["seconds"] += result["seconds"]
+            table["start"] = min(table["start"], result["start"])
+            table["end"] = max(table["end"], result["start"] + result["seconds"])
+
+        for table in tables.values():
+            table["wall"] = table["end"] - table["start"]
+        return tables
+
+    def log_report(self, report: Dict):
+        """Log thời gian theo table, table chiếm nhiều wall-clock nhất trước."""
+        tables = report["tables"]
+        total = sum(table["seconds"] for table in tables.values())
+
+        logger.info(
+            "   ⏱️  Extract %s tables / %s slices / %s workers: wall-clock %.2fs (tổng tuần tự %.2fs)",
+            len(tables),
+            len(report["slices"]),
+            self.workers,
+            report["wall"],
+            total,
+        )
+        for name, table in sorted(tables.items(), key=lambda item: item[1]["wall"], reverse=True):
+            logger.info(
+                "      • %s: %s rows, %s slice, %.2fs (bắt đầu +%.2fs, đọc SQL %.2fs, %.0f rows/s)%s",
+                name,
+                table["rows"],
+                table["slices"],
+                table["wall"],
+                table["start"],
+                table["read"],
+                table["rows"] / table["wall"] if table["wall"] else 0.0,
+                " (%s slice lỗi)" % table["errors"] if table["errors"] else "",
+            )
@@ -0,0 +1,154 @@
+# etl/db/keyset.py
+"""
+Phân trang keyset cho SourceDBReader.read_table_chunked.
+
+Thay vì một SELECT * quét cả table (giữ lock và bộ nhớ suốt thời gian
+đọc), mỗi trang là một query ngắn seek theo khóa:
+
+    SELECT TOP (n) * FROM dbo.t WHERE <khóa > khóa cuối> ORDER BY <khóa>
+
+Table lớn có thể chia thành các slice theo khoảng khóa (after, until] để
+đọc song song (xem extract.py).
+
+Khóa là khóa chính, hoặc unique index không có cột nullable (NULL phá thứ
+tự keyset). Khóa nhiều cột (a, b) dùng predicate mở rộng, thêm a >= ? để
+SQL Server seek theo cột đầu thay vì quét với OR:
+
+    a >= ? AND ((a > ?) OR (a = ? AND b > ?))
+"""
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+# Các index dùng được làm khóa keyset: khóa chính trước, rồi unique index
+KEY_INDEXES_QUERY = """
+    SELECT i.name, i.is_primary_key, c.name, c.is_nullable
+    FROM sys.indexes i
+    JOIN sys.index_columns ic ON ic.object_id = i.object_id AND ic.index_id = i.index_id
+    JOIN sys.columns c ON c.object_id = ic.object_id AND c.column_id = ic.column_id
+    WHERE i.object_id = OBJECT_ID(?)
+    AND (i.is_primary_key = 1 OR i.is_unique = 1)
+    AND i.is_disabled = 0
+    AND i.has_filter = 0
+    AND ic.is_included_column = 0
+    ORDER BY i.is_primary_key DESC, i.index_id, ic.key_ordinal
+"""
+
+
+# Số rows ước lượng của các table (metadata, không quét table)
+TABLE_SIZES_QUERY = """
+    SELECT t.name, SUM(p.rows)
+    FROM sys.tables t
+    JOIN sys.schemas s ON s.schema_id = t.schema_id
+    JOIN sys.partitions p ON p.object_id = t.object_id AND p.index_id IN (0, 1)
+    WHERE s.name = ?
+    GROUP BY t.name
+"""
+
+
+def boundaries_query(table: str, key_columns: Sequence[str], slices: int) -> str:
+    """
+    Khóa lớn nhất của mỗi phần trong `slices` phần bằng nhau theo thứ tự khóa
+    (NTILE), trừ phần cuối: ranh giới để chia table thành các slice.
+    """
+    columns = ", ".join(f"[{column}]" for column in key_columns)
+    descending = ", ".join(f"[{column}] DESC" for column in key_columns)
+    return f"""
+        SELECT {columns} FROM (
+            SELECT {columns}, tile, ROW_NUMBER() OVER (PARTITION BY tile ORDER BY {descending}) AS rn
+            FROM (SELECT {columns}, NTILE({int(slices)}) OVER (ORDER BY {columns}) AS tile FROM {table}) tiles
+        ) bounds
+        WHERE rn = 1 AND tile < {int(slices)}
+        ORDER BY tile
+    """
+
+
+class TableChunk(NamedTuple):
+    """Một trang của read_table_chunked."""
+    rows: List[Any]
+    # Giá trị khóa (chưa convert) của từng row, None nếu table không có khóa
+    keys: Optional[List[tuple]]
+
+    @property
+    def last_key(self) -> Optional[tuple]:
+        """Khóa của row cuối: truyền lại làm after để đọc tiếp từ trang sau."""
+        return self.keys[-1] if self.keys else None
+
+
+def choose_key(index_rows: Sequence[tuple]) -> Optional[List[str]]:
+    """
+    Chọn khóa keyset từ kết quả KEY_INDEXES_QUERY: khóa chính, nếu không có
+    thì unique index ít cột nhất không có cột nullable.
+    """
+    indexes: Dict[str, List[tuple]] = {}
+    for index_name, is_primary_key, column, is_nullable in index_rows:
+        indexes.setdefault(index_name, []).append((bool(is_primary_key), column, bool(is_nullable)))
+
+    candidates = [
+        columns for columns in indexes.values()
+        if columns[0][0] or not any(is_nullable for _, _, is_nullable in columns)
+    ]
+    if not candidates:
+        return None
+
+    # Bằng nhau thì min lấy index đứng trước trong query
+    best = min(candidates, key=lambda columns: (not columns[0][0], len(columns)))
+    return [column for _, column, _ in best]
+
+
+def normalize_key(value) -> Optional[tuple]:
+    """Khóa dạng tuple (checkpoint cũ lưu giá trị đơn, JSON lưu list)."""
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return tuple(value)
+    return (value,)
+
+
+# op → (so sánh các cột trước cột cuối, so sánh cột đầu để seek)
+_KEYSET_OPS = {">": (">", ">="), "<=": ("<", "<=")}
+
+
+def keyset_predicate(key_columns: Sequence[str], bound: Sequence, op: str = ">") -> Tuple[str, list]:
+    """
+    Predicate "khóa > bound" (hoặc "khóa <= bound" với op="<=") theo thứ tự
+    ORDER BY key_columns, và params.
+
+    Ví dụ: (["a", "b"], (1, 5)) → ("[a] >= ? AND (([a] > ?) OR ([a] = ? AND [b] > ?))", [1, 1, 1, 5])
+    """
+    if len(bound) != len(key_columns):
+        raise ValueError(
+            "Khóa %s cần %s giá trị, nhận %s" % (", ".join(key_columns), len(key_columns), len(bound))
+        )
+    strict, leading = _KEYSET_OPS[op]
+
+    clauses = []
+    params = []
+    for position, column in enumerate(key_columns):
+        terms = [f"[{previous}] = ?" for previous in key_columns[:position]]
+        terms.append(f"[{column}] {op if position == len(key_columns) - 1 else strict} ?")
+        clauses.append("(" + " AND ".join(terms) + ")")
+        params.extend(bound[:position])
+        params.append(bound[position])
+
+    if len(key_columns) == 1:
+        return f"[{key_columns[0]}] {op} ?", params
+    return f"[{key_columns[0]}] {leading} ? AND (" + " OR ".join(clauses) + ")", [bound[0]] + params
+
+
+def keyed_row_factory(
+    key_columns: Sequence[str],
+    row_factory: Optional[Callable] = None
+) -> Callable:
+    """
+    Row factory cho stream_query trả về (khóa, row đã đổi): khóa lấy từ
+    giá trị thô trước khi row_factory convert (VD: datetime chưa thành str).
+    """
+    def factory(description):
+        columns = [column[0] for column in description]
+        positions = [columns.index(column) for column in key_columns]
+        if row_factory:
+            convert = row_factory(description)
+        else:
+            convert = lambda row: dict(zip(columns, row))
+        return lambda row: (tuple(row[i] for i in positions), convert(row))
+
+    return factory
@@ -0,0 +1,334 @@
+# etl/db/pool.py
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+import pyodbc
+
+from .sql_client import SQLServerClient
+from ..config import settings
+from ..logger import logger
+
+# Khóa pool: (server, database)
+PoolKey = Tuple[str, str]
+
+
+class _KeyPool:
+    """Connection của một (server, database): idle (LIFO) + số connection đang mở."""
+
+    def __init__(self, client_kwargs: Dict):
+        self.client_kwargs = client_kwargs
+        # (client, thời điểm trả về pool); phải = vừa dùng, trái = rảnh lâu nhất
+        self.idle: Deque[Tuple[SQLServerClient, float]] = deque()
+        self.size = 0
+
+
+class SQLServerPool:
+    """
+    Pool kết nối SQL Server theo (server, database), thread-safe.
+
+    pyodbc connection không dùng chung được giữa các thread, nên mỗi lần
+    checkout một worker nhận một SQLServerClient riêng và trả lại pool khi
+    ra khỏi context; connection vừa trả được cấp lại trước (còn "ấm", cache
+    kiểu cột của bulk_insert vẫn còn). Checkout lồng nhau trong cùng thread
+    (cùng server/database) dùng lại client đang giữ.
+
+    - min_size: số connection mở sẵn cho mỗi database ở lần checkout đầu
+    - max_size: số connection tối đa mỗi database; pool đầy thì chờ tối đa
+      timeout giây
+    - health_check_interval: connection rảnh lâu hơn được kiểm tra bằng
+      SELECT 1 trước khi cấp, chết thì connect lại
+    - max_idle: connection rảnh lâu hơn được đóng (giữ lại min_size)
+
+    Ví dụ:
+
+    pool = SQLServerPool(max_size=8)
+    with pool.client(server="localhost,1433", database="newdata", trusted_connection=True) as db:
+        db.bulk_insert("staging.mon_csv", rows)
+    pool.close_all()
+    """
+
+    def __init__(
+        self,
+        min_size: int = 0,
+        max_size: int = 8,
+        health_check_interval: float = 30.0,
+        max_idle: float = 300.0,
+        timeout: float = 60.0
+    ):
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.health_check_interval = health_check_interval
+        self.max_idle = max_idle
+        self.timeout = timeout
+
+        self._cond = threading.Condition()
+        self._pools: Dict[PoolKey, _KeyPool] = {}
+        self._checked_out: Dict[SQLServerClient, _KeyPool] = {}
+        self._local = threading.local()
+
+        self.stats = {
+            "connects": 0,
+            "connect_seconds": 0.0,
+            "reuses": 0,
+            "health_checks": 0,
+            "reconnects": 0,
+            "waits": 0,
+            "wait_seconds": 0.0,
+        }
+
+    @contextmanager
+    def client(self, server: str, database: str, **client_kwargs) -> Iterator[SQLServerClient]:
+        """
+        Checkout một SQLServerClient đã connect, trả lại pool khi ra khỏi context.
+
+        Args:
+            server: "host,port"
+            database: Tên database
+            client_kwargs: Tham số khác của SQLServerClient (driver, trusted_connection, ...)
+        """
+        key = (server, database)
+        held = self._held()
+
+        if key in held:
+            # Checkout lồng trong cùng thread: dùng lại client đang giữ
+            entry = held[key]
+            entry[1] += 1
+            try:
+                yield entry[0]
+            finally:
+                entry[1] -= 1
+            return
+
+        client = self.acquire(server, database, **client_kwargs)
+        held[key] = [client, 1]
+        failed = False
+        try:
+            yield client
+        except Exception:
+            failed = True
+            raise
+        finally:
+            del held[key]
+            self.release(client, failed=failed)
+
+    def acquire(self, server: str, database: str, **client_kwargs) -> SQLServerClient:
+        """Lấy một client còn sống (idle hoặc connect mới); phải trả lại bằng release()."""
+        key = (server, database)
+        deadline = time.monotonic() + self.timeout
+        wait_started = None
+        client = None
+        last_used = 0.0
+        warm = 0
+
+        with self._cond:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self._pools[key] = _KeyPool(dict(client_kwargs, server=server, database=database))
+                warm = self.min_size - 1
+
+            while True:
+                if pool.idle:
+                    client, last_used = pool.idle.pop()
+                    break
+                if pool.size < self.max_size:
+                    pool.size += 1
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(
+                        "SQL pool %s/%s: hết %s connection sau %.0fs chờ (tăng SQL_POOL_MAX_SIZE)"
+                        % (server, database, self.max_size, self.timeout)
+                    )
+                if wait_started is None:
+                    wait_started = time.perf_counter()
+                    self.stats["waits"] += 1
+                self._cond.wait(remaining)
+
+            if wait_started is not None:
+                self.stats["wait_seconds"] += time.perf_counter() - wait_started
+
+        if client is not None:
+            if self._healthy(client, last_used):
+                with self._cond:
+                    self.stats["reuses"] += 1
+                    self._checked_out[client] = pool
+                return client
+
+            logger.warning("Connection SQL Server %s/%s đã đóng, kết nối lại", server, database)
+            with self._cond:
+                self.stats["reconnects"] += 1
+            self._close(client)
+
+        try:
+            client = self._connect(pool)
+        except Exception:
+            with self._cond:
+                pool.size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self._checked_out[client] = pool
+
+        if warm > 0:
+            self._warm(pool, warm)
+        return client
+
+    def release(self, client: SQLServerClient, failed: bool = False):
+        """
+        Trả client về pool.
+
+        Args:
+            client: Client lấy từ acquire()
+            failed: Code dùng client bị lỗi → rollback transaction dở trước khi trả
+        """
+        healthy = client.connection is not None
+        try:
+            if healthy and failed:
+                client.connection.rollback()
+            if healthy and client.connection.autocommit:
+                client.connection.autocommit = False
+        except pyodbc.Error as e:
+            logger.warning("Connection SQL Server %s/%s lỗi khi trả về pool: %s", client.server, client.database, e)
+            healthy = False
+
+        expired: List[SQLServerClient] = []
+        with self._cond:
+            pool = self._checked_out.pop(client, None)
+            current = pool is not None and self._pools.get((client.server, client.database)) is pool
+
+            if healthy and current:
+                pool.idle.append((client, time.monotonic()))
+                expired = self._expire(pool)
+            else:
+                if current:
+                    pool.size -= 1
+                expired = [client]
+            self._cond.notify()
+
+        for stale in expired:
+            self._close(stale)
+
+    def _held(self) -> Dict[PoolKey, list]:
+        held = getattr(self._local, "held", None)
+        if held is None:
+            held = self._local.held = {}
+        return held
+
+    def _connect(self, pool: _KeyPool) -> SQLServerClient:
+        client = SQLServerClient(**pool.client_kwargs)
+        started = time.perf_counter()
+        client.connect()
+        elapsed = time.perf_counter() - started
+
+        with self._cond:
+            self.stats["connects"] += 1
+            self.stats["connect_seconds"] += elapsed
+        return client
+
+    def _warm(self, pool: _KeyPool, count: int):
+        """Mở sẵn tối đa count connection idle (lỗi thì bỏ qua, connect lại khi cần)."""
+        for _ in range(count):
+            with self._cond:
+                if pool.size >= self.max_size:
+                    return
+                pool.size += 1
+            try:
+                client = self._connect(pool)
+            except Exception as e:
+                logger.warning("⚠️  Không mở sẵn được connection SQL Server: %s", e)
+                with self._cond:
+                    pool.size -= 1
+                return
+            with self._cond:
+                pool.idle.appendleft((client, time.monotonic()))
+                self._cond.notify()
+
+    def _healthy(self, client: SQLServerClient, last_used: float) -> bool:
+        if client.connection is None:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+
+        with self._cond:
+            self.stats["health_checks"] += 1
+        try:
+            cursor = client.connection.cursor()
+            try:
+                cursor.execute("SELECT 1")
+                cursor.fetchone()
+            finally:
+                cursor.close()
+        except pyodbc.Error as e:
+            logger.warning("Health check SQL Server thất bại: %s", e)
+            return False
+
+        return True
+
+    def _expire(self, pool: _KeyPool) -> List[SQLServerClient]:
+        """Lấy ra các connection rảnh quá max_idle (giữ lại min_size); gọi khi giữ lock."""
+        expired = []
+        now = time.monotonic()
+        while pool.idle and pool.size > self.min_size and now - pool.idle[0][1] > self.max_idle:
+            client, _ = pool.idle.popleft()
+            pool.size -= 1
+            expired.append(client)
+        return expired
+
+    @staticmethod
+    def _close(client: SQLServerClient):
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning("Lỗi đóng connection SQL Server: %s", e)
+
+    def summary(self) -> str:
+        """Một dòng tóm tắt: số connection, thời gian connect, số lần dùng lại và chờ."""
+        stats = self.stats
+        avg = stats["connect_seconds"] / stats["connects"] if stats["connects"] else 0.0
+        return "%s connections (connect %.2fs, TB %.0f ms), dùng lại %s lần (~tiết kiệm %.2fs), kết nối lại %s, chờ %s lần (%.2fs)" % (
+            stats["connects"],
+            stats["connect_seconds"],
+            avg * 1000,
+            stats["reuses"],
+            stats["reuses"] * avg,
+            stats["reconnects"],
+            stats["waits"],
+            stats["wait_seconds"],
+        )
+
+    def close_all(self):
+        """Đóng các connection idle; connection đang checkout được đóng khi trả về."""
+        with self._cond:
+            pools, self._pools = self._pools, {}
+            self._cond.notify_all()
+
+        for pool in pools.values():
+            for client, _ in pool.idle:
+                self._close(client)
+
+        if self.stats["connects"]:
+            logger.info("🔌 SQL pool: %s", self.summary())
+
+
+_shared_pool: Optional[SQLServerPool] = None
+_shared_lock = threading.Lock()
+
+
+def shared_pool() -> SQLServerPool:
+    """Pool dùng chung trong process, cấu hình theo settings.SQL_POOL_*."""
+    global _shared_pool
+    with _shared_lock:
+        if _shared_pool is None:
+            _shared_pool = SQLServerPool(
+                min_size=settings.SQL_POOL_MIN_SIZE,
+                max_size=settings.SQL_POOL_MAX_SIZE,
+                health_check_interval=settings.SQL_POOL_HEALTH_CHECK,
+                max_idle=settings.SQL_POOL_MAX_IDLE,
+                timeout=settings.SQL_POOL_TIMEOUT,
+            )
+        return _shared_pool
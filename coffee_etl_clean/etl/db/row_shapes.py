@@ -0,0 +1,48 @@
+# etl/db/row_shapes.py
+"""
+Dạng row trả về bởi SQLServerClient.iter_query.
+
+- "dict": {cột: giá trị} - tiện nhất, tốn bộ nhớ nhất (một dict mỗi row)
+- "tuple": tuple giá trị theo thứ tự cột
+- "record": namedtuple theo tên cột (__slots__ rỗng, không có __dict__ nên
+  nhẹ như tuple), truy cập row.ten_cot hoặc row[i]; tên cột không phải
+  identifier hợp lệ được đổi thành _<vị trí> (namedtuple rename=True)
+
+Mỗi factory nhận cursor.description và trả về hàm đổi một pyodbc.Row,
+dùng làm row_factory của SQLServerClient.stream_query.
+"""
+from collections import namedtuple
+from typing import Any, Callable, Dict
+
+ROW_SHAPES = ("dict", "tuple", "record")
+
+
+def dict_row_factory(description) -> Callable[[Any], Dict]:
+    columns = [column[0] for column in description]
+    return lambda row: dict(zip(columns, row))
+
+
+def tuple_row_factory(description) -> Callable[[Any], tuple]:
+    return tuple
+
+
+def record_row_factory(description) -> Callable[[Any], tuple]:
+    record = namedtuple("Record", [column[0] for column in description], rename=True)
+    return record._make
+
+
+ROW_FACTORIES = {
+    "dict": dict_row_factory,
+    "tuple": tuple_row_factory,
+    "record": record_row_factory,
+}
+
+
+def get_row_factory(row_shape: str):
+    """Row factory theo tên dạng row ("dict", "tuple", "record")."""
+    try:
+        return ROW_FACTORIES[row_shape]
+    except KeyError:
+        raise ValueError(
+            "Row shape không hợp lệ: %s (hỗ trợ: %s)" % (row_shape, ", ".join(ROW_SHAPES))
+        ) from None
@@ -1,10 +1,19 @@
 # etl/db/sql_client.py
 import pyodbc
-from typing import List, Dict, Optional, Any
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence
+from .column_types import COLUMNS_QUERY, ColumnType, column_type
+from .columnar import ColumnarResult, extend_column, new_column
+from .row_shapes import get_row_factory
 from ..logger import logger
 from ..utils.retry import retry
 
 
+# SQLSTATE driver trả về khi không hỗ trợ fast_executemany / setinputsizes
+# (optional feature not implemented, driver không hỗ trợ hàm); lỗi khác raise bình thường
+_FAST_UNSUPPORTED_STATES = {"HYC00", "IM001"}
+
+
 class SQLServerClient:
     """Client để kết nối và tương tác với SQL Server."""
     
@@ -15,16 +24,29 @@ class SQLServerClient:
         username: Optional[str] = None,
         password: Optional[str] = None,
         driver: str = "ODBC Driver 17 for SQL Server",
-        trusted_connection: bool = False
+        trusted_connection: bool = False,
+        fast_executemany: bool = True
     ):
+        """
+        Args:
+            fast_executemany: bulk_insert gửi cả lô tham số trong một round-trip
+                              (fast_executemany + setinputsizes theo kiểu cột của
+                              table đích); tự tắt nếu driver không hỗ trợ
+        """
         self.server = server
         self.database = database
         self.username = username
         self.password = password
         self.driver = driver
         self.trusted_connection = trusted_connection
+        self.fast_executemany = fast_executemany
         self.connection: Optional[pyodbc.Connection] = None
-        self.cursor: Optional[pyodbc.Cursor] = None    
+        self.cursor: Optional[pyodbc.Cursor] = None
+        # Kiểu cột theo table đích (None = không đọc được INFORMATION_SCHEMA)
+        self._column_types: Dict[str, Optional[Dict[str, ColumnType]]] = {}
+        # Đang trong transaction(): bulk_insert(atomic=True) không tự commit
+        self._in_transaction = False
+    
     @retry(times=3, delay_sec=2, label="sql_connect")
     def connect(self):
         """Kết nối tới SQL Server."""
@@ -52,6 +74,18 @@ class SQLServerClient:
             self.database
         )
     
+    def connection_params(self) -> Dict[str, Any]:
+        """Tham số khởi tạo của client (VD: mở thêm connection tương tự từ SQL pool)."""
+        return dict(
+            server=self.server,
+            database=self.database,
+            username=self.username,
+            password=self.password,
+            driver=self.driver,
+            trusted_connection=self.trusted_connection,
+            fast_executemany=self.fast_executemany
+        )
+    
     def execute_query(self, query: str, params: Optional[tuple] = None) -> List[Dict]:
         """
         Thực thi SELECT query và trả về kết quả.
@@ -88,6 +122,143 @@ class SQLServerClient:
             logger.error("Lỗi execute query: %s", e)
             raise
     
+    def stream_query(
+        self,
+        query: str,
+        params: Optional[tuple] = None,
+        chunk_size: int = 1000,
+        row_factory: Optional[Callable[[tuple], Callable[[pyodbc.Row], Any]]] = None
+    ) -> Iterator[List[Any]]:
+        """
+        Thực thi SELECT query và trả về kết quả từng chunk (fetchmany),
+        không giữ toàn bộ kết quả trong bộ nhớ.
+        
+        Dùng cursor riêng nên có thể chạy song song với execute_query
+        (cùng connection, khác thread thì không).
+        
+        Args:
+            query: SQL query
+            params: Parameters cho query
+            chunk_size: Số rows mỗi lần fetchmany
+            row_factory: Nhận cursor.description, trả về hàm đổi một row;
+                         mặc định đổi thành dict
+        
+        Yields:
+            List rows đã đổi (tối đa chunk_size rows)
+        """
+        if not self.connection:
+            raise RuntimeError("Chưa kết nối SQL Server")
+        
+        cursor = self.connection.cursor()
+        total = 0
+        try:
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            
+            if row_factory:
+                convert = row_factory(cursor.description)
+            else:
+                columns = [column[0] for column in cursor.description]
+                convert = lambda row: dict(zip(columns, row))
+            
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                total += len(rows)
+                yield [convert(row) for row in rows]
+            
+            logger.info("Query (stream) thành công, trả về %s rows", total)
+        
+        except pyodbc.Error as e:
+            logger.error("Lỗi execute query (stream): %s", e)
+            raise
+        finally:
+            cursor.close()
+    
+    def iter_query(
+        self,
+        query: str,
+        params: Optional[tuple] = None,
+        chunk_size: int = 1000,
+        row_shape: str = "dict",
+        chunks: bool = False
+    ) -> Iterator[Any]:
+        """
+        Thực thi SELECT query và trả về iterator lazy (fetchmany từng chunk):
+        bộ nhớ giữ tối đa một chunk dù kết quả lớn bao nhiêu.
+        
+        Args:
+            query: SQL query
+            params: Parameters cho query
+            chunk_size: Số rows mỗi lần fetchmany
+            row_shape: "dict", "tuple" hoặc "record" (namedtuple, xem row_shapes.py)
+            chunks: True = yield từng list rows thay vì từng row
+        
+        Yields:
+            Row theo row_shape (hoặc list rows khi chunks=True)
+        
+        Ví dụ:
+            for row in client.iter_query("SELECT id, ten FROM dbo.mon", row_shape="record"):
+                print(row.id, row.ten)
+        """
+        row_factory = get_row_factory(row_shape)
+        stream = self.stream_query(query, params, chunk_size=chunk_size, row_factory=row_factory)
+        if chunks:
+            return stream
+        return _iter_rows(stream)
+    
+    def execute_columnar(
+        self,
+        query: str,
+        params: Optional[tuple] = None,
+        chunk_size: int = 10000
+    ) -> ColumnarResult:
+        """
+        Thực thi SELECT query và trả về kết quả theo cột (xem columnar.py):
+        array cho cột int/float, list cho các cột khác, kèm tên và kiểu cột.
+        
+        Không tạo dict cho từng row như execute_query, phù hợp khi cần
+        cả cột (dedup, lookup map, aggregate).
+        
+        Args:
+            query: SQL query
+            params: Parameters cho query
+            chunk_size: Số rows mỗi lần fetchmany
+        """
+        if not self.connection:
+            raise RuntimeError("Chưa kết nối SQL Server")
+        
+        cursor = self.connection.cursor()
+        try:
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            
+            names = [column[0] for column in cursor.description]
+            types = [column[1] for column in cursor.description]
+            columns = [new_column(type_code) for type_code in types]
+            
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                for index, values in enumerate(zip(*rows)):
+                    columns[index] = extend_column(columns[index], values)
+            
+            result = ColumnarResult(names, types, columns)
+            logger.info("Query (columnar) thành công, trả về %s rows", len(result))
+            return result
+        
+        except pyodbc.Error as e:
+            logger.error("Lỗi execute query (columnar): %s", e)
+            raise
+        finally:
+            cursor.close()
+    
     def execute_non_query(self, query: str, params: Optional[tuple] = None) -> int:
         """
         Thực thi INSERT/UPDATE/DELETE query.
@@ -115,11 +286,38 @@ class SQLServerClient:
             logger.error("Lỗi execute non-query: %s", e)
             raise
     
+    @contextmanager
+    def transaction(self) -> Iterator["SQLServerClient"]:
+        """
+        Gộp nhiều bulk_insert(atomic=True) vào một transaction: commit một lần
+        khi ra khỏi with, lỗi thì rollback tất cả (with lồng nhau dùng chung
+        transaction ngoài cùng).
+        
+        Ví dụ:
+            with target_db.transaction():
+                target_db.bulk_insert("staging.khach_hang_csv", csv_rows, atomic=True)
+                target_db.bulk_insert("staging.khach_hang_sql", sql_rows, atomic=True)
+        """
+        if self._in_transaction:
+            yield self
+            return
+        
+        self._in_transaction = True
+        try:
+            yield self
+            self.connection.commit()
+        except BaseException:
+            self.connection.rollback()
+            raise
+        finally:
+            self._in_transaction = False
+    
     def bulk_insert(
         self,
         table_name: str,
         data: List[Dict],
-        batch_size: int = 1000
+        batch_size: int = 1000,
+        atomic: bool = False
     ) -> int:
         """
         Insert nhiều rows vào table.
@@ -128,9 +326,15 @@ class SQLServerClient:
             table_name: Tên table
             data: List of dict (mỗi dict là 1 row)
             batch_size: Số rows insert mỗi batch
+            atomic: True = tất cả rows trong một transaction, lỗi thì
+                    rollback toàn bộ và raise (thay vì bỏ qua batch lỗi);
+                    trong transaction() thì commit khi ra khỏi with
         
         Returns:
             Tổng số rows đã insert
+        
+        Khi bật fast_executemany, giá trị được chuẩn hóa theo kiểu cột
+        của table đích và bind bằng setinputsizes (xem column_types.py).
         """
         if not data:
             return 0
@@ -146,21 +350,63 @@ class SQLServerClient:
         
         query = f"INSERT INTO {table_name} ({column_names}) VALUES ({placeholders})"
         
+        types = self.get_column_types(table_name) if self.fast_executemany else None
+        if types:
+            column_specs = [types.get(col.lower()) for col in columns]
+            input_sizes = [spec.input_size if spec else None for spec in column_specs]
+            normalizers = [spec.normalize if spec else None for spec in column_specs]
+        else:
+            input_sizes = None
+            normalizers = None
+        
+        def row_values(rows: List[Dict]) -> List[tuple]:
+            if not normalizers:
+                return [tuple(row.get(col) for col in columns) for row in rows]
+            pairs = list(zip(columns, normalizers))
+            return [
+                tuple(normalize(row.get(col)) if normalize else row.get(col) for col, normalize in pairs)
+                for row in rows
+            ]
+        
         total_inserted = 0
         errors = 0
         
+        if atomic:
+            values = row_values(data)
+            while True:
+                fast = self.fast_executemany
+                try:
+                    for i in range(0, len(values), batch_size):
+                        self._executemany(query, values[i:i + batch_size], input_sizes)
+                    if not self._in_transaction:
+                        self.connection.commit()
+                except pyodbc.Error as e:
+                    self.connection.rollback()
+                    # Trong transaction(): rollback đã bỏ cả các lệnh trước đó nên không
+                    # chạy lại riêng lệnh này - raise để caller chạy lại cả transaction
+                    # (fast_executemany đã tắt)
+                    if fast and self._fast_unsupported(e) and not self._in_transaction:
+                        continue  # chạy lại cả transaction bằng executemany thường
+                    logger.error("Lỗi insert vào %s, đã rollback: %s", table_name, e)
+                    raise
+                
+                return len(values)
+        
         try:
             for i in range(0, len(data), batch_size):
                 batch = data[i:i + batch_size]
                 
                 try:
                     # Chuẩn bị values cho batch
-                    values = [
-                        tuple(row.get(col) for col in columns)
-                        for row in batch
-                    ]
+                    values = row_values(batch)
                     
-                    self.cursor.executemany(query, values)
+                    try:
+                        self._executemany(query, values, input_sizes)
+                    except pyodbc.Error as e:
+                        if not (self.fast_executemany and self._fast_unsupported(e)):
+                            raise
+                        self.connection.rollback()
+                        self._executemany(query, values, input_sizes)
                     self.connection.commit()
                     
                     total_inserted += len(batch)
@@ -193,6 +439,68 @@ class SQLServerClient:
             logger.error("Lỗi bulk insert: %s", e)
             raise
     
+    def _executemany(self, query: str, values: List[tuple], input_sizes: Optional[Sequence] = None):
+        """executemany trên cursor riêng (fast_executemany + setinputsizes khi bật)."""
+        # Cursor riêng: setinputsizes / fast_executemany không ảnh hưởng self.cursor
+        cursor = self.connection.cursor()
+        try:
+            if self.fast_executemany:
+                try:
+                    cursor.fast_executemany = True
+                except AttributeError:
+                    # pyodbc < 4.0.19 không có fast_executemany
+                    self.fast_executemany = False
+                    logger.warning("⚠️  pyodbc %s không có fast_executemany, dùng executemany thường", pyodbc.version)
+            if self.fast_executemany and input_sizes:
+                cursor.setinputsizes(input_sizes)
+            cursor.executemany(query, values)
+        finally:
+            cursor.close()
+    
+    def _fast_unsupported(self, error: pyodbc.Error) -> bool:
+        """Tắt fast_executemany nếu lỗi cho thấy driver không hỗ trợ (trả về True)."""
+        sqlstate = error.args[0] if error.args else None
+        if sqlstate not in _FAST_UNSUPPORTED_STATES:
+            return False
+        
+        self.fast_executemany = False
+        logger.warning(
+            "⚠️  Driver %s không hỗ trợ fast_executemany/setinputsizes (%s), dùng executemany thường",
+            self.driver,
+            sqlstate
+        )
+        return True
+    
+    def get_column_types(self, table_name: str) -> Optional[Dict[str, ColumnType]]:
+        """
+        Kiểu các cột của table (INFORMATION_SCHEMA.COLUMNS), cache theo table.
+        
+        Args:
+            table_name: "schema.table" hoặc "table" (schema dbo), có thể có []
+        
+        Returns:
+            {tên cột viết thường: ColumnType}, None nếu không đọc được
+        """
+        if table_name in self._column_types:
+            return self._column_types[table_name]
+        
+        schema, _, table = table_name.replace("[", "").replace("]", "").rpartition(".")
+        cursor = self.connection.cursor()
+        try:
+            cursor.execute(COLUMNS_QUERY, (schema or "dbo", table))
+            types = {
+                row[0].lower(): column_type(*row)
+                for row in cursor.fetchall()
+            } or None
+        except pyodbc.Error as e:
+            logger.warning("Không đọc được kiểu cột của %s: %s", table_name, e)
+            types = None
+        finally:
+            cursor.close()
+        
+        self._column_types[table_name] = types
+        return types
+    
     def table_exists(self, table_name: str) -> bool:
         """Kiểm tra table có tồn tại không."""
         query = """
@@ -223,3 +531,12 @@ class SQLServerClient:
     
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
+
+
+def _iter_rows(chunks: Iterator[List[Any]]) -> Iterator[Any]:
+    """Trải các chunk của stream_query thành từng row; đóng cursor khi dừng sớm."""
+    try:
+        for chunk in chunks:
+            yield from chunk
+    finally:
+        chunks.close()
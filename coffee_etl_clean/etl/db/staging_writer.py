@@ -1,5 +1,5 @@
 # etl/db/staging_writer.py
-from typing import Dict, List
+from typing import Any, Dict, Iterator, List
 from .sql_client import SQLServerClient
 from ..logger import logger
 
@@ -126,34 +126,43 @@ class StagingReader:
     def __init__(self, sql_client: SQLServerClient):
         self.sql_client = sql_client
     
+    @staticmethod
+    def _select_query(table_name: str, limit: int = None) -> str:
+        top = f"TOP {int(limit)} " if limit else ""
+        return f"SELECT {top}* FROM staging.{table_name}"
+    
+    def iter_table(
+        self,
+        table_name: str,
+        limit: int = None,
+        chunk_size: int = 1000,
+        row_shape: str = "dict"
+    ) -> Iterator[Any]:
+        """
+        Đọc lazy một staging table (không giữ cả table trong bộ nhớ).
+        
+        Args:
+            table_name: Tên table (không có prefix staging.), VD: khach_hang_tbl
+            row_shape: "dict", "tuple" hoặc "record" (xem SQLServerClient.iter_query)
+        """
+        return self.sql_client.iter_query(
+            self._select_query(table_name, limit),
+            chunk_size=chunk_size,
+            row_shape=row_shape
+        )
+    
     def read_nguyen_lieu(self, limit: int = None) -> List[Dict]:
         """Đọc dữ liệu nguyên liệu từ staging."""
-        query = "SELECT * FROM staging.nguyen_lieu_tbl"
-        if limit:
-            query += f" TOP {limit}"
-        
-        return self.sql_client.execute_query(query)
+        return self.sql_client.execute_query(self._select_query("nguyen_lieu_tbl", limit))
     
     def read_loai_mon(self, limit: int = None) -> List[Dict]:
         """Đọc dữ liệu loại món từ staging."""
-        query = "SELECT * FROM staging.loai_mon_tbl"
-        if limit:
-            query += f" TOP {limit}"
-        
-        return self.sql_client.execute_query(query)
+        return self.sql_client.execute_query(self._select_query("loai_mon_tbl", limit))
     
     def read_khach_hang(self, limit: int = None) -> List[Dict]:
         """Đọc dữ liệu khách hàng từ staging."""
-        query = "SELECT * FROM staging.khach_hang_tbl"
-        if limit:
-            query += f" TOP {limit}"
-        
-        return self.sql_client.execute_query(query)
+        return self.sql_client.execute_query(self._select_query("khach_hang_tbl", limit))
     
     def read_dat_hang(self, limit: int = None) -> List[Dict]:
         """Đọc dữ liệu đặt hàng từ staging."""
-        query = "SELECT * FROM staging.dat_hang_tbl"
-        if limit:
-            query += f" TOP {limit}"
-        
-        return self.sql_client.execute_query(query)
+        return self.sql_client.execute_query(self._select_query("dat_hang_tbl", limit))
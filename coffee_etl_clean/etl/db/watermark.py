@@ -0,0 +1,147 @@
+# etl/db/watermark.py
+"""
+Extract tăng dần (incremental) từ Source DB theo watermark của từng table.
+
+Mỗi run chỉ đọc rows có watermark trong khoảng (low, high]: low là high của
+lần extract thành công trước (lưu trong WatermarkStore), high chốt lúc bắt
+đầu đọc table. Cột watermark chọn theo thứ tự:
+
+- "rowversion": cột rowversion / timestamp - SQL Server tự tăng khi row được
+  insert hoặc update; high = MIN_ACTIVE_ROWVERSION() - 1 nên không bỏ sót
+  transaction đang chạy lúc chốt high
+- "updated_at": cột datetime NOT NULL có tên trong SQL_WATERMARK_COLUMNS
+  (VD: updated_at, ngay_cap_nhat) - chỉ đúng nếu ứng dụng luôn cập nhật cột
+- "key": khóa một cột IDENTITY - chỉ thấy rows mới insert (table append-only)
+
+Table không có cột nào như trên được đọc lại toàn bộ mỗi run.
+"""
+from datetime import datetime
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+
+from .keyset import keyset_predicate, normalize_key
+
+# Các cột của table: tên, kiểu, nullable, identity
+WATERMARK_COLUMNS_QUERY = """
+    SELECT c.name, t.name, c.is_nullable, c.is_identity
+    FROM sys.columns c
+    JOIN sys.types t ON t.user_type_id = c.user_type_id
+    WHERE c.object_id = OBJECT_ID(?)
+    ORDER BY c.column_id
+"""
+
+MIN_ACTIVE_ROWVERSION_QUERY = "SELECT MIN_ACTIVE_ROWVERSION()"
+
+_DATETIME_TYPES = {"datetime", "datetime2", "smalldatetime"}
+
+
+class Watermark(NamedTuple):
+    """Cột watermark của một table."""
+    kind: str
+    columns: List[str]
+
+
+class IncrementalRange(NamedTuple):
+    """Khoảng watermark (low, high] cần đọc của một table trong run."""
+    watermark: Watermark
+    # None = đọc từ đầu (lần đầu / full refresh)
+    low: Optional[tuple]
+    # None = table chưa có row nào (không đọc gì)
+    high: Optional[tuple]
+
+    @property
+    def where(self) -> Tuple[str, list]:
+        """Predicate (sql, params) cho read_table_chunked(where=...)."""
+        if self.high is None:
+            return "1 = 0", []
+        predicates = []
+        params = []
+        for bound, op in ((self.low, ">"), (self.high, "<=")):
+            if bound is not None:
+                predicate, bound_params = keyset_predicate(self.watermark.columns, bound, op)
+                predicates.append(f"({predicate})")
+                params.extend(bound_params)
+        return " AND ".join(predicates), params
+
+    def dump(self) -> dict:
+        """Dạng JSON (checkpoint / WatermarkStore)."""
+        return {
+            "kind": self.watermark.kind,
+            "columns": list(self.watermark.columns),
+            "low": dump_value(self.watermark.kind, self.low),
+            "high": dump_value(self.watermark.kind, self.high),
+        }
+
+    @classmethod
+    def load(cls, data: dict) -> "IncrementalRange":
+        kind = data["kind"]
+        return cls(
+            Watermark(kind, list(data["columns"])),
+            load_value(kind, data["low"]),
+            load_value(kind, data["high"]),
+        )
+
+
+def choose_watermark(
+    column_rows: Sequence[tuple],
+    key_columns: Optional[List[str]],
+    candidates: Sequence[str]
+) -> Optional[Watermark]:
+    """
+    Chọn cột watermark từ kết quả WATERMARK_COLUMNS_QUERY: rowversion, rồi
+    cột datetime NOT NULL có tên trong candidates (theo thứ tự candidates),
+    rồi khóa một cột IDENTITY; None nếu không có.
+    """
+    columns = {name: (type_name.lower(), bool(is_nullable), bool(is_identity))
+               for name, type_name, is_nullable, is_identity in column_rows}
+
+    for name, (type_name, _, _) in columns.items():
+        if type_name in ("timestamp", "rowversion"):
+            return Watermark("rowversion", [name])
+
+    by_lower_name = {name.lower(): name for name in columns}
+    for candidate in candidates:
+        name = by_lower_name.get(candidate.lower())
+        if name and columns[name][0] in _DATETIME_TYPES and not columns[name][1]:
+            return Watermark("updated_at", [name])
+
+    if key_columns and len(key_columns) == 1 and key_columns[0] in columns:
+        _, _, is_identity = columns[key_columns[0]]
+        if is_identity:
+            return Watermark("key", list(key_columns))
+    return None
+
+
+def high_watermark_query(table: str, watermark: Watermark) -> str:
+    """Query giá trị watermark lớn nhất hiện tại (high) của table."""
+    if watermark.kind == "rowversion":
+        return MIN_ACTIVE_ROWVERSION_QUERY
+    columns = ", ".join(f"[{column}]" for column in watermark.columns)
+    descending = ", ".join(f"[{column}] DESC" for column in watermark.columns)
+    return f"SELECT TOP (1) {columns} FROM {table} ORDER BY {descending}"
+
+
+def rowversion_before(value: bytes) -> bytes:
+    """rowversion ngay trước value (MIN_ACTIVE_ROWVERSION() - 1)."""
+    return (int.from_bytes(value, "big") - 1).to_bytes(len(value), "big")
+
+
+def dump_value(kind: str, value: Optional[Sequence]) -> Any:
+    """Watermark → JSON: rowversion thành hex, datetime thành ISO 8601."""
+    if value is None:
+        return None
+    return [
+        item.hex() if kind == "rowversion" else item.isoformat() if isinstance(item, datetime) else item
+        for item in value
+    ]
+
+
+def load_value(kind: str, value: Any) -> Optional[tuple]:
+    """Ngược lại của dump_value."""
+    value = normalize_key(value)
+    if value is None:
+        return None
+    if kind == "rowversion":
+        return tuple(bytes.fromhex(item) for item in value)
+    if kind == "updated_at":
+        return tuple(datetime.fromisoformat(item) for item in value)
+    return value
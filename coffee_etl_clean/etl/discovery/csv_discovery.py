@@ -4,6 +4,7 @@ CSV Discovery - Tự động phát hiện và phân loại CSV files
 """
 from pathlib import Path
 from typing import List, Dict
+from .entity_types import infer_entity_type
 from ..logger import logger
 
 
@@ -35,7 +36,7 @@ class CSVDiscovery:
         
         results = []
         for csv_file in csv_files:
-            entity_type = self._infer_entity_type(csv_file.stem)
+            entity_type = infer_entity_type(csv_file.stem)
             
             results.append({
                 "file_path": str(csv_file),
@@ -48,47 +49,6 @@ class CSVDiscovery:
         logger.info("Phát hiện %s CSV files", len(results))
         return results
     
-    def _infer_entity_type(self, file_stem: str) -> str:
-        """
-        Suy luận entity type từ tên file.
-        
-        Examples:
-            khachhang.csv -> khach_hang
-            nguyen_lieu_tbl.csv -> nguyen_lieu
-            mon_tbl.csv -> mon
-        """
-        # Mapping tên file -> entity type
-        mapping = {
-            "khachhang": "khach_hang",
-            "khach_hang": "khach_hang",
-            "khach_hang_tbl": "khach_hang",
-            
-            "nguyenlieu": "nguyen_lieu",
-            "nguyen_lieu": "nguyen_lieu",
-            "nguyen_lieu_tbl": "nguyen_lieu",
-            
-            "loaimon": "loai_mon",
-            "loai_mon": "loai_mon",
-            "loai_mon_tbl": "loai_mon",
-            "loaisanpham": "loai_mon",  # Thêm mapping cho loaisanpham.csv
-            
-            "tensanpham": "mon",  # tensanpham.csv -> mon (món ăn)
-            "ten_san_pham": "mon",
-            "ten_san_pham_tbl": "mon",
-            
-            "dathang": "dat_hang",
-            "dat_hang": "dat_hang",
-            "dat_hang_tbl": "dat_hang",
-            
-            "mon": "mon",
-            "mon_tbl": "mon",
-            
-            "sysdiagrams": "sysdiagrams"  # Skip system tables
-        }
-        
-        normalized = file_stem.lower().replace("-", "_").replace(" ", "_")
-        return mapping.get(normalized, normalized)
-    
     @staticmethod
     def get_latest_extract_dir(output_dir: str) -> str:
         """
@@ -0,0 +1,49 @@
+# etl/discovery/entity_types.py
+"""
+Entity type - suy luận từ tên file CSV / table SQL, dùng chung cho
+discovery, producer và topology broker.
+"""
+
+# Các entity có queue riêng (queue_<entity_type>)
+ENTITY_TYPES = ("khach_hang", "loai_mon", "mon", "nguyen_lieu", "dat_hang")
+
+# Tên file/table (đã chuẩn hóa) -> entity type
+_ALIASES = {
+    "khachhang": "khach_hang",
+    "khach_hang": "khach_hang",
+    "khach_hang_tbl": "khach_hang",
+
+    "nguyenlieu": "nguyen_lieu",
+    "nguyen_lieu": "nguyen_lieu",
+    "nguyen_lieu_tbl": "nguyen_lieu",
+
+    "loaimon": "loai_mon",
+    "loai_mon": "loai_mon",
+    "loai_mon_tbl": "loai_mon",
+    "loaisanpham": "loai_mon",  # loaisanpham.csv
+
+    "tensanpham": "mon",  # tensanpham.csv -> mon (món ăn)
+    "ten_san_pham": "mon",
+    "ten_san_pham_tbl": "mon",
+
+    "dathang": "dat_hang",
+    "dat_hang": "dat_hang",
+    "dat_hang_tbl": "dat_hang",
+
+    "mon": "mon",
+    "mon_tbl": "mon",
+}
+
+
+def infer_entity_type(name: str) -> str:
+    """
+    Suy luận entity type từ tên file (không có đuôi) hoặc tên table.
+
+    Examples:
+        khachhang -> khach_hang
+        nguyen_lieu_tbl -> nguyen_lieu
+        tensanpham -> mon
+        ten_khac -> ten_khac (không có trong mapping: giữ tên đã chuẩn hóa)
+    """
+    normalized = name.lower().replace("-", "_").replace(" ", "_")
+    return _ALIASES.get(normalized, normalized)
@@ -1,6 +1,7 @@
 # etl/readers/csv_staging_reader.py
 import csv
-from typing import Iterable, Dict
+import io
+from typing import Iterable, Iterator, Dict, List, Optional, Tuple
 from pathlib import Path
 
 
@@ -24,3 +25,112 @@ def csv_staging_reader(file_path: str) -> Iterable[Dict]:
         raise ValueError(f"Lỗi encoding file {file_path}: {e}")
     except csv.Error as e:
         raise ValueError(f"Lỗi đọc CSV {file_path}: {e}")
+
+
+def csv_chunk_ranges(file_path: str, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """
+    Chia phần dữ liệu (sau dòng header) của file CSV thành các đoạn byte
+    [start, end) khoảng `chunk_bytes`, mỗi đoạn bắt đầu ở đầu một record.
+    
+    Ranh giới chỉ đặt ở dấu xuống dòng nằm ngoài dấu nháy, nên field có
+    xuống dòng bên trong ("...\\n...") không bị cắt đôi. Việc dò ranh giới
+    chỉ đếm byte nên rẻ hơn nhiều so với parse CSV.
+    
+    Args:
+        chunk_bytes: Kích thước mỗi đoạn (<= 0: cả file là một đoạn)
+    """
+    path = Path(file_path)
+    if not path.is_file():
+        raise FileNotFoundError(f"Không tìm thấy file: {file_path}")
+    
+    size = path.stat().st_size
+    with open(file_path, "rb") as f:
+        start = len(f.readline())
+        if chunk_bytes <= 0 or size - start <= chunk_bytes:
+            return [(start, size)] if size > start else []
+        
+        ranges = []
+        position = start
+        target = start + chunk_bytes
+        in_quotes = False
+        for line in f:
+            position += len(line)
+            if line.count(b'"') % 2:
+                in_quotes = not in_quotes
+            if not in_quotes and position >= target and position < size:
+                ranges.append((start, position))
+                start = position
+                target = position + chunk_bytes
+        
+        if size > start:
+            ranges.append((start, size))
+        return ranges
+
+
+def csv_range_reader(file_path: str, start: int, end: int) -> Iterable[Dict]:
+    """Đọc các record trong đoạn byte [start, end) (xem csv_chunk_ranges), dùng header của file."""
+    try:
+        with open(file_path, "rb") as f:
+            header = f.readline().decode("utf-8-sig")
+            fieldnames = next(csv.reader([header]), [])
+            
+            f.seek(start)
+            data = f.read(end - start)
+        
+        reader = csv.DictReader(io.TextIOWrapper(io.BytesIO(data), encoding="utf-8"), fieldnames=fieldnames)
+        for row in reader:
+            yield row
+    except UnicodeDecodeError as e:
+        raise ValueError(f"Lỗi encoding file {file_path}: {e}")
+    except csv.Error as e:
+        raise ValueError(f"Lỗi đọc CSV {file_path}: {e}")
+
+
+def csv_offset_reader(file_path: str, start: Optional[int] = None) -> Iterator[Tuple[int, Dict]]:
+    """
+    Đọc file CSV từ byte offset `start` (None = ngay sau header), trả về
+    từng dòng kèm byte offset ngay sau dòng đó.
+    
+    Offset dùng làm checkpoint: đọc lại với start = offset sẽ tiếp tục từ
+    dòng kế tiếp. Kết quả từng dòng giống csv_staging_reader.
+    
+    Yields:
+        (offset, row)
+    """
+    path = Path(file_path)
+    if not path.is_file():
+        raise FileNotFoundError(f"Không tìm thấy file: {file_path}")
+    
+    position = [0]
+    
+    def records(f):
+        # Mỗi record là một hoặc nhiều dòng (field trong dấu nháy có xuống dòng)
+        pending = b""
+        for line in f:
+            pending += line
+            if pending.count(b'"') % 2:
+                continue
+            position[0] += len(pending)
+            text = pending.decode("utf-8")
+            pending = b""
+            yield text.replace("\r\n", "\n") if "\r" in text else text
+        if pending:
+            position[0] += len(pending)
+            yield pending.decode("utf-8")
+    
+    try:
+        with open(file_path, "rb") as f:
+            header = f.readline()
+            fieldnames = next(csv.reader([header.decode("utf-8-sig")]), [])
+            
+            if start is None:
+                start = len(header)
+            f.seek(start)
+            position[0] = start
+            
+            for row in csv.DictReader(records(f), fieldnames=fieldnames):
+                yield position[0], row
+    except UnicodeDecodeError as e:
+        raise ValueError(f"Lỗi encoding file {file_path}: {e}")
+    except csv.Error as e:
+        raise ValueError(f"Lỗi đọc CSV {file_path}: {e}")
@@ -0,0 +1,72 @@
+# etl/utils/batch_validation.py
+from typing import Dict, Iterable, List, Set, Tuple
+
+from ..broker.framing import unpack_message
+from ..quality.rule_registry import rule_registry
+
+ID_FIELDS = ("id", "customer_id")
+
+
+def validate_batch(
+    entity_type: str,
+    messages: Iterable[Dict],
+    seen_ids: Set[int],
+    seen_emails: Set[str]
+) -> Tuple[List[Dict], List[Dict], List[Tuple[Dict, List]], List[int], List[str]]:
+    """
+    Validate các rows của một micro-batch message (legacy hoặc framed).
+
+    Dedup theo ID / email dựa trên seen_ids / seen_emails của queue; các giá
+    trị mới được thêm vào hai set này.
+
+    Returns:
+        (csv_rows, sql_rows, invalid, new_ids, new_emails)
+        invalid là list (row, errors); new_ids / new_emails là các giá trị
+        vừa thêm, để rollback dedup khi load batch lỗi và batch được giao lại.
+    """
+    csv_rows: List[Dict] = []
+    sql_rows: List[Dict] = []
+    invalid: List[Tuple[Dict, List]] = []
+    new_ids: List[int] = []
+    new_emails: List[str] = []
+
+    for message in messages:
+        source, _, rows = unpack_message(message)
+
+        for data in rows:
+            is_valid, fixed_row, errors = rule_registry.validate_row(
+                entity_type=entity_type,
+                row=data,
+                context={
+                    "existing_ids": seen_ids,
+                    "existing_emails": seen_emails,
+                    "source": source,
+                },
+            )
+
+            if not is_valid:
+                invalid.append((data, errors))
+                continue
+
+            if source == "csv":
+                csv_rows.append(fixed_row)
+            else:
+                sql_rows.append(fixed_row)
+
+            for id_field in ID_FIELDS:
+                if id_field in fixed_row and fixed_row[id_field]:
+                    try:
+                        new_id = int(fixed_row[id_field])
+                    except (ValueError, TypeError):
+                        continue
+                    if new_id not in seen_ids:
+                        seen_ids.add(new_id)
+                        new_ids.append(new_id)
+
+            if "email" in fixed_row and fixed_row["email"]:
+                email = fixed_row["email"].lower()
+                if email not in seen_emails:
+                    seen_emails.add(email)
+                    new_emails.append(email)
+
+    return csv_rows, sql_rows, invalid, new_ids, new_emails
@@ -0,0 +1,115 @@
+# etl/utils/checkpoint.py
+import json
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from .json_encoder import TaggedJSONEncoder, json_dumps, tagged_object_hook
+from ..logger import logger
+
+
+class ProducerCheckpoint:
+    """
+    Checkpoint của producer cho từng (source, file/table) trong một run.
+
+    Lưu ở <directory>/producer_<run_id>.json:
+
+        {"csv:khachhang.csv": {"source": "csv", "name": "khachhang.csv",
+                               "run_id": ..., "position": 18234, "rows": 250,
+                               "done": false, "updated": ...}, ...}
+
+    position là byte offset (CSV) hoặc giá trị khóa cuối (SQL) của row cuối
+    cùng đã được broker confirm; chạy lại cùng run_id sẽ tiếp tục từ đó.
+    Giá trị khóa Decimal / datetime / bytes / UUID được ghi kèm kiểu
+    ({"$type": "decimal", "value": "10.50"}, xem TaggedJSONEncoder) để đọc
+    lại đúng giá trị đã so sánh trong predicate keyset.
+    File được ghi tối đa mỗi `min_interval` giây (ghi file tạm rồi rename),
+    nên checkpoint có thể chậm hơn vị trí thật nhưng không bao giờ vượt.
+    Thread-safe: các slice của producer SQL song song ghi cùng một checkpoint.
+    """
+
+    def __init__(self, run_id: str, directory: str = "staging/checkpoints", min_interval: float = 1.0):
+        self.run_id = run_id
+        self.directory = Path(directory)
+        self.path = self.directory / f"producer_{run_id}.json"
+        self.min_interval = min_interval
+        self.entries: Dict[str, Dict] = {}
+        self._dirty = False
+        self._saved_at = 0.0
+        self._lock = threading.RLock()
+
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f, object_hook=tagged_object_hook)
+            logger.info("Đã nạp checkpoint producer: %s (%s mục)", self.path, len(self.entries))
+
+    def __getstate__(self):
+        # ProducerPipeline.publish_csv_chunk được pickle sang worker process
+        # (ParallelCSVProducer): lock không pickle được, tạo lại ở process nhận
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def latest_run_id(directory: str = "staging/checkpoints") -> Optional[str]:
+        """run_id của checkpoint mới nhất (None nếu chưa có)."""
+        files = sorted(Path(directory).glob("producer_*.json"), key=lambda p: p.stat().st_mtime)
+        return files[-1].stem[len("producer_"):] if files else None
+
+    def get(self, source: str, name: str) -> Optional[Dict]:
+        return self.entries.get(f"{source}:{name}")
+
+    def advance(self, source: str, name: str, position: Any, rows: int):
+        """Ghi nhận vị trí đã được confirm (ghi file theo min_interval)."""
+        with self._lock:
+            self._set(source, name, position=position, rows=rows, done=False)
+            if time.monotonic() - self._saved_at >= self.min_interval:
+                self.save()
+
+    def complete(self, source: str, name: str, rows: int):
+        """Đánh dấu file/table đã publish xong (ghi file ngay)."""
+        with self._lock:
+            entry = self.get(source, name) or {}
+            self._set(source, name, position=entry.get("position"), rows=rows, done=True)
+            self.save()
+
+    def get_plan(self, source: str, name: str) -> Optional[Any]:
+        """Plan đã lưu của file/table (VD: ranh giới slice SQL), None nếu chưa có."""
+        entry = self.get(f"{source}-plan", name)
+        return entry["position"] if entry else None
+
+    def set_plan(self, source: str, name: str, plan: Any):
+        """Lưu plan (ghi file ngay) để lần resume chia việc giống hệt lần chạy đầu."""
+        with self._lock:
+            self._set(f"{source}-plan", name, position=plan, rows=0, done=True)
+            self.save()
+
+    def _set(self, source: str, name: str, **values):
+        self.entries[f"{source}:{name}"] = {
+            "source": source,
+            "name": name,
+            "run_id": self.run_id,
+            **values,
+            "updated": datetime.now().isoformat(),
+        }
+        self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if not self._dirty:
+                return
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(json_dumps(self.entries, indent=2, cls=TaggedJSONEncoder))
+            tmp_path.replace(self.path)
+
+            self._dirty = False
+            self._saved_at = time.monotonic()
@@ -0,0 +1,169 @@
+# etl/utils/concurrency.py
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+from ..logger import logger
+
+
+class ThreadLocalResource:
+    """
+    Mỗi worker thread giữ một resource riêng (VD: kết nối SQL Server).
+
+    Ví dụ:
+
+    dbs = ThreadLocalResource(create_db, close=lambda db: db.close())
+    db = dbs.get()      # tạo lần đầu trong thread, dùng lại ở các lần sau
+    dbs.close_all()     # đóng tất cả khi pool kết thúc
+    """
+
+    def __init__(self, factory: Callable[[], Any], close: Callable[[Any], None] = None):
+        self.factory = factory
+        self.close = close
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._created: List[Any] = []
+
+    def get(self) -> Any:
+        resource = getattr(self._local, "resource", None)
+        if resource is None:
+            resource = self.factory()
+            self._local.resource = resource
+            with self._lock:
+                self._created.append(resource)
+        return resource
+
+    def close_all(self):
+        with self._lock:
+            resources, self._created = self._created, []
+
+        for resource in resources:
+            try:
+                if self.close:
+                    self.close(resource)
+            except Exception as e:
+                logger.warning("Lỗi đóng resource của worker: %s", e)
+
+
+def run_queues_concurrently(
+    queues: List[Tuple[str, str]],
+    worker: Callable[[str, str], Any],
+    max_workers: int = 0
+) -> Dict[str, Dict]:
+    """
+    Chạy worker(queue_name, entity_type) song song cho từng queue.
+
+    Lỗi của một worker không dừng các worker khác; sau khi tất cả worker
+    kết thúc, lỗi đầu tiên (theo thứ tự `queues`) được raise lại.
+
+    Args:
+        queues: List (queue_name, entity_type)
+        worker: Function xử lý một queue
+        max_workers: Số worker tối đa (0 = mỗi queue một worker)
+
+    Returns:
+        Dict: {queue_name: {"entity_type": ..., "result": ..., "error": ..., "seconds": ...}}
+    """
+    max_workers = max_workers or len(queues)
+    results: Dict[str, Dict] = {}
+    started = time.perf_counter()
+
+    def timed(queue_name: str, entity_type: str):
+        t0 = time.perf_counter()
+        try:
+            return worker(queue_name, entity_type), None, time.perf_counter() - t0
+        except Exception as e:
+            logger.error("   ✗ Worker %s lỗi: %s", queue_name, e, exc_info=True)
+            return None, e, time.perf_counter() - t0
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="consumer") as pool:
+        futures = {
+            pool.submit(timed, queue_name, entity_type): (queue_name, entity_type)
+            for queue_name, entity_type in queues
+        }
+        for future in as_completed(futures):
+            result, error, seconds = future.result()
+            # Partition queue cùng entity → key theo queue để không ghi đè nhau
+            queue_name, entity_type = futures[future]
+            results[queue_name] = {"entity_type": entity_type, "result": result, "error": error, "seconds": seconds}
+
+    wall = time.perf_counter() - started
+    total = sum(r["seconds"] for r in results.values())
+    slowest = max((r["seconds"] for r in results.values()), default=0.0)
+
+    logger.info(
+        "   ⏱️  %s queues / %s workers: wall-clock %.2fs (tổng tuần tự %.2fs, queue chậm nhất %.2fs)",
+        len(queues),
+        max_workers,
+        wall,
+        total,
+        slowest,
+    )
+    for queue_name, r in sorted(results.items()):
+        logger.info("      • %s: %.2fs%s", queue_name, r["seconds"], " (lỗi)" if r["error"] else "")
+
+    errors = [results[queue_name]["error"] for queue_name, _ in queues if results[queue_name]["error"]]
+    if errors:
+        raise errors[0]
+
+    return results
+
+
+_END = object()
+
+
+def prefetch(items: Iterable[Any], depth: int = 2, name: str = "prefetch") -> Iterator[Any]:
+    """
+    Lấy trước các phần tử của `items` trong một background thread.
+
+    Thread nền chạy iterable (VD: fetchmany từ SQL Server, driver nhả GIL
+    khi chờ I/O) trong lúc thread gọi xử lý phần tử trước đó (VD: encode +
+    publish RabbitMQ trên connection của thread gọi). Tối đa `depth` phần tử
+    nằm chờ trong hàng đợi nên bộ nhớ vẫn bị giới hạn.
+
+    Lỗi trong thread nền được raise lại ở thread gọi. Đóng generator sớm
+    (break, exception) sẽ dừng thread nền.
+    """
+    buffer: "queue.Queue" = queue.Queue(maxsize=max(1, depth))
+    stop = threading.Event()
+    error: List[BaseException] = []
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def worker():
+        iterator = iter(items)
+        try:
+            for item in iterator:
+                if not put(item):
+                    # Thread gọi đã dừng: đóng generator (VD: cursor) ngay trong thread này
+                    close = getattr(iterator, "close", None)
+                    if close:
+                        close()
+                    return
+        except BaseException as e:
+            error.append(e)
+        finally:
+            put(_END)
+
+    thread = threading.Thread(target=worker, name=name, daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END:
+                break
+            yield item
+        if error:
+            raise error[0]
+    finally:
+        stop.set()
+        thread.join()
@@ -1,7 +1,8 @@
 # etl/utils/json_encoder.py
 import json
-from datetime import date, datetime
+from datetime import date, datetime, time
 from decimal import Decimal
+from uuid import UUID
 
 
 class CustomJSONEncoder(json.JSONEncoder):
@@ -34,6 +35,106 @@ def json_dumps(obj, **kwargs):
     return json.dumps(obj, **kwargs)
 
 
+class TaggedJSONEncoder(json.JSONEncoder):
+    """
+    Encoder giữ nguyên kiểu khi đọc lại bằng tagged_object_hook (VD: khóa SQL
+    trong checkpoint): Decimal, datetime, date, time, bytes, UUID được ghi
+    thành {"$type": ..., "value": ...} thay vì float / chuỗi như CustomJSONEncoder.
+    """
+    
+    def default(self, obj):
+        for value_type, tag, dump, _ in _TAGGED_TYPES:
+            if isinstance(obj, value_type):
+                return {"$type": tag, "value": dump(obj)}
+        return super().default(obj)
+
+
+def tagged_object_hook(obj):
+    """object_hook cho json.load: đổi {"$type": ..., "value": ...} về kiểu gốc."""
+    if len(obj) == 2 and "$type" in obj and "value" in obj:
+        load = _TAGGED_LOADERS.get(obj["$type"])
+        if load:
+            return load(obj["value"])
+    return obj
+
+
+# (kiểu, tag, dump, load); datetime đứng trước date vì datetime là subclass của date
+_TAGGED_TYPES = [
+    (Decimal, "decimal", str, Decimal),
+    (datetime, "datetime", datetime.isoformat, datetime.fromisoformat),
+    (date, "date", date.isoformat, date.fromisoformat),
+    (time, "time", time.isoformat, time.fromisoformat),
+    ((bytes, bytearray), "bytes", lambda value: value.hex(), bytes.fromhex),
+    (UUID, "uuid", str, UUID),
+]
+_TAGGED_LOADERS = {tag: load for _, tag, _, load in _TAGGED_TYPES}
+
+
+def _decode_bytes(value):
+    return value.decode('utf-8', errors='ignore')
+
+
+# Kiểu Python của cột (cursor.description[i][1]) → hàm convert giá trị
+_SQL_TYPE_CONVERTERS = {
+    datetime: datetime.isoformat,
+    date: date.isoformat,
+    Decimal: float,
+    bytes: _decode_bytes,
+    bytearray: _decode_bytes,
+}
+
+# Kiểu không cần convert
+_SQL_PLAIN_TYPES = (str, int, float, bool)
+
+
+def _convert_sql_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, bytes):
+        return value.decode('utf-8', errors='ignore')
+    return value
+
+
+def build_sql_row_converter(description):
+    """
+    Tạo hàm convert row (tuple / pyodbc.Row) thành dict JSON-compatible,
+    kết quả giống convert_sql_row_to_json_compatible.
+    
+    Plan convert được tính một lần từ cursor.description (tên + kiểu cột)
+    thay vì kiểm tra isinstance cho từng giá trị của từng row; cột có kiểu
+    không biết trước thì kiểm tra theo giá trị như cũ.
+    
+    Args:
+        description: cursor.description
+    
+    Returns:
+        Callable[[row], Dict]
+    """
+    columns = [column[0] for column in description]
+    plan = []
+    for index, column in enumerate(description):
+        type_code = column[1]
+        if type_code in _SQL_TYPE_CONVERTERS:
+            plan.append((index, _SQL_TYPE_CONVERTERS[type_code]))
+        elif type_code not in _SQL_PLAIN_TYPES:
+            plan.append((index, _convert_sql_value))
+    
+    if not plan:
+        return lambda row: dict(zip(columns, row))
+    
+    def convert(row):
+        values = list(row)
+        for index, converter in plan:
+            value = values[index]
+            if value is not None:
+                values[index] = converter(value)
+        return dict(zip(columns, values))
+    
+    return convert
+
+
 def convert_sql_row_to_json_compatible(row):
     """
     Convert một row từ SQL Server thành dict JSON-compatible.
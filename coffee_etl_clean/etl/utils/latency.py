@@ -0,0 +1,177 @@
+# etl/utils/latency.py
+import bisect
+import heapq
+import json
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from ..logger import logger
+
+# Biên trên (ms) của các bucket histogram, bucket cuối là "> 300s"
+BUCKET_BOUNDS_MS = (
+    1, 2, 5, 10, 20, 50, 100, 200, 500,
+    1000, 2000, 5000, 10000, 30000, 60000, 300000,
+)
+
+# Thứ tự các giai đoạn trong summary
+STAGES = ("dwell", "validate", "transform", "commit", "end_to_end")
+
+
+class LatencyHistogram:
+    """Histogram độ trễ với bucket cố định (ms); percentile = biên trên của bucket."""
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        ms = seconds * 1000
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def percentile(self, q: float) -> float:
+        """Percentile q (0-100) tính bằng giây, làm tròn lên biên bucket."""
+        if not self.count:
+            return 0.0
+        rank = max(1, int(round(self.count * q / 100)))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                if index < len(BUCKET_BOUNDS_MS):
+                    return min(BUCKET_BOUNDS_MS[index] / 1000, self.max)
+                return self.max
+        return self.max
+
+    def to_dict(self) -> Dict:
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 3),
+            "p95_ms": round(self.percentile(95) * 1000, 3),
+            "p99_ms": round(self.percentile(99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+            "buckets": self.buckets(),
+        }
+
+    def buckets(self) -> Dict[str, int]:
+        """Số lần đo của các bucket khác 0, VD: {"<=10ms": 3, ">300000ms": 1}."""
+        labels = ["<=%sms" % bound for bound in BUCKET_BOUNDS_MS]
+        labels.append(">%sms" % BUCKET_BOUNDS_MS[-1])
+        return {label: count for label, count in zip(labels, self.counts) if count}
+
+
+class LatencyRecorder:
+    """
+    Histogram độ trễ theo (entity, giai đoạn), dùng chung giữa các worker thread.
+
+    Giai đoạn:
+    - dwell: từ lúc producer publish tới lúc consumer nhận message
+    - validate / transform / commit: thời gian mỗi lần validate, transform,
+      bulk insert (một message hoặc một batch tùy mode consumer)
+    - end_to_end: từ lúc publish tới lúc rows của message đã vào staging
+
+    Ví dụ:
+
+    latency = LatencyRecorder()
+    latency.record("khach_hang", "dwell", 0.012, trace_id="...")
+    with latency.measure("khach_hang", "commit"):
+        db.bulk_insert(...)
+    latency.log_summary()
+    latency.write(Path("logs/run_x/latency.json"), run_id="x")
+    """
+
+    def __init__(self, slowest: int = 5):
+        """
+        Args:
+            slowest: Số message chậm nhất (theo trace id) giữ lại cho mỗi entity
+        """
+        self.slowest = slowest
+        self._histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self._slowest: Dict[str, List[Tuple[float, str]]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, entity_type: str, stage: str, seconds: float, trace_id: Optional[str] = None):
+        with self._lock:
+            histogram = self._histograms.get((entity_type, stage))
+            if histogram is None:
+                histogram = self._histograms[(entity_type, stage)] = LatencyHistogram()
+            histogram.record(seconds)
+
+            if stage == "end_to_end" and trace_id and self.slowest > 0:
+                slowest = self._slowest.setdefault(entity_type, [])
+                if len(slowest) < self.slowest:
+                    heapq.heappush(slowest, (seconds, trace_id))
+                elif seconds > slowest[0][0]:
+                    heapq.heapreplace(slowest, (seconds, trace_id))
+
+    @contextmanager
+    def measure(self, entity_type: str, stage: str) -> Iterator[None]:
+        """Đo thời gian của khối lệnh (chỉ ghi khi khối lệnh không raise)."""
+        started = time.perf_counter()
+        yield
+        self.record(entity_type, stage, time.perf_counter() - started)
+
+    def snapshot(self) -> Dict:
+        """{entity: {stage: histogram dict, ..., "slowest": [{trace_id, ms}]}}."""
+        with self._lock:
+            result: Dict[str, Dict] = {}
+            for (entity_type, stage), histogram in sorted(self._histograms.items()):
+                result.setdefault(entity_type, {})[stage] = histogram.to_dict()
+            for entity_type, slowest in self._slowest.items():
+                result.setdefault(entity_type, {})["slowest"] = [
+                    {"trace_id": trace_id, "ms": round(seconds * 1000, 3)}
+                    for seconds, trace_id in sorted(slowest, reverse=True)
+                ]
+            return result
+
+    def log_summary(self):
+        snapshot = self.snapshot()
+        if not snapshot:
+            return
+
+        logger.info("\n⏱️  ĐỘ TRỄ (p50 / p95 / p99 / max, ms):")
+        for entity_type, stages in snapshot.items():
+            logger.info("   • %s:", entity_type)
+            for stage in STAGES:
+                histogram = stages.get(stage)
+                if not histogram:
+                    continue
+                logger.info(
+                    "       %-10s %8.1f / %8.1f / %8.1f / %8.1f  (n=%s)",
+                    stage,
+                    histogram["p50_ms"],
+                    histogram["p95_ms"],
+                    histogram["p99_ms"],
+                    histogram["max_ms"],
+                    histogram["count"],
+                )
+
+    def write(self, path: Path, run_id: Optional[str] = None) -> Optional[Path]:
+        """Ghi histogram ra file JSON; trả về path (None nếu chưa có số đo)."""
+        snapshot = self.snapshot()
+        if not snapshot:
+            return None
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "run_id": run_id,
+                    "bucket_bounds_ms": list(BUCKET_BOUNDS_MS),
+                    "entities": snapshot,
+                },
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        logger.info("   ✓ Latency metrics: %s", path)
+        return path
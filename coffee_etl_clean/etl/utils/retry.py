@@ -1,3 +1,4 @@
+import asyncio
 from time import sleep
 from ..logger import logger
 
@@ -37,3 +38,40 @@ def retry(times: int = 3, delay_sec: float = 1.0, label: str = "operation"):
         return wrapper
 
     return decorator
+
+
+def async_retry(times: int = 3, delay_sec: float = 1.0, label: str = "operation"):
+    """
+    Giống retry() nhưng cho coroutine (chờ bằng asyncio.sleep, không block event loop).
+
+    Ví dụ:
+
+    @async_retry(times=3, delay_sec=2, label="rabbitmq_connect")
+    async def connect():
+        ...
+    """
+
+    def decorator(fn):
+        async def wrapper(*args, **kwargs):
+            last_exc = None
+            for attempt in range(1, times + 1):
+                try:
+                    return await fn(*args, **kwargs)
+                except Exception as exc:
+                    last_exc = exc
+                    logger.warning(
+                        "[%s] attempt %s/%s failed: %s",
+                        label,
+                        attempt,
+                        times,
+                        exc,
+                    )
+                    if attempt < times:
+                        await asyncio.sleep(delay_sec)
+
+            logger.error("[%s] all %s attempts failed", label, times)
+            raise last_exc
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,77 @@
+# etl/utils/watermark_store.py
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Optional
+
+from .json_encoder import json_dumps
+from ..logger import logger
+
+
+class WatermarkStore:
+    """
+    High watermark của từng table qua các run (extract incremental, xem
+    etl/db/watermark.py).
+
+    Lưu ở một file JSON (mặc định staging/watermarks/source_db.json):
+
+        {"ComVanPhong.dbo.dat_hang_tho": {"kind": "rowversion", "columns": ["rv"],
+                                          "value": ["00000000000007d1"], "rows": 120,
+                                          "run_id": ..., "updated": ...}, ...}
+
+    Chỉ ghi sau khi table đã extract xong (VD: mọi row đã được broker
+    confirm), nên run lỗi giữa chừng sẽ đọc lại từ watermark cũ.
+    """
+
+    def __init__(self, path: str = "staging/watermarks/source_db.json"):
+        self.path = Path(path)
+        self.entries: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+            logger.info("Đã nạp watermark: %s (%s tables)", self.path, len(self.entries))
+
+    def __getstate__(self):
+        # Lock không pickle được (ProducerPipeline được pickle sang worker process)
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[Dict]:
+        return self.entries.get(name)
+
+    def commit(self, name: str, kind: str, columns, value, rows: int = 0, run_id: str = None):
+        """Ghi high watermark mới của table (value đã qua dump_value, ghi file ngay)."""
+        with self._lock:
+            self.entries[name] = {
+                "kind": kind,
+                "columns": list(columns),
+                "value": value,
+                "rows": rows,
+                "run_id": run_id,
+                "updated": datetime.now().isoformat(),
+            }
+            self._save()
+
+    def reset(self, name: str = None):
+        """Xóa watermark của table (None = tất cả): lần sau đọc lại toàn bộ."""
+        with self._lock:
+            if name is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(name, None)
+            self._save()
+
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json_dumps(self.entries, indent=2))
+        tmp_path.replace(self.path)
@@ -1,5 +1,6 @@
 
 
+import threading
 import time
 import json
 from pathlib import Path
@@ -7,7 +8,17 @@ from datetime import datetime
 from typing import Dict, List
 
 from etl.broker.rabbitmq_client import RabbitMQClient
+from etl.broker.pool import BrokerPool
+from etl.broker.framing import unpack_message
+from etl.broker.batch_consumer import MicroBatchConsumer
+from etl.broker.topology import BrokerTopology
+from etl.broker.tracing import TraceBatch
+from etl.utils.batch_validation import validate_batch
+from etl.utils.concurrency import prefetch, run_queues_concurrently
+from etl.utils.latency import LatencyRecorder
 from etl.db.database_factory import DatabaseFactory, SourceDBReader
+from etl.db.pool import shared_pool
+from etl.discovery.entity_types import infer_entity_type
 from etl.readers.csv_staging_reader import csv_staging_reader
 from etl.quality.rule_registry import rule_registry
 from etl.transformers.data_transformer import DataTransformer
@@ -372,13 +383,36 @@ class MainETLPipeline:
         self.failed_logger = FailedDataLogger(self.run_id)
         self.entity_logger = EntityLogger(self.run_id)
 
+        # Pool connection RabbitMQ dùng chung cho mọi phase/queue của run
+        self.broker_pool = BrokerPool(
+            host=settings.RABBITMQ_HOST,
+            port=settings.RABBITMQ_PORT,
+            username=settings.RABBITMQ_USER,
+            password=settings.RABBITMQ_PASSWORD,
+            heartbeat=settings.RABBITMQ_HEARTBEAT,
+            codec=settings.MESSAGE_CODEC,
+            compression=settings.MESSAGE_COMPRESSION,
+            compress_min_bytes=settings.MESSAGE_COMPRESS_MIN_BYTES,
+            backend=settings.BROKER_BACKEND,
+            memory_dir=settings.BROKER_MEMORY_DIR,
+            high_watermark=settings.PRODUCER_HIGH_WATERMARK,
+            low_watermark=settings.PRODUCER_LOW_WATERMARK,
+            max_throttle=settings.PRODUCER_MAX_THROTTLE,
+        )
+        self.topology = BrokerTopology(settings.RABBITMQ_EXCHANGE, partitions=settings.BROKER_PARTITIONS)
+
         self.stats = {
             "produced": {},
             "consumed": {},
             "valid": {},
             "invalid": {},
             "loaded": {},
+            "idle": {},
         }
+        # Partition queue của cùng entity có thể được consume song song
+        self._stats_lock = threading.Lock()
+        # Độ trễ theo entity: dwell trong broker, validate, transform, commit
+        self.latency = LatencyRecorder()
 
     # -------------------------------------------------------------------------
     # ENTRY
@@ -419,31 +453,22 @@ class MainETLPipeline:
             
             # In đường dẫn log folder
             log_folder = Path("logs") / f"run_{self.run_id}"
+            self.latency.write(log_folder / "latency.json", run_id=self.run_id)
             logger.info("\n📁 Log folder: %s", log_folder)
 
         except Exception as e:
             logger.error("❌ Lỗi pipeline: %s", e, exc_info=True)
             raise
         finally:
-            if self.target_db:
-                self.target_db.close()
+            shared_pool().close_all()
+            self.broker_pool.close_all()
 
     # -------------------------------------------------------------------------
     # PHASE 0 – DB
     # -------------------------------------------------------------------------
 
     def setup_database(self):
-        from etl.db.sql_client import SQLServerClient
-
-        master_db = SQLServerClient(
-            server=f"{settings.TARGET_DB_HOST},{settings.TARGET_DB_PORT}",
-            database="master",
-            driver=settings.TARGET_DB_DRIVER,
-            trusted_connection=settings.TARGET_DB_TRUSTED_CONNECTION,
-        )
-
-        try:
-            master_db.connect()
+        with DatabaseFactory.target_db("master") as master_db:
             logger.info("📦 Tạo database: %s", self.db_name)
 
             if DatabaseManager.create_database(self.db_name, master_db):
@@ -451,35 +476,19 @@ class MainETLPipeline:
             else:
                 raise Exception("Không thể tạo database")
 
-        finally:
-            master_db.close()
-
-        new_db = SQLServerClient(
-            server=f"{settings.TARGET_DB_HOST},{settings.TARGET_DB_PORT}",
-            database=self.db_name,
-            driver=settings.TARGET_DB_DRIVER,
-            trusted_connection=settings.TARGET_DB_TRUSTED_CONNECTION,
-        )
-
-        try:
-            new_db.connect()
+        with DatabaseFactory.target_db(self.db_name) as new_db:
             DatabaseManager.create_staging_schema(new_db)
             DatabaseManager.create_staging_tables(new_db)
             logger.info("✅ Setup database hoàn thành")
-        finally:
-            new_db.close()
 
     # -------------------------------------------------------------------------
     # PHASE 1 – PRODUCER
     # -------------------------------------------------------------------------
 
     def producer_phase(self):
-        with RabbitMQClient(
-            host=settings.RABBITMQ_HOST,
-            port=settings.RABBITMQ_PORT,
-            username=settings.RABBITMQ_USER,
-            password=settings.RABBITMQ_PASSWORD,
-        ) as rabbitmq:
+        with self.broker_pool.client() as rabbitmq:
+            # Exchange + queue entity + binding khai báo một lần cho cả run
+            self.topology.declare(rabbitmq)
 
             logger.info("📄 Producer 1: Đọc CSV files...")
             csv_stats = self.produce_from_csv(rabbitmq)
@@ -494,6 +503,10 @@ class MainETLPipeline:
                 "   Tổng: %s messages đã gửi vào RabbitMQ",
                 sum(self.stats["produced"].values()),
             )
+            if rabbitmq.compressor.encoding:
+                logger.info("   🗜️  Nén: %s", rabbitmq.compressor.summary())
+            if rabbitmq.flow.enabled or rabbitmq.flow.stats["throttled_seconds"]:
+                logger.info("   ⏸️  Backpressure: %s", rabbitmq.flow.summary())
 
     def produce_from_csv(self, rabbitmq: RabbitMQClient) -> Dict[str, int]:
         stats = {}
@@ -516,26 +529,36 @@ class MainETLPipeline:
                 logger.warning("   ⚠️  Không tìm thấy: %s", file_name)
                 continue
 
-            rabbitmq.declare_queue(queue_name, durable=True)
-            count = 0
+            entity_type = queue_name.replace("queue_", "")
+            self.topology.ensure_entity(rabbitmq, entity_type)
 
             try:
-                for row in csv_staging_reader(str(file_path)):
-                    message = {
+                messages = (
+                    {
                         "source": "csv",
-                        "entity_type": queue_name.replace("queue_", ""),
+                        "entity_type": entity_type,
                         "data": row,
                         "metadata": {
                             "file": file_name,
                             "extract_time": datetime.now().isoformat(),
                         },
                     }
-                    rabbitmq.publish(queue_name, message, persistent=True)
-                    count += 1
+                    for row in csv_staging_reader(str(file_path))
+                )
+                result = rabbitmq.publish_batch(
+                    queue_name,
+                    messages,
+                    persistent=True,
+                    window=settings.RABBITMQ_PUBLISH_WINDOW,
+                    **self.topology.publish_args("csv", entity_type),
+                )
 
-                stats[f"csv_{queue_name}"] = count
+                stats[f"csv_{queue_name}"] = result["acked"]
                 logger.info(
-                    "   ✓ %s: %s messages → %s", file_name, count, queue_name
+                    "   ✓ %s: %s messages → %s",
+                    file_name,
+                    result["acked"],
+                    queue_name,
                 )
 
             except Exception as e:
@@ -545,10 +568,8 @@ class MainETLPipeline:
 
     def produce_from_sql(self, rabbitmq: RabbitMQClient) -> Dict[str, int]:
         stats = {}
-        source_db = DatabaseFactory.create_source_db()
 
-        try:
-            source_db.connect()
+        with DatabaseFactory.source_db() as source_db:
             reader = SourceDBReader(source_db)
 
             tables = reader.get_all_tables(schema="dbo")
@@ -557,43 +578,50 @@ class MainETLPipeline:
                 if table.lower() in ["sysdiagrams"]:
                     continue
 
-                entity_type = self.infer_entity_type(table)
-                queue_name = f"queue_{entity_type}"
-
-                rabbitmq.declare_queue(queue_name, durable=True)
+                entity_type = infer_entity_type(table)
+                queue_name = self.topology.ensure_entity(rabbitmq, entity_type)
 
                 try:
-                    data = reader.read_table(table, schema="dbo")
-
-                    from etl.utils.json_encoder import (
-                        convert_sql_row_to_json_compatible,
+                    # Đọc trang keyset tiếp theo trong thread nền trong lúc publish trang hiện tại
+                    chunks = prefetch(
+                        reader.read_table_chunked(table, schema="dbo", chunk_size=settings.SQL_FETCH_SIZE),
+                        depth=settings.SQL_PREFETCH_CHUNKS,
+                        name=f"sql-{table}",
                     )
 
-                    for row in data:
-                        json_row = convert_sql_row_to_json_compatible(row)
-                        message = {
+                    messages = (
+                        {
                             "source": "sql",
                             "entity_type": entity_type,
-                            "data": json_row,
+                            "data": row,
                             "metadata": {
                                 "table": table,
                                 "database": settings.SOURCE_DB_NAME,
                                 "extract_time": datetime.now().isoformat(),
                             },
                         }
-                        rabbitmq.publish(queue_name, message, persistent=True)
+                        for chunk in chunks
+                        for row in chunk.rows
+                    )
+                    result = rabbitmq.publish_batch(
+                        queue_name,
+                        messages,
+                        persistent=True,
+                        window=settings.RABBITMQ_PUBLISH_WINDOW,
+                        **self.topology.publish_args("sql", entity_type),
+                    )
 
-                    stats[f"sql_{queue_name}"] = len(data)
+                    stats[f"sql_{queue_name}"] = result["acked"]
                     logger.info(
-                        "   ✓ %s: %s messages → %s", table, len(data), queue_name
+                        "   ✓ %s: %s messages → %s",
+                        table,
+                        result["acked"],
+                        queue_name,
                     )
 
                 except Exception as e:
                     logger.error("   ✗ Lỗi %s: %s", table, e)
 
-        finally:
-            source_db.close()
-
         return stats
 
     # -------------------------------------------------------------------------
@@ -601,44 +629,61 @@ class MainETLPipeline:
     # -------------------------------------------------------------------------
 
     def consumer_phase(self):
-        from etl.db.sql_client import SQLServerClient
-
-        logger.info("💾 Kết nối Target DB: %s", self.db_name)
-        self.target_db = SQLServerClient(
-            server=f"{settings.TARGET_DB_HOST},{settings.TARGET_DB_PORT}",
-            database=self.db_name,
-            driver=settings.TARGET_DB_DRIVER,
-            trusted_connection=settings.TARGET_DB_TRUSTED_CONNECTION,
-        )
-        self.target_db.connect()
-
         queues = self.get_queues_to_consume()
         if not queues:
             logger.warning("Không có queue nào để consume")
             return
 
-        for queue_name, entity_type in queues:
-            logger.info("\n📥 Processing: %s", queue_name)
-            self.consume_and_process(queue_name, entity_type)
+        if settings.CONSUMER_WORKERS == 1:
+            logger.info("💾 Kết nối Target DB: %s", self.db_name)
+            with DatabaseFactory.target_db(self.db_name) as target_db:
+                self.target_db = target_db
+                try:
+                    for queue_name, entity_type in queues:
+                        logger.info("\n📥 Processing: %s", queue_name)
+                        self.consume_and_process(queue_name, entity_type)
+                finally:
+                    self.target_db = None
+        else:
+            self.consume_concurrently(queues)
 
         logger.info("\n✅ Consumer phase hoàn thành!")
 
+    def consume_concurrently(self, queues: List[tuple]):
+        """
+        Consume các queue song song: mỗi worker có RabbitMQ connection/channel
+        riêng và checkout kết nối Target DB từ SQL pool cho mỗi queue (worker
+        xử lý queue tiếp theo nhận lại connection vừa trả). Stats cộng dồn
+        theo entity dưới lock (partition queue của cùng entity chạy trên
+        nhiều worker).
+        """
+        logger.info(
+            "\n📥 Consume song song %s queues (workers: %s)",
+            len(queues),
+            settings.CONSUMER_WORKERS or len(queues),
+        )
+
+        def worker(queue_name: str, entity_type: str):
+            logger.info("\n📥 Processing: %s", queue_name)
+            with DatabaseFactory.target_db(self.db_name) as target_db:
+                self.consume_and_process(queue_name, entity_type, target_db=target_db)
+
+        run_queues_concurrently(queues, worker, settings.CONSUMER_WORKERS)
+
     def get_queues_to_consume(self) -> List[tuple]:
-        return [
-            ("queue_khach_hang", "khach_hang"),
-            ("queue_loai_mon", "loai_mon"),
-            ("queue_mon", "mon"),
-            ("queue_nguyen_lieu", "nguyen_lieu"),
-            ("queue_dat_hang", "dat_hang"),
-        ]
+        return self.topology.consumer_queues()
 
-    def consume_and_process(self, queue_name: str, entity_type: str):
-        with RabbitMQClient(
-            host=settings.RABBITMQ_HOST,
-            port=settings.RABBITMQ_PORT,
-            username=settings.RABBITMQ_USER,
-            password=settings.RABBITMQ_PASSWORD,
-        ) as rabbitmq:
+    def add_stats(self, entity_type: str, **counts):
+        """Cộng stats consume của entity (idle=..., consumed=..., ...)."""
+        with self._stats_lock:
+            for stats_name, value in counts.items():
+                entity_stats = self.stats[stats_name]
+                entity_stats[entity_type] = entity_stats.get(entity_type, 0) + value
+
+    def consume_and_process(
+        self, queue_name: str, entity_type: str, target_db=None
+    ):
+        with self.broker_pool.client() as rabbitmq:
 
             try:
                 method_frame = rabbitmq.channel.queue_declare(
@@ -649,67 +694,82 @@ class MainETLPipeline:
                 logger.warning("   Queue không tồn tại: %s", queue_name)
                 return
 
-            if message_count == 0:
+            if message_count == 0 and not settings.CONSUMER_FOLLOW:
                 logger.info("   Queue rỗng")
                 return
 
             logger.info("   Messages: %s", message_count)
 
+            if settings.CONSUMER_BATCH_SIZE > 0:
+                self.consume_and_process_batched(
+                    rabbitmq, queue_name, entity_type, target_db
+                )
+                return
+
             consumed = 0
+            row_count = 0
             csv_valid_rows: List[Dict] = []
             sql_valid_rows: List[Dict] = []
             invalid_rows = []
 
             seen_ids = set()
             seen_emails = set()
+            trace = TraceBatch(self.latency, entity_type)
 
             def callback(ch, method, properties, body):
-                nonlocal consumed
+                nonlocal consumed, row_count
 
                 try:
-                    message = json.loads(body.decode("utf-8"))
-                    data = message.get("data", {})
-                    source = message.get("source", "unknown")
-
-                    is_valid, fixed_row, errors = rule_registry.validate_row(
-                        entity_type=entity_type,
-                        row=data,
-                        context={
-                            "existing_ids": seen_ids,
-                            "existing_emails": seen_emails,
-                            "source": source,  # Thêm source để phân biệt CSV vs SQL
-                        },
-                    )
-
-                    if is_valid:
-                        if source == "csv":
-                            csv_valid_rows.append(fixed_row)
-                        elif source == "sql":
-                            sql_valid_rows.append(fixed_row)
-                        else:
-                            csv_valid_rows.append(fixed_row)
-
-                        for id_field in ["id", "customer_id"]:
-                            if id_field in fixed_row and fixed_row[id_field]:
-                                try:
-                                    seen_ids.add(int(fixed_row[id_field]))
-                                except (ValueError, TypeError):
-                                    pass
-
-                        if "email" in fixed_row and fixed_row["email"]:
-                            seen_emails.add(fixed_row["email"].lower())
-
-                    else:
-                        invalid_rows.append((data, errors))
-                        # Ghi ra 2 nơi: file CSV tổng + file JSON theo entity
-                        self.failed_logger.add_failed_record(
-                            entity_type, data, errors
-                        )
-                        self.entity_logger.log_invalid_row(
-                            entity_type, consumed + 1, errors, data
+                    message = rabbitmq.decode(body, properties)
+                    source, _, rows = unpack_message(message)
+                    trace.received(properties)
+                    validate_started = time.perf_counter()
+
+                    for data in rows:
+                        row_count += 1
+
+                        is_valid, fixed_row, errors = rule_registry.validate_row(
+                            entity_type=entity_type,
+                            row=data,
+                            context={
+                                "existing_ids": seen_ids,
+                                "existing_emails": seen_emails,
+                                "source": source,  # Thêm source để phân biệt CSV vs SQL
+                            },
                         )
-                        # KHÔNG log từng lỗi lên console nữa (đỡ ồn)
 
+                        if is_valid:
+                            if source == "csv":
+                                csv_valid_rows.append(fixed_row)
+                            elif source == "sql":
+                                sql_valid_rows.append(fixed_row)
+                            else:
+                                csv_valid_rows.append(fixed_row)
+
+                            for id_field in ["id", "customer_id"]:
+                                if id_field in fixed_row and fixed_row[id_field]:
+                                    try:
+                                        seen_ids.add(int(fixed_row[id_field]))
+                                    except (ValueError, TypeError):
+                                        pass
+
+                            if "email" in fixed_row and fixed_row["email"]:
+                                seen_emails.add(fixed_row["email"].lower())
+
+                        else:
+                            invalid_rows.append((data, errors))
+                            # Ghi ra 2 nơi: file CSV tổng + file JSON theo entity
+                            self.failed_logger.add_failed_record(
+                                entity_type, data, errors
+                            )
+                            self.entity_logger.log_invalid_row(
+                                entity_type, row_count, errors, data
+                            )
+                            # KHÔNG log từng lỗi lên console nữa (đỡ ồn)
+
+                    self.latency.record(
+                        entity_type, "validate", time.perf_counter() - validate_started
+                    )
                     ch.basic_ack(delivery_tag=method.delivery_tag)
                     consumed += 1
 
@@ -719,23 +779,26 @@ class MainETLPipeline:
                         delivery_tag=method.delivery_tag, requeue=False
                     )
 
-            rabbitmq.channel.basic_qos(prefetch_count=1)
-            rabbitmq.channel.basic_consume(
-                queue=queue_name,
-                on_message_callback=callback,
-                auto_ack=False,
+            # Consume cho tới khi queue cạn (hoặc liên tục nếu CONSUMER_FOLLOW)
+            drain_stats = rabbitmq.drain(
+                queue_name,
+                callback,
+                idle_timeout=settings.CONSUMER_IDLE_TIMEOUT,
+                follow=settings.CONSUMER_FOLLOW,
+                prefetch_count=settings.CONSUMER_PREFETCH_COUNT,
             )
-
-            while consumed < message_count:
-                rabbitmq.connection.process_data_events(time_limit=1)
-
             total_valid = len(csv_valid_rows) + len(sql_valid_rows)
-            self.stats["consumed"][entity_type] = consumed
-            self.stats["valid"][entity_type] = total_valid
-            self.stats["invalid"][entity_type] = len(invalid_rows)
+            self.add_stats(
+                entity_type,
+                idle=drain_stats["idle_seconds"],
+                consumed=row_count,
+                valid=total_valid,
+                invalid=len(invalid_rows),
+            )
 
             logger.info(
-                "   Consumed: %s | Valid: %s (CSV: %s, SQL: %s) | Invalid: %s",
+                "   Consumed: %s rows / %s messages | Valid: %s (CSV: %s, SQL: %s) | Invalid: %s",
+                row_count,
                 consumed,
                 total_valid,
                 len(csv_valid_rows),
@@ -744,24 +807,142 @@ class MainETLPipeline:
             )
 
             if csv_valid_rows:
-                self.transform_and_load(entity_type, csv_valid_rows, source="csv")
+                self.transform_and_load(
+                    entity_type, csv_valid_rows, source="csv", target_db=target_db
+                )
 
             if sql_valid_rows:
-                self.transform_and_load(entity_type, sql_valid_rows, source="sql")
+                self.transform_and_load(
+                    entity_type, sql_valid_rows, source="sql", target_db=target_db
+                )
+            trace.committed()
+
+    def consume_and_process_batched(
+        self,
+        rabbitmq: RabbitMQClient,
+        queue_name: str,
+        entity_type: str,
+        target_db=None,
+    ):
+        """
+        Micro-batch mode: validate → transform → load → commit từng batch
+        K messages, sau đó mới ack cả batch (ack-after-commit).
+        """
+        seen_ids = set()
+        seen_emails = set()
+        counts = {"rows": 0, "csv": 0, "sql": 0, "invalid": 0}
+        trace = TraceBatch(self.latency, entity_type)
+
+        def handle_batch(messages: List[Dict]):
+            validate_started = time.perf_counter()
+            csv_valid_rows, sql_valid_rows, invalid_rows, new_ids, new_emails = validate_batch(
+                entity_type, messages, seen_ids, seen_emails
+            )
+
+            self.latency.record(
+                entity_type, "validate", time.perf_counter() - validate_started
+            )
+
+            try:
+                # CSV + SQL của batch commit trong một transaction: không có phần
+                # nào đã commit khi batch bị nack và giao lại
+                with (target_db or self.target_db).transaction():
+                    if csv_valid_rows:
+                        self.transform_and_load(
+                            entity_type,
+                            csv_valid_rows,
+                            source="csv",
+                            atomic=True,
+                            target_db=target_db,
+                        )
+                    if sql_valid_rows:
+                        self.transform_and_load(
+                            entity_type,
+                            sql_valid_rows,
+                            source="sql",
+                            atomic=True,
+                            target_db=target_db,
+                        )
+            except Exception:
+                # Batch sẽ được giao lại → bỏ các ID/email vừa ghi nhận
+                seen_ids.difference_update(new_ids)
+                seen_emails.difference_update(new_emails)
+                trace.discard()
+                raise
+            trace.committed()
+
+            # Chỉ ghi log invalid sau khi batch đã commit (tránh ghi trùng khi giao lại)
+            for data, errors in invalid_rows:
+                counts["rows"] += 1
+                counts["invalid"] += 1
+                self.failed_logger.add_failed_record(entity_type, data, errors)
+                self.entity_logger.log_invalid_row(
+                    entity_type, counts["rows"], errors, data
+                )
+
+            counts["rows"] += len(csv_valid_rows) + len(sql_valid_rows)
+            counts["csv"] += len(csv_valid_rows)
+            counts["sql"] += len(sql_valid_rows)
+
+        consumer = MicroBatchConsumer(
+            rabbitmq,
+            handle_batch,
+            batch_size=settings.CONSUMER_BATCH_SIZE,
+            prefetch_count=settings.CONSUMER_PREFETCH_COUNT,
+            max_wait=settings.CONSUMER_BATCH_MAX_WAIT,
+            on_receive=trace.received,
+        )
+        batch_stats = consumer.consume(
+            queue_name,
+            idle_timeout=settings.CONSUMER_IDLE_TIMEOUT,
+            follow=settings.CONSUMER_FOLLOW,
+        )
+        total_valid = counts["csv"] + counts["sql"]
+        self.add_stats(
+            entity_type,
+            idle=batch_stats["idle_seconds"],
+            consumed=counts["rows"],
+            valid=total_valid,
+            invalid=counts["invalid"],
+        )
+
+        logger.info(
+            "   Consumed: %s rows / %s messages (%s batches) | Valid: %s (CSV: %s, SQL: %s) | Invalid: %s",
+            counts["rows"],
+            batch_stats["acked"],
+            batch_stats["batches"],
+            total_valid,
+            counts["csv"],
+            counts["sql"],
+            counts["invalid"],
+        )
 
     def transform_and_load(
-        self, entity_type: str, rows: List[Dict], source: str = "csv"
+        self,
+        entity_type: str,
+        rows: List[Dict],
+        source: str = "csv",
+        atomic: bool = False,
+        target_db=None,
     ):
+        """
+        Transform và load rows vào staging table.
+
+        atomic=True: load trong một transaction và raise nếu lỗi
+        (dùng cho micro-batch mode để không ack khi chưa commit).
+        target_db: kết nối riêng của worker (mặc định self.target_db).
+        """
         logger.info("   🔄 Transform & Load [%s]...", source.upper())
 
         transformed_rows = []
-        for row in rows:
-            try:
-                transformed_rows.append(
-                    DataTransformer.transform(entity_type, row)
-                )
-            except Exception as e:
-                logger.error("   Lỗi transform: %s", e)
+        with self.latency.measure(entity_type, "transform"):
+            for row in rows:
+                try:
+                    transformed_rows.append(
+                        DataTransformer.transform(entity_type, row)
+                    )
+                except Exception as e:
+                    logger.error("   Lỗi transform: %s", e)
 
         if not transformed_rows:
             return
@@ -770,42 +951,25 @@ class MainETLPipeline:
         staging_table = f"staging.{entity_type}{suffix}"
 
         try:
-            loaded = self.target_db.bulk_insert(
-                table_name=staging_table,
-                data=transformed_rows,
-                batch_size=1000,
-            )
-            stats_key = f"{entity_type}_{source}"
-            self.stats["loaded"][stats_key] = loaded
+            with self.latency.measure(entity_type, "commit"):
+                loaded = (target_db or self.target_db).bulk_insert(
+                    table_name=staging_table,
+                    data=transformed_rows,
+                    batch_size=1000,
+                    atomic=atomic,
+                )
+            self.add_stats(f"{entity_type}_{source}", loaded=loaded)
             logger.info("   ✅ Loaded: %s rows → %s", loaded, staging_table)
 
         except Exception as e:
             logger.error("   ❌ Lỗi load: %s", e)
+            if atomic:
+                raise
 
     # -------------------------------------------------------------------------
     # HELPERS & SUMMARY
     # -------------------------------------------------------------------------
 
-    def infer_entity_type(self, name: str) -> str:
-        mapping = {
-            "khachhang": "khach_hang",
-            "khach_hang": "khach_hang",
-            "khach_hang_tbl": "khach_hang",
-            "mon": "mon",
-            "mon_tbl": "mon",
-            "nguyenlieu": "nguyen_lieu",
-            "nguyen_lieu": "nguyen_lieu",
-            "nguyen_lieu_tbl": "nguyen_lieu",
-            "loaimon": "loai_mon",
-            "loai_mon": "loai_mon",
-            "loai_mon_tbl": "loai_mon",
-            "dathang": "dat_hang",
-            "dat_hang": "dat_hang",
-            "dat_hang_tbl": "dat_hang",
-        }
-        normalized = name.lower().replace("-", "_").replace(" ", "_")
-        return mapping.get(normalized, normalized)
-
     def print_summary(self):
         logger.info("\n" + "=" * 80)
         logger.info("📊 TỔNG KẾT PIPELINE")
@@ -825,6 +989,14 @@ class MainETLPipeline:
             "   TỔNG CONSUMED: %s messages",
             sum(self.stats["consumed"].values()),
         )
+        if self.stats["idle"]:
+            logger.info(
+                "   Thời gian chờ (idle): %s",
+                ", ".join(
+                    "%s=%.2fs" % (entity, seconds)
+                    for entity, seconds in self.stats["idle"].items()
+                ),
+            )
 
         logger.info("\n3️⃣  VALIDATE (Data Quality Rules):")
         total_valid = sum(self.stats["valid"].values())
@@ -869,6 +1041,8 @@ class MainETLPipeline:
             sql_total,
         )
 
+        self.latency.log_summary()
+
         # Thông tin file log validation theo entity
         summary = self.entity_logger.get_summary()
         if summary["log_files"]:
@@ -897,6 +1071,7 @@ class MainETLPipeline:
         logger.info("   • Error: logs/error.log")
         logger.info("   • Failed data: logs/failed_data_%s.csv", self.run_id)
         logger.info("   • Validation per-entity: *_validation_%s.log", self.run_id)
+        logger.info("   • Latency: logs/run_%s/latency.json", self.run_id)
         logger.info("")
         logger.info("💾 Database: %s", self.db_name)
         logger.info("   • Staging CSV: staging.*_csv")
@@ -0,0 +1,29 @@
+# tests/conftest.py
+import sys
+import types
+from pathlib import Path
+
+# Chạy pytest từ thư mục gốc project: import được STEP1_PRODUCER, etl, ...
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+try:
+    import pyodbc  # noqa: F401
+except ImportError:
+    # Máy chạy test không có driver ODBC: module thay thế đủ để import etl.db;
+    # các test dùng cursor giả, không kết nối SQL Server thật
+    pyodbc = types.ModuleType("pyodbc")
+
+    class Error(Exception):
+        pass
+
+    pyodbc.Error = Error
+    pyodbc.Row = tuple
+    pyodbc.Connection = object
+    pyodbc.Cursor = object
+    pyodbc.version = "stub"
+    for name in (
+        "SQL_WVARCHAR", "SQL_VARCHAR", "SQL_INTEGER", "SQL_BIGINT", "SQL_SMALLINT", "SQL_TINYINT",
+        "SQL_BIT", "SQL_DECIMAL", "SQL_DOUBLE", "SQL_REAL", "SQL_TYPE_DATE", "SQL_TYPE_TIMESTAMP",
+    ):
+        setattr(pyodbc, name, name)
+    sys.modules["pyodbc"] = pyodbc
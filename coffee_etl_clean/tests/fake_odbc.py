@@ -0,0 +1,108 @@
+# tests/fake_odbc.py
+"""Connection / cursor giả cho test SQLServerClient (không cần SQL Server)."""
+import re
+import sqlite3
+from typing import Callable, List, Optional
+
+import pyodbc
+
+from etl.db.sql_client import SQLServerClient
+
+
+class FakeCursor:
+    def __init__(self, connection: "FakeConnection"):
+        self.connection = connection
+        self.fast_executemany = False
+        self.input_sizes = None
+        self.description = None
+        self.rowcount = -1
+        self._rows: List[tuple] = []
+
+    def setinputsizes(self, sizes):
+        self.input_sizes = list(sizes)
+
+    def execute(self, query: str, params=()):
+        params = tuple(params or ())
+        self.connection.log.append(("execute", query, params))
+        self.description, rows = self.connection.query(query, params)
+        self._rows = list(rows)
+
+    def executemany(self, query: str, values):
+        values = list(values)
+        self.connection.log.append(("executemany", self.fast_executemany, self.input_sizes, values))
+        if self.connection.on_executemany:
+            self.connection.on_executemany(self, query, values)
+
+    def fetchmany(self, size: int):
+        rows, self._rows = self._rows[:size], self._rows[size:]
+        return rows
+
+    def fetchone(self):
+        return self._rows.pop(0) if self._rows else None
+
+    def fetchall(self):
+        rows, self._rows = self._rows, []
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """
+    Ghi lại execute / executemany / commit / rollback / close vào `log`.
+
+    Args:
+        query: (query, params) → (description, rows) cho execute
+        on_executemany: (cursor, query, values) → None, raise để giả lập lỗi driver
+    """
+
+    def __init__(self, query: Optional[Callable] = None, on_executemany: Optional[Callable] = None):
+        self.log: List[tuple] = []
+        self.query = query or (lambda query, params: ([], []))
+        self.on_executemany = on_executemany
+        self.autocommit = False
+
+    def cursor(self) -> FakeCursor:
+        return FakeCursor(self)
+
+    def commit(self):
+        self.log.append(("commit",))
+
+    def rollback(self):
+        self.log.append(("rollback",))
+
+    def close(self):
+        self.log.append(("close",))
+
+    def calls(self, kind: str) -> List[tuple]:
+        return [entry for entry in self.log if entry[0] == kind]
+
+
+def fake_client(connection: FakeConnection, fast_executemany: bool = False) -> SQLServerClient:
+    """SQLServerClient đã "kết nối" tới connection giả."""
+    client = SQLServerClient("fake", "fake_db", fast_executemany=fast_executemany)
+    client.connection = connection
+    client.cursor = connection.cursor()
+    return client
+
+
+def odbc_error(sqlstate: str, message: str = "driver error") -> pyodbc.Error:
+    return pyodbc.Error(sqlstate, message)
+
+
+def sqlite_query(db: sqlite3.Connection) -> Callable:
+    """
+    Handler query cho FakeConnection chạy trên sqlite: đổi SELECT TOP (n) ...
+    thành LIMIT n và bỏ tiền tố schema dbo.
+    """
+    def query(sql: str, params: tuple):
+        sql = sql.replace("dbo.", "")
+        match = re.match(r"\s*SELECT TOP \((\d+)\) (.*)$", sql, re.S)
+        if match:
+            sql = f"SELECT {match.group(2)} LIMIT {match.group(1)}"
+        cursor = db.execute(sql, params)
+        description = [(column[0], None) for column in cursor.description]
+        return description, cursor.fetchall()
+
+    return query
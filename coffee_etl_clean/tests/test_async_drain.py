@@ -0,0 +1,109 @@
+# tests/test_async_drain.py
+import asyncio
+
+from etl.broker.async_client import AsyncRabbitMQClient
+
+QUEUE = "queue_test_async"
+
+
+class FakeMessage:
+    def __init__(self, channel, tag: int):
+        self.channel = channel
+        self.tag = tag
+
+    async def ack(self, multiple: bool = False):
+        if self.channel.is_closed:
+            raise RuntimeError("channel đã đóng")
+        self.channel.acked.append((self.tag, multiple))
+
+
+class FakeQueue:
+    def __init__(self, channel, count: int):
+        self.channel = channel
+        self.count = count
+
+    async def consume(self, callback, no_ack=False):
+        for tag in range(1, self.count + 1):
+            await callback(FakeMessage(self.channel, tag))
+        return "ctag"
+
+    async def cancel(self, consumer_tag):
+        pass
+
+
+class FakeChannel:
+    def __init__(self, count: int):
+        self.count = count
+        self.is_closed = False
+        self.acked = []
+
+    async def set_qos(self, prefetch_count):
+        pass
+
+    async def declare_queue(self, queue_name, durable=True):
+        return FakeQueue(self, self.count)
+
+    async def close(self):
+        self.is_closed = True
+
+
+class FakeConnection:
+    def __init__(self, channel: FakeChannel):
+        self._channel = channel
+
+    async def channel(self, publisher_confirms=False):
+        return self._channel
+
+
+def fake_client(channel: FakeChannel) -> AsyncRabbitMQClient:
+    client = AsyncRabbitMQClient()
+    client.connection = FakeConnection(channel)
+
+    async def get_message_count(queue_name):
+        return 0
+
+    client.get_message_count = get_message_count
+    return client
+
+
+def test_drain_runs_finalizer_before_closing_channel():
+    channel = FakeChannel(3)
+    client = fake_client(channel)
+    buffer = []
+
+    async def on_message(message):
+        buffer.append(message)
+
+    async def on_finish():
+        await buffer[-1].ack(multiple=True)
+        buffer.clear()
+
+    stats = asyncio.run(client.drain(QUEUE, on_message, idle_timeout=0.01, on_finish=on_finish))
+
+    assert stats["messages"] == 3
+    assert channel.acked == [(3, True)]
+    assert channel.is_closed
+
+
+def test_drain_waits_while_caller_has_pending_work():
+    channel = FakeChannel(2)
+    client = fake_client(channel)
+    buffer = []
+    ticks = []
+
+    async def on_message(message):
+        buffer.append(message)
+
+    async def on_tick():
+        ticks.append(len(buffer))
+        # Batch "load xong" sau vài lần tick
+        if len(ticks) == 3:
+            await buffer[-1].ack(multiple=True)
+            buffer.clear()
+
+    asyncio.run(client.drain(
+        QUEUE, on_message, idle_timeout=0.01, on_tick=on_tick, pending=lambda: bool(buffer)
+    ))
+
+    assert len(ticks) >= 3
+    assert channel.acked == [(2, True)]
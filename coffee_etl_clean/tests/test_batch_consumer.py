@@ -0,0 +1,50 @@
+# tests/test_batch_consumer.py
+from etl.broker.batch_consumer import MicroBatchConsumer
+from etl.broker.rabbitmq_client import RabbitMQClient
+from etl.broker.retry import RetryPolicy
+
+QUEUE = "queue_test_batch"
+
+
+def memory_client(tmp_path) -> RabbitMQClient:
+    client = RabbitMQClient(backend="memory", memory_dir=str(tmp_path))
+    client.connect()
+    client.declare_queue(QUEUE)
+    return client
+
+
+def test_redelivered_batch_parks_only_the_failing_message(tmp_path):
+    client = memory_client(tmp_path)
+    for i in range(5):
+        client.publish(QUEUE, {"id": i, "poison": i == 3})
+
+    committed = []
+
+    def handler(batch):
+        if any(message["poison"] for message in batch):
+            raise ValueError("poison")
+        committed.extend(message["id"] for message in batch)
+
+    consumer = MicroBatchConsumer(client, handler, batch_size=10, max_wait=0.01)
+    stats = consumer.consume(QUEUE, idle_timeout=0.05)
+
+    assert sorted(committed) == [0, 1, 2, 4]
+    assert stats["acked"] == 4
+    assert stats["failed"] == 1
+    assert stats["retried"] == 1
+    assert client.get_message_count(QUEUE) == 0
+    assert client.get_message_count(RetryPolicy.retry_queue(QUEUE, 1)) == 1
+
+
+def test_undecodable_message_goes_to_parking(tmp_path):
+    client = memory_client(tmp_path)
+    client.channel.basic_publish(exchange="", routing_key=QUEUE, body=b"not json")
+    client.publish(QUEUE, {"id": 1})
+
+    committed = []
+    consumer = MicroBatchConsumer(client, committed.extend, batch_size=10, max_wait=0.01)
+    stats = consumer.consume(QUEUE, idle_timeout=0.05)
+
+    assert [message["id"] for message in committed] == [1]
+    assert stats["parked"] == 1
+    assert client.get_message_count(RetryPolicy.parking_queue(QUEUE)) == 1
@@ -0,0 +1,49 @@
+# tests/test_batch_validation.py
+import importlib
+import sys
+import types
+
+import pytest
+
+from etl.broker.framing import build_frame
+
+
+class FakeRuleRegistry:
+    """Row có "bad" hoặc ID đã gặp là invalid."""
+
+    def validate_row(self, entity_type, row, context):
+        if row.get("bad"):
+            return False, dict(row), ["bad"]
+        if int(row["id"]) in context["existing_ids"]:
+            return False, dict(row), ["duplicate id"]
+        return True, dict(row), []
+
+
+@pytest.fixture
+def validate_batch(monkeypatch):
+    quality = types.ModuleType("etl.quality")
+    registry = types.ModuleType("etl.quality.rule_registry")
+    registry.rule_registry = FakeRuleRegistry()
+    monkeypatch.setitem(sys.modules, "etl.quality", quality)
+    monkeypatch.setitem(sys.modules, "etl.quality.rule_registry", registry)
+    monkeypatch.delitem(sys.modules, "etl.utils.batch_validation", raising=False)
+    return importlib.import_module("etl.utils.batch_validation").validate_batch
+
+
+def test_rows_split_by_source_and_deduplicated(validate_batch):
+    seen_ids = {1}
+    seen_emails = set()
+    messages = [
+        build_frame({"source": "csv"}, [{"id": 1}, {"id": 2, "email": "An@x.vn"}, {"id": 3, "bad": True}]),
+        {"source": "sql", "data": {"id": "4", "email": "an@x.vn"}},
+    ]
+
+    csv_rows, sql_rows, invalid, new_ids, new_emails = validate_batch("khach_hang", messages, seen_ids, seen_emails)
+
+    assert [row["id"] for row in csv_rows] == [2]
+    assert [row["id"] for row in sql_rows] == ["4"]
+    assert invalid == [({"id": 1}, ["duplicate id"]), ({"id": 3, "bad": True}, ["bad"])]
+    assert new_ids == [2, 4]
+    assert new_emails == ["an@x.vn"]
+    assert seen_ids == {1, 2, 4}
+    assert seen_emails == {"an@x.vn"}
@@ -0,0 +1,40 @@
+# tests/test_checkpoint.py
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from etl.db.keyset import normalize_key
+from etl.utils.checkpoint import ProducerCheckpoint
+
+KEY = (
+    Decimal("12345678901234567890.0012"),
+    datetime(2024, 5, 6, 7, 8, 9, 123457),
+    date(2024, 5, 6),
+    b"\x00\x00\x00\x00\x00\x00\x07\xd1",
+    UUID("6f1c1b8e-1d7a-4c8e-9a43-1f7c2b3d4e5f"),
+    2 ** 63 - 1,
+    "ma_don",
+)
+
+
+def test_sql_key_position_keeps_types_across_runs(tmp_path):
+    checkpoint = ProducerCheckpoint("run", str(tmp_path))
+    checkpoint.advance("sql", "dat_hang_tho", KEY, rows=10)
+    checkpoint.set_plan("sql", "dat_hang_tho", [KEY])
+    checkpoint.save()
+
+    resumed = ProducerCheckpoint("run", str(tmp_path))
+
+    assert normalize_key(resumed.get("sql", "dat_hang_tho")["position"]) == KEY
+    assert [normalize_key(bound) for bound in resumed.get_plan("sql", "dat_hang_tho")] == [KEY]
+
+
+def test_plain_positions_are_stored_as_plain_json(tmp_path):
+    checkpoint = ProducerCheckpoint("run", str(tmp_path))
+    checkpoint.advance("csv", "khachhang.csv", 18234, rows=250)
+    checkpoint.save()
+
+    with open(tmp_path / "producer_run.json", encoding="utf-8") as f:
+        assert json.load(f)["csv:khachhang.csv"]["position"] == 18234
+    assert ProducerCheckpoint("run", str(tmp_path)).get("csv", "khachhang.csv")["position"] == 18234
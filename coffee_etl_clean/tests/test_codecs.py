@@ -0,0 +1,137 @@
+# tests/test_codecs.py
+import gzip
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+
+from etl.broker.codecs import BodyCompressor, CodecError, RowsBinaryCodec, decode_body, get_codec
+
+HEADER = {"source": "sql", "entity_type": "dat_hang", "metadata": {"table": "dat_hang_tho"}}
+
+# Một giá trị cho mỗi tag của binary codec
+VALUES = {
+    "none": None,
+    "true": True,
+    "false": False,
+    "int8": -5,
+    "int32": 70000,
+    "int64": 2 ** 40,
+    "bigint": 2 ** 64,
+    "negative_bigint": -(2 ** 63) - 1,
+    "float": 1.5,
+    "str8": "Cà phê sữa",
+    "str32": "x" * 300,
+    "decimal": Decimal("12345678901234567890.0012"),
+    "datetime": datetime(2024, 5, 6, 7, 8, 9, 123457),
+    "datetime_before_epoch": datetime(1960, 1, 2, 3, 4, 5),
+    "aware_datetime": datetime(2024, 5, 6, 7, 8, 9, tzinfo=timezone(timedelta(hours=7))),
+    "date": date(2024, 5, 6),
+    "time": time(7, 8, 9, 123),
+    "bytes": b"\x00\x01\xff",
+    "json": ["thừa", 1],
+}
+
+codec = RowsBinaryCodec()
+
+
+def round_trip(message):
+    return codec.decode(codec.encode(message))
+
+
+def test_every_tag_round_trips_with_its_type():
+    decoded = round_trip({**HEADER, "data": VALUES})
+
+    assert decoded == {**HEADER, "data": VALUES}
+    for column, value in VALUES.items():
+        assert type(decoded["data"][column]) is type(value), column
+    assert decoded["data"]["aware_datetime"].utcoffset() == timedelta(hours=7)
+    assert decoded["data"]["datetime"].tzinfo is None
+
+
+def test_absent_column_differs_from_none():
+    rows = [{"id": 1, "email": None}, {"id": 2}, {"id": 3, "phone": "0901"}]
+
+    decoded = round_trip({**HEADER, "format": "framed", "rows": rows})
+
+    assert decoded["rows"] == rows
+    assert "email" not in decoded["rows"][1]
+    assert "phone" not in decoded["rows"][0]
+
+
+def test_none_column_key_is_named_like_json():
+    # csv.DictReader đặt cột thừa dưới key None
+    decoded = round_trip({**HEADER, "data": {"id": 1, None: ["a", "b"]}})
+
+    assert decoded["data"] == {"id": 1, "null": ["a", "b"]}
+
+
+def test_message_kinds():
+    assert round_trip({**HEADER, "data": {}})["data"] == {}
+    assert round_trip({**HEADER, "rows": []})["rows"] == []
+    assert round_trip(dict(HEADER)) == HEADER
+
+
+def test_bytearray_decodes_as_bytes():
+    assert round_trip({"data": {"b": bytearray(b"ab")}})["data"]["b"] == b"ab"
+
+
+def test_short_text_too_long_raises_codec_error():
+    with pytest.raises(CodecError):
+        codec.encode({"data": {"d": Decimal("1" * 300)}})
+    with pytest.raises(CodecError):
+        codec.encode({"data": {"n": 10 ** 300}})
+
+
+def test_unsupported_type_and_corrupt_body_raise_codec_error():
+    with pytest.raises(CodecError):
+        codec.encode({"data": {"x": object()}})
+    with pytest.raises(CodecError):
+        codec.decode(b"not binary")
+    with pytest.raises(CodecError):
+        codec.decode(codec.encode({"data": {"id": 1}})[:-1])
+
+
+def test_decode_body_picks_codec_by_content_type():
+    body = codec.encode({**HEADER, "data": {"id": 1}})
+
+    assert decode_body(body, "application/x-etl-rows; charset=binary")["data"] == {"id": 1}
+    assert decode_body(b'{"data": {"id": 1}}', None)["data"] == {"id": 1}
+    with pytest.raises(CodecError):
+        get_codec("application/xml")
+
+
+def test_compressor_skips_bodies_below_threshold():
+    compressor = BodyCompressor("gzip", min_bytes=100)
+
+    assert compressor.compress(b"a" * 99) == (b"a" * 99, None)
+    body, encoding = compressor.compress(b"a" * 100)
+
+    assert encoding == "gzip"
+    assert gzip.decompress(body) == b"a" * 100
+    assert compressor.decompress(body, "GZIP") == b"a" * 100
+    assert compressor.stats["messages"] == 2
+    assert compressor.stats["compressed"] == 1
+
+
+def test_compressor_keeps_body_when_compression_does_not_help():
+    compressor = BodyCompressor("deflate", min_bytes=0)
+
+    assert compressor.compress(b"\x00") == (b"\x00", None)
+
+
+def test_identity_and_missing_encoding_pass_through():
+    compressor = BodyCompressor()
+
+    assert compressor.compress(b"a" * 5000) == (b"a" * 5000, None)
+    assert compressor.decompress(b"raw", "identity") == b"raw"
+    assert compressor.decompress(b"raw", None) == b"raw"
+
+
+def test_unknown_or_corrupt_encoding_raises_codec_error():
+    with pytest.raises(CodecError):
+        BodyCompressor("brotli")
+    with pytest.raises(CodecError):
+        BodyCompressor().decompress(b"raw", "brotli")
+    with pytest.raises(CodecError):
+        BodyCompressor().decompress(b"not gzip", "gzip")
@@ -0,0 +1,54 @@
+# tests/test_columnar.py
+from array import array
+from decimal import Decimal
+
+from fake_odbc import FakeConnection, fake_client
+
+DESCRIPTION = [("id", int), ("gia", float), ("ten", str), ("so_luong", Decimal)]
+
+
+def rows_query(rows):
+    return lambda query, params: (DESCRIPTION, rows)
+
+
+def test_numeric_columns_are_arrays_across_chunks():
+    rows = [(i, i / 2, f"mon {i}", Decimal(i)) for i in range(7)]
+    client = fake_client(FakeConnection(query=rows_query(rows)))
+
+    result = client.execute_columnar("SELECT * FROM dbo.mon", chunk_size=3)
+
+    assert len(result) == 7
+    assert result["id"] == array("q", range(7))
+    assert result["gia"] == array("d", [i / 2 for i in range(7)])
+    assert result["ten"] == [f"mon {i}" for i in range(7)]
+    assert result["so_luong"] == [Decimal(i) for i in range(7)]
+    assert list(result.rows()) == rows
+
+
+def test_null_or_oversized_int_switches_column_to_list():
+    rows = [(1, 1.0, "a", None), (2, None, "b", None), (2 ** 70, 3.0, "c", None)]
+    client = fake_client(FakeConnection(query=rows_query(rows)))
+
+    result = client.execute_columnar("SELECT * FROM dbo.mon", chunk_size=2)
+
+    assert result["id"] == [1, 2, 2 ** 70]
+    assert result["gia"] == [1.0, None, 3.0]
+
+
+def test_empty_result_keeps_column_names():
+    client = fake_client(FakeConnection(query=rows_query([])))
+
+    result = client.execute_columnar("SELECT * FROM dbo.mon")
+
+    assert len(result) == 0
+    assert result.names == ["id", "gia", "ten", "so_luong"]
+    assert "id" in result
+
+
+def test_params_are_passed_to_execute():
+    connection = FakeConnection(query=rows_query([]))
+    client = fake_client(connection)
+
+    client.execute_columnar("SELECT * FROM dbo.mon WHERE id > ?", (5,))
+
+    assert connection.calls("execute") == [("execute", "SELECT * FROM dbo.mon WHERE id > ?", (5,))]
@@ -0,0 +1,36 @@
+# tests/test_concurrency.py
+import threading
+
+import pytest
+
+from etl.utils.concurrency import run_queues_concurrently
+
+QUEUES = [
+    ("queue_khach_hang.p0", "khach_hang"),
+    ("queue_khach_hang.p1", "khach_hang"),
+    ("queue_san_pham", "san_pham"),
+]
+
+
+def test_results_are_keyed_by_queue():
+    results = run_queues_concurrently(QUEUES, lambda queue_name, entity_type: queue_name.upper())
+
+    assert sorted(results) == sorted(queue_name for queue_name, _ in QUEUES)
+    assert results["queue_khach_hang.p1"]["entity_type"] == "khach_hang"
+    assert results["queue_khach_hang.p1"]["result"] == "QUEUE_KHACH_HANG.P1"
+
+
+def test_first_error_is_raised_after_all_workers_finish():
+    finished = []
+    lock = threading.Lock()
+
+    def worker(queue_name, entity_type):
+        if queue_name.endswith(".p0"):
+            raise ValueError(queue_name)
+        with lock:
+            finished.append(queue_name)
+
+    with pytest.raises(ValueError, match="queue_khach_hang.p0"):
+        run_queues_concurrently(QUEUES, worker, max_workers=1)
+
+    assert sorted(finished) == ["queue_khach_hang.p1", "queue_san_pham"]
@@ -0,0 +1,25 @@
+# tests/test_confirms.py
+import pika
+import pytest
+from pika.adapters.blocking_connection import BlockingChannel
+
+from etl.broker.confirms import PIKA_REQUIREMENT, ConfirmPublisher
+
+
+def test_installed_pika_has_the_internals_confirm_publisher_uses():
+    assert callable(getattr(BlockingChannel, "_flush_output", None))
+    assert callable(getattr(pika.channel.Channel, "confirm_delivery", None))
+    assert callable(getattr(pika.channel.Channel, "basic_publish", None))
+
+
+def test_missing_internals_fail_when_the_channel_opens():
+    class Channel:
+        _impl = object()
+        is_closed = False
+
+    with pytest.raises(RuntimeError) as raised:
+        ConfirmPublisher(Channel(), lambda method_frame: None)
+
+    assert "_impl.confirm_delivery" in str(raised.value)
+    assert "_flush_output" in str(raised.value)
+    assert PIKA_REQUIREMENT in str(raised.value)
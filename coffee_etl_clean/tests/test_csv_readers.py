@@ -0,0 +1,100 @@
+# tests/test_csv_readers.py
+import pytest
+
+from etl.readers.csv_staging_reader import (
+    csv_chunk_ranges,
+    csv_offset_reader,
+    csv_range_reader,
+    csv_staging_reader,
+)
+
+ROWS = [
+    ["1", "An", "Cà phê sữa"],
+    ["2", "Bình", '"Ghi chú" có\nxuống dòng'],
+    ["3", "Chi", "a,b"],
+    ["4", "Dũng", "dòng 1\ndòng 2\ndòng 3"],
+    ["5", "Em", ""],
+]
+
+
+def quote(value: str) -> str:
+    if any(char in value for char in ',"\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+@pytest.fixture(params=["\n", "\r\n"], ids=["lf", "crlf"])
+def csv_file(request, tmp_path):
+    newline = request.param
+    lines = ["id,ten,ghi_chu"] + [",".join(quote(value) for value in row) for row in ROWS]
+    text = newline.join(line.replace("\n", newline) for line in lines) + newline
+    path = tmp_path / "khachhang.csv"
+    # BOM như file xuất từ Excel
+    path.write_bytes("\ufeff".encode("utf-8") + text.encode("utf-8"))
+    return str(path)
+
+
+def test_ranges_cover_data_and_never_split_quoted_newlines(csv_file):
+    expected = list(csv_staging_reader(csv_file))
+    ranges = csv_chunk_ranges(csv_file, chunk_bytes=1)
+
+    with open(csv_file, "rb") as f:
+        header_len = len(f.readline())
+        size = len(f.read()) + header_len
+
+    assert len(ranges) == len(ROWS)
+    assert ranges[0][0] == header_len
+    assert ranges[-1][1] == size
+    assert all(end == next_start for (_, end), (next_start, _) in zip(ranges, ranges[1:]))
+    assert [row for start, end in ranges for row in csv_range_reader(csv_file, start, end)] == expected
+
+
+def test_larger_chunks_group_records(csv_file):
+    expected = list(csv_staging_reader(csv_file))
+    ranges = csv_chunk_ranges(csv_file, chunk_bytes=40)
+
+    assert 1 < len(ranges) < len(ROWS)
+    assert [row for start, end in ranges for row in csv_range_reader(csv_file, start, end)] == expected
+
+
+def test_whole_file_is_one_range_without_chunking(csv_file):
+    ranges = csv_chunk_ranges(csv_file, chunk_bytes=0)
+
+    assert len(ranges) == 1
+    assert list(csv_range_reader(csv_file, *ranges[0])) == list(csv_staging_reader(csv_file))
+
+
+def test_header_only_file_has_no_ranges(tmp_path):
+    path = tmp_path / "rong.csv"
+    path.write_bytes(b"id,ten\r\n")
+
+    assert csv_chunk_ranges(str(path), chunk_bytes=1) == []
+    assert list(csv_offset_reader(str(path))) == []
+
+
+def test_offset_reader_matches_staging_reader(csv_file):
+    rows = [row for _, row in csv_offset_reader(csv_file)]
+
+    assert rows == list(csv_staging_reader(csv_file))
+    assert rows[1]["ghi_chu"] == '"Ghi chú" có\nxuống dòng'
+
+
+def test_offset_reader_resumes_after_any_row(csv_file):
+    read = list(csv_offset_reader(csv_file))
+
+    for index, (offset, _) in enumerate(read):
+        resumed = [row for _, row in csv_offset_reader(csv_file, offset)]
+        assert resumed == [row for _, row in read[index + 1:]]
+
+
+def test_offsets_line_up_with_chunk_boundaries(csv_file):
+    offsets = [offset for offset, _ in csv_offset_reader(csv_file)]
+
+    assert offsets == [end for _, end in csv_chunk_ranges(csv_file, chunk_bytes=1)]
+
+
+def test_missing_file_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        csv_chunk_ranges(str(tmp_path / "khong_co.csv"), 1)
+    with pytest.raises(FileNotFoundError):
+        list(csv_offset_reader(str(tmp_path / "khong_co.csv")))
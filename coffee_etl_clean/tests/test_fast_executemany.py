@@ -0,0 +1,65 @@
+# tests/test_fast_executemany.py
+import pytest
+
+from fake_odbc import FakeConnection, fake_client, odbc_error
+
+
+def fail_fast(sqlstate: str):
+    """Driver lỗi `sqlstate` mỗi khi executemany chạy với fast_executemany."""
+    def on_executemany(cursor, query, values):
+        if cursor.fast_executemany:
+            raise odbc_error(sqlstate)
+    return on_executemany
+
+
+def executemany_modes(connection: FakeConnection):
+    return [entry[1] for entry in connection.calls("executemany")]
+
+
+@pytest.mark.parametrize("sqlstate", ["HYC00", "IM001"])
+def test_unsupported_driver_falls_back_to_plain_executemany(sqlstate):
+    connection = FakeConnection(on_executemany=fail_fast(sqlstate))
+    client = fake_client(connection, fast_executemany=True)
+
+    inserted = client.bulk_insert("staging.mon_csv", [{"id": 1}, {"id": 2}], atomic=True)
+
+    assert inserted == 2
+    assert executemany_modes(connection) == [True, False]
+    assert connection.calls("commit") == [("commit",)]
+    assert client.fast_executemany is False
+
+
+def test_fallback_without_atomic_retries_the_batch():
+    connection = FakeConnection(on_executemany=fail_fast("HYC00"))
+    client = fake_client(connection, fast_executemany=True)
+
+    inserted = client.bulk_insert("staging.mon_csv", [{"id": 1}, {"id": 2}], batch_size=1)
+
+    assert inserted == 2
+    assert executemany_modes(connection) == [True, False, False]
+    assert client.fast_executemany is False
+
+
+@pytest.mark.parametrize("sqlstate", ["HY004", "HY010", "HY090", "23000"])
+def test_real_errors_are_raised_and_keep_fast_executemany(sqlstate):
+    connection = FakeConnection(on_executemany=fail_fast(sqlstate))
+    client = fake_client(connection, fast_executemany=True)
+
+    with pytest.raises(Exception):
+        client.bulk_insert("staging.mon_csv", [{"id": 1}], atomic=True)
+
+    assert executemany_modes(connection) == [True]
+    assert connection.calls("commit") == []
+    assert client.fast_executemany is True
+
+
+def test_fallback_inside_transaction_raises_for_caller_to_retry():
+    connection = FakeConnection(on_executemany=fail_fast("HYC00"))
+    client = fake_client(connection, fast_executemany=True)
+
+    with pytest.raises(Exception):
+        with client.transaction():
+            client.bulk_insert("staging.mon_csv", [{"id": 1}], atomic=True)
+
+    assert connection.calls("commit") == []
+    assert client.fast_executemany is False
@@ -0,0 +1,66 @@
+# tests/test_iter_query.py
+import pytest
+
+from fake_odbc import FakeConnection, fake_client
+
+DESCRIPTION = [("id", int), ("ten", str), ("so luong", int)]
+ROWS = [(i, f"mon {i}", i * 10) for i in range(5)]
+
+
+class CountingConnection(FakeConnection):
+    """Đếm số lần fetchmany để kiểm tra iter_query đọc lazy."""
+
+    def __init__(self):
+        super().__init__(query=lambda query, params: (DESCRIPTION, ROWS))
+        self.fetches = 0
+
+    def cursor(self):
+        cursor = super().cursor()
+        fetchmany = cursor.fetchmany
+
+        def counted(size):
+            self.fetches += 1
+            return fetchmany(size)
+
+        cursor.fetchmany = counted
+        return cursor
+
+
+def test_row_shapes():
+    client = fake_client(FakeConnection(query=lambda query, params: (DESCRIPTION, ROWS)))
+
+    dicts = list(client.iter_query("SELECT * FROM dbo.mon"))
+    tuples = list(client.iter_query("SELECT * FROM dbo.mon", row_shape="tuple"))
+    records = list(client.iter_query("SELECT * FROM dbo.mon", row_shape="record"))
+
+    assert dicts[1] == {"id": 1, "ten": "mon 1", "so luong": 10}
+    assert tuples == ROWS
+    assert records[1].ten == "mon 1"
+    # "so luong" không phải identifier → đổi thành _<vị trí>
+    assert records[1]._2 == 10
+
+
+def test_iter_query_is_lazy():
+    connection = CountingConnection()
+    client = fake_client(connection)
+
+    rows = client.iter_query("SELECT * FROM dbo.mon", chunk_size=2, row_shape="tuple")
+    assert connection.fetches == 0
+
+    assert next(rows) == ROWS[0]
+    assert connection.fetches == 1
+
+
+def test_chunks_mode_yields_lists():
+    client = fake_client(FakeConnection(query=lambda query, params: (DESCRIPTION, ROWS)))
+
+    chunks = list(client.iter_query("SELECT * FROM dbo.mon", chunk_size=2, row_shape="tuple", chunks=True))
+
+    assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+
+
+def test_unknown_row_shape():
+    client = fake_client(FakeConnection())
+
+    with pytest.raises(ValueError):
+        client.iter_query("SELECT 1", row_shape="frame")
@@ -0,0 +1,81 @@
+# tests/test_keyset.py
+import sqlite3
+
+import pytest
+
+from etl.db.database_factory import SourceDBReader
+from etl.db.keyset import keyset_predicate
+from fake_odbc import FakeConnection, fake_client, sqlite_query
+
+
+def make_reader(rows, columns=("a", "b", "ten")):
+    db = sqlite3.connect(":memory:")
+    db.execute(f"CREATE TABLE t ({', '.join(columns)})")
+    db.executemany(f"INSERT INTO t VALUES ({', '.join('?' for _ in columns)})", rows)
+    connection = FakeConnection(query=sqlite_query(db))
+    return SourceDBReader(fake_client(connection)), connection
+
+
+def read_keys(reader, chunk_size, key_columns=("a", "b"), **kwargs):
+    chunks = list(reader.read_table_chunked("t", chunk_size=chunk_size, key_columns=list(key_columns), **kwargs))
+    return chunks, [key for chunk in chunks for key in chunk.keys]
+
+
+def page_queries(connection):
+    return [entry for entry in connection.calls("execute") if "FROM dbo.t" in entry[1]]
+
+
+def test_empty_table_yields_nothing():
+    reader, connection = make_reader([])
+
+    chunks, keys = read_keys(reader, chunk_size=10)
+
+    assert chunks == []
+    assert len(page_queries(connection)) == 1
+
+
+def test_composite_key_with_duplicate_leading_values_across_pages():
+    rows = [(a, b, f"{a}-{b}") for a in range(3) for b in range(5)]
+    reader, _ = make_reader(rows)
+
+    chunks, keys = read_keys(reader, chunk_size=4)
+
+    assert keys == [(a, b) for a, b, _ in rows]
+    assert [len(chunk.rows) for chunk in chunks] == [4, 4, 4, 3]
+    assert chunks[1].rows[0]["ten"] == "0-4"
+
+
+def test_resume_after_last_key_of_a_page():
+    rows = [(a, b, None) for a in range(3) for b in range(5)]
+    reader, _ = make_reader(rows)
+
+    first = next(iter(reader.read_table_chunked("t", chunk_size=6, key_columns=["a", "b"])))
+    _, keys = read_keys(reader, chunk_size=6, after=list(first.last_key))
+
+    assert first.last_key == (1, 0)
+    assert keys == [(a, b) for a, b, _ in rows][6:]
+
+
+@pytest.mark.parametrize("count, pages, queries", [(12, [4, 4, 4], 4), (10, [4, 4, 2], 3), (4, [4], 2)])
+def test_last_chunk_boundary(count, pages, queries):
+    reader, connection = make_reader([(i, 0, None) for i in range(count)])
+
+    chunks, keys = read_keys(reader, chunk_size=4)
+
+    assert [len(chunk.rows) for chunk in chunks] == pages
+    assert keys == [(i, 0) for i in range(count)]
+    # Trang cuối đầy thì cần thêm một query rỗng để biết đã hết
+    assert len(page_queries(connection)) == queries
+
+
+def test_until_bound_is_inclusive():
+    reader, _ = make_reader([(i, 0, None) for i in range(10)])
+
+    _, keys = read_keys(reader, chunk_size=3, after=(2, 0), until=(7, 0))
+
+    assert keys == [(i, 0) for i in range(3, 8)]
+
+
+def test_keyset_predicate_checks_bound_arity():
+    with pytest.raises(ValueError):
+        keyset_predicate(["a", "b"], (1,))
@@ -0,0 +1,61 @@
+# tests/test_memory_broker.py
+import time
+
+import pika
+
+from etl.broker.memory_broker import SNAPSHOT_FILE, MemoryBroker
+
+
+def consume(channel, queue):
+    deliveries = []
+    channel.basic_consume(queue, lambda ch, method, properties, body: deliveries.append(method.delivery_tag))
+    channel.connection.process_data_events()
+    return deliveries
+
+
+def test_requeue_keeps_original_expiry():
+    broker = MemoryBroker()
+    broker.declare("q.retry", arguments={"x-message-ttl": 200, "x-dead-letter-exchange": "", "x-dead-letter-routing-key": "q"})
+    broker.declare("q")
+    broker.enqueue("q.retry", b"m")
+    expires_at = broker._expires["q.retry"][0]
+
+    channel = broker.connection().channel()
+    tags = consume(channel, "q.retry")
+    time.sleep(0.01)
+    channel.basic_nack(tags[0], requeue=True)
+
+    assert broker._expires["q.retry"][0] == expires_at
+    assert broker.queues["q.retry"][0][2] is True
+
+
+def test_nacked_message_still_dead_letters_when_ttl_runs_out():
+    broker = MemoryBroker()
+    broker.declare("q.retry", arguments={"x-message-ttl": 50, "x-dead-letter-exchange": "", "x-dead-letter-routing-key": "q"})
+    broker.declare("q")
+    broker.enqueue("q.retry", b"m")
+
+    channel = broker.connection().channel()
+    tags = consume(channel, "q.retry")
+    time.sleep(0.06)
+    channel.basic_cancel(next(iter(channel.consumers)))
+    channel.basic_nack(tags[0], requeue=True)
+    broker.expire()
+
+    assert len(broker.queues["q.retry"]) == 0
+    assert [body for body, _, _ in broker.queues["q"]] == [b"m"]
+
+
+def test_snapshot_round_trip_keeps_persistent_messages(tmp_path):
+    broker = MemoryBroker(str(tmp_path))
+    broker.declare("q", durable=True)
+    broker.enqueue("q", b"persistent", pika.BasicProperties(delivery_mode=2, headers={"x-attempt": 2}))
+    broker.enqueue("q", b"transient", pika.BasicProperties(delivery_mode=1))
+    broker.save()
+
+    restored = MemoryBroker(str(tmp_path))
+
+    assert (tmp_path / SNAPSHOT_FILE).exists()
+    assert [(body, properties.headers) for body, properties, _ in restored.queues["q"]] == [
+        (b"persistent", {"x-attempt": 2})
+    ]
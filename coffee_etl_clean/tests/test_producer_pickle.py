@@ -0,0 +1,43 @@
+# tests/test_producer_pickle.py
+import pickle
+
+import pytest
+
+import STEP1_PRODUCER
+from etl.utils.checkpoint import ProducerCheckpoint
+from etl.utils.watermark_store import WatermarkStore
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setattr(STEP1_PRODUCER.settings, "PRODUCER_CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    monkeypatch.setattr(STEP1_PRODUCER.settings, "SOURCE_WATERMARK_FILE", str(tmp_path / "watermarks.json"))
+    return STEP1_PRODUCER.ProducerPipeline(incremental=True)
+
+
+def test_publish_csv_chunk_pickles(pipeline):
+    # ParallelCSVProducer gửi đúng callable này sang ProcessPoolExecutor
+    publish = pickle.loads(pickle.dumps(pipeline.publish_csv_chunk))
+
+    assert publish.__self__.run_id == pipeline.run_id
+    assert publish.__self__.checkpoint.path == pipeline.checkpoint.path
+
+
+def test_checkpoint_lock_rebuilt_after_unpickle(tmp_path):
+    checkpoint = ProducerCheckpoint("run1", str(tmp_path))
+    checkpoint.advance("sql", "t", [1], 10)
+
+    restored = pickle.loads(pickle.dumps(checkpoint))
+    restored.complete("sql", "t", 12)
+
+    assert restored.get("sql", "t")["done"] is True
+    assert restored.get("sql", "t")["rows"] == 12
+
+
+
+def test_watermark_store_pickles(tmp_path):
+    store = WatermarkStore(str(tmp_path / "wm.json"))
+    restored = pickle.loads(pickle.dumps(store))
+    restored.commit("db.dbo.t", "key", ["id"], [5])
+
+    assert WatermarkStore(str(tmp_path / "wm.json")).get("db.dbo.t")["value"] == [5]
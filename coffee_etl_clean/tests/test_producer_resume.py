@@ -0,0 +1,75 @@
+# tests/test_producer_resume.py
+from types import SimpleNamespace
+
+import pytest
+
+import STEP1_PRODUCER
+
+QUEUE = "queue_khach_hang"
+
+
+class FakeParallelProducer:
+    """ParallelCSVProducer chạy trong process hiện tại; các đoạn trong `fail` bị lỗi."""
+
+    fail = set()
+    published = []
+
+    def __init__(self, client_kwargs, workers=0, chunk_bytes=0):
+        pass
+
+    def produce(self, file_queue_mapping, publish, keepalive=None, ranges=None, on_chunk=None):
+        results = {}
+        for file_path, queue_name in file_queue_mapping.items():
+            result = results[file_path] = {"success": 0, "errors": 0, "queue": queue_name, "chunks": 0, "seconds": 0.0}
+            for start, end in ranges[file_path]:
+                result["chunks"] += 1
+                self.published.append((start, end))
+                if (start, end) in self.fail:
+                    result.update(errors=-1, error="broker nack")
+                    continue
+                on_chunk(file_path, start, end, 1)
+                result["success"] += 1
+        return results
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(STEP1_PRODUCER.settings, "PRODUCER_CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+    monkeypatch.setattr(STEP1_PRODUCER.settings, "PRODUCER_CHUNK_BYTES", 1)
+    monkeypatch.setattr(STEP1_PRODUCER, "ParallelCSVProducer", FakeParallelProducer)
+    FakeParallelProducer.fail = set()
+    FakeParallelProducer.published = []
+
+    (tmp_path / "khachhang.csv").write_bytes(b"id,ten\n1,An\n2,Binh\n3,Chi\n")
+    return tmp_path
+
+
+def produce(run_id, data_dir):
+    pipeline = STEP1_PRODUCER.ProducerPipeline(resume_run_id=run_id, incremental=False)
+    pipeline.topology.ensure_entity = lambda rabbitmq, entity_type: None
+    rabbitmq = SimpleNamespace(
+        client_kwargs=lambda: {},
+        compressor=SimpleNamespace(stats={}),
+        flow=SimpleNamespace(stats={"throttled_seconds": 0.0}),
+    )
+    return pipeline, pipeline.produce_from_csv_parallel(rabbitmq, data_dir, {"khachhang.csv": QUEUE})
+
+
+def test_resume_publishes_only_unfinished_ranges(data_dir):
+    ranges = STEP1_PRODUCER.csv_chunk_ranges(str(data_dir / "khachhang.csv"), 1)
+    FakeParallelProducer.fail = {ranges[1]}
+
+    pipeline, stats = produce(None, data_dir)
+
+    assert stats[QUEUE] == 2
+    assert not (pipeline.checkpoint.get("csv", "khachhang.csv") or {}).get("done")
+
+    FakeParallelProducer.fail = set()
+    FakeParallelProducer.published = []
+    resumed, stats = produce(pipeline.run_id, data_dir)
+
+    assert FakeParallelProducer.published == [ranges[1]]
+    assert stats[QUEUE] == 3
+    entry = resumed.checkpoint.get("csv", "khachhang.csv")
+    assert entry["done"] is True
+    assert entry["rows"] == 3
@@ -0,0 +1,88 @@
+# tests/test_retry.py
+import pickle
+
+import pytest
+
+from etl.broker.rabbitmq_client import PublishNackedError, RabbitMQClient
+from etl.broker.retry import RetryPolicy
+
+QUEUE = "queue_test_retry"
+
+
+def memory_client(tmp_path) -> RabbitMQClient:
+    client = RabbitMQClient(backend="memory", memory_dir=str(tmp_path))
+    client.connect()
+    client.declare_queue(QUEUE)
+    return client
+
+
+def nack_next_confirm(client: RabbitMQClient):
+    """Broker nack message kế tiếp được publish trên channel confirm."""
+    client._open_confirm_channel()
+    confirms = client._confirms
+    wait = confirms.wait
+
+    def wait_with_nack(until=None):
+        if confirms.published_tag > confirms.confirmed_tag:
+            confirms.confirm(confirms.confirmed_tag + 1, nack=True)
+        confirms.wait = wait
+        wait(until)
+
+    confirms.wait = wait_with_nack
+
+
+def test_publish_batch_raises_when_broker_nacks(tmp_path):
+    client = memory_client(tmp_path)
+    nack_next_confirm(client)
+
+    with pytest.raises(PublishNackedError) as raised:
+        client.publish_batch(QUEUE, [{"id": i} for i in range(3)])
+
+    assert raised.value.result["nacked"] == [0]
+    assert raised.value.result["acked"] == 2
+
+
+def test_publish_nacked_error_survives_pickling():
+    error = PublishNackedError(QUEUE, {"published": 3, "acked": 2, "nacked": [1]})
+
+    restored = pickle.loads(pickle.dumps(error))
+
+    assert restored.result == error.result
+    assert str(restored) == str(error)
+
+
+def receive_one(client: RabbitMQClient):
+    received = []
+    client.channel.basic_consume(QUEUE, lambda ch, method, properties, body: received.append((method, properties, body)))
+    client.connection.process_data_events()
+    client.channel.basic_cancel(next(iter(client.channel.consumers)))
+    return received[0]
+
+
+def test_reject_acks_original_after_retry_copy_is_confirmed(tmp_path):
+    client = memory_client(tmp_path)
+    policy = RetryPolicy()
+    policy.declare(client, QUEUE)
+    client.publish(QUEUE, {"id": 1})
+    method, properties, body = receive_one(client)
+
+    target = policy.reject(client, QUEUE, method.delivery_tag, properties, body, ValueError("lỗi"))
+
+    assert target == policy.retry_queue(QUEUE, 1)
+    assert client.get_message_count(target) == 1
+    assert not client.channel.unacked
+
+
+def test_reject_requeues_original_when_retry_copy_is_nacked(tmp_path):
+    client = memory_client(tmp_path)
+    policy = RetryPolicy()
+    policy.declare(client, QUEUE)
+    client.publish(QUEUE, {"id": 1})
+    method, properties, body = receive_one(client)
+    nack_next_confirm(client)
+
+    target = policy.reject(client, QUEUE, method.delivery_tag, properties, body, ValueError("lỗi"))
+
+    assert target == QUEUE
+    assert client.get_message_count(QUEUE) == 1
+    assert not client.channel.unacked
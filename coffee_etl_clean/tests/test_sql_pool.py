@@ -0,0 +1,119 @@
+# tests/test_sql_pool.py
+import threading
+import time
+
+import pytest
+
+from etl.db import sql_client
+from etl.db.pool import SQLServerPool
+from fake_odbc import FakeConnection, odbc_error
+
+SERVER = "localhost,1433"
+DATABASE = "newdata"
+
+
+@pytest.fixture
+def connections(monkeypatch):
+    """Các FakeConnection được pool mở, theo thứ tự connect."""
+    opened = []
+
+    def connect(conn_str):
+        connection = FakeConnection()
+        opened.append(connection)
+        return connection
+
+    monkeypatch.setattr(sql_client.pyodbc, "connect", connect, raising=False)
+    return opened
+
+
+def test_full_pool_waits_for_a_release(connections):
+    pool = SQLServerPool(max_size=1, timeout=5)
+    first = pool.acquire(SERVER, DATABASE)
+    received = []
+
+    worker = threading.Thread(target=lambda: received.append(pool.acquire(SERVER, DATABASE)))
+    worker.start()
+    time.sleep(0.05)
+    assert not received
+
+    pool.release(first)
+    worker.join(timeout=5)
+
+    assert received == [first]
+    assert pool.stats["waits"] == 1
+    assert pool.stats["connects"] == 1
+
+
+def test_full_pool_times_out(connections):
+    pool = SQLServerPool(max_size=1, timeout=0.05)
+    pool.acquire(SERVER, DATABASE)
+
+    with pytest.raises(TimeoutError):
+        pool.acquire(SERVER, DATABASE)
+
+
+def test_nested_checkout_in_same_thread_reuses_client(connections):
+    pool = SQLServerPool(max_size=1, timeout=0.05)
+
+    with pool.client(SERVER, DATABASE) as outer:
+        with pool.client(SERVER, DATABASE) as inner:
+            assert inner is outer
+        # Client lồng bên trong chưa được trả về pool
+        with pytest.raises(TimeoutError):
+            pool.acquire(SERVER, DATABASE)
+
+    assert pool.stats["connects"] == 1
+    assert pool.acquire(SERVER, DATABASE) is outer
+
+
+def test_failed_checkout_rolls_back_before_reuse(connections):
+    pool = SQLServerPool(max_size=1)
+
+    with pytest.raises(ValueError):
+        with pool.client(SERVER, DATABASE) as client:
+            client.connection.autocommit = True
+            raise ValueError("load lỗi")
+
+    assert connections[0].calls("rollback")
+    assert client.connection.autocommit is False
+    with pool.client(SERVER, DATABASE) as reused:
+        assert reused is client
+    assert pool.stats["reuses"] == 1
+
+
+def test_successful_checkout_does_not_roll_back(connections):
+    pool = SQLServerPool(max_size=1)
+
+    with pool.client(SERVER, DATABASE):
+        pass
+
+    assert not connections[0].calls("rollback")
+
+
+def test_dead_idle_connection_is_replaced(connections):
+    pool = SQLServerPool(max_size=1, health_check_interval=0)
+
+    with pool.client(SERVER, DATABASE) as client:
+        def broken(query, params):
+            raise odbc_error("08S01", "Communication link failure")
+        client.connection.query = broken
+
+    with pool.client(SERVER, DATABASE) as replacement:
+        assert replacement is not client
+
+    assert len(connections) == 2
+    assert connections[0].calls("close")
+    assert pool.stats["health_checks"] == 1
+    assert pool.stats["reconnects"] == 1
+
+
+def test_healthy_idle_connection_passes_check(connections):
+    pool = SQLServerPool(max_size=1, health_check_interval=0)
+
+    with pool.client(SERVER, DATABASE) as client:
+        pass
+    with pool.client(SERVER, DATABASE) as reused:
+        assert reused is client
+
+    assert connections[0].calls("execute") == [("execute", "SELECT 1", ())]
+    assert pool.stats["reconnects"] == 0
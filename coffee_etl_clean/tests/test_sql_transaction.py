@@ -0,0 +1,47 @@
+# tests/test_sql_transaction.py
+import pytest
+
+from fake_odbc import FakeConnection, fake_client, odbc_error
+
+
+def fail_on_table(table: str):
+    def on_executemany(cursor, query, values):
+        if table in query:
+            raise odbc_error("23000", "constraint violation")
+    return on_executemany
+
+
+def test_atomic_inserts_commit_once_in_transaction():
+    connection = FakeConnection()
+    client = fake_client(connection)
+
+    with client.transaction():
+        client.bulk_insert("staging.mon_csv", [{"id": 1}], atomic=True)
+        client.bulk_insert("staging.mon_sql", [{"id": 2}], atomic=True)
+        assert connection.calls("commit") == []
+
+    assert connection.calls("commit") == [("commit",)]
+    assert len(connection.calls("executemany")) == 2
+
+
+def test_failure_rolls_back_every_insert_of_the_transaction():
+    connection = FakeConnection(on_executemany=fail_on_table("mon_sql"))
+    client = fake_client(connection)
+
+    with pytest.raises(Exception):
+        with client.transaction():
+            client.bulk_insert("staging.mon_csv", [{"id": 1}], atomic=True)
+            client.bulk_insert("staging.mon_sql", [{"id": 2}], atomic=True)
+
+    assert connection.calls("commit") == []
+    assert connection.calls("rollback")
+    assert not client._in_transaction
+
+
+def test_atomic_insert_outside_transaction_commits_itself():
+    connection = FakeConnection()
+    client = fake_client(connection)
+
+    client.bulk_insert("staging.mon_csv", [{"id": 1}, {"id": 2}], batch_size=1, atomic=True)
+
+    assert connection.calls("commit") == [("commit",)]
@@ -0,0 +1,50 @@
+# tests/test_staging_consumer.py
+from etl.broker.consumer import StagingConsumer
+from etl.broker.framing import build_frame, unpack_message
+from etl.broker.rabbitmq_client import RabbitMQClient
+from etl.broker.retry import ATTEMPT_HEADER, RetryPolicy
+
+QUEUE = "queue_test_staging"
+
+
+def memory_client(tmp_path) -> RabbitMQClient:
+    client = RabbitMQClient(backend="memory", memory_dir=str(tmp_path))
+    client.connect()
+    client.declare_queue(QUEUE)
+    return client
+
+
+def receive(client: RabbitMQClient, queue_name: str):
+    received = []
+    client.channel.basic_consume(queue_name, lambda ch, method, properties, body: received.append((properties, body)))
+    client.connection.process_data_events()
+    client.channel.basic_cancel(next(iter(client.channel.consumers)))
+    return received
+
+
+def test_failed_rows_of_framed_message_are_retried(tmp_path):
+    client = memory_client(tmp_path)
+    rows = [{"id": 1}, {"id": 2}, {"id": 3}]
+    client.publish(QUEUE, build_frame({"source": "csv", "entity_type": "test"}, rows))
+
+    written = []
+
+    def staging_writer(data):
+        if data["id"] == 2:
+            return False
+        written.append(data["id"])
+        return True
+
+    consumer = StagingConsumer(client, staging_writer)
+    consumer.start_consuming(QUEUE, max_messages=2)
+
+    assert written == [1, 3]
+    assert consumer.retried_count == 1
+    assert client.get_message_count(QUEUE) == 0
+    assert not client.channel.unacked
+
+    [(properties, body)] = receive(client, RetryPolicy.retry_queue(QUEUE, 1))
+    source, _, retried_rows = unpack_message(client.decode(body, properties))
+    assert source == "csv"
+    assert retried_rows == [{"id": 2}]
+    assert properties.headers[ATTEMPT_HEADER] == 2
@@ -0,0 +1,100 @@
+# tests/test_watermark.py
+import sqlite3
+from datetime import datetime
+from itertools import product
+
+import pytest
+
+from etl.db.watermark import (
+    IncrementalRange,
+    Watermark,
+    choose_watermark,
+    dump_value,
+    load_value,
+    rowversion_before,
+)
+
+CANDIDATES = ["updated_at", "ngay_cap_nhat"]
+
+
+def test_rowversion_wins_over_datetime_and_identity():
+    columns = [("id", "int", 0, 1), ("updated_at", "datetime2", 0, 0), ("rv", "timestamp", 0, 0)]
+
+    assert choose_watermark(columns, ["id"], CANDIDATES) == Watermark("rowversion", ["rv"])
+
+
+def test_datetime_candidates_follow_candidate_order_and_skip_nullable():
+    columns = [
+        ("id", "int", 0, 1),
+        ("Updated_At", "datetime", 1, 0),
+        ("NGAY_CAP_NHAT", "datetime2", 0, 0),
+    ]
+
+    assert choose_watermark(columns, ["id"], CANDIDATES) == Watermark("updated_at", ["NGAY_CAP_NHAT"])
+
+
+def test_datetime_candidate_must_have_datetime_type():
+    columns = [("id", "int", 0, 1), ("updated_at", "nvarchar", 0, 0)]
+
+    assert choose_watermark(columns, ["id"], CANDIDATES) == Watermark("key", ["id"])
+
+
+def test_key_watermark_needs_single_identity_column():
+    columns = [("ma_don", "int", 0, 0), ("dong", "int", 0, 1)]
+
+    assert choose_watermark(columns, ["ma_don"], CANDIDATES) is None
+    assert choose_watermark(columns, ["ma_don", "dong"], CANDIDATES) is None
+    assert choose_watermark(columns, None, CANDIDATES) is None
+
+
+def matching_rows(incremental: IncrementalRange):
+    """Các (a, b) trong lưới 0..3 x 0..3 thỏa predicate where (chạy trên SQLite)."""
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE t (a INTEGER, b INTEGER)")
+    db.executemany("INSERT INTO t VALUES (?, ?)", list(product(range(4), range(4))))
+    sql, params = incremental.where
+    return db.execute(f"SELECT a, b FROM t WHERE {sql} ORDER BY a, b", params).fetchall()
+
+
+def test_where_on_composite_watermark_reads_low_exclusive_high_inclusive():
+    incremental = IncrementalRange(Watermark("key", ["a", "b"]), (1, 2), (2, 1))
+
+    assert matching_rows(incremental) == [(1, 3), (2, 0), (2, 1)]
+
+
+def test_where_without_low_reads_up_to_high():
+    incremental = IncrementalRange(Watermark("key", ["a", "b"]), None, (0, 2))
+
+    assert matching_rows(incremental) == [(0, 0), (0, 1), (0, 2)]
+
+
+def test_where_without_high_reads_nothing():
+    incremental = IncrementalRange(Watermark("key", ["id"]), (5,), None)
+
+    assert incremental.where == ("1 = 0", [])
+
+
+@pytest.mark.parametrize("kind, value", [
+    ("rowversion", (b"\x00\x00\x00\x00\x00\x00\x07\xd1",)),
+    ("updated_at", (datetime(2024, 5, 6, 7, 8, 9, 123457),)),
+    ("key", (42,)),
+    ("key", None),
+])
+def test_dump_and_load_value_round_trip(kind, value):
+    assert load_value(kind, dump_value(kind, value)) == value
+
+
+def test_incremental_range_dump_load_round_trip():
+    incremental = IncrementalRange(
+        Watermark("rowversion", ["rv"]),
+        (b"\x00\x00\x00\x00\x00\x00\x00\x10",),
+        (b"\x00\x00\x00\x00\x00\x00\x01\x00",),
+    )
+
+    assert incremental.dump()["high"] == ["0000000000000100"]
+    assert IncrementalRange.load(incremental.dump()) == incremental
+
+
+def test_rowversion_before_borrows_across_bytes():
+    assert rowversion_before(b"\x00\x00\x00\x00\x00\x00\x01\x00") == b"\x00\x00\x00\x00\x00\x00\x00\xff"
+    assert rowversion_before(b"\x00\x00\x00\x00\x00\x00\x07\xd1") == b"\x00\x00\x00\x00\x00\x00\x07\xd0"